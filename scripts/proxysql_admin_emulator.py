@@ -0,0 +1,1321 @@
+#!/usr/bin/env -S uv run --quiet --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = []
+# ///
+
+"""
+ProxySQL Admin Interface Emulator v1.0.0
+
+Stand-in for the ProxySQL admin interface (port 6032) used to test, load-test and
+profile proxysql_report.py without a real proxy. Speaks enough of the MySQL wire
+protocol for mysql-connector-python and the mysql CLI (mysql_native_password
+auth, COM_QUERY with multi-statements, COM_PING, COM_INIT_DB, COM_QUIT) and is
+backed by in-memory SQLite tables named and shaped like the real ones, exactly
+as ProxySQL's own admin module is.
+
+With --mysql-port it also stands in for the proxy's data path: client queries
+(e.g. a proxysql_workload.py replay) are digested, served from a query cache
+by the runtime cache rules or delayed by a simulated backend, and show up in
+the stats tables, so cache rules can be benchmarked before rollout.
+
+by George Liu (eva2000) at https://centminmod.com/
+
+Usage:
+    uv run proxysql_admin_emulator.py --port 6032 --digests 1000000 --pool-servers 50 --free-connections 10000
+    uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin
+    uv run proxysql_admin_emulator.py --port 6032 --digests 0 --cache-rules 0 --mysql-port 6033 --workload prod.json
+    uv run proxysql_admin_emulator.py --help
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import re
+import socket
+import socketserver
+import sqlite3
+import struct
+import threading
+import time
+from typing import List, Optional, Tuple
+
+# Schemas follow the ProxySQL 2.x/3.x admin definitions (columns the analyzer reads
+# plus the ones real deployments have, so SELECT * round-trips like the real thing)
+ADMIN_SCHEMA = """
+CREATE TABLE global_variables (
+    variable_name VARCHAR NOT NULL PRIMARY KEY,
+    variable_value VARCHAR NOT NULL);
+CREATE TABLE mysql_servers (
+    hostgroup_id INT CHECK (hostgroup_id>=0) NOT NULL DEFAULT 0,
+    hostname VARCHAR NOT NULL,
+    port INT CHECK (port >= 0 AND port <= 65535) NOT NULL DEFAULT 3306,
+    gtid_port INT NOT NULL DEFAULT 0,
+    status VARCHAR NOT NULL DEFAULT 'ONLINE',
+    weight INT NOT NULL DEFAULT 1,
+    compression INT NOT NULL DEFAULT 0,
+    max_connections INT NOT NULL DEFAULT 1000,
+    max_replication_lag INT NOT NULL DEFAULT 0,
+    use_ssl INT NOT NULL DEFAULT 0,
+    max_latency_ms INT NOT NULL DEFAULT 0,
+    comment VARCHAR NOT NULL DEFAULT '',
+    PRIMARY KEY (hostgroup_id, hostname, port));
+CREATE TABLE mysql_replication_hostgroups (
+    writer_hostgroup INT CHECK (writer_hostgroup>=0) NOT NULL PRIMARY KEY,
+    reader_hostgroup INT NOT NULL CHECK (reader_hostgroup<>writer_hostgroup AND reader_hostgroup>=0),
+    check_type VARCHAR NOT NULL DEFAULT 'read_only',
+    comment VARCHAR NOT NULL DEFAULT '',
+    UNIQUE (reader_hostgroup));
+CREATE TABLE mysql_query_rules (
+    rule_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    active INT CHECK (active IN (0,1)) NOT NULL DEFAULT 0,
+    username VARCHAR,
+    schemaname VARCHAR,
+    flagIN INT CHECK (flagIN >= 0) NOT NULL DEFAULT 0,
+    client_addr VARCHAR,
+    proxy_addr VARCHAR,
+    proxy_port INT,
+    digest VARCHAR,
+    match_digest VARCHAR,
+    match_pattern VARCHAR,
+    negate_match_pattern INT CHECK (negate_match_pattern IN (0,1)) NOT NULL DEFAULT 0,
+    re_modifiers VARCHAR DEFAULT 'CASELESS',
+    flagOUT INT CHECK (flagOUT >= 0),
+    replace_pattern VARCHAR,
+    destination_hostgroup INT DEFAULT NULL,
+    cache_ttl INT CHECK(cache_ttl > 0),
+    cache_empty_result INT CHECK (cache_empty_result IN (0,1)) DEFAULT NULL,
+    cache_timeout INT CHECK(cache_timeout >= 0),
+    reconnect INT CHECK (reconnect IN (0,1)) DEFAULT NULL,
+    timeout INT UNSIGNED CHECK (timeout >= 0),
+    retries INT CHECK (retries>=0 AND retries <=1000),
+    delay INT UNSIGNED CHECK (delay >=0),
+    next_query_flagIN INT UNSIGNED,
+    mirror_flagOUT INT UNSIGNED,
+    mirror_hostgroup INT UNSIGNED,
+    error_msg VARCHAR,
+    OK_msg VARCHAR,
+    sticky_conn INT CHECK (sticky_conn IN (0,1)),
+    multiplex INT CHECK (multiplex IN (0,1,2)),
+    gtid_from_hostgroup INT UNSIGNED,
+    log INT CHECK (log IN (0,1)),
+    apply INT CHECK(apply IN (0,1)) NOT NULL DEFAULT 0,
+    attributes VARCHAR CHECK (JSON_VALID(attributes) OR attributes = '') NOT NULL DEFAULT '',
+    comment VARCHAR);
+CREATE TABLE stats_mysql_query_digest (
+    hostgroup INT,
+    schemaname VARCHAR NOT NULL,
+    username VARCHAR NOT NULL,
+    client_address VARCHAR NOT NULL,
+    digest VARCHAR NOT NULL,
+    digest_text VARCHAR NOT NULL,
+    count_star INTEGER NOT NULL,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    sum_time INTEGER NOT NULL,
+    min_time INTEGER NOT NULL,
+    max_time INTEGER NOT NULL,
+    sum_rows_affected INTEGER NOT NULL,
+    sum_rows_sent INTEGER NOT NULL,
+    PRIMARY KEY(hostgroup, schemaname, username, client_address, digest));
+CREATE TABLE stats_mysql_connection_pool (
+    hostgroup INT,
+    srv_host VARCHAR,
+    srv_port INT,
+    status VARCHAR,
+    ConnUsed INT,
+    ConnFree INT,
+    ConnOK INT,
+    ConnERR INT,
+    MaxConnUsed INT,
+    Queries INT,
+    Queries_GTID_sync INT,
+    Bytes_data_sent INT,
+    Bytes_data_recv INT,
+    Latency_us INT);
+CREATE TABLE stats_mysql_free_connections (
+    fd INT NOT NULL,
+    hostgroup INT NOT NULL,
+    srv_host VARCHAR NOT NULL,
+    srv_port INT NOT NULL,
+    user VARCHAR NOT NULL,
+    schema VARCHAR,
+    init_connect VARCHAR,
+    time_zone VARCHAR,
+    sql_mode VARCHAR,
+    autocommit VARCHAR,
+    idle_ms INT,
+    statistics VARCHAR,
+    mysql_info VARCHAR);
+CREATE TABLE stats_mysql_global (
+    Variable_Name VARCHAR NOT NULL PRIMARY KEY,
+    Variable_Value VARCHAR NOT NULL);
+CREATE TABLE stats_memory_metrics (
+    Variable_Name VARCHAR NOT NULL PRIMARY KEY,
+    Variable_Value VARCHAR NOT NULL);
+CREATE TABLE stats_mysql_commands_counters (
+    Command VARCHAR NOT NULL PRIMARY KEY,
+    Total_Time_us INT NOT NULL,
+    Total_cnt INT NOT NULL,
+    cnt_100us INT NOT NULL,
+    cnt_500us INT NOT NULL,
+    cnt_1ms INT NOT NULL,
+    cnt_5ms INT NOT NULL,
+    cnt_10ms INT NOT NULL,
+    cnt_50ms INT NOT NULL,
+    cnt_100ms INT NOT NULL,
+    cnt_500ms INT NOT NULL,
+    cnt_1s INT NOT NULL,
+    cnt_5s INT NOT NULL,
+    cnt_10s INT NOT NULL,
+    cnt_INFs);
+CREATE TABLE stats_mysql_query_rules (
+    rule_id INTEGER PRIMARY KEY,
+    hits INT NOT NULL);
+CREATE TABLE runtime_checksums_values (
+    name VARCHAR NOT NULL PRIMARY KEY,
+    version INT NOT NULL,
+    epoch INT NOT NULL,
+    checksum VARCHAR NOT NULL);
+"""
+
+MONITOR_SCHEMA = """
+CREATE TABLE monitor.mysql_server_ping_log (
+    hostname VARCHAR NOT NULL,
+    port INT NOT NULL DEFAULT 3306,
+    time_start_us INT NOT NULL DEFAULT 0,
+    ping_success_time_us INT DEFAULT 0,
+    ping_error VARCHAR,
+    PRIMARY KEY (hostname, port, time_start_us));
+CREATE TABLE monitor.mysql_server_connect_log (
+    hostname VARCHAR NOT NULL,
+    port INT NOT NULL DEFAULT 3306,
+    time_start_us INT NOT NULL DEFAULT 0,
+    connect_success_time_us INT DEFAULT 0,
+    connect_error VARCHAR,
+    PRIMARY KEY (hostname, port, time_start_us));
+"""
+
+# Protocol constants
+CLIENT_LONG_PASSWORD = 0x00000001
+CLIENT_FOUND_ROWS = 0x00000002
+CLIENT_LONG_FLAG = 0x00000004
+CLIENT_CONNECT_WITH_DB = 0x00000008
+CLIENT_PROTOCOL_41 = 0x00000200
+CLIENT_TRANSACTIONS = 0x00002000
+CLIENT_SECURE_CONNECTION = 0x00008000
+CLIENT_MULTI_STATEMENTS = 0x00010000
+CLIENT_MULTI_RESULTS = 0x00020000
+CLIENT_PLUGIN_AUTH = 0x00080000
+CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA = 0x00200000
+CLIENT_DEPRECATE_EOF = 0x01000000
+
+SERVER_CAPABILITIES = (CLIENT_LONG_PASSWORD | CLIENT_FOUND_ROWS | CLIENT_LONG_FLAG |
+                       CLIENT_CONNECT_WITH_DB | CLIENT_PROTOCOL_41 | CLIENT_TRANSACTIONS |
+                       CLIENT_SECURE_CONNECTION | CLIENT_MULTI_STATEMENTS | CLIENT_MULTI_RESULTS |
+                       CLIENT_PLUGIN_AUTH | CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA)
+
+SERVER_STATUS_AUTOCOMMIT = 0x0002
+SERVER_MORE_RESULTS_EXISTS = 0x0008
+
+COM_QUIT = 0x01
+COM_INIT_DB = 0x02
+COM_QUERY = 0x03
+COM_PING = 0x0e
+
+MYSQL_TYPE_VAR_STRING = 0xfd
+CHARSET_UTF8MB4 = 45
+
+# Admin commands ProxySQL accepts that have no SQLite meaning; answered with OK
+NOOP_COMMAND_RE = re.compile(
+    r'^\s*(LOAD|SAVE)\s+.+\s+(TO|FROM)\s+(RUNTIME|MEMORY|DISK|RUN|MEM)\s*$'
+    r'|^\s*(SET|PROXYSQL)\s', re.IGNORECASE | re.DOTALL)
+SESSION_VARIABLE_RE = re.compile(r'@@(session\.|global\.)?(\w+)', re.IGNORECASE)
+# Query rule commands the emulator acts on: LOAD ... TO RUNTIME makes the active
+# cache rules serve matching digests from the query cache (LiveLoad)
+RULES_COMMAND_RE = re.compile(r'^\s*(LOAD|SAVE)\s+MYSQL\s+QUERY\s+RULES\s+TO\s+(RUNTIME|RUN|DISK)\s*$',
+                              re.IGNORECASE)
+# Literals the --mysql-port listener replaces with ? to digest client queries,
+# as ProxySQL's query digests do (IN-lists keep their arity: no grouping limit)
+DIGEST_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+WORKLOAD_FORMAT = 'proxysql-report-workload'
+
+
+def lenenc_int(value: int) -> bytes:
+    """Encode a length-encoded integer"""
+    if value < 251:
+        return bytes([value])
+    if value < 2 ** 16:
+        return b'\xfc' + struct.pack('<H', value)
+    if value < 2 ** 24:
+        return b'\xfd' + struct.pack('<I', value)[:3]
+    return b'\xfe' + struct.pack('<Q', value)
+
+
+def lenenc_str(value: bytes) -> bytes:
+    """Encode a length-encoded string"""
+    return lenenc_int(len(value)) + value
+
+
+def native_password_hash(password: str, scramble: bytes) -> bytes:
+    """Expected mysql_native_password client response for a scramble"""
+    if not password:
+        return b''
+    stage1 = hashlib.sha1(password.encode()).digest()
+    stage2 = hashlib.sha1(stage1).digest()
+    mix = hashlib.sha1(scramble + stage2).digest()
+    return bytes(a ^ b for a, b in zip(stage1, mix))
+
+
+def query_digest_text(sql: str) -> str:
+    """Digest text of a client query: literals become ?, whitespace is collapsed"""
+    return ' '.join(DIGEST_LITERAL_RE.sub('?', sql).split()).rstrip(';')
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a multi-statement COM_QUERY on top-level semicolons"""
+    statements = []
+    current = ''
+    for piece in sql.split(';'):
+        current = f"{current};{piece}" if current else piece
+        if sqlite3.complete_statement(current + ';'):
+            if current.strip():
+                statements.append(current.strip())
+            current = ''
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+
+class AdminDatabase:
+    """SQLite tables standing in for ProxySQL's admin, stats and monitor schemas"""
+
+    def __init__(self, version: str = "3.0.2-emulator", latency_ms: float = 0.0,
+                 server_version: str = "8.0.11"):
+        self.version = version
+        self.server_version = server_version
+        self.latency_ms = latency_ms
+        # ProxySQL serializes admin queries on one SQLite handle; so do we
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        self.db.execute("ATTACH DATABASE ':memory:' AS monitor")
+        self.db.executescript(ADMIN_SCHEMA)
+        self.db.executescript(MONITOR_SCHEMA)
+        self.queries_served = 0
+        # Runtime cache rules: (rule_id, digest, match_digest, match_pattern), compiled;
+        # rules_generation changes on every LOAD MYSQL QUERY RULES TO RUNTIME
+        self.runtime_rules: List[Tuple[int, Optional[str], Optional['re.Pattern'], Optional['re.Pattern']]] = []
+        self.rules_generation = 0
+        # rule_id -> (cache_ttl ms, destination_hostgroup) of the runtime cache rules
+        self.rule_settings: dict = {}
+
+    def execute(self, sql: str) -> Tuple[List[str], List[Tuple], int]:
+        """Run one statement: (column names, rows, affected rows)
+
+        Raises sqlite3.Error on bad SQL, like ProxySQL's admin does.
+        """
+        command = RULES_COMMAND_RE.match(sql)
+        if command:
+            if command.group(1).upper() == 'LOAD':
+                count = self.load_query_rules()
+                with self.lock:
+                    # Like ProxySQL: new runtime rules start from 0 hits and a new epoch
+                    self.db.execute("UPDATE stats_mysql_query_rules SET hits = 0")
+                    self.db.execute("INSERT OR REPLACE INTO runtime_checksums_values "
+                                    "SELECT 'mysql_query_rules', COALESCE(MAX(version), 0) + 1, "
+                                    "CAST(strftime('%s', 'now') AS INT), printf('0x%016X', random() & 0xFFFFFFFFFFFF) "
+                                    "FROM runtime_checksums_values WHERE name = 'mysql_query_rules'")
+                print(f"ℹ  LOAD MYSQL QUERY RULES TO RUNTIME: {count} cache rules at runtime")
+            else:
+                print("ℹ  SAVE MYSQL QUERY RULES TO DISK")
+            return [], [], 0
+        if NOOP_COMMAND_RE.match(sql):
+            return [], [], 0
+
+        # ProxySQL answers @@variables itself rather than via SQLite
+        if sql.lstrip().upper().startswith('SELECT') and '@@' in sql and 'FROM' not in sql.upper():
+            return self._select_session_variables(sql)
+
+        with self.lock:
+            self.queries_served += 1
+            cursor = self.db.execute(sql)
+            if cursor.description is None:
+                return [], [], max(cursor.rowcount, 0)
+            columns = [d[0] for d in cursor.description]
+            return columns, cursor.fetchall(), 0
+
+    def load_query_rules(self) -> int:
+        """Compile the active cache rules of mysql_query_rules as the runtime set; returns their count
+
+        Rules with a regex Python cannot compile are skipped, as ProxySQL skips
+        rules whose regex fails to compile.
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT rule_id, digest, match_digest, match_pattern, re_modifiers, cache_ttl, destination_hostgroup "
+                "FROM mysql_query_rules WHERE active = 1 AND cache_ttl > 0 ORDER BY rule_id").fetchall()
+            rules, settings = [], {}
+            for rule_id, digest, match_digest, match_pattern, modifiers, cache_ttl, destination in rows:
+                flags = re.IGNORECASE if 'CASELESS' in (modifiers or '').upper() else 0
+                try:
+                    rules.append((rule_id, digest or None,
+                                  re.compile(match_digest, flags) if match_digest else None,
+                                  re.compile(match_pattern, flags) if match_pattern else None))
+                except re.error:
+                    continue
+                settings[rule_id] = (int(cache_ttl), destination)
+            self.db.executemany("INSERT OR IGNORE INTO stats_mysql_query_rules VALUES (?, 0)",
+                                [(rule[0],) for rule in rules])
+            self.runtime_rules = rules
+            self.rule_settings = settings
+            self.rules_generation += 1
+        return len(rules)
+
+    def cache_rule_for(self, digest: str, digest_text: str) -> Optional[int]:
+        """rule_id of the first runtime cache rule matching a digest, like the query processor
+
+        match_pattern is tested against digest_text with every ? replaced by 1,
+        as proxysql_report.py --simulate-rules does; flagIN chains are ignored.
+        """
+        query_text = digest_text.replace('?', '1')
+        for rule_id, rule_digest, match_digest, match_pattern in self.runtime_rules:
+            if rule_digest and rule_digest.lower() != digest.lower():
+                continue
+            if match_digest is not None and not match_digest.search(digest_text):
+                continue
+            if match_pattern is not None and not match_pattern.search(query_text):
+                continue
+            return rule_id
+        return None
+
+    def _select_session_variables(self, sql: str) -> Tuple[List[str], List[Tuple], int]:
+        """Answer SELECT @@version and friends"""
+        values = {'version': self.version, 'version_comment': '(ProxySQL Admin Module)',
+                  'max_allowed_packet': '67108864', 'sql_mode': '', 'autocommit': '1'}
+        columns, row = [], []
+        for match in SESSION_VARIABLE_RE.finditer(sql):
+            columns.append(match.group(0))
+            row.append(values.get(match.group(2).lower(), ''))
+        return columns, [tuple(row)], 0
+
+
+class AdminSession(socketserver.BaseRequestHandler):
+    """One client connection speaking the MySQL text protocol"""
+
+    server: 'EmulatorServer'
+
+    def setup(self):
+        self.seq = 0
+        self.client_flags = 0
+        self.username = ''
+        self.schemaname = ''
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.request.makefile('rb')
+
+    def finish(self):
+        self.rfile.close()
+
+    # Packet framing
+
+    def read_packet(self) -> Optional[bytes]:
+        payload = b''
+        while True:
+            header = self.rfile.read(4)
+            if len(header) < 4:
+                return None
+            length = header[0] | (header[1] << 8) | (header[2] << 16)
+            self.seq = (header[3] + 1) & 0xff
+            chunk = self.rfile.read(length)
+            if len(chunk) < length:
+                return None
+            payload += chunk
+            if length < 0xffffff:
+                return payload
+
+    def packet(self, payload: bytes) -> bytes:
+        out = b''
+        while True:
+            chunk, payload = payload[:0xffffff], payload[0xffffff:]
+            out += struct.pack('<I', len(chunk))[:3] + bytes([self.seq]) + chunk
+            self.seq = (self.seq + 1) & 0xff
+            if len(chunk) < 0xffffff:
+                return out
+
+    def send(self, *payloads: bytes):
+        self.request.sendall(b''.join(self.packet(p) for p in payloads))
+
+    def ok_packet(self, affected: int = 0, status: int = SERVER_STATUS_AUTOCOMMIT, eof: bool = False) -> bytes:
+        return (b'\xfe' if eof else b'\x00') + lenenc_int(affected) + lenenc_int(0) + struct.pack('<HH', status, 0)
+
+    def eof_packet(self, status: int = SERVER_STATUS_AUTOCOMMIT) -> bytes:
+        return b'\xfe' + struct.pack('<HH', 0, status)
+
+    def err_packet(self, code: int, message: str, state: str = 'HY000') -> bytes:
+        return b'\xff' + struct.pack('<H', code) + b'#' + state.encode() + message.encode()
+
+    # Connection phase
+
+    def handle(self):
+        if not self.authenticate():
+            return
+        while True:
+            self.seq = 0
+            payload = self.read_packet()
+            if not payload or payload[0] == COM_QUIT:
+                return
+            command, body = payload[0], payload[1:]
+            if command == COM_QUERY:
+                self.handle_query(body.decode('utf-8', errors='replace'))
+            elif command in (COM_PING, COM_INIT_DB):
+                if command == COM_INIT_DB:
+                    self.schemaname = body.decode('utf-8', errors='replace')
+                self.send(self.ok_packet())
+            else:
+                self.send(self.err_packet(1047, 'Unknown command', '08S01'))
+
+    def authenticate(self) -> bool:
+        scramble = bytes(random.randint(1, 127) for _ in range(20))
+        conn_id = self.server.next_connection_id()
+        # Like ProxySQL, the handshake advertises mysql-server_version, not the proxy version
+        handshake = (b'\x0a' + self.server.database.server_version.encode() + b'\x00' +
+                     struct.pack('<I', conn_id) + scramble[:8] + b'\x00' +
+                     struct.pack('<H', SERVER_CAPABILITIES & 0xffff) + bytes([CHARSET_UTF8MB4]) +
+                     struct.pack('<H', SERVER_STATUS_AUTOCOMMIT) +
+                     struct.pack('<H', SERVER_CAPABILITIES >> 16) + bytes([21]) + b'\x00' * 10 +
+                     scramble[8:] + b'\x00' + b'mysql_native_password\x00')
+        self.send(handshake)
+
+        response = self.read_packet()
+        if not response or len(response) < 32:
+            return False
+        self.client_flags = struct.unpack('<I', response[:4])[0]
+        pos = 32
+        end = response.index(b'\x00', pos)
+        username = response[pos:end].decode()
+        pos = end + 1
+        if self.client_flags & CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA:
+            length = response[pos]
+            pos += 1
+        else:
+            length = response[pos]
+            pos += 1
+        auth = response[pos:pos + length]
+        pos += length
+        if self.client_flags & CLIENT_CONNECT_WITH_DB and pos < len(response):
+            end = response.index(b'\x00', pos)
+            self.schemaname = response[pos:end].decode('utf-8', errors='replace')
+            pos = end + 1
+        plugin = ''
+        if self.client_flags & CLIENT_PLUGIN_AUTH and pos < len(response):
+            end = response.find(b'\x00', pos)
+            plugin = response[pos:end if end >= 0 else None].decode()
+
+        if plugin and plugin != 'mysql_native_password':
+            # Ask the client to redo auth with the plugin we support
+            self.send(b'\xfe' + b'mysql_native_password\x00' + scramble + b'\x00')
+            auth = self.read_packet() or b''
+
+        if not self.server.accepts(username, auth, scramble):
+            self.send(self.err_packet(1045, f"ProxySQL Error: Access denied for user '{username}'", '28000'))
+            return False
+        self.username = username
+        self.send(self.ok_packet())
+        return True
+
+    # Command phase
+
+    def handle_query(self, sql: str):
+        statements = split_statements(sql)
+        if not statements:
+            self.send(self.err_packet(1065, 'Query was empty', '42000'))
+            return
+        if len(statements) > 1 and not self.client_flags & CLIENT_MULTI_STATEMENTS:
+            self.send(self.err_packet(1064, 'Multi-statements not enabled for this connection', '42000'))
+            return
+        if self.server.database.latency_ms:
+            # Simulated network wait, once per COM_QUERY (a multi-statement batch is
+            # one round trip) and outside the lock like a real round trip
+            time.sleep(self.server.database.latency_ms / 1000.0)
+
+        for index, statement in enumerate(statements):
+            status = SERVER_STATUS_AUTOCOMMIT
+            if index < len(statements) - 1:
+                status |= SERVER_MORE_RESULTS_EXISTS
+            try:
+                columns, rows, affected = self.execute(statement)
+            except sqlite3.Error as e:
+                # An error ends the whole multi-statement batch
+                self.send(self.err_packet(1045, f"ProxySQL Admin Error: {e}"))
+                return
+            if columns:
+                self.send_resultset(columns, rows, status)
+            else:
+                self.send(self.ok_packet(affected, status))
+
+    def execute(self, statement: str) -> Tuple[List[str], List[Tuple], int]:
+        """Run one statement of a COM_QUERY: (column names, rows, affected rows)"""
+        return self.server.database.execute(statement)
+
+    def send_resultset(self, columns: List[str], rows: List[Tuple], status: int):
+        """Send a text resultset; like ProxySQL admin, every column is a string"""
+        deprecate_eof = bool(self.client_flags & CLIENT_DEPRECATE_EOF)
+        out = [self.packet(lenenc_int(len(columns)))]
+        for name in columns:
+            name_bytes = name.encode()
+            out.append(self.packet(
+                lenenc_str(b'def') + lenenc_str(b'') + lenenc_str(b'') + lenenc_str(b'') +
+                lenenc_str(name_bytes) + lenenc_str(name_bytes) + b'\x0c' +
+                struct.pack('<HIBHB', CHARSET_UTF8MB4, 255, MYSQL_TYPE_VAR_STRING, 0, 0) + b'\x00\x00'))
+        if not deprecate_eof:
+            out.append(self.packet(self.eof_packet(status)))
+        for row in rows:
+            out.append(self.packet(b''.join(
+                b'\xfb' if value is None else lenenc_str(str(value).encode()) for value in row)))
+            if len(out) >= 1000:
+                # Stream large resultsets instead of building them whole
+                self.request.sendall(b''.join(out))
+                out = []
+        if deprecate_eof:
+            out.append(self.packet(self.ok_packet(0, status, eof=True)))
+        else:
+            out.append(self.packet(self.eof_packet(status)))
+        self.request.sendall(b''.join(out))
+
+
+class EmulatorServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Threaded TCP server sharing one AdminDatabase"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+    session_class = AdminSession
+
+    def __init__(self, address: Tuple[str, int], database: AdminDatabase,
+                 admin_user: str = 'admin', admin_password: str = 'admin'):
+        super().__init__(address, self.session_class)
+        self.database = database
+        self.admin_user = admin_user
+        self.admin_password = admin_password
+        self._connection_id = 0
+        self._id_lock = threading.Lock()
+
+    def next_connection_id(self) -> int:
+        with self._id_lock:
+            self._connection_id += 1
+            return self._connection_id
+
+    def accepts(self, username: str, auth: bytes, scramble: bytes) -> bool:
+        """Check a client's mysql_native_password credentials against the admin user"""
+        return username == self.admin_user and auth == native_password_hash(self.admin_password, scramble)
+
+
+class WorkloadGenerator:
+    """Fill the emulator tables with a synthetic, reproducible workload"""
+
+    TABLES = ['users', 'orders', 'products', 'sessions', 'carts', 'payments',
+              'inventory', 'reviews', 'categories', 'shipments']
+    USERS = ['app', 'api', 'batch', 'reporting', 'web']
+
+    def __init__(self, database: AdminDatabase, seed: int = 42, writer_hostgroup: int = 10,
+                 reader_hostgroup: int = 20):
+        self.database = database
+        self.rng = random.Random(seed)
+        self.writer_hostgroup = writer_hostgroup
+        self.reader_hostgroup = reader_hostgroup
+        self.now_us = int(time.time() * 1_000_000)
+
+    def insert_many(self, sql: str, rows, batch: int = 50000):
+        """Bulk insert from an iterator without materializing it"""
+        db = self.database.db
+        with self.database.lock:
+            db.execute('BEGIN')
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= batch:
+                    db.executemany(sql, chunk)
+                    chunk = []
+            if chunk:
+                db.executemany(sql, chunk)
+            db.execute('COMMIT')
+
+    def servers(self, count: int) -> List[Tuple[int, str, int]]:
+        """Backends: first server is the writer, the rest are readers"""
+        servers = [(self.writer_hostgroup, '10.0.0.1', 3306)]
+        servers += [(self.reader_hostgroup, f'10.0.1.{i}', 3306) for i in range(1, count)]
+        return servers
+
+    def digest_text(self, index: int) -> str:
+        """Deterministic, realistic-looking digest text for digest number `index`"""
+        rng = random.Random(index)
+        table = rng.choice(self.TABLES)
+        kind = rng.random()
+        if kind < 0.70:
+            shape = rng.randrange(6)
+            if shape == 0:
+                return f"SELECT * FROM {table} WHERE id = ?"
+            if shape == 1:
+                return f"SELECT id, name, status FROM {table} WHERE status = ? ORDER BY id DESC LIMIT ?"
+            if shape == 2:
+                args = ','.join('?' * rng.randint(1, 8))
+                return f"SELECT * FROM {table} WHERE id IN ({args})"
+            if shape == 3:
+                other = rng.choice(self.TABLES)
+                return f"SELECT {table}.* FROM {table} JOIN {other} ON {other}.{table}_id = {table}.id WHERE {other}.id = ?"
+            if shape == 4:
+                return f"SELECT COUNT(*) FROM {table} WHERE created_at > ?"
+            return f"SELECT col{index % 97}, col{index % 89} FROM {table} WHERE tenant_id = ? AND col{index % 83} = ?"
+        if kind < 0.85:
+            return f"UPDATE {table} SET status = ?, updated_at = ? WHERE id = ?"
+        if kind < 0.95:
+            return f"INSERT INTO {table} (id, status, created_at) VALUES (?,?,?)"
+        return f"DELETE FROM {table} WHERE id = ?"
+
+    def fill_digests(self, count: int):
+        """Zipf-like digest table: a few hot digests, a long cold tail"""
+        def rows():
+            for i in range(count):
+                text = self.digest_text(i)
+                is_select = text.startswith('SELECT')
+                count_star = max(1, int(2_000_000 / (i + 1) ** 0.9 * self.rng.uniform(0.5, 1.5)))
+                avg_us = self.rng.lognormvariate(6.0, 1.2)
+                sum_time = int(count_star * avg_us)
+                hostgroup = self.writer_hostgroup if (not is_select or self.rng.random() < 0.3) else self.reader_hostgroup
+                digest = '0x' + hashlib.md5(f'{i}:{text}'.encode()).hexdigest()[:16].upper()
+                yield (hostgroup, 'appdb', self.USERS[i % len(self.USERS)], '', digest, text,
+                       count_star, self.now_us // 1_000_000 - 86400, self.now_us // 1_000_000,
+                       sum_time, max(1, int(avg_us * 0.3)), int(avg_us * self.rng.uniform(2, 40)),
+                       0 if is_select else count_star, count_star * self.rng.randint(1, 50) if is_select else 0)
+        self.insert_many("INSERT INTO stats_mysql_query_digest VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", rows())
+
+    def fill_pool(self, server_count: int, free_connections: int):
+        """Connection pool, free connection list and backend server config"""
+        servers = self.servers(server_count)
+        per_server = max(1, free_connections // len(servers))
+        pool_rows = []
+        for hostgroup, host, port in servers:
+            used = self.rng.randint(1, 50)
+            conn_ok = self.rng.randint(100, 5000)
+            conn_err = self.rng.choice([0, 0, 0, self.rng.randint(1, 40)])
+            queries = conn_ok * self.rng.randint(5, 500)
+            pool_rows.append((hostgroup, host, port, 'ONLINE', used, per_server, conn_ok, conn_err,
+                              used + self.rng.randint(0, 50), queries, 0, queries * 120, queries * 900,
+                              self.rng.randint(150, 15000)))
+        self.insert_many("INSERT INTO stats_mysql_connection_pool VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", pool_rows)
+        self.insert_many("INSERT INTO mysql_servers (hostgroup_id, hostname, port) VALUES (?,?,?)", servers)
+        self.insert_many("INSERT INTO mysql_replication_hostgroups (writer_hostgroup, reader_hostgroup) VALUES (?,?)",
+                         [(self.writer_hostgroup, self.reader_hostgroup)])
+
+        def free_rows():
+            fd = 100
+            for hostgroup, host, port in servers:
+                for _ in range(per_server):
+                    fd += 1
+                    yield (fd, hostgroup, host, port, self.rng.choice(self.USERS), 'appdb', '', 'SYSTEM',
+                           '', '1', int(self.rng.expovariate(1 / 60000)), '{}', '')
+        self.insert_many("INSERT INTO stats_mysql_free_connections VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", free_rows())
+
+    def fill_monitor(self, server_count: int, samples: int, interval_ms: int = 10000):
+        """Ping/connect logs covering the last `samples` monitor intervals"""
+        servers = self.servers(server_count)
+
+        def ping_rows():
+            for _, host, port in servers:
+                slow = self.rng.random() < 0.2
+                for n in range(samples):
+                    start = self.now_us - n * interval_ms * 1000
+                    if self.rng.random() < 0.01:
+                        yield (host, port, start, 0, 'timeout on ping')
+                    else:
+                        spike = slow and self.rng.random() < 0.01
+                        yield (host, port, start, int(200_000 if spike else self.rng.lognormvariate(5.5, 0.4)), None)
+
+        def connect_rows():
+            for _, host, port in servers:
+                for n in range(max(1, samples // 6)):
+                    start = self.now_us - n * interval_ms * 6000
+                    if self.rng.random() < 0.01:
+                        yield (host, port, start, 0, "Access denied for user 'monitor'")
+                    else:
+                        yield (host, port, start, int(self.rng.lognormvariate(7.0, 0.5)), None)
+
+        self.insert_many("INSERT INTO monitor.mysql_server_ping_log VALUES (?,?,?,?,?)", ping_rows())
+        self.insert_many("INSERT INTO monitor.mysql_server_connect_log VALUES (?,?,?,?,?)", connect_rows())
+
+    def fill_globals(self, cache_rules: int):
+        """stats_mysql_global, memory metrics, command counters, variables and rules"""
+        questions = self.rng.randint(10_000_000, 500_000_000)
+        count_get = questions // 3
+        stats = {
+            'ProxySQL_Uptime': self.rng.randint(3600, 30 * 86400),
+            'Active_Transactions': self.rng.randint(0, 20),
+            'Client_Connections_connected': self.rng.randint(100, 5000),
+            'Server_Connections_created': self.rng.randint(50, 500),
+            'Questions': questions,
+            'Slow_queries': questions // self.rng.randint(200, 5000),
+            'Query_Cache_Memory_bytes': self.rng.randint(1, 256) * 1024 * 1024,
+            'Query_Cache_count_GET': count_get,
+            'Query_Cache_count_GET_OK': int(count_get * self.rng.uniform(0.2, 0.9)),
+            'Query_Cache_count_SET': count_get // 4,
+            'Query_Cache_bytes_IN': count_get * 800,
+            'Query_Cache_bytes_OUT': count_get * 600,
+            'Query_Cache_Purged': count_get // 10,
+            'Query_Cache_Entries': self.rng.randint(100, 100000),
+            'Com_backend_stmt_prepare': 0,
+            'mysql_backend_buffers_bytes': self.rng.randint(1, 64) * 1024 * 1024,
+        }
+        self.insert_many("INSERT INTO stats_mysql_global VALUES (?,?)",
+                         [(k, str(v)) for k, v in stats.items()])
+        # Rules loaded at startup (from the config file), so rule hits cover the whole uptime
+        self.insert_many("INSERT INTO runtime_checksums_values VALUES (?,?,?,?)",
+                         [('mysql_query_rules', 1, int(time.time()) - stats['ProxySQL_Uptime'], '0x0000000000000001')])
+
+        allocated = self.rng.randint(200, 2000) * 1024 * 1024
+        memory = {
+            'SQLite3_memory_bytes': self.rng.randint(2, 80) * 1024 * 1024,
+            'jemalloc_resident': int(allocated * self.rng.uniform(1.05, 1.8)),
+            'jemalloc_active': int(allocated * 1.02),
+            'jemalloc_allocated': allocated,
+            'jemalloc_mapped': allocated * 2,
+            'jemalloc_metadata': allocated // 50,
+            'jemalloc_retained': allocated // 4,
+            'Auth_memory': self.rng.randint(10, 500) * 1024,
+            'query_digest_memory': self.rng.randint(1, 300) * 1024 * 1024,
+            'stack_memory_mysql_threads': 8 * 1024 * 1024 * 4,
+            'stack_memory_admin_threads': 8 * 1024 * 1024,
+            'stack_memory_cluster_threads': 0,
+        }
+        self.insert_many("INSERT INTO stats_memory_metrics VALUES (?,?)",
+                         [(k, str(v)) for k, v in memory.items()])
+
+        commands = ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SET', 'SHOW', 'REPLACE']
+        self.insert_many("INSERT INTO stats_mysql_commands_counters VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                         [(c, questions // (i + 2) * 300, questions // (i + 2)) + (0,) * 12
+                          for i, c in enumerate(commands)])
+
+        variables = {
+            'mysql-query_cache_size_MB': '256',
+            'mysql-query_cache_stores_empty_result': 'true',
+            'mysql-query_cache_soft_ttl_pct': '0',
+            'mysql-query_cache_handle_warnings': '0',
+            'admin-stats_mysql_query_cache': '60',
+            'mysql-monitor_enabled': 'true',
+            'mysql-monitor_ping_interval': '10000',
+            'mysql-monitor_connect_interval': '60000',
+            'mysql-monitor_read_only_interval': '1500',
+            'mysql-monitor_username': 'monitor',
+            'mysql-monitor_history': '600000',
+            'mysql-max_connections': '2048',
+            'mysql-wait_timeout': '28800000',
+            'mysql-free_connections_pct': '10',
+            'mysql-long_query_time': '1000',
+            'mysql-threads': '4',
+        }
+        self.insert_many("INSERT INTO global_variables VALUES (?,?)", list(variables.items()))
+
+        rules = []
+        for n in range(cache_rules):
+            table = self.TABLES[n % len(self.TABLES)]
+            rules.append((100 + n, 1, f'^SELECT .* FROM {table} WHERE id = .*', self.reader_hostgroup, 5000, 1))
+        self.insert_many("INSERT INTO mysql_query_rules (rule_id, active, match_pattern, destination_hostgroup, cache_ttl, apply) "
+                         "VALUES (?,?,?,?,?,?)", rules)
+        self.insert_many("INSERT INTO stats_mysql_query_rules VALUES (?,?)",
+                         [(r[0], self.rng.randint(0, 100000) if n % 3 else 0) for n, r in enumerate(rules)])
+
+
+class LiveLoad(threading.Thread):
+    """Advance the cumulative counters every tick, as a proxy under load would
+
+    Digest hits follow the same Zipf-like skew as WorkloadGenerator (rows were
+    inserted hottest first, so low rowids are hot). One ping sample per backend
+    is logged each tick and samples older than mysql-monitor_history are pruned.
+
+    Executions of a digest matched by a runtime cache rule are answered from
+    the query cache rule_hit_rate of the time: those go to the digest's
+    hostgroup -1 row (as ProxySQL records cache hits) and to Query_Cache
+    GET_OK, never reach a backend, and count as hits of the rule. The rest run
+    on the backend at the digest's usual latency times cache_rule_penalty.
+    """
+
+    CACHE_HIT_US = 50   # time recorded for an execution answered from the query cache
+
+    def __init__(self, database: AdminDatabase, qps: int, interval: float = 1.0,
+                 hit_rate: float = 0.6, seed: int = 42, rule_hit_rate: float = 0.8,
+                 cache_rule_penalty: float = 1.0):
+        super().__init__(name='live-load', daemon=True)
+        self.database = database
+        self.qps = qps
+        self.interval = interval
+        self.hit_rate = hit_rate
+        self.rule_hit_rate = rule_hit_rate
+        self.cache_rule_penalty = cache_rule_penalty
+        self.rng = random.Random(seed)
+        self.stop_event = threading.Event()
+        self.digest_rows = None   # rowids hits are drawn from (hostgroup -1 rows are added after)
+        # rowid -> (cache rule_id or None, average time, digest row key) for rules_generation
+        self.matched: dict = {}
+        self.matched_generation = -1
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.tick()
+
+    def tick(self):
+        db = self.database.db
+        now = time.time()
+        queries = int(self.qps * self.interval)
+        with self.database.lock:
+            if self.digest_rows is None:
+                self.digest_rows = db.execute("SELECT MAX(rowid) FROM stats_mysql_query_digest").fetchone()[0] or 0
+            hits: dict = {}
+            if self.digest_rows:
+                for _ in range(min(queries, 2000)):
+                    rowid = min(self.digest_rows, int(self.rng.paretovariate(1.1)))
+                    hits[rowid] = hits.get(rowid, 0) + max(1, queries // 2000)
+
+            backend, cached, rule_hits = [], [], {}
+            rule_gets = rule_served = 0
+            for rowid, n in hits.items():
+                rule_id, avg_us, key = self.cache_rule(rowid)
+                if rule_id is None:
+                    backend.append((n, n, int(now), rowid))
+                    continue
+                served = min(n, int(n * self.rule_hit_rate + self.rng.random()))
+                rule_gets += n
+                rule_served += served
+                rule_hits[rule_id] = rule_hits.get(rule_id, 0) + n
+                if served:
+                    cached.append((served, served * self.CACHE_HIT_US, int(now)) + key)
+                if n > served:
+                    missed = n - served
+                    db.execute("UPDATE stats_mysql_query_digest SET count_star = count_star + ?, "
+                               "sum_time = sum_time + ?, last_seen = ? WHERE rowid = ?",
+                               (missed, int(missed * avg_us * self.cache_rule_penalty), int(now), rowid))
+            db.executemany(
+                "UPDATE stats_mysql_query_digest SET count_star = count_star + ?, "
+                "sum_time = sum_time + ? * (sum_time / count_star), last_seen = ? WHERE rowid = ?",
+                backend)
+            if cached:
+                db.executemany(
+                    "INSERT OR IGNORE INTO stats_mysql_query_digest "
+                    "SELECT -1, schemaname, username, client_address, digest, digest_text, "
+                    "0, ?, ?, 0, ?, ?, 0, 0 FROM stats_mysql_query_digest "
+                    "WHERE hostgroup = ? AND schemaname = ? AND username = ? AND client_address = ? AND digest = ?",
+                    [(c[2], c[2], self.CACHE_HIT_US, self.CACHE_HIT_US) + c[3:] for c in cached])
+                db.executemany(
+                    "UPDATE stats_mysql_query_digest SET count_star = count_star + ?, "
+                    "sum_time = sum_time + ?, last_seen = ? WHERE hostgroup = -1 "
+                    "AND schemaname = ? AND username = ? AND client_address = ? AND digest = ?",
+                    [c[:3] + c[4:] for c in cached])
+                db.executemany("UPDATE stats_mysql_query_rules SET hits = hits + ? WHERE rule_id = ?",
+                               [(n, rule_id) for rule_id, n in rule_hits.items()])
+
+            gets = queries // 3
+            counters = {
+                'Questions': queries,
+                'Slow_queries': queries // 2000,
+                'Query_Cache_count_GET': gets + rule_gets,
+                'Query_Cache_count_GET_OK': int(gets * self.hit_rate) + rule_served,
+                'Query_Cache_count_SET': int(gets * (1 - self.hit_rate)) + rule_gets - rule_served,
+                'Query_Cache_Purged': gets // 20,
+                'ProxySQL_Uptime': int(self.interval),
+            }
+            db.executemany(
+                "UPDATE stats_mysql_global SET Variable_Value = CAST(Variable_Value AS INTEGER) + ? "
+                "WHERE Variable_Name = ?", [(v, k) for k, v in counters.items()])
+
+            servers = db.execute("SELECT rowid, srv_host, srv_port FROM stats_mysql_connection_pool").fetchall()
+            if servers:
+                per_server = (queries - rule_served) // len(servers)
+                db.executemany(
+                    "UPDATE stats_mysql_connection_pool SET Queries = Queries + ?, "
+                    "ConnOK = ConnOK + ?, ConnERR = ConnERR + ? WHERE rowid = ?",
+                    [(per_server, self.rng.randint(0, 3), 1 if self.rng.random() < 0.05 else 0, rowid)
+                     for rowid, _, _ in servers])
+                now_us = int(now * 1_000_000)
+                db.executemany(
+                    "INSERT OR IGNORE INTO monitor.mysql_server_ping_log VALUES (?,?,?,?,?)",
+                    [(host, port, now_us, int(self.rng.lognormvariate(5.5, 0.4)), None)
+                     for _, host, port in servers])
+                history = db.execute("SELECT variable_value FROM global_variables "
+                                     "WHERE variable_name = 'mysql-monitor_history'").fetchone()
+                history_us = int(history[0]) * 1000 if history else 600_000_000
+                db.execute("DELETE FROM monitor.mysql_server_ping_log WHERE time_start_us < ?",
+                           (now_us - history_us,))
+
+    def cache_rule(self, rowid: int) -> Tuple[Optional[int], float, Tuple]:
+        """(runtime cache rule_id or None, average time, row key) of one digest row
+
+        Memoized per rules_generation, so rules are only matched again after a
+        LOAD MYSQL QUERY RULES TO RUNTIME. Called with the database lock held.
+        """
+        if self.matched_generation != self.database.rules_generation:
+            self.matched = {}
+            self.matched_generation = self.database.rules_generation
+        entry = self.matched.get(rowid)
+        if entry is None:
+            row = self.database.db.execute(
+                "SELECT hostgroup, schemaname, username, client_address, digest, digest_text, "
+                "sum_time * 1.0 / count_star FROM stats_mysql_query_digest WHERE rowid = ?", (rowid,)).fetchone()
+            if row is None or not self.database.runtime_rules:
+                entry = (None, 0.0, ())
+            else:
+                entry = (self.database.cache_rule_for(row[4], row[5]), row[6] or 0.0, tuple(row[:5]))
+            self.matched[rowid] = entry
+        return entry
+
+
+class QueryTraffic(threading.Thread):
+    """Serve the --mysql-port client traffic the way ProxySQL's query cache would
+
+    Every query is digested (literals become ?) and matched against the runtime
+    cache rules. A SELECT matched by a rule is answered from a query cache keyed
+    on user, schema and query text while its entry is younger than the rule's
+    cache_ttl: that execution is a hostgroup -1 row of its digest and a
+    Query_Cache GET_OK, and never reaches a backend. Everything else waits the
+    digest's backend time (avg_time_us of a --workload file, else
+    --backend-latency-ms; times cache_rule_penalty for rule-matched digests),
+    on the rule's destination_hostgroup or the writer hostgroup.
+
+    Counters are kept in memory and written to stats_mysql_query_digest,
+    stats_mysql_global, stats_mysql_query_rules and stats_mysql_connection_pool
+    every interval, so proxysql_report.py (--watch, --apply) sees the replayed
+    traffic like a real proxy's.
+    """
+
+    MAX_ROWS = 100          # rows a resultset carries at most, whatever rows_per_exec says
+    ROW_BYTES = 64          # query cache bytes per cached row
+    COUNTERS = ('Questions', 'Query_Cache_count_GET', 'Query_Cache_count_GET_OK', 'Query_Cache_count_SET',
+                'Query_Cache_bytes_IN', 'Query_Cache_bytes_OUT', 'Query_Cache_Purged')
+
+    def __init__(self, database: AdminDatabase, backend_latency_ms: float = 1.0, workload: Optional[dict] = None,
+                 cache_rule_penalty: float = 1.0, default_hostgroup: int = 10, interval: float = 1.0):
+        super().__init__(name='query-traffic', daemon=True)
+        self.database = database
+        self.backend_us = backend_latency_ms * 1000
+        # digest text -> (average backend time us, rows per execution), from --workload
+        self.workload = workload or {}
+        self.cache_rule_penalty = cache_rule_penalty
+        self.default_hostgroup = default_hostgroup
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.cache: dict = {}       # (username, schemaname, query) -> (expires at, bytes)
+        self.matched: dict = {}     # digest text -> cache rule_id or None, for matched_generation
+        self.matched_generation = -1
+        # Not yet flushed: digest row key -> [count, sum_time, min, max, rows_affected, rows_sent, first, last]
+        self.pending: dict = {}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.rule_hits: dict = {}
+        self.backend_queries: dict = {}   # hostgroup -> executions
+        # Counters start from zero, so cache hit rates reflect the replayed traffic only;
+        # uptime, rule hits and the rule load time restart with them
+        self.started = time.time()
+        with database.lock:
+            database.db.executemany("INSERT OR REPLACE INTO stats_mysql_global VALUES (?, '0')",
+                                    [(name,) for name in self.COUNTERS + ('Query_Cache_Entries',
+                                                                          'Query_Cache_Memory_bytes',
+                                                                          'ProxySQL_Uptime')])
+            database.db.execute("UPDATE runtime_checksums_values SET epoch = ? WHERE name = 'mysql_query_rules'",
+                                (int(self.started),))
+            database.db.execute("UPDATE stats_mysql_query_rules SET hits = 0")
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+
+    def cache_rule(self, digest: str, text: str) -> Optional[int]:
+        """Runtime cache rule_id matching a SELECT digest, memoized per rules_generation"""
+        with self.lock:
+            if self.matched_generation != self.database.rules_generation:
+                self.matched = {}
+                self.matched_generation = self.database.rules_generation
+            if text not in self.matched:
+                self.matched[text] = self.database.cache_rule_for(digest, text)
+            return self.matched[text]
+
+    def execute(self, username: str, schemaname: str, sql: str) -> Tuple[List[str], List[Tuple], int]:
+        """Run one client query: (column names, rows, affected rows)"""
+        text = query_digest_text(sql)
+        digest = '0x' + hashlib.md5(text.encode()).hexdigest()[:16].upper()
+        avg_us, rows_per_exec = self.workload.get(text, (self.backend_us, 1.0))
+        is_select = text[:6].upper() == 'SELECT'
+        rows = max(1, min(self.MAX_ROWS, round(rows_per_exec))) if is_select else 0
+        rule_id = self.cache_rule(digest, text) if is_select else None
+        cache_ttl, destination = self.database.rule_settings.get(rule_id, (0, None))
+        hostgroup = destination if destination is not None else self.default_hostgroup
+
+        key = (username, schemaname, sql)
+        started = time.time()
+        with self.lock:
+            entry = self.cache.get(key) if rule_id is not None else None
+        hit = entry is not None and entry[0] > started
+        if hit:
+            hostgroup, elapsed_us = -1, LiveLoad.CACHE_HIT_US
+        else:
+            time.sleep(avg_us * (self.cache_rule_penalty if rule_id is not None else 1.0) / 1_000_000)
+            elapsed_us = int((time.time() - started) * 1_000_000)
+
+        size = rows * self.ROW_BYTES
+        with self.lock:
+            self.counters['Questions'] += 1
+            if rule_id is not None:
+                self.counters['Query_Cache_count_GET'] += 1
+                self.rule_hits[rule_id] = self.rule_hits.get(rule_id, 0) + 1
+                if hit:
+                    self.counters['Query_Cache_count_GET_OK'] += 1
+                    self.counters['Query_Cache_bytes_OUT'] += size
+                else:
+                    self.cache[key] = (started + cache_ttl / 1000, size)
+                    self.counters['Query_Cache_count_SET'] += 1
+                    self.counters['Query_Cache_bytes_IN'] += size
+            if not hit:
+                self.backend_queries[hostgroup] = self.backend_queries.get(hostgroup, 0) + 1
+            stats = self.pending.get((hostgroup, schemaname, username, digest, text))
+            if stats is None:
+                stats = self.pending[(hostgroup, schemaname, username, digest, text)] = \
+                    [0, 0, elapsed_us, elapsed_us, 0, 0, int(started), 0]
+            stats[0] += 1
+            stats[1] += elapsed_us
+            stats[2] = min(stats[2], elapsed_us)
+            stats[3] = max(stats[3], elapsed_us)
+            stats[4] += 0 if is_select else 1
+            stats[5] += rows
+            stats[7] = int(started)
+        if is_select:
+            return ['c'], [('1',)] * rows, 0
+        return [], [], 1
+
+    def flush(self):
+        """Write the counters gathered since the last flush and purge expired cache entries"""
+        now = time.time()
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            counters, self.counters = self.counters, dict.fromkeys(self.COUNTERS, 0)
+            rule_hits, self.rule_hits = self.rule_hits, {}
+            backend_queries, self.backend_queries = self.backend_queries, {}
+            expired = [key for key, (expires, _) in self.cache.items() if expires <= now]
+            for key in expired:
+                del self.cache[key]
+            counters['Query_Cache_Purged'] += len(expired)
+            entries, memory = len(self.cache), sum(size for _, size in self.cache.values())
+        db = self.database.db
+        with self.database.lock:
+            db.execute("UPDATE stats_mysql_global SET Variable_Value = ? WHERE Variable_Name = 'ProxySQL_Uptime'",
+                       (str(int(now - self.started)),))
+        if not pending and not expired:
+            return
+
+        with self.database.lock:
+            db.executemany(
+                "INSERT OR IGNORE INTO stats_mysql_query_digest VALUES (?,?,?,'',?,?,0,?,?,0,?,?,0,0)",
+                [key + (stats[6], stats[7], stats[2], stats[3]) for key, stats in pending.items()])
+            db.executemany(
+                "UPDATE stats_mysql_query_digest SET count_star = count_star + ?, sum_time = sum_time + ?, "
+                "min_time = MIN(min_time, ?), max_time = MAX(max_time, ?), sum_rows_affected = sum_rows_affected + ?, "
+                "sum_rows_sent = sum_rows_sent + ?, last_seen = ? WHERE hostgroup = ? AND schemaname = ? "
+                "AND username = ? AND client_address = '' AND digest = ?",
+                [tuple(stats[:6]) + (stats[7],) + key[:4] for key, stats in pending.items()])
+            db.executemany(
+                "UPDATE stats_mysql_global SET Variable_Value = CAST(Variable_Value AS INTEGER) + ? "
+                "WHERE Variable_Name = ?", [(v, k) for k, v in counters.items()])
+            db.executemany("UPDATE stats_mysql_global SET Variable_Value = ? WHERE Variable_Name = ?",
+                           [(str(entries), 'Query_Cache_Entries'), (str(memory), 'Query_Cache_Memory_bytes')])
+            db.executemany("UPDATE stats_mysql_query_rules SET hits = hits + ? WHERE rule_id = ?",
+                           [(n, rule_id) for rule_id, n in rule_hits.items()])
+            for hostgroup, queries in backend_queries.items():
+                servers = [row[0] for row in db.execute(
+                    "SELECT rowid FROM stats_mysql_connection_pool WHERE hostgroup = ?", (hostgroup,))]
+                if servers:
+                    db.executemany("UPDATE stats_mysql_connection_pool SET Queries = Queries + ? WHERE rowid = ?",
+                                   [(queries // len(servers) + (n < queries % len(servers)), rowid)
+                                    for n, rowid in enumerate(servers)])
+
+
+class TrafficSession(AdminSession):
+    """One client connection of the --mysql-port listener (the proxy's data path)"""
+
+    server: 'TrafficServer'
+
+    def execute(self, statement: str) -> Tuple[List[str], List[Tuple], int]:
+        # Connector session setup (SET ..., SELECT @@...) is answered as the admin does
+        if NOOP_COMMAND_RE.match(statement) or (
+                statement.lstrip().upper().startswith('SELECT') and '@@' in statement
+                and 'FROM' not in statement.upper()):
+            return self.server.database.execute(statement)
+        return self.server.traffic.execute(self.username, self.schemaname, statement)
+
+
+class TrafficServer(EmulatorServer):
+    """Threaded TCP server for client traffic; any user and password is accepted"""
+
+    session_class = TrafficSession
+
+    def __init__(self, address: Tuple[str, int], database: AdminDatabase, traffic: QueryTraffic):
+        super().__init__(address, database)
+        self.traffic = traffic
+
+    def accepts(self, username: str, auth: bytes, scramble: bytes) -> bool:
+        return True
+
+
+def load_workload(path: str) -> dict:
+    """Backend time and rows per execution of each digest of a proxysql_report.py --workload FILE
+
+    Keyed by the digest text the --mysql-port listener computes for the
+    replayed queries: (avg_time_us, rows_per_exec).
+    """
+    with open(path, encoding='utf-8') as f:
+        spec = json.load(f)
+    if not isinstance(spec, dict) or spec.get('format') != WORKLOAD_FORMAT:
+        raise ValueError(f"{path} is not a ProxySQL report workload (write one with proxysql_report.py --workload FILE)")
+    return {query_digest_text(d['sql']): (d['avg_time_us'], d['rows_per_exec']) for d in spec['digests']}
+
+
+def load_snapshot(database: AdminDatabase, path: str) -> int:
+    """Seed the emulator from a proxysql_report.py --capture file; returns rows loaded"""
+    loaded = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        info = json.loads(f.readline() or '{}')
+        if info.get('format') != 'proxysql-report-snapshot':
+            raise ValueError(f"{path} is not a ProxySQL report snapshot")
+        database.version = info.get('proxysql_version', database.version)
+        offset = int(time.time() - info.get('captured_at', time.time()))
+        insert, batch = None, []
+        with database.lock:
+            for line in f:
+                record = json.loads(line)
+                if isinstance(record, list):
+                    batch.append(record)
+                    loaded += 1
+                elif 'table' in record:
+                    columns = ', '.join(f'"{c}"' for c in record['columns'])
+                    database.db.execute(f"DELETE FROM {record['table']}")
+                    insert = (f"INSERT OR REPLACE INTO {record['table']} ({columns}) "
+                              f"VALUES ({', '.join('?' * len(record['columns']))})")
+                elif 'end' in record and batch:
+                    database.db.executemany(insert, batch)
+                    batch = []
+            # The rule load time moves with the capture moment, as proxysql_report.py does offline
+            database.db.execute("UPDATE runtime_checksums_values SET epoch = epoch + ? WHERE epoch > 0", (offset,))
+    return loaded
+
+
+def build_database(args) -> AdminDatabase:
+    """Create and populate the emulator database from CLI arguments"""
+    database = AdminDatabase(version=args.proxysql_version, latency_ms=args.latency_ms)
+    if args.from_snapshot:
+        started = time.time()
+        rows = load_snapshot(database, args.from_snapshot)
+        database.load_query_rules()
+        print(f"✔  Loaded {rows:,} rows from snapshot {args.from_snapshot} in {time.time() - started:.1f}s")
+        return database
+
+    generator = WorkloadGenerator(database, seed=args.seed)
+    started = time.time()
+    generator.fill_globals(args.cache_rules)
+    generator.fill_pool(args.pool_servers, args.free_connections)
+    generator.fill_monitor(args.pool_servers, args.monitor_samples)
+    generator.fill_digests(args.digests)
+    database.load_query_rules()
+    print(f"✔  Generated {args.digests:,} digests, {args.pool_servers} backends, "
+          f"{args.free_connections:,} free connections in {time.time() - started:.1f}s")
+    return database
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(
+        description="ProxySQL Admin Interface Emulator - SQLite-backed stand-in for load-testing proxysql_report.py",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  uv run proxysql_admin_emulator.py --port 16032
+  uv run proxysql_admin_emulator.py --port 16032 --digests 1000000 --free-connections 10000 --latency-ms 5
+  uv run proxysql_admin_emulator.py --port 16032 --live-qps 5000
+  uv run proxysql_admin_emulator.py --port 16032 --live-qps 1000 --cache-rule-penalty 1.5
+  uv run proxysql_admin_emulator.py --port 16032 --from-snapshot node1.snap.gz
+  uv run proxysql_admin_emulator.py --port 16032 --digests 0 --cache-rules 0 --mysql-port 16033 --workload prod.json
+
+by George Liu (eva2000) at https://centminmod.com/
+        """
+    )
+
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=6032,
+                       help='Port to listen on (default: 6032)')
+    parser.add_argument('--user', default='admin',
+                       help='Admin user to accept (default: admin)')
+    parser.add_argument('--password', default='admin',
+                       help='Admin password to accept (default: admin)')
+    parser.add_argument('--digests', type=int, default=5000,
+                       help='Rows in stats_mysql_query_digest (default: 5000)')
+    parser.add_argument('--pool-servers', type=int, default=4,
+                       help='Backend servers in the connection pool (default: 4)')
+    parser.add_argument('--free-connections', type=int, default=200,
+                       help='Rows in stats_mysql_free_connections (default: 200)')
+    parser.add_argument('--monitor-samples', type=int, default=60,
+                       help='Ping log samples per backend (default: 60)')
+    parser.add_argument('--cache-rules', type=int, default=5,
+                       help='Existing cache rules in mysql_query_rules (default: 5)')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                       help='Simulated delay added to every query round trip (default: 0)')
+    parser.add_argument('--live-qps', type=int, default=0,
+                       help='Advance counters every second as if serving this many queries/s (default: 0 = static)')
+    parser.add_argument('--cache-rule-penalty', type=float, default=1.0, metavar='FACTOR',
+                       help='With --live-qps or --mysql-port, multiply the backend time of digests matched by a runtime cache rule '
+                            '(e.g. 1.5 to exercise proxysql_report.py --apply rollback; default: 1.0)')
+    parser.add_argument('--from-snapshot', metavar='FILE',
+                       help='Serve the tables of a proxysql_report.py --capture FILE instead of generated data')
+    parser.add_argument('--mysql-port', type=int, metavar='PORT',
+                       help='Also accept client traffic on PORT (any user/password): queries are digested, '
+                            'answered from the query cache by the runtime cache rules or after the backend time, '
+                            'and recorded in the stats tables')
+    parser.add_argument('--workload', metavar='FILE',
+                       help='With --mysql-port, take each digest\'s backend time and result rows from a '
+                            'proxysql_report.py --workload FILE')
+    parser.add_argument('--backend-latency-ms', type=float, default=1.0, metavar='MS',
+                       help='With --mysql-port, backend time of digests not in --workload (default: 1.0)')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Random seed for reproducible workloads (default: 42)')
+    parser.add_argument('--proxysql-version', default='3.0.2-emulator',
+                       help='Version string reported by SELECT @@version')
+    parser.add_argument('--version', action='version', version='ProxySQL Admin Interface Emulator 1.0.0')
+
+    args = parser.parse_args()
+    if args.workload and not args.mysql_port:
+        parser.error("--workload needs --mysql-port PORT")
+    workload = None
+    if args.workload:
+        try:
+            workload = load_workload(args.workload)
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"cannot read workload file {args.workload}: {e}")
+
+    database = build_database(args)
+    server = EmulatorServer((args.host, args.port), database, args.user, args.password)
+    if args.live_qps:
+        LiveLoad(database, args.live_qps, seed=args.seed, cache_rule_penalty=args.cache_rule_penalty).start()
+        print(f"✔  Live load: counters advancing at {args.live_qps:,} queries/s")
+    if args.mysql_port:
+        traffic = QueryTraffic(database, backend_latency_ms=args.backend_latency_ms, workload=workload,
+                               cache_rule_penalty=args.cache_rule_penalty)
+        traffic.start()
+        traffic_server = TrafficServer((args.host, args.mysql_port), database, traffic)
+        threading.Thread(target=traffic_server.serve_forever, name='mysql-port', daemon=True).start()
+        source = f"backend times of {len(workload):,} workload digests" if workload else \
+            f"{args.backend_latency_ms:g} ms backend time"
+        print(f"✔  Client traffic on {args.host}:{args.mysql_port} (any user; {source})")
+    print(f"✔  Listening on {args.host}:{args.port} (user: {args.user})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nℹ  Shutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
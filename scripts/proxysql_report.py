@@ -21,20 +21,310 @@ Usage:
 """
 
 import argparse
+import contextlib
+import functools
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
 import sys
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+import threading
+import time
+import weakref
+from array import array
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
+from dataclasses import asdict, dataclass, field, fields, replace
 from datetime import datetime
 
 try:
     import mysql.connector
     from mysql.connector import Error
+    from mysql.connector.constants import DEFAULT_CONFIGURATION as CONNECTOR_DEFAULTS
 except ImportError:
     print("Error: mysql-connector-python not installed. Run with: uv run proxysql_report.py")
     sys.exit(1)
 
+try:
+    import numpy as np
+except ImportError:
+    # Optional: only --columnar needs it (uv run --with numpy proxysql_report.py ...)
+    np = None
+
+
+# Every table a get_* collector reads; --capture dumps exactly these
+SNAPSHOT_TABLES = [
+    'stats_mysql_query_digest',
+    'stats_mysql_global',
+    'stats_mysql_connection_pool',
+    'stats_mysql_commands_counters',
+    'stats_mysql_free_connections',
+    'stats_memory_metrics',
+    'global_variables',
+    'mysql_query_rules',
+    'stats_mysql_query_rules',
+    'runtime_checksums_values',
+    'mysql_servers',
+    'mysql_replication_hostgroups',
+    'monitor.mysql_server_ping_log',
+    'monitor.mysql_server_connect_log',
+]
+SNAPSHOT_FORMAT = 'proxysql-report-snapshot'
+SNAPSHOT_VERSION = 1
+
+# Free connections idle longer than this are stale (potential leaks)
+STALE_IDLE_MS = 300000
+
+# Cache worthiness score of a digest (digest_cache_score and its vectorized
+# DigestFrame.cache_score): executions, total time (μs) and average time (μs)
+# are each divided by their scale, capped at CACHE_SCORE_CAP and weighted
+CACHE_SCORE_CAP = 1000
+CACHE_SCORE_COUNT_SCALE = 10
+CACHE_SCORE_COUNT_WEIGHT = 0.4
+CACHE_SCORE_SUM_TIME_SCALE = 100000
+CACHE_SCORE_SUM_TIME_WEIGHT = 0.3
+CACHE_SCORE_AVG_TIME_SCALE = 1000
+CACHE_SCORE_AVG_TIME_WEIGHT = 0.3
+
+# Connection pool efficiency score, 0-100 (ConnectionPoolStats.efficiency_score
+# and its vectorized PoolFrame.efficiency_scores): weights of the four 0-100
+# parts, utilization that counts as optimal (higher can indicate saturation),
+# queries per connection that count as excellent, and latency bands as
+# (up to ms, score) with the points lost per ms beyond the last band
+POOL_SCORE_WEIGHTS = {'success': 0.35, 'utilization': 0.25, 'queries_per_conn': 0.25, 'latency': 0.15}
+POOL_SCORE_OPTIMAL_UTILIZATION = 80
+POOL_SCORE_QUERIES_PER_CONN = 100
+POOL_SCORE_LATENCY_BANDS = ((2, 100), (5, 80), (10, 50))
+POOL_SCORE_LATENCY_PENALTY = 5
+
+# Health checks: the monitor log window reported, and the bucket size of the
+# rolling per-backend aggregates kept between reads (MonitorLogWindow)
+MONITOR_WINDOW_SECONDS = 300
+MONITOR_BUCKET_US = 10_000_000
+
+# Anomaly detection (--anomalies): default alert threshold in standard
+# deviations, EWMA weight of the newest interval, intervals
+# before a digest's baseline is trusted, executions below which an interval is
+# too quiet to judge, share of interval query time that makes a new digest hot,
+# digests kept in the state file, memory samples kept and the jemalloc resident
+# growth per day that is flagged
+ANOMALY_SIGMA = 3.0
+ANOMALY_EWMA_ALPHA = 0.3
+ANOMALY_WARMUP = 3
+ANOMALY_MIN_EXECUTIONS = 20
+ANOMALY_NEW_HOT_SHARE = 0.01
+ANOMALY_TRACK_DIGESTS = 5000
+ANOMALY_MEMORY_SAMPLES = 48
+ANOMALY_MEMORY_GROWTH_PCT = 10.0
+
+# Baseline comparison (--baseline / --compare): digests kept in a baseline file
+# (by total query time), executions a digest needs in both runs to be compared,
+# share of query time below which a slower digest is listed but does not fail
+# the run, and the default regression thresholds (--threshold NAME=VALUE)
+BASELINE_TOP_DIGESTS = 500
+BASELINE_MIN_EXECUTIONS = 100
+BASELINE_MIN_SHARE = 0.005
+BASELINE_THRESHOLDS = {
+    'digest_time_pct': 20.0,        # per-digest average time increase, %
+    'cache_hit_rate_pts': 5.0,      # query cache hit rate drop, percentage points
+    'multiplexing_pct': 20.0,       # multiplexing ratio drop, %
+    'pool_efficiency_pts': 10.0,    # per-backend efficiency score drop, points
+    'memory_pct': 25.0,             # jemalloc resident growth, %
+}
+
+# Latency sketches: relative error of every quantile, and the most logarithmic
+# bins one sketch keeps (the lowest are merged beyond that)
+LATENCY_SKETCH_ACCURACY = 0.01
+LATENCY_SKETCH_BINS = 1024
+
+# Simulated rules whose regex averages more than this per evaluation are flagged
+# as expensive (Python re timing - a relative cost, ProxySQL itself uses RE2/PCRE)
+RULE_REGEX_COST_WARN_US = 10.0
+
+# What proposed cache rules match on (--rule-match): a match_pattern regex built
+# from the digest text (cut after FROM beyond 100 characters), an anchored
+# match_digest of the whole digest text, or the digest hash itself (no regex)
+RULE_MATCH_MODES = ('pattern', 'match_digest', 'digest')
+
+# Regex cache rule conversion (--convert-rules): digest texts both regexes of a
+# rule are timed on, and timed runs of which the fastest counts (like timeit);
+# timing once per replayed evaluation is too noisy to compare sub-μs regexes
+RULE_CONVERT_SAMPLE = 1000
+RULE_CONVERT_REPEAT = 5
+
+# --rule-chain only renumbers live rules when the reordered chain saves at least
+# this share of the evaluations of the pruned chain; smaller savings are noise
+# in the hit counters and not worth rewriting rule_ids for
+RULE_CHAIN_MIN_SAVING_PCT = 5.0
+
+# Query cache simulation: candidate TTLs, cache sizes as multiples of
+# mysql-query_cache_size_MB, and the assumed resultset size per row / per entry
+CACHE_SIM_TTLS_MS = [1000, 5000, 10000, 30000, 60000]
+CACHE_SIM_SIZE_FACTORS = [0.5, 1, 2, 4]
+CACHE_SIM_ROW_BYTES = 128
+CACHE_SIM_ENTRY_OVERHEAD = 256
+
+# History store retention: raw samples, then 1-minute and 1-hour rollups (hour
+# rows are kept until the disk cap trims them)
+HISTORY_RAW_RETENTION = 2 * 3600
+HISTORY_MINUTE_RETENTION = 7 * 86400
+
+# Fleet mode: a top digest whose busiest node runs this many times the per-node
+# mean is skewed; a node whose question rate is this far off an even share is flagged
+FLEET_SKEW_WARN = 1.5
+FLEET_SHARE_WARN = 0.25
+
+# Report renderers (--format) and the markers of the free connection and memory
+# recommendation sections, by severity
+REPORT_FORMATS = ('text', 'json', 'ndjson')
+EMOJI_MARKERS = {'ok': '✔  ', 'info': 'ℹ️  ', 'tip': '💡 ', 'warning': '⚠️  ', 'critical': '✗  '}
+
+# Canary apply (--apply): backend executions a digest needs in both observation
+# windows to count towards the latency change, connection attempts each window
+# needs before error rates are compared, and the smallest drop in backend
+# queries per client query / rise in cache hit rate that counts as a benefit
+APPLY_MIN_EXECUTIONS = 10
+APPLY_MIN_CONNECTS = 50
+APPLY_MIN_OFFLOAD_PCT = 1.0
+APPLY_MIN_HIT_RATE_PTS = 1.0
+
+# Read/write split advisor (--routing): executions a read-only digest needs on a
+# writer hostgroup to be considered, the functions and variables that tie a
+# SELECT to its session or to the writer's state (it must stay on the writer),
+# and the table references compared for read-after-write
+ROUTING_MIN_EXECUTIONS = 100
+ROUTING_SESSION_RE = re.compile(
+    r'\b(LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|CONNECTION_ID|GET_LOCK|RELEASE_LOCK|RELEASE_ALL_LOCKS|'
+    r'IS_FREE_LOCK|IS_USED_LOCK|MASTER_POS_WAIT|SOURCE_POS_WAIT|WAIT_FOR_EXECUTED_GTID_SET)\b|@',
+    re.IGNORECASE)
+ROUTING_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+`?(\w+(?:`?\.`?\w+)?)', re.IGNORECASE)
+
+# Digest clustering (--cluster-digests): tokenizations memoized per digest hash
+# (kept across passes, oldest dropped first), the most digest shapes one cluster
+# rule's match_digest alternation lists before the cluster is split over more
+# rules, the digest_text tokens, and an IN-list of placeholders in any arity
+# (ProxySQL ends lists cut by mysql-query_digests_grouping_limit with ,...)
+CLUSTER_TOKEN_CACHE = 200000
+CLUSTER_MAX_SHAPES = 16
+DIGEST_TOKEN_RE = re.compile(r"`[^`]*`|'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\.\.\.|\?|\w+|<=>|<>|!=|<=|>=|\S")
+DIGEST_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*(?:\s*,\s*\.\.\.)?\s*\)', re.IGNORECASE)
+
+# Workload replay (--workload FILE): file format tag, the statements replayed
+# (SET / SHOW / BEGIN ... depend on session state and are left out), columns
+# whose placeholders get quoted strings or datetimes instead of integers, the
+# value of every LIMIT / OFFSET placeholder, the first datetime of the time
+# placeholders (2026-01-01 00:00:00 UTC) and the ,... ending grouped lists
+WORKLOAD_FORMAT = 'proxysql-report-workload'
+WORKLOAD_VERSION = 1
+WORKLOAD_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+WORKLOAD_TIME_COLUMN_RE = re.compile(r'(?:_at|_on|date|time|timestamp)$', re.IGNORECASE)
+WORKLOAD_STRING_COLUMN_RE = re.compile(
+    r'(?:^|_)(?:status|state|type|kind|name|slug|title|email|code|token|uuid|hash|lang|locale|country)$',
+    re.IGNORECASE)
+WORKLOAD_LIMIT = 20
+WORKLOAD_TIME_BASE = 1767225600
+WORKLOAD_GROUPED_RE = re.compile(r'\s*,\s*\.\.\.')
+
+
+def regex_literal(text: str) -> str:
+    """text as a regex matching itself (spaces left unescaped, as in hand-written rules)"""
+    return re.escape(text).replace('\\ ', ' ')
+
+
+def digest_cache_score(count_star: int, sum_time: int) -> float:
+    """Cache worthiness score (weighted algorithm) from raw digest counters"""
+    avg_time = sum_time / count_star if count_star > 0 else 0
+
+    # Score components (normalized to 0-CACHE_SCORE_CAP range)
+    count_score = min(count_star / CACHE_SCORE_COUNT_SCALE, CACHE_SCORE_CAP) * CACHE_SCORE_COUNT_WEIGHT
+    sum_score = min(sum_time / CACHE_SCORE_SUM_TIME_SCALE, CACHE_SCORE_CAP) * CACHE_SCORE_SUM_TIME_WEIGHT
+    avg_score = min(avg_time / CACHE_SCORE_AVG_TIME_SCALE, CACHE_SCORE_CAP) * CACHE_SCORE_AVG_TIME_WEIGHT
+
+    return count_score + sum_score + avg_score
+
+
+def digest_is_read_only(digest_text: str) -> bool:
+    """True for plain SELECTs that are safe to cache or route to readers
+
+    Locking reads (FOR UPDATE / LOCK IN SHARE MODE / FOR SHARE) and
+    SELECT ... INTO count as writes.
+    """
+    text = digest_text.strip().upper()
+    if not text.startswith('SELECT'):
+        return False
+    return not any(marker in text for marker in (' FOR UPDATE', ' LOCK IN SHARE MODE', ' FOR SHARE', ' INTO '))
+
+
+def digest_tables(digest_text: str) -> set:
+    """Lower-cased table names (schema dropped) a digest reads or writes (FROM / JOIN / UPDATE / INTO)"""
+    return {name.replace('`', '').split('.')[-1].lower() for name in ROUTING_TABLE_RE.findall(digest_text)}
+
+
+def workload_params(digest_text: str) -> List[str]:
+    """Kind of value every ? of a digest text is replayed with (--workload)
+
+    'limit' after LIMIT / OFFSET; otherwise the column the placeholder is
+    compared with (=, IN, BETWEEN, LIKE ...) or inserted into decides:
+    'time' and 'string' for names like WORKLOAD_TIME_COLUMN_RE /
+    WORKLOAD_STRING_COLUMN_RE, 'int' for everything else.
+    """
+    tokens = DIGEST_TOKEN_RE.findall(digest_text)
+    upper = [token.upper() for token in tokens]
+    values_at = upper.index('VALUES') if upper[:1] in (['INSERT'], ['REPLACE']) and 'VALUES' in upper else -1
+    insert_columns: List[str] = []
+    if values_at > 0 and '(' in tokens[:values_at]:
+        insert_columns = [token.strip('`') for token in tokens[tokens.index('('):values_at]
+                          if token[0] == '`' or token[0].isalpha() or token[0] == '_']
+
+    kinds = []
+    for i, token in enumerate(tokens):
+        if token != '?':
+            continue
+        j = i - 1
+        while j >= 0 and tokens[j] in ('?', ',', '('):
+            j -= 1
+        previous = upper[j] if j >= 0 else ''
+        column = ''
+        if previous in ('LIMIT', 'OFFSET'):
+            kinds.append('limit')
+            continue
+        if 0 < values_at < i:
+            position = 0
+            k = i - 1
+            while tokens[k] != '(':
+                position += tokens[k] == '?'
+                k -= 1
+            column = insert_columns[position] if position < len(insert_columns) else ''
+        elif previous in ('=', '<>', '!=', '<', '>', '<=', '>=', '<=>', 'LIKE', 'IN', 'BETWEEN') and j > 0:
+            column = tokens[j - 1] if upper[j - 1] != 'NOT' or j < 2 else tokens[j - 2]
+        elif previous == 'AND' and j > 2 and tokens[j - 1] == '?' and upper[j - 2] == 'BETWEEN':
+            column = tokens[j - 3]
+        column = column.strip('`')
+        if WORKLOAD_TIME_COLUMN_RE.search(column):
+            kinds.append('time')
+        elif WORKLOAD_STRING_COLUMN_RE.search(column):
+            kinds.append('string')
+        else:
+            kinds.append('int')
+    return kinds
 
-@dataclass
+
+# Ranking keys for digest top-N, computed from (count_star, sum_time, max_time)
+# so rows can be scored without building a QueryDigest first
+DIGEST_RANK_KEYS: Dict[str, Callable[[int, int, int], float]] = {
+    'cache_score': lambda count_star, sum_time, max_time: digest_cache_score(count_star, sum_time),
+    'sum_time': lambda count_star, sum_time, max_time: sum_time,
+    'count_star': lambda count_star, sum_time, max_time: count_star,
+    'avg_time': lambda count_star, sum_time, max_time: sum_time / count_star if count_star > 0 else 0,
+    'max_time': lambda count_star, sum_time, max_time: max_time,
+}
+
+
+@dataclass(slots=True)
 class QueryDigest:
     """Query digest statistics from ProxySQL"""
     hostgroup: int
@@ -55,17 +345,11 @@ class QueryDigest:
     @property
     def cache_score(self) -> float:
         """Calculate cache worthiness score (weighted algorithm)"""
-        # Normalize values for scoring
-        count_weight = 0.4
-        sum_time_weight = 0.3
-        avg_time_weight = 0.3
-
-        # Score components (normalized to 0-1000 range)
-        count_score = min(self.count_star / 10, 1000) * count_weight
-        sum_score = min(self.sum_time / 100000, 1000) * sum_time_weight
-        avg_score = min(self.avg_time / 1000, 1000) * avg_time_weight
+        return digest_cache_score(self.count_star, self.sum_time)
 
-        return count_score + sum_score + avg_score
+    def rank_value(self, rank_by: str) -> float:
+        """Value of one of the DIGEST_RANK_KEYS for this digest"""
+        return DIGEST_RANK_KEYS[rank_by](self.count_star, self.sum_time, self.max_time)
 
     @property
     def is_select(self) -> bool:
@@ -135,40 +419,101 @@ class ConnectionPoolStats:
         """Average backend latency in milliseconds"""
         return self.latency_us / 1000.0 if self.latency_us > 0 else 0.0
 
-    @property
+    @functools.cached_property
     def efficiency_score(self) -> float:
         """Overall connection pool efficiency score (0-100)
 
-        Weighted formula:
+        Weighted formula (POOL_SCORE_WEIGHTS):
         - 35% connection success rate
         - 25% pool utilization (capped at 80% optimal)
         - 25% queries per connection efficiency
         - 15% latency performance
         """
-        success_weight = self.connection_success_rate * 0.35
+        success_weight = self.connection_success_rate * POOL_SCORE_WEIGHTS['success']
 
-        # Cap utilization at 80% (higher can indicate saturation)
-        util_pct = min(self.pool_utilization, 80) / 80 * 100
-        util_weight = util_pct * 0.25
+        # Cap utilization at the optimum (higher can indicate saturation)
+        util_pct = min(self.pool_utilization, POOL_SCORE_OPTIMAL_UTILIZATION) / POOL_SCORE_OPTIMAL_UTILIZATION * 100
+        util_weight = util_pct * POOL_SCORE_WEIGHTS['utilization']
 
         # Normalize queries/conn (100+ is excellent)
-        qpc_pct = min(self.queries_per_connection / 100, 1) * 100
-        qpc_weight = qpc_pct * 0.25
+        qpc_pct = min(self.queries_per_connection / POOL_SCORE_QUERIES_PER_CONN, 1) * 100
+        qpc_weight = qpc_pct * POOL_SCORE_WEIGHTS['queries_per_conn']
 
         # Latency scoring: reward <2ms, penalize >5ms
-        if self.avg_latency_ms <= 2:
-            latency_score = 100
-        elif self.avg_latency_ms <= 5:
-            latency_score = 80
-        elif self.avg_latency_ms <= 10:
-            latency_score = 50
+        for limit, latency_score in POOL_SCORE_LATENCY_BANDS:
+            if self.avg_latency_ms <= limit:
+                break
         else:
-            latency_score = max(0, 100 - (self.avg_latency_ms - 10) * 5)
-        latency_weight = latency_score * 0.15
+            last_band = POOL_SCORE_LATENCY_BANDS[-1][0]
+            latency_score = max(0, 100 - (self.avg_latency_ms - last_band) * POOL_SCORE_LATENCY_PENALTY)
+        latency_weight = latency_score * POOL_SCORE_WEIGHTS['latency']
 
         return success_weight + util_weight + qpc_weight + latency_weight
 
 
+class LatencySketch:
+    """Mergeable streaming quantile sketch of latencies (DDSketch-style)
+
+    Each value is counted in a logarithmic bin whose width grows with the
+    value, so any quantile is returned within LATENCY_SKETCH_ACCURACY relative
+    error. At most LATENCY_SKETCH_BINS bins are kept (the lowest are folded
+    together, keeping the tail exact), so memory stays constant however many
+    samples are added. Two sketches merge by adding their bin counts, which
+    makes per-bucket, per-pass and per-node sketches combinable.
+    """
+
+    GAMMA = (1 + LATENCY_SKETCH_ACCURACY) / (1 - LATENCY_SKETCH_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+
+    __slots__ = ('bins', 'count', 'min', 'max')
+
+    def __init__(self):
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+        self.min = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        if value <= 0:
+            return
+        index = math.ceil(math.log(value) / self.LOG_GAMMA)
+        self.bins[index] = self.bins.get(index, 0) + 1
+        self.min = value if not self.count else min(self.min, value)
+        self.max = max(self.max, value)
+        self.count += 1
+        if len(self.bins) > LATENCY_SKETCH_BINS:
+            self._collapse()
+
+    def merge(self, other: 'LatencySketch'):
+        if not other.count:
+            return
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.min = other.min if not self.count else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        if len(self.bins) > LATENCY_SKETCH_BINS:
+            self._collapse()
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        folded = indexes[:len(indexes) - LATENCY_SKETCH_BINS + 1]
+        self.bins[folded[-1]] = sum(self.bins.pop(i) for i in folded[:-1]) + self.bins[folded[-1]]
+
+    def quantile(self, q: float) -> float:
+        """Value at quantile q (0..1); 0 for an empty sketch"""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.GAMMA ** index / (self.GAMMA + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
 @dataclass
 class HealthCheckStats:
     """Backend health check monitoring statistics"""
@@ -179,6 +524,28 @@ class HealthCheckStats:
     failed_checks: int
     avg_time_us: int
     last_error: Optional[str] = None
+    # Successful check times (microseconds) for the percentiles
+    sketch: LatencySketch = field(default_factory=LatencySketch, repr=False)
+
+    def percentile_ms(self, q: float) -> float:
+        """Check time in milliseconds at quantile q of the successful checks"""
+        return self.sketch.quantile(q) / 1000.0
+
+    @property
+    def p50_ms(self) -> float:
+        return self.percentile_ms(0.50)
+
+    @property
+    def p95_ms(self) -> float:
+        return self.percentile_ms(0.95)
+
+    @property
+    def p99_ms(self) -> float:
+        return self.percentile_ms(0.99)
+
+    @property
+    def max_ms(self) -> float:
+        return self.sketch.max / 1000.0
 
     @property
     def success_rate(self) -> float:
@@ -191,6 +558,113 @@ class HealthCheckStats:
         return self.avg_time_us / 1000.0 if self.avg_time_us > 0 else 0.0
 
 
+class MonitorLogWindow:
+    """Rolling per-backend aggregates of one monitor log table, read incrementally
+
+    The first read takes the raw rows of the last MONITOR_WINDOW_SECONDS of the
+    log and folds them into MONITOR_BUCKET_US buckets per backend: count,
+    failures, success time sum and count, MAX(error) and a LatencySketch of
+    the success times. Later reads only fetch rows from the start of the bucket
+    before the newest time_start_us seen, and the buckets they rebuild replace
+    the stored ones - the overlap picks up checks that were logged late.
+    Buckets that fall out of the window are dropped, so a pass costs in
+    proportion to the samples logged since the previous one rather than to
+    the window, and memory stays bounded by the window.
+
+    Window expiry uses ProxySQL's clock (strftime('now') rides along on every
+    row, advanced by local monotonic time when no rows came back), so client
+    clock skew is harmless.
+    """
+
+    def __init__(self, table: str, check_type: str, time_column: str, error_column: str,
+                 report_errors: bool = False, window: int = MONITOR_WINDOW_SECONDS):
+        self.table = table
+        self.check_type = check_type
+        self.time_column = time_column
+        self.error_column = error_column
+        self.report_errors = report_errors
+        self.window_us = window * 1_000_000
+        # (hostname, port) -> bucket -> [count, failed, time_sum, time_count, max_error, sketch]
+        self.buckets: Dict[Tuple[str, int], Dict[int, list]] = {}
+        self.high_water_us = 0      # newest time_start_us read so far (0 = no read yet)
+        self.server_now_us = 0      # ProxySQL's clock at the last read that returned rows
+        self._read_at = 0.0         # time.monotonic() of that read
+        self.rows_read = 0          # raw log rows transferred, all reads
+
+    def query(self) -> str:
+        """SQL of the next read: the whole window first, then only newer buckets"""
+        if self.high_water_us:
+            since = str((self.high_water_us // MONITOR_BUCKET_US - 1) * MONITOR_BUCKET_US)
+        else:
+            since = f"(strftime('%s', 'now') - {self.window_us // 1_000_000}) * 1000000"
+        return f"""
+    SELECT hostname, port, time_start_us, {self.time_column}, {self.error_column}, strftime('%s', 'now')
+    FROM {self.table}
+    WHERE time_start_us >= {since}
+    """
+
+    def update(self, rows: List[Tuple]):
+        """Fold the rows of one query() read in and expire buckets outside the window"""
+        as_int = lambda v: int(v) if str(v).lstrip('-').isdigit() else 0
+        rebuilt: Dict[Tuple[str, int], Dict[int, list]] = {}
+        for row in rows:
+            time_start_us = as_int(row[2])
+            success_us = as_int(row[3])
+            backend = rebuilt.setdefault((str(row[0]), as_int(row[1])), {})
+            bucket = backend.get(time_start_us // MONITOR_BUCKET_US)
+            if bucket is None:
+                bucket = backend[time_start_us // MONITOR_BUCKET_US] = [0, 0, 0, 0, None, LatencySketch()]
+            bucket[0] += 1
+            if row[4] is not None:
+                bucket[1] += 1
+                bucket[4] = max(bucket[4] or '', str(row[4]))
+            if success_us > 0:
+                bucket[2] += success_us
+                bucket[3] += 1
+                bucket[5].add(success_us)
+            self.high_water_us = max(self.high_water_us, time_start_us)
+        if rows:
+            self.server_now_us = as_int(rows[-1][5]) * 1_000_000
+            self._read_at = time.monotonic()
+        for backend, buckets in rebuilt.items():
+            self.buckets.setdefault(backend, {}).update(buckets)
+        self.rows_read += len(rows)
+
+        if not self.server_now_us:
+            return
+        now_us = self.server_now_us + int((time.monotonic() - self._read_at) * 1_000_000)
+        # Keep a bucket while any part of it is inside the window
+        oldest = (now_us - self.window_us) // MONITOR_BUCKET_US
+        for backend in list(self.buckets):
+            kept = {bucket: agg for bucket, agg in self.buckets[backend].items() if bucket >= oldest}
+            if kept:
+                self.buckets[backend] = kept
+            else:
+                del self.buckets[backend]
+
+    def stats(self) -> List[HealthCheckStats]:
+        """Current per-backend totals, ordered by hostname and port"""
+        checks = []
+        for (hostname, port), buckets in sorted(self.buckets.items()):
+            aggregates = list(buckets.values())
+            time_count = sum(a[3] for a in aggregates)
+            errors = [a[4] for a in aggregates if a[4] is not None]
+            sketch = LatencySketch()
+            for aggregate in aggregates:
+                sketch.merge(aggregate[5])
+            checks.append(HealthCheckStats(
+                check_type=self.check_type,
+                hostname=hostname,
+                port=port,
+                total_checks=sum(a[0] for a in aggregates),
+                failed_checks=sum(a[1] for a in aggregates),
+                avg_time_us=sum(a[2] for a in aggregates) // time_count if time_count else 0,
+                last_error=max(errors) if errors and self.report_errors else None,
+                sketch=sketch
+            ))
+        return checks
+
+
 @dataclass
 class GlobalStats:
     """ProxySQL global performance statistics"""
@@ -242,7 +716,7 @@ class FreeConnectionStats:
     @property
     def is_stale(self) -> bool:
         """Connection idle > 5 minutes (potential leak)"""
-        return self.idle_ms > 300000
+        return self.idle_ms > STALE_IDLE_MS
 
 
 @dataclass
@@ -310,368 +784,3470 @@ class MemoryMetrics:
         return ((self.jemalloc_resident - self.jemalloc_allocated) / self.jemalloc_allocated * 100) if self.jemalloc_allocated > 0 else 0.0
 
 
-class ProxySQLAnalyzer:
-    """ProxySQL metrics analyzer - MySQLTuner equivalent for ProxySQL"""
+@dataclass
+class QueryRule:
+    """One mysql_query_rules row (the columns the query processor matches and acts on)"""
+    rule_id: int
+    active: bool = True
+    username: Optional[str] = None
+    schemaname: Optional[str] = None
+    flag_in: int = 0
+    digest: Optional[str] = None
+    match_digest: Optional[str] = None
+    match_pattern: Optional[str] = None
+    negate_match_pattern: bool = False
+    re_modifiers: str = 'CASELESS'
+    flag_out: Optional[int] = None
+    destination_hostgroup: Optional[int] = None
+    cache_ttl: Optional[int] = None
+    apply: bool = False
+    proposed: bool = False                # generated by this report, not in mysql_query_rules yet
+    source_digest: Optional[str] = None   # digest a proposed rule was generated from
+    comment: str = ''
 
-    VERSION = "1.2.0"
+    @property
+    def regex_flags(self) -> int:
+        """Python re flags equivalent to re_modifiers"""
+        return re.IGNORECASE if 'CASELESS' in (self.re_modifiers or '').upper() else 0
 
-    def __init__(self, host: str, port: int, user: str, password: str):
-        self.host = host
-        self.port = port
-        self.user = user
-        self.password = password
-        self.conn: Optional[mysql.connector.connection.MySQLConnection] = None
+    @property
+    def match_column(self) -> Tuple[str, str]:
+        """(column, value) the rule matches queries on: digest, match_digest or match_pattern"""
+        for column in ('digest', 'match_digest', 'match_pattern'):
+            if getattr(self, column):
+                return column, getattr(self, column)
+        return '', ''
 
-    def connect(self) -> bool:
-        """Connect to ProxySQL admin interface"""
-        try:
-            self.conn = mysql.connector.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                connection_timeout=10
-            )
-            return self.conn.is_connected()
-        except Error as e:
-            print(f"✗  Connection failed: {e}")
+
+@dataclass
+class RuleMatchStats:
+    """Replay outcome of one rule in the simulated rule chain"""
+    rule: QueryRule
+    compile_error: str = ''
+    reached: int = 0            # executions that were evaluated against this rule
+    digests: int = 0            # digest rows matched
+    executions: int = 0         # executions matched (count_star weighted)
+    other_digests: int = 0      # matched digests other than source_digest (proposed rules)
+    write_digests: int = 0      # matched non-SELECT / locking digests
+    write_executions: int = 0
+    write_examples: List[str] = field(default_factory=list)
+    regex_evals: int = 0        # timed regex evaluations (one per digest row reaching the rule)
+    regex_ns: int = 0
+    source_matches: Optional[bool] = None    # rule regex matches its own source digest
+    source_applied_by: Optional[int] = None  # rule_id that finally applied to the source digest
+    standalone_digests: int = 0              # digests the rule matches on its own (track_overlaps)
+    taken_by: Dict[int, int] = field(default_factory=dict)  # rule_id that applied instead -> digests
+    matched: Dict[str, str] = field(default_factory=dict)   # digest -> digest_text matched in the chain (record_matches)
+
+    @property
+    def avg_regex_us(self) -> float:
+        """Average regex evaluation time in microseconds"""
+        return self.regex_ns / self.regex_evals / 1000 if self.regex_evals > 0 else 0.0
+
+    def verdict(self, existing_ids: set) -> str:
+        """Merge verdict for a proposed rule"""
+        rule = self.rule
+        if self.compile_error:
+            return f"✗ invalid regex ({self.compile_error})"
+        if rule.proposed and rule.rule_id in existing_ids:
+            return "✗ rule_id already in use"
+        if self.write_digests:
+            return f"✗ matches {self.write_digests} write digests"
+        if rule.proposed and self.source_matches is False:
+            return "✗ misses its own digest"
+        if rule.proposed and self.source_applied_by not in (None, rule.rule_id):
+            return f"⚠ shadowed by rule {self.source_applied_by}"
+        if self.avg_regex_us > RULE_REGEX_COST_WARN_US:
+            return f"⚠ expensive ({self.avg_regex_us:.1f}μs/eval)"
+        if self.other_digests:
+            return f"⚠ broad (+{self.other_digests} digests)"
+        if not rule.proposed:
+            return "✔ ok" if self.digests else "ℹ no matches"
+        return "✔ precise"
+
+
+class RuleSimulator:
+    """Replays digests through mysql_query_rules the way ProxySQL's query processor does
+
+    Active rules are walked in rule_id order. A rule is only considered when its
+    flagIN equals the current flag (0 for a new query); every set criterion
+    (username, schemaname, digest, match_digest, match_pattern with
+    negate_match_pattern) must match. A matching rule switches the flag to its
+    flagOUT and stops the walk when apply=1; cache_ttl and destination_hostgroup
+    are taken from the last matching rule that sets them.
+
+    match_digest is tested against digest_text and match_pattern against a
+    sample query text (digest_text with every ? placeholder replaced by 1),
+    since the original query text is not kept by ProxySQL.
+
+    With record_matches every rule keeps the digests it matched where the
+    walk reached it (RuleMatchStats.matched), and the first
+    RULE_CONVERT_SAMPLE digests are kept as a regex timing sample.
+    """
+
+    def __init__(self, rules: List[QueryRule], track_overlaps: bool = False, record_matches: bool = False):
+        ordered = sorted((r for r in rules if r.active), key=lambda r: (r.rule_id, r.proposed))
+        self.track_overlaps = track_overlaps
+        self.record_matches = record_matches
+        self.samples: List[Tuple[str, str]] = []   # (digest_text, query_text) with record_matches
+        self.overlaps: set = set()   # (rule_id, rule_id) pairs matching a common digest (track_overlaps)
+        self.stats = [RuleMatchStats(rule=rule) for rule in ordered]
+        self._compiled: List[Tuple[Optional['re.Pattern'], Optional['re.Pattern']]] = []
+        for stats in self.stats:
+            rule = stats.rule
+            patterns = []
+            for pattern in (rule.match_digest, rule.match_pattern):
+                try:
+                    patterns.append(re.compile(pattern, rule.regex_flags) if pattern else None)
+                except re.error as e:
+                    stats.compile_error = str(e)
+                    patterns.append(None)
+            self._compiled.append(tuple(patterns))
+        self._sources: Dict[str, List[int]] = {}
+        for index, stats in enumerate(self.stats):
+            if stats.rule.source_digest:
+                self._sources.setdefault(stats.rule.source_digest.lower(), []).append(index)
+        self.digests = 0
+        self.executions = 0
+        self.select_executions = 0
+        self.cached_executions = 0
+        self.cached_write_executions = 0
+        self.rule_evaluations = 0    # executions x rules evaluated per execution
+
+    def _matches(self, index: int, username: str, schemaname: str, digest: str,
+                 digest_text: str, query_text: str, timed: bool = True) -> bool:
+        """Whether rule `index` matches one query, timing the regex work"""
+        stats = self.stats[index]
+        rule = stats.rule
+        if stats.compile_error:
+            return False
+        if rule.username and rule.username != username:
+            return False
+        if rule.schemaname and rule.schemaname != schemaname:
             return False
+        if rule.digest and rule.digest.lower() != digest.lower():
+            return False
+        match_digest, match_pattern = self._compiled[index]
+        if match_digest is None and match_pattern is None:
+            return True
+        started = time.perf_counter_ns()
+        matched = True
+        if match_digest is not None:
+            matched = match_digest.search(digest_text) is not None
+        if matched and match_pattern is not None:
+            matched = (match_pattern.search(query_text) is not None) != rule.negate_match_pattern
+        if timed:
+            stats.regex_ns += time.perf_counter_ns() - started
+            stats.regex_evals += 1
+        return matched
+
+    def replay(self, username: str, schemaname: str, digest: str, digest_text: str, count: int):
+        """Run one digest row (count executions) through the rule chain"""
+        query_text = digest_text.replace('?', '1')
+        read_only = digest_is_read_only(digest_text)
+        if self.record_matches and len(self.samples) < RULE_CONVERT_SAMPLE:
+            self.samples.append((digest_text, query_text))
+        self.digests += 1
+        self.executions += count
+        if read_only:
+            self.select_executions += count
+
+        flag = 0
+        cache_ttl = None
+        applied_by = None
+        for index, stats in enumerate(self.stats):
+            rule = stats.rule
+            if rule.flag_in != flag:
+                continue
+            stats.reached += count
+            self.rule_evaluations += count
+            if not self._matches(index, username, schemaname, digest, digest_text, query_text):
+                continue
+            stats.digests += 1
+            stats.executions += count
+            if self.record_matches:
+                stats.matched[digest] = digest_text
+            if rule.source_digest and rule.source_digest.lower() != digest.lower():
+                stats.other_digests += 1
+            if not read_only and (rule.cache_ttl or rule.destination_hostgroup is not None):
+                stats.write_digests += 1
+                stats.write_executions += count
+                if len(stats.write_examples) < 3 and digest_text not in stats.write_examples:
+                    stats.write_examples.append(digest_text)
+            if rule.cache_ttl:
+                cache_ttl = rule.cache_ttl
+            if rule.flag_out is not None:
+                flag = rule.flag_out
+            applied_by = rule.rule_id
+            if rule.apply:
+                break
+
+        if cache_ttl:
+            self.cached_executions += count
+            if not read_only:
+                self.cached_write_executions += count
+
+        for index in self._sources.get(digest.lower(), ()):
+            stats = self.stats[index]
+            matched = self._matches(index, username, schemaname, digest, digest_text, query_text, timed=False)
+            stats.source_matches = bool(stats.source_matches) or matched
+            stats.source_applied_by = applied_by
+
+        if self.track_overlaps:
+            matched_ids = []
+            for index, stats in enumerate(self.stats):
+                if not self._matches(index, username, schemaname, digest, digest_text, query_text, timed=False):
+                    continue
+                stats.standalone_digests += 1
+                if applied_by is not None and applied_by != stats.rule.rule_id:
+                    stats.taken_by[applied_by] = stats.taken_by.get(applied_by, 0) + 1
+                matched_ids.append(stats.rule.rule_id)
+            for position, first in enumerate(matched_ids):
+                for second in matched_ids[position + 1:]:
+                    self.overlaps.add((first, second))
+
+    def destination(self, username: str, schemaname: str, digest: str,
+                    digest_text: str) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+        """(destination_hostgroup, rule_id that set it, apply=1 rule_id that ended the walk) for one query
+
+        Walks the chain like replay() but counts nothing; None for whatever no
+        rule decided (the query goes to the user's default_hostgroup).
+        """
+        query_text = digest_text.replace('?', '1')
+        flag = 0
+        destination, set_by = None, None
+        for index, stats in enumerate(self.stats):
+            rule = stats.rule
+            if rule.flag_in != flag:
+                continue
+            if not self._matches(index, username, schemaname, digest, digest_text, query_text, timed=False):
+                continue
+            if rule.destination_hostgroup is not None:
+                destination, set_by = rule.destination_hostgroup, rule.rule_id
+            if rule.flag_out is not None:
+                flag = rule.flag_out
+            if rule.apply:
+                return destination, set_by, rule.rule_id
+        return destination, set_by, None
+
+    def regex_costs_us(self, rules: List[QueryRule]) -> List[float]:
+        """μs one evaluation of each rule's regexes takes on the timing sample (0 for no regex)
+
+        Best of RULE_CONVERT_REPEAT runs over the whole sample; the rules take
+        turns within every run so that they are timed under the same load.
+        """
+        compiled = []
+        for rule in rules:
+            regexes = []
+            for pattern, on_query_text in ((rule.match_digest, False), (rule.match_pattern, True)):
+                try:
+                    if pattern:
+                        regexes.append((re.compile(pattern, rule.regex_flags), on_query_text))
+                except re.error:
+                    regexes = []
+                    break
+            compiled.append(regexes)
+        best: List[Optional[int]] = [0 if not regexes or not self.samples else None for regexes in compiled]
+        for _ in range(RULE_CONVERT_REPEAT):
+            for index, regexes in enumerate(compiled):
+                if best[index] == 0:
+                    continue
+                started = time.perf_counter_ns()
+                for digest_text, query_text in self.samples:
+                    for regex, on_query_text in regexes:
+                        regex.search(query_text if on_query_text else digest_text)
+                elapsed = time.perf_counter_ns() - started
+                best[index] = elapsed if best[index] is None else min(best[index], elapsed)
+        return [ns / len(self.samples) / 1000 if ns else 0.0 for ns in best]
+
+    def rule_stats(self, rule_id: int) -> Optional[RuleMatchStats]:
+        """Replay stats of one (active) rule"""
+        return next((stats for stats in self.stats if stats.rule.rule_id == rule_id), None)
 
-    def close(self):
-        """Close database connection"""
-        if self.conn and self.conn.is_connected():
-            self.conn.close()
+    @property
+    def rules_per_query(self) -> float:
+        """Average number of rules evaluated per executed query"""
+        return self.rule_evaluations / self.executions if self.executions > 0 else 0.0
 
-    def execute_query(self, query: str) -> List[Tuple]:
-        """Execute SQL query and return results"""
-        if not self.conn or not self.conn.is_connected():
-            return []
+    @property
+    def regex_us_per_query(self) -> float:
+        """Estimated regex time per executed query (execution weighted)"""
+        if self.executions == 0:
+            return 0.0
+        return sum(s.reached * s.avg_regex_us for s in self.stats) / self.executions
 
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute(query)
-            results = cursor.fetchall()
-            cursor.close()
-            return results
-        except Error as e:
-            print(f"Query error: {e}")
-            return []
 
-    def get_proxysql_version(self) -> str:
-        """Get ProxySQL version"""
-        result = self.execute_query("SELECT @@version")
-        return result[0][0] if result else "Unknown"
+@dataclass
+class RuleConversion:
+    """One existing regex cache rule and the exact-match rule that can replace it (--convert-rules)"""
+    rule: QueryRule
+    matched: Dict[str, str] = field(default_factory=dict)   # digest -> digest_text it matched in the chain
+    converted: Optional[QueryRule] = None
+    verdict: str = ''
+    reached: int = 0            # executions the chain evaluates the rule for
+    us_before: float = 0.0      # μs per evaluation of the regex (RuleSimulator.regex_costs_us)
+    us_after: float = 0.0       # same for the replacement (0 for a digest rule)
 
-    def get_query_digest(self, limit: int = 100) -> List[QueryDigest]:
-        """Fetch query digest statistics"""
-        query = f"""
-        SELECT hostgroup, schemaname, username, digest, digest_text,
-               count_star, sum_time, min_time, max_time
-        FROM stats_mysql_query_digest
-        WHERE count_star >= 10
-        ORDER BY sum_time DESC
-        LIMIT {limit}
-        """
+    @property
+    def texts(self) -> int:
+        return len(set(self.matched.values()))
 
-        results = self.execute_query(query)
-        return [
-            QueryDigest(
-                hostgroup=int(row[0]) if str(row[0]).isdigit() else 0,
-                schemaname=str(row[1]),
-                username=str(row[2]),
-                digest=str(row[3]),
-                digest_text=str(row[4]),
-                count_star=int(row[5]) if str(row[5]).isdigit() else 0,
-                sum_time=int(row[6]) if str(row[6]).isdigit() else 0,
-                min_time=int(row[7]) if str(row[7]).isdigit() else 0,
-                max_time=int(row[8]) if str(row[8]).isdigit() else 0
-            )
-            for row in results
-        ]
 
-    def get_cache_stats(self) -> CacheStats:
-        """Fetch query cache statistics"""
-        query = """
-        SELECT Variable_name, Variable_Value
-        FROM stats_mysql_global
-        WHERE Variable_name LIKE 'Query_Cache%'
-        """
+@dataclass
+class RuleConversionPlan:
+    """The regex cache rules' conversions and the rule chain replayed before and after them"""
+    conversions: List[RuleConversion]
+    before: RuleSimulator
+    after: RuleSimulator
+
+    def us_per_query(self, converted: bool) -> float:
+        """Estimated regex time per executed query of the regex cache rules, now or converted"""
+        if self.before.executions == 0:
+            return 0.0
+        total = sum(c.reached * (c.us_after if converted and c in self.ready else c.us_before)
+                    for c in self.conversions)
+        return total / self.before.executions
 
-        results = self.execute_query(query)
-        stats = CacheStats()
+    @property
+    def ready(self) -> List[RuleConversion]:
+        """Conversions that match exactly the digests of the rule they replace"""
+        return [c for c in self.conversions if c.converted is not None and c.verdict.startswith('✔')]
 
-        for var_name, var_value in results:
-            value = int(var_value) if var_value.isdigit() else 0
-            if 'Memory_bytes' in var_name:
-                stats.memory_bytes = value
-            elif 'Entries' in var_name:
-                stats.entries = value
-            elif 'count_GET_OK' in var_name:
-                stats.count_get_ok = value
-            elif 'count_GET' in var_name:
-                stats.count_get = value
-            elif 'count_SET' in var_name:
-                stats.count_set = value
-            elif 'bytes_IN' in var_name:
-                stats.bytes_in = value
-            elif 'bytes_OUT' in var_name:
-                stats.bytes_out = value
-            elif 'Purged' in var_name:
-                stats.purged = value
 
-        return stats
+@dataclass
+class WorkloadDigest:
+    """One digest of a --workload file: its share of the replayed mix and how its placeholders are filled"""
+    digest: str
+    digest_text: str
+    sql: str                # digest_text with grouped lists (,...) closed: the replayed template
+    params: List[str]       # workload_params() kind of every ? in sql
+    weight: float           # share of the replayed executions
+    count_star: int
+    qps: float              # production rate over the digest stats window
+    avg_time_us: float      # backend time per execution (query cache hits excluded; 0 = unknown)
+    rows_per_exec: float
+    read_only: bool
 
-    def get_extended_connection_pool_stats(self) -> List[ConnectionPoolStats]:
-        """Fetch extended connection pool statistics with efficiency metrics"""
-        query = """
-        SELECT hostgroup, srv_host, srv_port, status, Queries,
-               ConnUsed, ConnFree, Bytes_data_sent, Bytes_data_recv,
-               ConnOK, ConnERR, MaxConnUsed, Latency_us
-        FROM stats_mysql_connection_pool
-        """
 
-        results = self.execute_query(query)
-        pool_stats = []
-        for row in results:
-            pool_stats.append(ConnectionPoolStats(
-                hostgroup=int(row[0]) if str(row[0]).isdigit() else 0,
-                srv_host=str(row[1]),
-                srv_port=int(row[2]) if str(row[2]).isdigit() else 0,
-                status=str(row[3]),
-                queries=int(row[4]) if str(row[4]).isdigit() else 0,
-                conn_used=int(row[5]) if str(row[5]).isdigit() else 0,
-                conn_free=int(row[6]) if str(row[6]).isdigit() else 0,
-                bytes_sent=int(row[7]) if str(row[7]).isdigit() else 0,
-                bytes_recv=int(row[8]) if str(row[8]).isdigit() else 0,
-                conn_ok=int(row[9]) if str(row[9]).isdigit() else 0,
-                conn_err=int(row[10]) if str(row[10]).isdigit() else 0,
-                max_conn_used=int(row[11]) if str(row[11]).isdigit() else 0,
-                latency_us=int(row[12]) if str(row[12]).isdigit() else 0
-            ))
-        return pool_stats
+@dataclass
+class HostgroupTopology:
+    """Backend hostgroups from mysql_servers and their mysql_replication_hostgroups pairing"""
+    # hostgroup -> [(hostname, port, status, max_replication_lag)]
+    servers: Dict[int, List[Tuple[str, int, str, int]]] = field(default_factory=dict)
+    readers: Dict[int, int] = field(default_factory=dict)   # writer hostgroup -> reader hostgroup
 
-    def get_command_counters(self) -> List[Tuple[str, int, int]]:
-        """Fetch command counter statistics"""
-        query = """
-        SELECT Command, Total_cnt, Total_Time_us
-        FROM stats_mysql_commands_counters
-        WHERE Total_cnt > 0
-        ORDER BY Total_cnt DESC
-        LIMIT 10
-        """
+    @property
+    def writers(self) -> List[int]:
+        return sorted(self.readers)
 
-        results = self.execute_query(query)
-        return [
-            (str(row[0]),
-             int(row[1]) if str(row[1]).isdigit() else 0,
-             int(row[2]) if str(row[2]).isdigit() else 0)
-            for row in results
-        ]
+    def online(self, hostgroup: int) -> List[Tuple[str, int, str, int]]:
+        """ONLINE servers of a hostgroup"""
+        return [server for server in self.servers.get(hostgroup, []) if server[2] == 'ONLINE']
 
-    def get_cache_config(self) -> Dict[str, str]:
-        """Fetch cache configuration variables"""
-        query = """
-        SELECT variable_name, variable_value
-        FROM global_variables
-        WHERE variable_name LIKE '%cache%'
-        ORDER BY variable_name
+    def read_hostgroup(self, hostgroup: int) -> Optional[int]:
+        """Where reads of a digest seen on `hostgroup` belong
+
+        The reader hostgroup of a writer, the hostgroup itself for any other
+        configured one, None when unknown (-1 is the query cache).
         """
+        if hostgroup in self.readers:
+            return self.readers[hostgroup]
+        return hostgroup if hostgroup in self.servers or hostgroup in self.readers.values() else None
 
-        results = self.execute_query(query)
-        return {name: value for name, value in results}
 
-    def get_monitor_config(self) -> Dict[str, str]:
-        """Fetch monitor configuration variables"""
-        query = """
-        SELECT variable_name, variable_value
-        FROM global_variables
-        WHERE variable_name LIKE 'mysql-monitor%'
-        ORDER BY variable_name
-        """
+@dataclass
+class RoutingCandidate:
+    """A read-only digest served by a writer hostgroup, summed over users and schemas"""
+    digest: str
+    digest_text: str
+    writer_hostgroup: int
+    reader_hostgroup: int
+    window_s: float                       # digest window of the writer hostgroups (rates are averaged over it)
+    executions: int = 0
+    sum_time: int = 0
+    users: List[Tuple[str, str]] = field(default_factory=list)   # (username, schemaname) that ran it there
+    verdict: str = ''
+    rule_id: Optional[int] = None         # generated routing rule, if any
 
-        results = self.execute_query(query)
-        return {name: value for name, value in results}
+    @property
+    def qps(self) -> float:
+        return self.executions / self.window_s if self.window_s > 0 else 0.0
 
-    def get_existing_cache_rules(self) -> List[Tuple[int, str, int]]:
-        """Fetch existing cache rules"""
-        query = """
-        SELECT rule_id, match_pattern, cache_ttl
-        FROM mysql_query_rules
-        WHERE cache_ttl > 0
-        ORDER BY rule_id
-        """
+    @property
+    def backend_time_per_s(self) -> float:
+        """Writer backend seconds spent on this digest per wall-clock second"""
+        return self.sum_time / 1_000_000 / self.window_s if self.window_s > 0 else 0.0
 
-        results = self.execute_query(query)
-        return [
-            (int(row[0]) if str(row[0]).isdigit() else 0,
-             str(row[1]),
-             int(row[2]) if str(row[2]).isdigit() else 0)
-            for row in results
-        ]
 
-    def get_global_stats(self) -> GlobalStats:
-        """Fetch ProxySQL global performance statistics"""
-        query = """
-        SELECT Variable_name, Variable_Value
-        FROM stats_mysql_global
-        WHERE Variable_name IN (
-            'ProxySQL_Uptime',
-            'Client_Connections_connected',
-            'Server_Connections_created',
-            'Questions',
-            'Slow_queries',
-            'Active_Transactions'
-        )
-        """
+@dataclass
+class RoutingAdvice:
+    """--routing: read-only load on the writer hostgroups and the digests that could move to readers"""
+    topology: HostgroupTopology
+    window_s: float = 0.0
+    executions: int = 0                  # everything the writer hostgroups executed
+    sum_time: int = 0
+    read_executions: int = 0             # of which read-only SELECTs
+    read_time: int = 0
+    candidates: List[RoutingCandidate] = field(default_factory=list)   # by backend time, descending
+    issues: List['Recommendation'] = field(default_factory=list)
 
-        results = self.execute_query(query)
-        stats = GlobalStats()
+    @property
+    def writer_qps(self) -> float:
+        return self.executions / self.window_s if self.window_s > 0 else 0.0
 
-        for var_name, var_value in results:
-            value = int(var_value) if var_value.isdigit() else 0
-            if 'Uptime' in var_name:
-                stats.uptime_seconds = value
-            elif 'Client_Connections_connected' in var_name:
-                stats.client_connections_connected = value
-            elif 'Server_Connections_created' in var_name:
-                stats.server_connections_created = value
-            elif 'Questions' in var_name:
-                stats.queries_total = value
-            elif 'Slow_queries' in var_name:
-                stats.slow_queries = value
-            elif 'Active_Transactions' in var_name:
-                stats.active_transactions = value
+    @property
+    def writer_time_per_s(self) -> float:
+        return self.sum_time / 1_000_000 / self.window_s if self.window_s > 0 else 0.0
+
+    def moved(self, candidates: List[RoutingCandidate]) -> Dict[str, float]:
+        """Writer load the given candidates account for: rates and shares of the writer total"""
+        executions = sum(c.executions for c in candidates)
+        sum_time = sum(c.sum_time for c in candidates)
+        return {
+            'digests': len(candidates),
+            'qps': sum(c.qps for c in candidates),
+            'backend_time_per_s': sum(c.backend_time_per_s for c in candidates),
+            'executions_pct': executions / self.executions * 100 if self.executions else 0.0,
+            'backend_time_pct': sum_time / self.sum_time * 100 if self.sum_time else 0.0,
+        }
 
-        return stats
+    @property
+    def ruled(self) -> List[RoutingCandidate]:
+        """Candidates a routing rule was generated for"""
+        return [c for c in self.candidates if c.rule_id is not None]
 
-    def get_health_checks(self) -> Tuple[List[HealthCheckStats], List[HealthCheckStats]]:
-        """Fetch backend health check statistics (ping and connect)
+    @property
+    def safe(self) -> List[RoutingCandidate]:
+        return [c for c in self.candidates if c.verdict.startswith('✔')]
 
-        Returns: (ping_checks, connect_checks)
-        """
-        # Ping checks (last 5 minutes)
-        ping_query = """
-        SELECT 'ping' as check_type, hostname, port,
-               COUNT(*) as total_checks,
-               SUM(CASE WHEN ping_error IS NOT NULL THEN 1 ELSE 0 END) as failed_checks,
-               COALESCE(AVG(CASE WHEN ping_success_time_us > 0 THEN ping_success_time_us ELSE NULL END), 0) as avg_time_us
-        FROM monitor.mysql_server_ping_log
-        WHERE time_start_us > (strftime('%s', 'now') - 300) * 1000000
-        GROUP BY hostname, port
-        """
+    @property
+    def risky(self) -> List[RoutingCandidate]:
+        """Movable, but a session reading its own writes could see replica lag"""
+        return [c for c in self.candidates if c.verdict.startswith('⚠')]
+
+
+@dataclass(frozen=True)
+class DigestShape:
+    """Structure of one SELECT digest_text, as far as clustering cares
+
+    family holds everything that must be equal within a cluster: the SELECT
+    modifiers and column set (order ignored), FROM/JOIN, GROUP BY, HAVING,
+    ORDER BY and LIMIT, with every IN-list collapsed whatever its arity. The
+    WHERE clause is kept as a set of top-level AND predicates, so digests
+    that only add optional predicates can join the one without them.
+    """
+    family: Tuple
+    predicates: frozenset
+    select_order: Tuple
+    predicate_order: Tuple
+    pattern: str          # regex for this digest_text, IN-lists of any arity matched
+
+
+class DigestTokenizer:
+    """Memoized digest_text -> DigestShape, keyed by digest hash
+
+    A digest hash always stands for the same digest_text, so a digest is
+    tokenized once however many hostgroup/user/schema rows, fleet nodes or
+    passes it shows up in. At most CLUSTER_TOKEN_CACHE shapes are kept.
+    """
+
+    CLAUSES = ('SELECT', 'FROM', 'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT')
+
+    def __init__(self, max_entries: int = CLUSTER_TOKEN_CACHE):
+        self.max_entries = max_entries
+        self._shapes: Dict[str, DigestShape] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def shape(self, digest: str, digest_text: str) -> DigestShape:
+        shape = self._shapes.get(digest)
+        if shape is not None:
+            self.hits += 1
+            return shape
+        self.misses += 1
+        shape = self._shape(digest_text)
+        if len(self._shapes) >= self.max_entries:
+            del self._shapes[next(iter(self._shapes))]
+        self._shapes[digest] = shape
+        return shape
+
+    @staticmethod
+    def tokens(digest_text: str) -> List[str]:
+        """Upper-cased tokens with backticks dropped and every IN-list of placeholders as IN (?+)"""
+        tokens = [token.strip('`').upper() for token in DIGEST_TOKEN_RE.findall(DIGEST_IN_LIST_RE.sub(' IN_LIST ', digest_text))]
+        collapsed = []
+        for token in tokens:
+            collapsed += ['IN', '(?+)'] if token == 'IN_LIST' else [token]
+        return collapsed
+
+    @staticmethod
+    def _split(tokens: List[str], separator: str) -> List[Tuple[str, ...]]:
+        """Split at top-level separator tokens (a BETWEEN's own AND is not a separator)"""
+        parts, current, depth, between = [], [], 0, False
+        for token in tokens:
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            elif depth == 0 and token == 'BETWEEN':
+                between = True
+            elif depth == 0 and token == separator:
+                if separator == 'AND' and between:
+                    between = False
+                else:
+                    parts.append(tuple(current))
+                    current = []
+                    continue
+            current.append(token)
+        parts.append(tuple(current))
+        return [part for part in parts if part]
+
+    def _shape(self, digest_text: str) -> DigestShape:
+        pattern = ''.join(DIGEST_IN_LIST_RE.pattern if index % 2 else regex_literal(piece)
+                          for index, piece in enumerate(re.split(f"({DIGEST_IN_LIST_RE.pattern})", digest_text,
+                                                                 flags=re.IGNORECASE)))
+        tokens = self.tokens(digest_text)
+        clauses: Dict[str, List[str]] = {}
+        current, depth = None, 0
+        for position, token in enumerate(tokens):
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            if depth == 0 and token in self.CLAUSES and token not in clauses and (
+                    current is None or self.CLAUSES.index(token) > self.CLAUSES.index(current)):
+                current = token
+                clauses[current] = []
+                continue
+            if current is None or token in ('UNION', 'INTO'):
+                # Not a plain single SELECT: only identical token streams cluster
+                return DigestShape(('RAW', tuple(tokens)), frozenset(), (), (), pattern)
+            clauses[current].append(token)
+
+        columns = self._split(clauses.get('SELECT', []), ',')
+        modifiers = ()
+        while columns and columns[0][:1] and columns[0][0] in ('DISTINCT', 'SQL_NO_CACHE', 'SQL_CALC_FOUND_ROWS',
+                                                               'STRAIGHT_JOIN', 'HIGH_PRIORITY'):
+            modifiers += (columns[0][0],)
+            columns[0] = columns[0][1:]
+        predicates = self._split(clauses.get('WHERE', []), 'AND')
+        family = ('SELECT', modifiers, frozenset(columns),
+                  *(tuple(clauses.get(name, ())) for name in ('FROM', 'GROUP', 'HAVING', 'ORDER', 'LIMIT')))
+        return DigestShape(family, frozenset(predicates), tuple(columns), tuple(predicates), pattern)
 
-        # Connect checks (last 5 minutes)
-        connect_query = """
-        SELECT 'connect' as check_type, hostname, port,
-               COUNT(*) as total_checks,
-               SUM(CASE WHEN connect_error IS NOT NULL THEN 1 ELSE 0 END) as failed_checks,
-               COALESCE(AVG(CASE WHEN connect_success_time_us > 0 THEN connect_success_time_us ELSE NULL END), 0) as avg_time_us,
-               MAX(connect_error) as last_error
-        FROM monitor.mysql_server_connect_log
-        WHERE time_start_us > (strftime('%s', 'now') - 300) * 1000000
-        GROUP BY hostname, port
-        """
 
-        ping_results = self.execute_query(ping_query)
-        connect_results = self.execute_query(connect_query)
-
-        ping_checks = []
-        for row in ping_results:
-            ping_checks.append(HealthCheckStats(
-                check_type=str(row[0]),
-                hostname=str(row[1]),
-                port=int(row[2]) if str(row[2]).isdigit() else 0,
-                total_checks=int(row[3]) if str(row[3]).isdigit() else 0,
-                failed_checks=int(row[4]) if str(row[4]).isdigit() else 0,
-                avg_time_us=int(float(row[5])) if row[5] else 0
-            ))
+@dataclass
+class DigestCluster:
+    """Structurally equivalent SELECT digests, with their load added up"""
+    digests: List[Tuple[str, str, int]] = field(default_factory=list)   # (digest, digest_text, count_star)
+    shapes: List[DigestShape] = field(default_factory=list)             # aligned with digests
+    count_star: int = 0
+    sum_time: int = 0
+    max_time: int = 0
+    hostgroups: Dict[int, int] = field(default_factory=dict)            # hostgroup -> executions
 
-        connect_checks = []
-        for row in connect_results:
-            # Handle last_error which is optional (7th field)
-            last_error = str(row[6]) if len(row) > 6 and row[6] else None
-            connect_checks.append(HealthCheckStats(
-                check_type=str(row[0]),
-                hostname=str(row[1]),
-                port=int(row[2]) if str(row[2]).isdigit() else 0,
-                total_checks=int(row[3]) if str(row[3]).isdigit() else 0,
-                failed_checks=int(row[4]) if str(row[4]).isdigit() else 0,
-                avg_time_us=int(float(row[5])) if row[5] else 0,
-                last_error=last_error
-            ))
+    @property
+    def avg_time(self) -> float:
+        return self.sum_time / self.count_star if self.count_star > 0 else 0.0
 
-        return ping_checks, connect_checks
+    @property
+    def cache_score(self) -> float:
+        return digest_cache_score(self.count_star, self.sum_time)
 
-    def get_free_connections(self) -> FreeConnectionSummary:
-        """Fetch and analyze free connection statistics"""
+    def rank_value(self, rank_by: str) -> float:
+        return DIGEST_RANK_KEYS[rank_by](self.count_star, self.sum_time, self.max_time)
+
+    @property
+    def digest_text(self) -> str:
+        """digest_text of the busiest member"""
+        return max(self.digests, key=lambda member: member[2])[1] if self.digests else ''
+
+    @property
+    def hostgroup(self) -> int:
+        """Hostgroup that runs most of the cluster's executions"""
+        return max(self.hostgroups, key=self.hostgroups.get) if self.hostgroups else 0
+
+    @property
+    def patterns(self) -> List[str]:
+        """Distinct member regexes, busiest first"""
+        ranked = sorted(zip(self.digests, self.shapes), key=lambda pair: pair[0][2], reverse=True)
+        return list(dict.fromkeys(shape.pattern for _, shape in ranked))
+
+    @property
+    def variations(self) -> List[str]:
+        """How the members differ from each other"""
+        found = []
+        texts = {digest_text for _, digest_text, _ in self.digests}
+        if len(texts) < len(self.digests):
+            found.append('same text, other user/schema')
+        if len(self.patterns) < len(texts):
+            found.append('IN arity')
+        if len({shape.select_order for shape in self.shapes}) > 1:
+            found.append('column order')
+        if len({shape.predicates for shape in self.shapes}) > 1:
+            found.append('optional predicates')
+        elif len({shape.predicate_order for shape in self.shapes}) > 1:
+            found.append('predicate order')
+        return found
+
+
+@dataclass
+class DigestClustering:
+    """--cluster-digests: every SELECT digest grouped into clusters, and the tokenizer work it took"""
+    digests: int = 0             # distinct SELECT digests
+    tokenized: int = 0           # of which tokenized in this pass (the rest came from the memo)
+    seconds: float = 0.0
+    clusters: List[DigestCluster] = field(default_factory=list)
+
+    def top(self, top_n: int, rank_by: str = 'cache_score') -> List[DigestCluster]:
+        """The top_n clusters of more than one digest by rank_by"""
+        multi = [cluster for cluster in self.clusters if len(cluster.digests) > 1]
+        return sorted(multi, key=lambda cluster: cluster.rank_value(rank_by), reverse=True)[:top_n]
+
+
+@dataclass
+class DigestLoad:
+    """Arrival rate and result size of one cache candidate digest"""
+    digest: str
+    digest_text: str
+    qps: float                # executions per second over the digest's first_seen..last_seen window
+    rows_per_exec: float      # sum_rows_sent / count_star
+    avg_time_us: float        # backend time per execution
+    keys: int = 1             # distinct cache keys (literal combinations) the arrivals spread over
+
+    @property
+    def entry_bytes(self) -> float:
+        """Approximate size of one cached resultset"""
+        return self.rows_per_exec * CACHE_SIM_ROW_BYTES + CACHE_SIM_ENTRY_OVERHEAD + len(self.digest_text)
+
+    def hit_ratio(self, ttl_s: float) -> float:
+        """Steady-state hit ratio of one key with Poisson arrivals and TTL ttl_s"""
+        hits_per_fill = self.qps / self.keys * ttl_s
+        return hits_per_fill / (1 + hits_per_fill)
+
+    def best_ttl(self, ttls_ms: List[int] = CACHE_SIM_TTLS_MS, share: float = 0.9) -> int:
+        """Shortest TTL reaching share of the hit ratio of the longest one (least staleness)"""
+        ceiling = self.hit_ratio(max(ttls_ms) / 1000)
+        return next(ttl for ttl in sorted(ttls_ms) if self.hit_ratio(ttl / 1000) >= ceiling * share)
+
+
+@dataclass
+class CachePrediction:
+    """Predicted steady state of the query cache for one TTL policy and size"""
+    policy: str
+    size_mb: float
+    hit_rate: float = 0.0           # % of candidate executions served from cache
+    memory_bytes: float = 0.0
+    entries: float = 0.0
+    purge_per_sec: float = 0.0      # entries expired or evicted per second
+    saved_ms_per_sec: float = 0.0   # backend time no longer spent, per second of wall time
+    ttl_scale: float = 1.0          # < 1 when the size limit forces early eviction
+
+    @property
+    def memory_mb(self) -> float:
+        return self.memory_bytes / (1024 * 1024)
+
+
+class QueryCacheModel:
+    """Steady-state model of ProxySQL's query cache for a set of cacheable digests
+
+    The cache key is the full query text, so a digest's arrivals are split
+    evenly over `keys` keys. Per key, with Poisson arrivals at rate λ and TTL T,
+    each fill is followed by λT hits before the entry expires: hit ratio is
+    λT/(1+λT), the entry is resident T out of every T + 1/λ seconds, and each
+    such cycle ends with one purge. When the resident total exceeds the cache
+    size the purge thread has to drop entries before their TTL; that is
+    modelled by shrinking every TTL by one common factor until the cache fits
+    (a characteristic-time approximation).
+    """
+
+    def __init__(self, loads: List[DigestLoad], size_mb: float, keys_per_digest: int = 100):
+        self.loads = loads
+        self.size_mb = size_mb
+        self.keys_per_digest = keys_per_digest
+
+    def _steady_state(self, ttls_s: List[float], scale: float) -> Tuple[float, float, float, float, float]:
+        """(hits/s, executions/s, memory bytes, entries, purges/s) with every TTL times scale"""
+        hits = executions = memory = entries = purges = 0.0
+        for load, ttl_s in zip(self.loads, ttls_s):
+            ttl_s *= scale
+            key_rate = load.qps / load.keys
+            if key_rate <= 0 or ttl_s <= 0:
+                executions += load.qps
+                continue
+            cycle = ttl_s + 1 / key_rate
+            resident = load.keys * ttl_s / cycle
+            hits += load.qps * load.hit_ratio(ttl_s)
+            executions += load.qps
+            entries += resident
+            memory += resident * load.entry_bytes
+            purges += load.keys / cycle
+        return hits, executions, memory, entries, purges
+
+    def predict(self, ttls_ms: List[int], size_mb: float, policy: str) -> CachePrediction:
+        """Prediction for per-digest TTLs (same order as loads) and a cache size"""
+        ttls_s = [ttl / 1000 for ttl in ttls_ms]
+        capacity = size_mb * 1024 * 1024
+        scale = 1.0
+        if self._steady_state(ttls_s, 1.0)[2] > capacity:
+            low, high = 0.0, 1.0
+            for _ in range(40):
+                scale = (low + high) / 2
+                if self._steady_state(ttls_s, scale)[2] > capacity:
+                    high = scale
+                else:
+                    low = scale
+            scale = low
+
+        hits, executions, memory, entries, purges = self._steady_state(ttls_s, scale)
+        saved = 0.0
+        for load, ttl_s in zip(self.loads, ttls_s):
+            saved += load.qps * load.hit_ratio(ttl_s * scale) * load.avg_time_us / 1000
+        return CachePrediction(policy=policy, size_mb=size_mb,
+                               hit_rate=hits / executions * 100 if executions > 0 else 0.0,
+                               memory_bytes=memory, entries=entries, purge_per_sec=purges,
+                               saved_ms_per_sec=saved, ttl_scale=scale)
+
+    def policies(self, suggested_ttls_ms: List[int]) -> Dict[str, List[int]]:
+        """Candidate per-digest TTL policies: suggest_ttl, best_ttl and each uniform TTL"""
+        policies = {
+            'suggest_ttl': suggested_ttls_ms,
+            'best_ttl': [load.best_ttl() for load in self.loads],
+        }
+        for ttl in CACHE_SIM_TTLS_MS:
+            policies[f'uniform {ttl // 1000}s'] = [ttl] * len(self.loads)
+        return policies
+
+
+class RuleChainProfile:
+    """Evaluation cost model of the mysql_query_rules chain from stats_mysql_query_rules hits
+
+    Every query starts at flag 0 and is evaluated against each active rule
+    whose flagIN equals its current flag, in rule_id order. A hit on an apply=1
+    rule removes the query from the chain; a hit on a flagOUT rule moves it to
+    the flagOUT sub-chain. Walking the chain with the recorded hit counts gives
+    the number of rule evaluations ProxySQL performed, without any regex work.
+
+    With a RuleSimulator replay (track_overlaps) it also knows which rules
+    matched a common digest; only rules with no observed overlap are
+    reordered relative to each other, so the first matching rule for every
+    replayed digest stays the same.
+    """
+
+    def __init__(self, rules: List[QueryRule], hits: Dict[int, int], window_queries: Optional[int] = None,
+                 window_s: Optional[int] = None, simulator: Optional[RuleSimulator] = None):
+        self.chain = sorted((r for r in rules if r.active), key=lambda r: r.rule_id)
+        self.hits = {rule.rule_id: hits.get(rule.rule_id, 0) for rule in self.chain}
+        # Queries that left the flag 0 chain on a hit, over the hit window (since the
+        # last LOAD ... TO RUNTIME)
+        self.matched_queries = sum(self.hits[r.rule_id] for r in self.chain
+                                   if r.flag_in == 0 and (r.apply or r.flag_out not in (None, r.flag_in)))
+        # Queries that match no rule walk every flag 0 rule; their count is only
+        # known with an estimate of all queries over the same window (None otherwise)
+        self.fallthrough_queries = max(0, window_queries - self.matched_queries) \
+            if window_queries is not None else None
+        self.window_s = window_s
+        self.total_queries = self.matched_queries + (self.fallthrough_queries or 0)
+        self.simulator = simulator
+        self.overlaps = simulator.overlaps if simulator else set()
+        self.reached: Dict[int, int] = {}
+        self.current_evaluations = self.evaluations(self.chain, record=True)
+
+    def evaluations(self, chain: List[QueryRule], record: bool = False) -> int:
+        """Total rule evaluations for total_queries queries walking chain"""
+        remaining = {0: self.total_queries}
+        total = 0
+        for rule in chain:
+            arriving = remaining.get(rule.flag_in, 0)
+            total += arriving
+            if record:
+                self.reached[rule.rule_id] = arriving
+            hits = min(self.hits.get(rule.rule_id, 0), arriving)
+            if rule.apply or (rule.flag_out is not None and rule.flag_out != rule.flag_in):
+                remaining[rule.flag_in] = arriving - hits
+                if not rule.apply:
+                    remaining[rule.flag_out] = remaining.get(rule.flag_out, 0) + hits
+        return total
+
+    @property
+    def dead_rules(self) -> List[QueryRule]:
+        """Active rules without a single hit"""
+        return [rule for rule in self.chain if self.hits[rule.rule_id] == 0]
+
+    def unreachable(self, rule: QueryRule) -> bool:
+        """flagIN that no earlier rule's flagOUT ever sets"""
+        if rule.flag_in == 0:
+            return False
+        return not any(r.flag_out == rule.flag_in for r in self.chain if r.rule_id < rule.rule_id)
+
+    def shadowed_by(self, rule: QueryRule) -> Optional[int]:
+        """Earlier rule that takes every query this rule would match, if any"""
+        for earlier in self.chain:
+            if earlier.rule_id >= rule.rule_id:
+                break
+            if not earlier.apply or earlier.flag_in != rule.flag_in:
+                continue
+            same_filter = all(getattr(earlier, name) in (None, getattr(rule, name))
+                              for name in ('username', 'schemaname', 'digest'))
+            same_regex = all(getattr(earlier, name) in (None, getattr(rule, name))
+                             for name in ('match_digest', 'match_pattern')) and \
+                earlier.negate_match_pattern == rule.negate_match_pattern
+            if same_filter and same_regex:
+                return earlier.rule_id
+        if self.simulator:
+            stats = next((s for s in self.simulator.stats if s.rule.rule_id == rule.rule_id), None)
+            if stats and stats.standalone_digests and not stats.digests and stats.taken_by:
+                return max(stats.taken_by, key=stats.taken_by.get)
+        return None
+
+    def wiring_issue(self, rule: QueryRule) -> Optional[str]:
+        """apply/flagOUT settings that force extra evaluation or lead nowhere"""
+        later = [r for r in self.chain if r.rule_id > rule.rule_id]
+        if rule.flag_out is not None and not rule.apply:
+            if rule.flag_out == rule.flag_in:
+                return "flagOUT equals flagIN - no effect, matches keep walking the chain"
+            if not any(r.flag_in == rule.flag_out for r in later):
+                return f"flagOUT {rule.flag_out} has no later rules - matches end here without apply"
+            return None
+        if not rule.apply and self.hits[rule.rule_id]:
+            following = sum(1 for r in later if r.flag_in == rule.flag_in)
+            if following:
+                return f"apply=0 - {self.hits[rule.rule_id]:,} matches keep walking {following} more rules"
+        return None
+
+    def _movable(self, rule: QueryRule) -> bool:
+        return rule.apply and rule.flag_out is None
+
+    def _conflicts(self, first: QueryRule, second: QueryRule) -> bool:
+        """Whether swapping two movable rules could change which one applies"""
+        if first.flag_in != second.flag_in:
+            return False
+        for name in ('username', 'schemaname', 'digest'):
+            a, b = getattr(first, name), getattr(second, name)
+            if a is not None and b is not None and a != b:
+                return False
+        if self.simulator is None:
+            return True
+        pair = tuple(sorted((first.rule_id, second.rule_id)))
+        catch_all = lambda r: not (r.match_digest or r.match_pattern or r.digest)
+        return pair in self.overlaps or catch_all(first) or catch_all(second)
+
+    def proposed_chain(self) -> List[Tuple[int, QueryRule]]:
+        """Pruned, reordered chain as (new rule_id, rule) pairs
+
+        Dead rules are dropped. Runs of movable (apply=1, no flagOUT) rules
+        between other rules are sorted by hits, hottest first, with each rule
+        only passing rules it cannot conflict with; the run reuses its own
+        rule_ids so it stays between the same neighbours.
+        """
+        result: List[Tuple[int, QueryRule]] = []
+        run: List[QueryRule] = []
+
+        def flush():
+            ordered: List[QueryRule] = []
+            for rule in run:
+                position = len(ordered)
+                while position > 0 and self.hits[ordered[position - 1].rule_id] < self.hits[rule.rule_id] \
+                        and not self._conflicts(ordered[position - 1], rule):
+                    position -= 1
+                ordered.insert(position, rule)
+            ids = sorted(rule.rule_id for rule in ordered)
+            result.extend(zip(ids, ordered))
+            run.clear()
+
+        for rule in self.chain:
+            if self.hits[rule.rule_id] == 0:
+                continue
+            if self._movable(rule):
+                run.append(rule)
+                continue
+            flush()
+            result.append((rule.rule_id, rule))
+        flush()
+        return result
+
+    @property
+    def proposed_evaluations(self) -> int:
+        return self.evaluations([rule for _, rule in self.proposed_chain()])
+
+    @property
+    def pruned_evaluations(self) -> int:
+        """Evaluations with the dead rules disabled and the order left as it is"""
+        return self.evaluations([rule for rule in self.chain if self.hits[rule.rule_id]])
+
+    @staticmethod
+    def window_queries(stats: GlobalStats, rules_age_s: Optional[int]) -> Optional[int]:
+        """Questions scaled to the hit window (rules loaded rules_age_s ago), None when unknown"""
+        if rules_age_s is None or stats.uptime_seconds <= 0:
+            return None
+        return int(stats.queries_total * min(rules_age_s, stats.uptime_seconds) / stats.uptime_seconds)
+
+    @property
+    def reorder_saving_pct(self) -> Optional[float]:
+        """Share of the pruned chain's evaluations the reordering saves (None without a query estimate)"""
+        pruned = self.pruned_evaluations
+        if self.fallthrough_queries is None:
+            return None
+        return (1 - self.proposed_evaluations / pruned) * 100 if pruned else 0.0
+
+    @property
+    def saved_per_hit(self) -> float:
+        """Evaluations the reordering saves per query that hit a rule"""
+        saved = self.pruned_evaluations - self.proposed_evaluations
+        return saved / self.matched_queries if self.matched_queries else 0.0
+
+    @property
+    def moves(self) -> List[Tuple[int, int]]:
+        """(new rule_id, old rule_id) renumberings worth applying
+
+        Gated on RULE_CHAIN_MIN_SAVING_PCT when the queries matching no rule
+        are known; without that estimate no share can be given, so any
+        reordering that saves evaluations is listed.
+        """
+        saving = self.reorder_saving_pct
+        if saving is not None and saving < RULE_CHAIN_MIN_SAVING_PCT:
+            return []
+        return [(new_id, rule.rule_id) for new_id, rule in self.proposed_chain() if new_id != rule.rule_id]
+
+
+class DigestFrame:
+    """Columnar (NumPy) view of stats_mysql_query_digest
+
+    Counters live in int64 columns and string key columns in plain lists, so
+    derived metrics (avg_time, cache_score, ...) are whole-column operations
+    computed once per frame instead of per-row property calls. QueryDigest
+    objects are only built as thin display views for the rows actually shown.
+    """
+
+    def __init__(self, hostgroup, schemaname: List[str], username: List[str], digest: List[str],
+                 count_star, sum_time, min_time, max_time):
+        self.hostgroup = hostgroup
+        self.schemaname = schemaname
+        self.username = username
+        self.digest = digest
+        self.count_star = count_star
+        self.sum_time = sum_time
+        self.min_time = min_time
+        self.max_time = max_time
+        self.digest_text: Dict[int, str] = {}   # row index -> text, filled for shown rows only
+        self._scores: Dict[str, 'np.ndarray'] = {}
+
+    @classmethod
+    def from_rows(cls, rows) -> 'DigestFrame':
+        """Build from (hostgroup, schemaname, username, digest, count_star, sum_time, min_time, max_time) rows
+
+        Numbers are appended to typed array('q') buffers while streaming (8 bytes
+        per value, no per-row objects) and wrapped zero-copy by NumPy at the end;
+        repeated schema and user names are interned.
+        """
+        hostgroup, count_star, sum_time, min_time, max_time = (array('q') for _ in range(5))
+        schemaname, username, digest = [], [], []
+        to_int = lambda v: int(v) if str(v).lstrip('-').isdigit() else 0
+        for row in rows:
+            hostgroup.append(to_int(row[0]))
+            schemaname.append(sys.intern(str(row[1])))
+            username.append(sys.intern(str(row[2])))
+            digest.append(str(row[3]))
+            count_star.append(to_int(row[4]))
+            sum_time.append(to_int(row[5]))
+            min_time.append(to_int(row[6]))
+            max_time.append(to_int(row[7]))
+        columns = [np.frombuffer(c, dtype=np.int64) if len(c) else np.zeros(0, dtype=np.int64)
+                   for c in (hostgroup, count_star, sum_time, min_time, max_time)]
+        return cls(columns[0], schemaname, username, digest, *columns[1:])
+
+    def __len__(self) -> int:
+        return len(self.digest)
+
+    @property
+    def avg_time(self) -> 'np.ndarray':
+        """Average execution time column in microseconds (0 where count_star is 0)"""
+        if 'avg_time' not in self._scores:
+            count = self.count_star.astype(np.float64)
+            self._scores['avg_time'] = np.divide(self.sum_time, count, out=np.zeros_like(count), where=count > 0)
+        return self._scores['avg_time']
+
+    @property
+    def cache_score(self) -> 'np.ndarray':
+        """Vectorized digest_cache_score() for every row"""
+        if 'cache_score' not in self._scores:
+            self._scores['cache_score'] = (
+                np.minimum(self.count_star / CACHE_SCORE_COUNT_SCALE, CACHE_SCORE_CAP) * CACHE_SCORE_COUNT_WEIGHT +
+                np.minimum(self.sum_time / CACHE_SCORE_SUM_TIME_SCALE, CACHE_SCORE_CAP) * CACHE_SCORE_SUM_TIME_WEIGHT +
+                np.minimum(self.avg_time / CACHE_SCORE_AVG_TIME_SCALE, CACHE_SCORE_CAP) * CACHE_SCORE_AVG_TIME_WEIGHT)
+        return self._scores['cache_score']
+
+    def scores(self, rank_by: str) -> 'np.ndarray':
+        """Column for any DIGEST_RANK_KEYS key"""
+        if rank_by == 'cache_score':
+            return self.cache_score
+        if rank_by == 'avg_time':
+            return self.avg_time
+        return getattr(self, rank_by)
+
+    def top_indices(self, top_n: int, rank_by: str = 'cache_score') -> 'np.ndarray':
+        """Row indices of the top_n rows by rank_by, best first
+
+        argpartition selects the top_n in O(n); only those are fully sorted.
+        """
+        scores = self.scores(rank_by)
+        if top_n >= len(scores):
+            return np.argsort(-scores, kind='stable')
+        candidates = np.argpartition(-scores, top_n - 1)[:top_n]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    def view(self, index: int) -> QueryDigest:
+        """QueryDigest display view of one row"""
+        index = int(index)
+        return QueryDigest(
+            hostgroup=int(self.hostgroup[index]),
+            schemaname=self.schemaname[index],
+            username=self.username[index],
+            digest=self.digest[index],
+            digest_text=self.digest_text.get(index, self.digest[index]),
+            count_star=int(self.count_star[index]),
+            sum_time=int(self.sum_time[index]),
+            min_time=int(self.min_time[index]),
+            max_time=int(self.max_time[index])
+        )
+
+
+class PoolFrame:
+    """Columnar (NumPy) view of stats_mysql_connection_pool
+
+    Computes every derived ratio and ConnectionPoolStats.efficiency_score for
+    all backends in one batch, using the same weights and latency bands.
+    """
+
+    def __init__(self, pools: List[ConnectionPoolStats]):
+        self.pools = pools
+        column = lambda name: np.array([getattr(p, name) for p in pools], dtype=np.float64)
+        self.queries = column('queries')
+        self.conn_used = column('conn_used')
+        self.conn_free = column('conn_free')
+        self.conn_ok = column('conn_ok')
+        self.conn_err = column('conn_err')
+        self.latency_us = column('latency_us')
+
+    def _ratio(self, numerator, denominator, default: float) -> 'np.ndarray':
+        return np.divide(numerator, denominator, out=np.full_like(numerator, default), where=denominator > 0)
+
+    @property
+    def pool_utilization(self) -> 'np.ndarray':
+        return self._ratio(self.conn_used * 100, self.conn_used + self.conn_free, 0.0)
+
+    @property
+    def connection_success_rate(self) -> 'np.ndarray':
+        return self._ratio(self.conn_ok * 100, self.conn_ok + self.conn_err, 100.0)
+
+    @property
+    def queries_per_connection(self) -> 'np.ndarray':
+        return self._ratio(self.queries, self.conn_ok, 0.0)
+
+    @property
+    def efficiency_scores(self) -> 'np.ndarray':
+        """Vectorized ConnectionPoolStats.efficiency_score"""
+        latency_ms = self.latency_us / 1000.0
+        last_band = POOL_SCORE_LATENCY_BANDS[-1][0]
+        latency_score = np.select(
+            [latency_ms <= limit for limit, _ in POOL_SCORE_LATENCY_BANDS],
+            [float(score) for _, score in POOL_SCORE_LATENCY_BANDS],
+            np.maximum(0, 100 - (latency_ms - last_band) * POOL_SCORE_LATENCY_PENALTY))
+        optimal = POOL_SCORE_OPTIMAL_UTILIZATION
+        return (self.connection_success_rate * POOL_SCORE_WEIGHTS['success'] +
+                np.minimum(self.pool_utilization, optimal) / optimal * 100 * POOL_SCORE_WEIGHTS['utilization'] +
+                np.minimum(self.queries_per_connection / POOL_SCORE_QUERIES_PER_CONN, 1) * 100 *
+                POOL_SCORE_WEIGHTS['queries_per_conn'] +
+                latency_score * POOL_SCORE_WEIGHTS['latency'])
+
+    def apply_scores(self) -> List[ConnectionPoolStats]:
+        """Seed each row's cached efficiency_score from the batch computation"""
+        for pool, score in zip(self.pools, self.efficiency_scores):
+            pool.__dict__['efficiency_score'] = float(score)
+        return self.pools
+
+
+@dataclass
+class AnalysisSnapshot:
+    """Every metric gathered by one collection pass, handed to the print stage"""
+    version: str = "Unknown"
+    queries: List[QueryDigest] = field(default_factory=list)
+    cache_stats: CacheStats = field(default_factory=CacheStats)
+    pool_stats: List[ConnectionPoolStats] = field(default_factory=list)
+    global_stats: GlobalStats = field(default_factory=GlobalStats)
+    ping_checks: List[HealthCheckStats] = field(default_factory=list)
+    connect_checks: List[HealthCheckStats] = field(default_factory=list)
+    free_conns: FreeConnectionSummary = field(default_factory=FreeConnectionSummary)
+    memory_metrics: MemoryMetrics = field(default_factory=MemoryMetrics)
+    commands: List[Tuple[str, int, int]] = field(default_factory=list)
+    cache_config: Dict[str, str] = field(default_factory=dict)
+    monitor_config: Dict[str, str] = field(default_factory=dict)
+    existing_rules: List[Tuple[int, str, int]] = field(default_factory=list)
+    topology: HostgroupTopology = field(default_factory=HostgroupTopology)
+    free_conn_details: List[FreeConnectionStats] = field(default_factory=list)  # only with --free-conn-details
+    digest_frame: Optional[DigestFrame] = None  # only with --columnar
+    query_rules: List[QueryRule] = field(default_factory=list)  # only with --simulate-rules
+    rule_simulation: Optional[RuleSimulator] = None             # only with --simulate-rules
+    rule_chain: Optional[RuleChainProfile] = None               # only with --rule-chain
+    cache_model: Optional[QueryCacheModel] = None               # only with --cache-sim
+    digest_rows: List[Tuple] = field(default_factory=list)      # fleet nodes: whole digest table, unmerged
+    anomalies: Optional['AnomalyReport'] = None                 # only with --anomalies
+    baseline: Optional['PerformanceBaseline'] = None            # only with --baseline / --compare
+    baseline_diff: Optional['BaselineDiff'] = None              # only with --compare
+    fleet: Optional['FleetSummary'] = None                      # only with --fleet
+    routing: Optional[RoutingAdvice] = None                     # only with --routing
+    clusters: Optional[DigestClustering] = None                 # only with --cluster-digests
+    rule_conversion: Optional[RuleConversionPlan] = None        # only with --convert-rules
+
+
+def record_dict(obj, *properties: str) -> Dict:
+    """Dataclass fields plus the named derived properties, for the report model"""
+    record = {f.name: getattr(obj, f.name) for f in fields(obj)}
+    record.update((name, getattr(obj, name)) for name in properties)
+    return record
+
+
+@dataclass
+class Recommendation:
+    """One finding of the report, with the SQL that acts on it if any"""
+    severity: str          # 'ok', 'info', 'tip', 'warning' or 'critical'
+    message: str
+    subject: str = ''      # what it is about, e.g. 'hostgroup 10' or 'multiplexing'
+    sql: str = ''
+
+    def as_dict(self) -> Dict:
+        return {'severity': self.severity, 'message': self.message, 'subject': self.subject, 'sql': self.sql}
+
+
+@dataclass
+class ReportSection:
+    """One section of a Report: scalar metrics, table rows, findings and generated SQL"""
+    name: str
+    title: str
+    metrics: Dict = field(default_factory=dict)
+    rows: List[Dict] = field(default_factory=list)
+    recommendations: List[Recommendation] = field(default_factory=list)
+    sql: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> Dict:
+        return {'name': self.name, 'title': self.title, 'metrics': self.metrics, 'rows': self.rows,
+                'recommendations': [r.as_dict() for r in self.recommendations], 'sql': self.sql}
+
+
+@dataclass
+class Report:
+    """Typed result of one analysis run, rendered as text, JSON or NDJSON (--format)
+
+    Built once from an AnalysisSnapshot by ProxySQLAnalyzer.build_report; the
+    text renderer prints the snapshot's tables and the sections' findings,
+    the JSON renderers serialize the sections.
+    """
+    snapshot: AnalysisSnapshot
+    top_queries: List[QueryDigest]
+    info: Dict = field(default_factory=dict)     # analyzer version, source, generated time
+    sections: List[ReportSection] = field(default_factory=list)
+
+    def section(self, name: str) -> Optional[ReportSection]:
+        return next((s for s in self.sections if s.name == name), None)
+
+    def recommendations(self, name: str) -> List[Recommendation]:
+        section = self.section(name)
+        return section.recommendations if section else []
+
+    def as_dict(self) -> Dict:
+        return {**self.info, 'sections': [s.as_dict() for s in self.sections]}
+
+    def records(self) -> Iterator[Dict]:
+        """NDJSON records: the report header, then per section its header, rows, findings and SQL"""
+        yield {'type': 'report', **self.info}
+        for section in self.sections:
+            yield {'type': 'section', 'section': section.name, 'title': section.title, 'metrics': section.metrics}
+            for row in section.rows:
+                yield {'type': 'row', 'section': section.name, **row}
+            for recommendation in section.recommendations:
+                yield {'type': 'recommendation', 'section': section.name, **recommendation.as_dict()}
+            for sql in section.sql:
+                yield {'type': 'sql', 'section': section.name, 'sql': sql}
+
+
+@dataclass
+class FleetNode:
+    """One admin endpoint of a --fleet run and the outcome of its collection"""
+    endpoint: str
+    status: str = 'queued'          # queued / running / ok / failed / timeout
+    started: float = 0.0            # time.monotonic() when its collection began
+    seconds: float = 0.0
+    error: str = ''
+    snapshot: Optional[AnalysisSnapshot] = None
+    rule_hits: Dict[int, int] = field(default_factory=dict)
+    rules_age: Optional[int] = None  # seconds since this node's rules were loaded, None when unknown
+    # (hostgroup, schemaname, username, digest) -> count_star on this node, keyed like the merged top queries
+    digest_counts: Dict[Tuple[int, str, str, str], int] = field(default_factory=dict)
+
+    @property
+    def qps(self) -> float:
+        """Average questions per second since this node started"""
+        stats = self.snapshot.global_stats if self.snapshot else None
+        return stats.queries_total / stats.uptime_seconds if stats and stats.uptime_seconds > 0 else 0.0
+
+
+@dataclass
+class FleetSummary:
+    """Per-node view of a merged --fleet snapshot"""
+    nodes: List[FleetNode]
+    seconds: float = 0.0            # wall time of the whole fleet collection
+    memory_node: str = ''           # node whose memory metrics the report shows (largest resident)
+    cache_node: str = ''            # node whose query cache memory/entries the report shows (fullest)
+    drift: List[str] = field(default_factory=list)  # configuration differences between nodes
+
+    @property
+    def ok_nodes(self) -> List[FleetNode]:
+        return [node for node in self.nodes if node.status == 'ok']
+
+    def digest_skew(self, query: QueryDigest) -> Tuple[str, int, float, float]:
+        """(busiest node, cluster executions, busiest node's share, max / mean per-node count) of one merged digest row"""
+        nodes = self.ok_nodes
+        key = (query.hostgroup, query.schemaname, query.username, query.digest)
+        counts = [node.digest_counts.get(key, 0) for node in nodes]
+        total = sum(counts)
+        if not total:
+            return '', 0, 0.0, 0.0
+        busiest = max(range(len(nodes)), key=counts.__getitem__)
+        return nodes[busiest].endpoint, total, counts[busiest] / total * 100, counts[busiest] / (total / len(nodes))
+
+
+@dataclass
+class WatchSample:
+    """Cumulative counters captured at one watch tick"""
+    taken_at: float                     # time.monotonic() when the sample was read
+    cache_stats: CacheStats
+    global_stats: GlobalStats
+    # (hostgroup, srv_host, srv_port) -> (Queries, ConnOK, ConnERR)
+    pool_counters: Dict[Tuple[int, str, int], Tuple[int, int, int]]
+    # Digest rows that executed since the previous tick:
+    # (hostgroup, schemaname, username, client_address, digest) -> (count_star, sum_time)
+    digest_counters: Dict[Tuple[str, ...], Tuple[int, int]]
+    digest_texts: Dict[str, str]        # digest -> digest_text for the rows above
+    memory: Optional[MemoryMetrics] = None   # read in the same round trip when history is on
+
+
+@dataclass
+class DigestRate:
+    """Per-digest activity over one watch interval"""
+    digest: str
+    digest_text: str
+    executions: int
+    time_us: int
+    interval_s: float
+
+    @property
+    def qps(self) -> float:
+        """Executions per second over the interval"""
+        return self.executions / self.interval_s if self.interval_s > 0 else 0.0
+
+    @property
+    def avg_time(self) -> float:
+        """Average execution time over the interval in microseconds"""
+        return self.time_us / self.executions if self.executions > 0 else 0.0
+
+
+@dataclass
+class BackendRate:
+    """Per-backend connection pool activity over one watch interval"""
+    hostgroup: int
+    srv_host: str
+    srv_port: int
+    queries_per_sec: float
+    conn_ok_per_sec: float
+    conn_err_per_sec: float
+
+
+@dataclass
+class WatchRates:
+    """Per-second rates derived from two consecutive watch samples"""
+    interval_s: float
+    questions_per_sec: float = 0.0
+    slow_queries_per_sec: float = 0.0
+    cache_gets_per_sec: float = 0.0
+    cache_hits_per_sec: float = 0.0
+    cache_sets_per_sec: float = 0.0
+    cache_purged_per_sec: float = 0.0
+    client_connections: int = 0
+    digests: List[DigestRate] = field(default_factory=list)
+    backends: List[BackendRate] = field(default_factory=list)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Cache hit rate percentage within this interval only"""
+        return (self.cache_hits_per_sec / self.cache_gets_per_sec * 100) if self.cache_gets_per_sec > 0 else 0.0
+
+
+@dataclass
+class CanaryWindow:
+    """Counter deltas over one --apply observation window (before or after the rules)"""
+    label: str
+    seconds: float = 0.0
+    questions: int = 0            # client queries (Questions)
+    backend_queries: int = 0      # stats_mysql_connection_pool Queries
+    conn_ok: int = 0
+    conn_err: int = 0
+    cache_gets: int = 0
+    cache_hits: int = 0
+    # digest -> [executions, time μs] on a backend, and executions answered
+    # from the query cache (ProxySQL's hostgroup -1 digest rows)
+    digests: Dict[str, List[int]] = field(default_factory=dict)
+    cached: Dict[str, int] = field(default_factory=dict)
+    restarted: bool = False       # uptime went backwards during the window
+
+    def add(self, previous: WatchSample, current: WatchSample, baseline: Dict[Tuple[str, ...], Tuple[int, int]]):
+        """Accumulate the deltas between two consecutive samples"""
+        self.seconds += current.taken_at - previous.taken_at
+        self.questions += counter_delta(current.global_stats.queries_total, previous.global_stats.queries_total)
+        self.cache_gets += counter_delta(current.cache_stats.count_get, previous.cache_stats.count_get)
+        self.cache_hits += counter_delta(current.cache_stats.count_get_ok, previous.cache_stats.count_get_ok)
+        for key, (queries, conn_ok, conn_err) in current.pool_counters.items():
+            prev_queries, prev_ok, prev_err = previous.pool_counters.get(key, (0, 0, 0))
+            self.backend_queries += counter_delta(queries, prev_queries)
+            self.conn_ok += counter_delta(conn_ok, prev_ok)
+            self.conn_err += counter_delta(conn_err, prev_err)
+        for key, (count_star, sum_time) in current.digest_counters.items():
+            prev_count, prev_time = baseline.get(key, (0, 0))
+            executions = counter_delta(count_star, prev_count)
+            if executions <= 0:
+                continue
+            if key[0] == '-1':
+                self.cached[key[4]] = self.cached.get(key[4], 0) + executions
+                continue
+            totals = self.digests.setdefault(key[4], [0, 0])
+            totals[0] += executions
+            totals[1] += counter_delta(sum_time, prev_time)
+
+    @property
+    def backend_qps(self) -> float:
+        """Backend queries per second"""
+        return self.backend_queries / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def backend_share(self) -> float:
+        """Backend queries per client query"""
+        return self.backend_queries / self.questions if self.questions > 0 else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        """Query cache hit rate percentage within the window"""
+        return self.cache_hits / self.cache_gets * 100 if self.cache_gets > 0 else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        """Backend connection error rate percentage within the window"""
+        attempts = self.conn_ok + self.conn_err
+        return self.conn_err / attempts * 100 if attempts > 0 else 0.0
+
+    def avg_time(self, digest: str) -> float:
+        """Average backend time of one digest in microseconds"""
+        executions, time_us = self.digests.get(digest, (0, 0))
+        return time_us / executions if executions > 0 else 0.0
+
+    def judge(self, after: 'CanaryWindow', watched: List[str], max_latency_pct: float,
+              max_error_pts: float) -> 'CanaryOutcome':
+        """Compare this (before) window with the window after the rules were applied
+
+        Backend latency is mix-adjusted: digests that ran often enough in both
+        windows are weighted by their before executions, so moving a fast or
+        slow digest into the cache does not read as a latency change. The
+        watched digests (the ones the rules were made for) are also judged one
+        by one, since their cache misses are what still reaches a backend.
+        """
+        outcome = CanaryOutcome(hit_rate_change_pts=after.hit_rate - self.hit_rate)
+
+        common = [(before, after.digests[digest]) for digest, before in self.digests.items()
+                  if before[0] >= APPLY_MIN_EXECUTIONS
+                  and after.digests.get(digest, (0, 0))[0] >= APPLY_MIN_EXECUTIONS]
+        before_time = sum(before[1] for before, _ in common)
+        if before_time > 0:
+            adjusted = sum(before[0] * now[1] / now[0] for before, now in common)
+            outcome.latency_change_pct = (adjusted / before_time - 1) * 100
+            if outcome.latency_change_pct > max_latency_pct:
+                outcome.regressions.append(f"backend latency +{outcome.latency_change_pct:.1f}% "
+                                           f"(limit {max_latency_pct:g}%)")
+        for digest in watched:
+            before_avg, after_avg = self.avg_time(digest), after.avg_time(digest)
+            if (before_avg > 0 and self.digests[digest][0] >= APPLY_MIN_EXECUTIONS
+                    and after.digests.get(digest, (0, 0))[0] >= APPLY_MIN_EXECUTIONS):
+                change = (after_avg / before_avg - 1) * 100
+                if change > max_latency_pct:
+                    outcome.regressions.append(f"digest {digest} backend latency +{change:.1f}% "
+                                               f"(limit {max_latency_pct:g}%)")
+
+        if min(self.conn_ok + self.conn_err, after.conn_ok + after.conn_err) >= APPLY_MIN_CONNECTS:
+            outcome.error_rate_change_pts = after.error_rate - self.error_rate
+            if outcome.error_rate_change_pts > max_error_pts:
+                outcome.regressions.append(f"backend connection errors +{outcome.error_rate_change_pts:.1f} pts "
+                                           f"(limit {max_error_pts:g} pts)")
+
+        if self.backend_share > 0 and after.questions > 0:
+            outcome.offload_change_pct = (after.backend_share / self.backend_share - 1) * 100
+            if -outcome.offload_change_pct >= APPLY_MIN_OFFLOAD_PCT:
+                outcome.benefits.append(f"backend queries per client query {outcome.offload_change_pct:.1f}%")
+        if outcome.hit_rate_change_pts >= APPLY_MIN_HIT_RATE_PTS:
+            outcome.benefits.append(f"cache hit rate +{outcome.hit_rate_change_pts:.1f} pts")
+        if after.restarted:
+            outcome.regressions.append("ProxySQL restarted during the window")
+        return outcome
+
+
+@dataclass
+class CanaryOutcome:
+    """Before/after verdict of an --apply canary"""
+    hit_rate_change_pts: float = 0.0
+    latency_change_pct: Optional[float] = None     # None: no digest ran often enough in both windows
+    error_rate_change_pts: Optional[float] = None  # None: too few connection attempts to compare
+    offload_change_pct: Optional[float] = None     # backend queries per client query
+    regressions: List[str] = field(default_factory=list)
+    benefits: List[str] = field(default_factory=list)
+
+    @property
+    def keep(self) -> bool:
+        """Whether the rules showed a benefit without making anything worse"""
+        return bool(self.benefits) and not self.regressions
+
+
+def parse_duration(text: str) -> int:
+    """'90s', '30m', '24h', '7d' (or plain seconds) -> seconds, for argparse"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', text.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid duration '{text}' (use e.g. 90s, 30m, 24h, 7d)")
+    unit = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+    return int(float(match.group(1)) * unit)
+
+
+def parse_threshold(text: str) -> Tuple[str, float]:
+    """'digest_time_pct=10' -> ('digest_time_pct', 10.0), for argparse"""
+    name, sep, value = text.partition('=')
+    name = name.strip().replace('-', '_')
+    if not sep or name not in BASELINE_THRESHOLDS:
+        raise argparse.ArgumentTypeError(
+            f"invalid threshold '{text}' (use NAME=VALUE, NAME one of {', '.join(BASELINE_THRESHOLDS)})")
+    try:
+        limit = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid threshold value '{value}' for {name}")
+    if limit < 0:
+        raise argparse.ArgumentTypeError(f"threshold {name} cannot be negative")
+    return name, limit
+
+
+def parse_endpoints(text: str) -> List[str]:
+    """'host1:6032,host2,node3.snap.gz' or '@FILE' (one per line, # comments) -> endpoint list"""
+    if text.startswith('@'):
+        try:
+            with open(text[1:]) as f:
+                entries = [line.split('#', 1)[0] for line in f]
+        except OSError as e:
+            raise argparse.ArgumentTypeError(f"cannot read endpoint list: {e}")
+    else:
+        entries = text.split(',')
+    endpoints = [entry.strip() for entry in entries if entry.strip()]
+    for endpoint in endpoints:
+        _, sep, port = endpoint.rpartition(':')
+        if sep and not port.isdigit() and not os.path.isfile(endpoint):
+            raise argparse.ArgumentTypeError(f"invalid endpoint '{endpoint}' (use HOST[:PORT] or a --capture file)")
+    if not endpoints:
+        raise argparse.ArgumentTypeError("no endpoints given")
+    return list(dict.fromkeys(endpoints))
+
+
+def counter_delta(current: int, previous: int) -> int:
+    """Difference between two cumulative counter readings
+
+    A counter that went backwards was reset (stats table truncated or ProxySQL
+    restarted), so everything counted since is the current value.
+    """
+    return current - previous if current >= previous else current
+
+
+class SnapshotCursor:
+    """Cursor over a SnapshotConnection, mimicking the mysql-connector API in use"""
+
+    VERSION_QUERY = re.compile(r'^\s*SELECT\s+@@version\s*$', re.IGNORECASE)
+
+    def __init__(self, connection: 'SnapshotConnection'):
+        self.connection = connection
+        self._rows: Iterator[Tuple] = iter(())
+        self.column_names: Tuple[str, ...] = ()
+        self.with_rows = False
+
+    def execute(self, query: str):
+        if self.VERSION_QUERY.match(query):
+            self.column_names = ('@@version',)
+            self._rows = iter([(self.connection.info.get('proxysql_version', 'Unknown'),)])
+            self.with_rows = True
+            return
+        try:
+            cursor = self.connection.db.execute(query)
+        except sqlite3.Error as e:
+            raise mysql.connector.errors.DatabaseError(msg=str(e))
+        self.column_names = tuple(d[0] for d in cursor.description or ())
+        self.with_rows = cursor.description is not None
+        # ProxySQL's admin interface returns every value as a string
+        self._rows = (tuple(None if v is None else str(v) for v in row) for row in cursor)
+
+    def fetchmany(self, size: int = 1) -> List[Tuple]:
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def fetchall(self) -> List[Tuple]:
+        return list(self._rows)
+
+    def close(self):
+        self._rows = iter(())
+
+
+class SnapshotConnection:
+    """Offline stand-in for an admin connection, backed by a --capture file
+
+    The captured tables are loaded into an in-memory SQLite database (ProxySQL's
+    admin interface is SQLite too), so every collector runs its normal SQL.
+    """
+
+    def __init__(self, db: sqlite3.Connection, info: Dict):
+        self.db = db
+        self.info = info
+
+    @classmethod
+    def load(cls, path: str) -> 'SnapshotConnection':
+        """Load a snapshot file written by ProxySQLAnalyzer.capture_snapshot()"""
+        db = sqlite3.connect(':memory:')
+        db.execute("ATTACH DATABASE ':memory:' AS monitor")
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            info = json.loads(f.readline() or '{}')
+            if info.get('format') != SNAPSHOT_FORMAT:
+                raise ValueError(f"{path} is not a ProxySQL report snapshot")
+            if info.get('version') != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported snapshot version {info.get('version')} "
+                                 f"(this analyzer reads version {SNAPSHOT_VERSION})")
+
+            table, insert, batch = None, None, []
+            for line in f:
+                record = json.loads(line)
+                if isinstance(record, list):
+                    # Integer-looking strings become integers so numeric filters
+                    # and ORDER BY behave like ProxySQL's INT columns
+                    batch.append([int(v) if isinstance(v, str) and v.lstrip('-').isdigit() else v
+                                  for v in record])
+                    if len(batch) >= 5000:
+                        db.executemany(insert, batch)
+                        batch = []
+                elif 'table' in record:
+                    table = record['table']
+                    columns = ', '.join(f'"{c}"' for c in record['columns'])
+                    db.execute(f"CREATE TABLE {table} ({columns})")
+                    insert = f"INSERT INTO {table} VALUES ({', '.join('?' * len(record['columns']))})"
+                elif 'end' in record and batch:
+                    db.executemany(insert, batch)
+                    batch = []
+
+        # Monitor log filters are relative to 'now'; shift samples so the
+        # capture moment becomes now and the "last 5 minutes" window still holds
+        offset_us = int((time.time() - info.get('captured_at', time.time())) * 1_000_000)
+        for table in ('monitor.mysql_server_ping_log', 'monitor.mysql_server_connect_log'):
+            try:
+                db.execute(f"UPDATE {table} SET time_start_us = time_start_us + ?", (offset_us,))
+            except sqlite3.OperationalError:
+                pass  # table was not captured
+        # Same for the rule load time, so the rule hit window keeps its length
+        try:
+            db.execute("UPDATE runtime_checksums_values SET epoch = epoch + ? WHERE epoch > 0",
+                       (offset_us // 1_000_000,))
+        except sqlite3.OperationalError:
+            # Captured before the table was: an empty one leaves the load time unknown
+            db.execute("CREATE TABLE runtime_checksums_values (name, version, epoch, checksum)")
+
+        return cls(db, info)
+
+    def is_connected(self) -> bool:
+        return True
+
+    def cursor(self, buffered: Optional[bool] = None) -> SnapshotCursor:
+        return SnapshotCursor(self)
+
+    def close(self):
+        self.db.close()
+
+
+class HistoryStore:
+    """Local time-series history of report metrics in one SQLite file
+
+    Every sample is a set of named points (e.g. 'cache.hit_rate',
+    'pool.efficiency_score{hostgroup=10,server=10.0.0.1:3306}') written in a
+    single executemany() transaction into the raw table. Series names are
+    interned to integer ids and raw rows are WITHOUT ROWID keyed by (ts, series),
+    so a sample is an append at the end of the index and rollups and retention
+    are range scans; the file runs in WAL mode with synchronous=NORMAL. A write
+    is one small commit - cheap enough for 1-second watch ticks. The rollup
+    tables are keyed by (series, ts) for --trend reads.
+
+    Completed minutes are rolled up from raw into the minute table (count, sum,
+    min, max) the first time a sample crosses a minute boundary, and completed
+    hours from minute into hour the same way; raw rows older than
+    HISTORY_RAW_RETENTION (each minute) and minute rows older than
+    HISTORY_MINUTE_RETENTION (each hour) are dropped at rollup time. When the file grows past max_mb the finest
+    data goes first: the older half of raw, then of minute, then of hour,
+    until it fits.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS series (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS raw (
+        ts INTEGER NOT NULL, series INTEGER NOT NULL, value REAL NOT NULL,
+        PRIMARY KEY (ts, series)) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS minute (
+        series INTEGER NOT NULL, ts INTEGER NOT NULL, count INTEGER NOT NULL,
+        sum REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL,
+        PRIMARY KEY (series, ts)) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS hour (
+        series INTEGER NOT NULL, ts INTEGER NOT NULL, count INTEGER NOT NULL,
+        sum REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL,
+        PRIMARY KEY (series, ts)) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str, max_mb: float = 128):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        new_file = not os.path.exists(path)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        if new_file:
+            # Must be set before the first table exists
+            self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(self.SCHEMA)
+        self._series: Dict[str, int] = dict(self.db.execute("SELECT name, id FROM series"))
+        self._rolled = dict(self.db.execute("SELECT key, value FROM meta"))
+        self._lock = threading.Lock()
+
+    def _series_id(self, name: str) -> int:
+        series_id = self._series.get(name)
+        if series_id is None:
+            series_id = self.db.execute("INSERT INTO series (name) VALUES (?)", (name,)).lastrowid
+            self._series[name] = series_id
+        return series_id
+
+    def record(self, points: Dict[str, float], ts: Optional[float] = None):
+        """Append one sample (ts defaults to now)"""
+        ts = int(ts if ts is not None else time.time())
+        with self._lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO raw (series, ts, value) VALUES (?, ?, ?)",
+                                [(self._series_id(name), ts, float(value)) for name, value in points.items()])
+            if ts // 60 * 60 > self._rolled.get('minute', 0):
+                self._rollup(ts)
+        if ts // 60 * 60 > self._rolled.get('checked', 0):
+            self._rolled['checked'] = ts // 60 * 60
+            self._enforce_cap()
+
+    def _rollup(self, ts: int):
+        """Fold completed minutes (and hours) into the coarser tables"""
+        minute = ts // 60 * 60
+        self.db.execute("""
+            INSERT OR REPLACE INTO minute (series, ts, count, sum, min, max)
+            SELECT series, ts / 60 * 60, COUNT(*), SUM(value), MIN(value), MAX(value)
+            FROM raw WHERE ts >= ? AND ts < ? GROUP BY series, ts / 60 * 60
+        """, (self._rolled.get('minute', 0), minute))
+        self._set_meta('minute', minute)
+
+        hour = ts // 3600 * 3600
+        if hour > self._rolled.get('hour', 0):
+            self.db.execute("""
+                INSERT OR REPLACE INTO hour (series, ts, count, sum, min, max)
+                SELECT series, ts / 3600 * 3600, SUM(count), SUM(sum), MIN(min), MAX(max)
+                FROM minute WHERE ts >= ? AND ts < ? GROUP BY series, ts / 3600 * 3600
+            """, (self._rolled.get('hour', 0), hour))
+            self._set_meta('hour', hour)
+
+            self.db.execute("DELETE FROM minute WHERE ts < ?", (ts - HISTORY_MINUTE_RETENTION,))
+
+        self.db.execute("DELETE FROM raw WHERE ts < ?", (ts - HISTORY_RAW_RETENTION,))
+
+    def _set_meta(self, key: str, value: int):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        self._rolled[key] = value
+
+    def size_bytes(self) -> int:
+        """Bytes used by live pages (free pages are returned by incremental_vacuum)"""
+        page_size, = self.db.execute("PRAGMA page_size").fetchone()
+        pages, = self.db.execute("PRAGMA page_count").fetchone()
+        free, = self.db.execute("PRAGMA freelist_count").fetchone()
+        return (pages - free) * page_size
+
+    def _enforce_cap(self):
+        """Trim the finest, oldest data until the file fits in max_bytes"""
+        with self._lock:
+            trimmed = False
+            for table in ('raw', 'minute', 'hour'):
+                while self.size_bytes() > self.max_bytes:
+                    oldest, newest = self.db.execute(f"SELECT MIN(ts), MAX(ts) FROM {table}").fetchone()
+                    if oldest is None or oldest == newest:
+                        break
+                    with self.db:
+                        self.db.execute(f"DELETE FROM {table} WHERE ts < ?", (oldest + (newest - oldest) // 2 + 1,))
+                    trimmed = True
+            if trimmed:
+                self.db.execute("PRAGMA incremental_vacuum")
+                self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def series_names(self) -> List[str]:
+        return sorted(self._series)
+
+    def resolution(self, window: int) -> str:
+        """Finest table that still covers window seconds"""
+        if window <= HISTORY_RAW_RETENTION:
+            return 'raw'
+        if window <= HISTORY_MINUTE_RETENTION:
+            return 'minute'
+        return 'hour'
+
+    def query(self, name: str, since: int, table: str) -> List[Tuple[int, float, float, float]]:
+        """(ts, avg, min, max) rows of one series from since, oldest first"""
+        series_id = self._series.get(name)
+        if series_id is None:
+            return []
+        if table == 'raw':
+            sql = "SELECT ts, value, value, value FROM raw WHERE series = ? AND ts >= ? ORDER BY ts"
+        else:
+            sql = f"SELECT ts, sum / count, min, max FROM {table} WHERE series = ? AND ts >= ? ORDER BY ts"
+        with self._lock:
+            return self.db.execute(sql, (series_id, since)).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+@dataclass
+class Alert:
+    """One anomaly found between two consecutive snapshots"""
+    severity: str        # 'critical' or 'warning'
+    kind: str            # 'new_digest', 'latency', 'rate' or 'memory'
+    subject: str         # digest hash, or the memory metric name
+    message: str
+    value: float = 0.0        # interval value that triggered the alert
+    baseline: float = 0.0     # EWMA mean it was compared with
+    deviation: float = 0.0    # standard deviations from the baseline (0 for new digests)
+    share: float = 0.0        # fraction of the interval's query time (digests)
+    score: float = 0.0        # ranking weight within a severity
+    digest_text: str = ""
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in
+                ('severity', 'kind', 'subject', 'message', 'value', 'baseline', 'deviation', 'share',
+                 'score', 'digest_text')}
+
+
+@dataclass
+class AnomalyReport:
+    """Ranked alerts of one run against the previous run's state (--anomalies)"""
+    alerts: List[Alert] = field(default_factory=list)
+    interval_s: float = 0.0        # ProxySQL time between the two snapshots
+    baseline_only: bool = False    # first run (or restart): nothing to compare with yet
+    digests_seen: int = 0
+    digests_tracked: int = 0
+    reset: bool = False            # counters went backwards: baselines kept, deltas skipped
+
+
+class AnomalyDetector:
+    """Regression and anomaly detection between successive digest snapshots
+
+    State is a small JSON file carried from run to run (cron), holding per
+    digest hash the last cumulative count_star / sum_time plus EWMA mean and
+    variance of the interval average latency and execution rate, and the
+    recent jemalloc resident samples. Each run turns the change in the
+    counters into one interval observation per digest and raises:
+
+    - new_digest: first_seen after the previous snapshot and at least
+      ANOMALY_NEW_HOT_SHARE of the interval's query time
+    - latency: interval sum_time/count_star more than sigma standard
+      deviations above the digest's EWMA baseline
+    - rate: executions/s more than sigma standard deviations away from the
+      baseline, either way
+    - memory: jemalloc resident growing steadily (least-squares fit over the
+      kept samples) by more than ANOMALY_MEMORY_GROWTH_PCT a day
+
+    Digests with fewer than ANOMALY_MIN_EXECUTIONS executions in the interval
+    are not judged, and baselines need ANOMALY_WARMUP observations first. Time
+    comes from ProxySQL's last_seen, so the client clock does not matter. Only
+    the ANOMALY_TRACK_DIGESTS busiest digests keep state.
+    """
+
+    STATE_VERSION = 1
+
+    def __init__(self, path: str, sigma: float = ANOMALY_SIGMA):
+        self.path = path
+        self.sigma = sigma
+        self.state: Dict = {}
+
+    def load(self) -> bool:
+        """Read the previous run's state; False if there is none usable"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"⚠  Ignoring unreadable anomaly state {self.path}: {e}")
+            return False
+        if state.get('version') != self.STATE_VERSION:
+            print(f"⚠  Ignoring anomaly state {self.path} from another analyzer version")
+            return False
+        self.state = state
+        return True
+
+    def save(self):
+        try:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠  Could not write anomaly state {self.path}: {e}")
+
+    @staticmethod
+    def _ewma(mean: float, var: float, value: float) -> Tuple[float, float]:
+        diff = value - mean
+        incr = ANOMALY_EWMA_ALPHA * diff
+        return mean + incr, (1 - ANOMALY_EWMA_ALPHA) * (var + diff * incr)
+
+    def _deviation(self, mean: float, var: float, value: float) -> float:
+        # Floor the spread at 5% of the mean so a perfectly flat history
+        # does not turn every wobble into an infinite deviation
+        spread = max(math.sqrt(max(var, 0.0)), abs(mean) * 0.05, 1e-9)
+        return (value - mean) / spread
+
+    def observe(self, digests: List[Tuple[str, int, int, int, int]], jemalloc_resident: int) -> AnomalyReport:
+        """Compare (digest, count_star, sum_time, first_seen, last_seen) totals with the state"""
+        previous = self.state.get('digests', {}) if self.state else {}
+        taken_at = max((row[4] for row in digests), default=0) or int(time.time())
+        report = AnomalyReport(digests_seen=len(digests))
+
+        prev_taken = self.state.get('taken_at', 0) if self.state else 0
+        interval = taken_at - prev_taken
+        report.baseline_only = not self.state
+        report.interval_s = max(interval, 0) if self.state else 0
+        report.reset = bool(self.state) and interval > 0 and any(
+            row[1] < previous[row[0]][0] for row in digests if row[0] in previous)
+
+        judged = bool(self.state) and interval > 0 and not report.reset
+        deltas = {}
+        for digest, count, sum_time, first_seen, _ in digests:
+            if judged and digest in previous:
+                deltas[digest] = (counter_delta(count, previous[digest][0]),
+                                  counter_delta(sum_time, previous[digest][1]))
+            elif judged and first_seen > prev_taken:
+                deltas[digest] = (count, sum_time)
+        total_time = sum(d[1] for d in deltas.values()) or 1
+
+        alerts: List[Alert] = []
+        tracked: Dict[str, list] = {}
+        for digest, count, sum_time, first_seen, _ in digests:
+            entry = list(previous.get(digest, [0, 0, 0, 0.0, 0.0, 0.0, 0.0]))
+            entry[0], entry[1] = count, sum_time
+            if digest in deltas:
+                executions, spent = deltas[digest]
+                share = spent / total_time
+                if digest not in previous:
+                    if share >= ANOMALY_NEW_HOT_SHARE and executions >= ANOMALY_MIN_EXECUTIONS:
+                        alerts.append(Alert(
+                            severity='critical' if share >= 10 * ANOMALY_NEW_HOT_SHARE else 'warning',
+                            kind='new_digest', subject=digest, value=executions / interval, share=share,
+                            score=share * 100 * 10,
+                            message=f"New digest since the previous run: {executions / interval:,.1f}/s, "
+                                    f"{share * 100:.1f}% of query time, avg {spent / executions:,.0f}μs"))
+                elif executions >= ANOMALY_MIN_EXECUTIONS:
+                    avg_us, qps = spent / executions, executions / interval
+                    if entry[2] >= ANOMALY_WARMUP:
+                        for kind, value, mean, var in (('latency', avg_us, entry[3], entry[4]),
+                                                       ('rate', qps, entry[5], entry[6])):
+                            deviation = self._deviation(mean, var, value)
+                            if deviation >= self.sigma or (kind == 'rate' and deviation <= -self.sigma):
+                                unit = 'μs avg' if kind == 'latency' else '/s'
+                                alerts.append(Alert(
+                                    severity='critical' if abs(deviation) >= 2 * self.sigma else 'warning',
+                                    kind=kind, subject=digest, value=value, baseline=mean,
+                                    deviation=deviation, share=share,
+                                    score=max(share, 0.001) * 100 * min(abs(deviation) / self.sigma, 10),
+                                    message=f"{'Latency' if kind == 'latency' else 'Rate'} {value:,.1f}{unit} vs "
+                                            f"baseline {mean:,.1f}{unit} ({deviation:+.1f}σ), "
+                                            f"{share * 100:.1f}% of query time"))
+                    if entry[2]:
+                        entry[3], entry[4] = self._ewma(entry[3], entry[4], avg_us)
+                        entry[5], entry[6] = self._ewma(entry[5], entry[6], qps)
+                    else:
+                        entry[3], entry[5] = avg_us, qps
+                    entry[2] += 1
+            tracked[digest] = entry
+
+        # Keep state for the busiest digests only: by interval time, then lifetime time
+        keep = heapq.nlargest(ANOMALY_TRACK_DIGESTS, tracked,
+                              key=lambda d: (deltas.get(d, (0, 0))[1], tracked[d][1]))
+        report.digests_tracked = len(keep)
+
+        memory = [sample for sample in (self.state.get('memory', []) if self.state else [])
+                  if sample[0] < taken_at][-(ANOMALY_MEMORY_SAMPLES - 1):]
+        if jemalloc_resident:
+            memory.append([taken_at, jemalloc_resident])
+            alert = self._memory_trend(memory)
+            if alert is not None and judged:
+                alerts.append(alert)
+
+        alerts.sort(key=lambda a: (a.severity != 'critical', -a.score))
+        report.alerts = alerts
+        self.state = {'version': self.STATE_VERSION, 'taken_at': taken_at,
+                      'digests': {d: tracked[d] for d in keep}, 'memory': memory}
+        return report
+
+    @staticmethod
+    def _memory_trend(samples: List[List[int]]) -> Optional[Alert]:
+        """Steady jemalloc resident growth from a least-squares fit, if any"""
+        if len(samples) < 3:
+            return None
+        xs = [s[0] for s in samples]
+        ys = [s[1] for s in samples]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        sxx = sum((x - mean_x) ** 2 for x in xs)
+        syy = sum((y - mean_y) ** 2 for y in ys)
+        if not sxx or not syy or not mean_y:
+            return None
+        sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+        slope = sxy / sxx                        # bytes per second
+        fit = sxy * sxy / (sxx * syy)            # R²: how steady the trend is
+        growth_pct = slope * 86400 / mean_y * 100
+        if growth_pct < ANOMALY_MEMORY_GROWTH_PCT or fit < 0.8:
+            return None
+        return Alert(
+            severity='critical' if growth_pct >= 3 * ANOMALY_MEMORY_GROWTH_PCT else 'warning',
+            kind='memory', subject='jemalloc_resident', value=ys[-1], baseline=ys[0],
+            score=growth_pct / ANOMALY_MEMORY_GROWTH_PCT,
+            message=f"jemalloc resident growing {growth_pct:,.1f}%/day "
+                    f"({ys[0] / 1048576:,.1f} → {ys[-1] / 1048576:,.1f} MB over {len(samples)} runs, R² {fit:.2f})")
+
+
+@dataclass
+class MetricChange:
+    """One metric of a --compare run next to its --baseline value"""
+    name: str                 # metric series name, or digest hash
+    label: str                # what the comparison table prints
+    before: float
+    after: float
+    change: float = 0.0       # in the threshold's unit: percentage points or %
+    unit: str = '%'           # 'pts' or '%' (how change is expressed)
+    threshold: str = ''       # BASELINE_THRESHOLDS key that judges it ('' = informational)
+    regression: bool = False
+    share: float = 0.0        # digests: fraction of the current run's query time
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in
+                ('name', 'label', 'before', 'after', 'change', 'unit', 'threshold', 'regression', 'share')}
+
+
+@dataclass
+class BaselineDiff:
+    """A --compare run against a stored --baseline result"""
+    path: str
+    info: Dict = field(default_factory=dict)            # the baseline's source, version and taken_at
+    thresholds: Dict[str, float] = field(default_factory=dict)
+    metrics: List[MetricChange] = field(default_factory=list)
+    digests: List[MetricChange] = field(default_factory=list)   # regressions first, then by change
+    digests_compared: int = 0
+    new_digests: int = 0       # busy in this run, absent from the baseline
+    gone_digests: int = 0      # in the baseline, absent (or idle) in this run
+
+    @property
+    def regressions(self) -> List[MetricChange]:
+        return [c for c in self.metrics + self.digests if c.regression]
+
+
+class PerformanceBaseline:
+    """Structured result of one analysis run, stored by --baseline and diffed by --compare
+
+    The JSON file holds the report's derived metrics by series name (the same
+    points --history records: cache hit rate, multiplexing ratio, per-backend
+    efficiency scores, memory), plus count_star / sum_time / digest_text of
+    the BASELINE_TOP_DIGESTS digest hashes with the most query time. Digest
+    counters are lifetime totals, so the runs being compared should each start
+    from fresh stats (new ProxySQL, or stats_mysql_query_digest_reset).
+    """
+
+    FILE_VERSION = 1
+
+    def __init__(self, data: Dict, path: str = ''):
+        self.data = data
+        self.path = path
+
+    @classmethod
+    def from_run(cls, points: Dict[str, float], version: str, source: str, digests: List[Tuple],
+                 digest_time_total: int, texts: Dict[str, str]) -> 'PerformanceBaseline':
+        """Build from history_points() and the kept (digest, count_star, sum_time, ...) rows"""
+        return cls({
+            'version': cls.FILE_VERSION,
+            'taken_at': int(time.time()),
+            'proxysql_version': version,
+            'source': source,
+            'metrics': points,
+            'digest_time_total': digest_time_total,
+            'digests': {row[0]: [row[1], row[2], texts.get(row[0], '')] for row in digests},
+        })
+
+    @classmethod
+    def load(cls, path: str) -> 'PerformanceBaseline':
+        """Read a --baseline file (raises OSError / ValueError)"""
+        with open(path) as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get('version') != cls.FILE_VERSION:
+            raise ValueError("not a baseline file of this analyzer version")
+        return cls(data, path)
+
+    def save(self, path: str) -> bool:
+        try:
+            tmp = f"{path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.data, f, indent=1)
+            os.replace(tmp, path)
+            return True
+        except OSError as e:
+            print(f"✗  Could not write baseline {path}: {e}")
+            return False
+
+    @staticmethod
+    def _pct(before: float, after: float) -> float:
+        return (after - before) / before * 100 if before else 0.0
+
+    def compare(self, current: 'PerformanceBaseline', thresholds: Dict[str, float]) -> BaselineDiff:
+        """Diff current (this run) against self (the stored baseline)"""
+        diff = BaselineDiff(path=self.path, thresholds=thresholds,
+                            info={k: self.data.get(k) for k in ('source', 'proxysql_version', 'taken_at')})
+        before, after = self.data.get('metrics', {}), current.data['metrics']
+
+        def judge(name: str, label: str, change: float, unit: str, threshold: str, worse: int):
+            # worse: -1 when a drop is a regression, +1 when growth is
+            diff.metrics.append(MetricChange(
+                name=name, label=label, before=before[name], after=after[name], change=change,
+                unit=unit, threshold=threshold,
+                regression=change * worse > 0 and change * worse >= thresholds[threshold]))
+
+        name = 'cache.hit_rate_pct'
+        if name in before and name in after:
+            judge(name, 'Query cache hit rate', after[name] - before[name], 'pts', 'cache_hit_rate_pts', -1)
+        name = 'global.multiplexing_ratio'
+        if before.get(name) and name in after:
+            judge(name, 'Multiplexing ratio', self._pct(before[name], after[name]), '%', 'multiplexing_pct', -1)
+        name = 'memory.jemalloc_resident_bytes'
+        if before.get(name) and after.get(name):
+            judge(name, 'jemalloc resident', self._pct(before[name], after[name]), '%', 'memory_pct', +1)
+        for name in sorted(n for n in after if n.startswith('pool.efficiency_score{') and n in before):
+            labels = dict(pair.split('=', 1) for pair in name[name.index('{') + 1:-1].split(','))
+            judge(name, f"Pool efficiency hg {labels.get('hostgroup')} {labels.get('server')}",
+                  after[name] - before[name], 'pts', 'pool_efficiency_pts', -1)
+
+        old, new = self.data.get('digests', {}), current.data['digests']
+        total = current.data.get('digest_time_total') or 1
+        limit = thresholds['digest_time_pct']
+        for digest, (count, sum_time, text) in new.items():
+            if digest not in old:
+                diff.new_digests += count >= BASELINE_MIN_EXECUTIONS
+                continue
+            old_count, old_time = old[digest][0], old[digest][1]
+            if count < BASELINE_MIN_EXECUTIONS or old_count < BASELINE_MIN_EXECUTIONS:
+                continue
+            diff.digests_compared += 1
+            avg_before, avg_after = old_time / old_count, sum_time / count
+            change, share = self._pct(avg_before, avg_after), sum_time / total
+            diff.digests.append(MetricChange(
+                name=digest, label=text or old[digest][2], before=avg_before, after=avg_after,
+                change=change, threshold='digest_time_pct', share=share,
+                regression=share >= BASELINE_MIN_SHARE and change > 0 and change >= limit))
+        diff.gone_digests = sum(1 for digest, entry in old.items()
+                                if entry[0] >= BASELINE_MIN_EXECUTIONS and digest not in new)
+        diff.digests.sort(key=lambda c: (not c.regression, -abs(c.change) * max(c.share, 0.001)))
+        return diff
+
+
+@dataclass
+class ProfileEntry:
+    """Time and traffic of one collector or analysis stage (--profile)"""
+    name: str
+    kind: str                 # 'collector' or 'stage'
+    calls: int = 0
+    statements: int = 0
+    wall_ns: int = 0          # whole collector / stage, queries included
+    wait_ns: int = 0          # cursor.execute(): send until the result header arrives
+    fetch_ns: int = 0         # reading and parsing the rows into tuples (connector)
+    overhead_ns: int = 0      # the profiler's own row and byte accounting
+    rows: int = 0
+    bytes: int = 0            # result values as text, excluding protocol framing
+
+    @property
+    def decode_ns(self) -> int:
+        """Python time outside the connector: turning rows into report objects"""
+        return max(0, self.wall_ns - self.wait_ns - self.fetch_ns - self.overhead_ns)
+
+    def as_dict(self) -> Dict:
+        return {'name': self.name, 'kind': self.kind, 'calls': self.calls,
+                'statements': self.statements, 'rows': self.rows, 'bytes': self.bytes,
+                'wall_ms': self.wall_ns / 1e6, 'server_wait_ms': self.wait_ns / 1e6,
+                'fetch_ms': self.fetch_ns / 1e6, 'decode_ms': self.decode_ns / 1e6}
+
+
+class CollectorProfiler:
+    """Per-collector and per-stage timings of one analysis run (--profile)
+
+    collector()/stage() time a block and make it the current entry of the
+    calling thread; every admin statement run inside it adds its server wait,
+    fetch time, rows and bytes to that entry via record_query(). Statements
+    outside any block land in '(other)'. Collectors on parallel worker
+    threads are timed independently, so their wall times overlap.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path           # JSON copy of the profile, if wanted
+        self.entries: Dict[str, ProfileEntry] = {}
+        self.started_ns = time.perf_counter_ns()
+        self.wall_ns = 0           # whole run, header to profile
+        self.collect_ns = 0        # collect_metrics() wall time (collectors overlap within it)
+        self.workers = 1
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _entry(self, name: str, kind: str) -> ProfileEntry:
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                entry = self.entries[name] = ProfileEntry(name=name, kind=kind)
+            return entry
+
+    @contextlib.contextmanager
+    def _timed(self, name: str, kind: str):
+        entry = self._entry(name, kind)
+        outer = getattr(self._local, 'entry', None)
+        self._local.entry = entry
+        started = time.perf_counter_ns()
+        try:
+            yield entry
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            self._local.entry = outer
+            with self._lock:
+                entry.calls += 1
+                entry.wall_ns += elapsed
+
+    def collector(self, name: str):
+        return self._timed(name, 'collector')
+
+    def stage(self, name: str):
+        return self._timed(name, 'stage')
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """func timed as collector name (for the collect_metrics collector table)"""
+        def profiled(*args, **kwargs):
+            with self.collector(name):
+                return func(*args, **kwargs)
+        return profiled
+
+    def record_query(self, wait_ns: int, fetch_ns: int, rows: List[Tuple], statements: int = 1):
+        """Add one statement's (or one streamed batch's, statements=0) cost to the current entry"""
+        started = time.perf_counter_ns()
+        size = sum(len(value) if isinstance(value, (str, bytes, bytearray)) else len(str(value))
+                   for row in rows for value in row if value is not None)
+        entry = getattr(self._local, 'entry', None) or self._entry('(other)', 'stage')
+        with self._lock:
+            entry.statements += statements
+            entry.wait_ns += wait_ns
+            entry.fetch_ns += fetch_ns
+            entry.rows += len(rows)
+            entry.bytes += size
+            entry.overhead_ns += time.perf_counter_ns() - started
+
+    def finish(self):
+        self.wall_ns = time.perf_counter_ns() - self.started_ns
+
+    def as_dict(self) -> Dict:
+        entries = list(self.entries.values())
+        return {
+            'analyzer_version': ProxySQLAnalyzer.VERSION,
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'wall_ms': self.wall_ns / 1e6,
+            'collect_wall_ms': self.collect_ns / 1e6,
+            'workers': self.workers,
+            'totals': {
+                'statements': sum(e.statements for e in entries),
+                'rows': sum(e.rows for e in entries),
+                'bytes': sum(e.bytes for e in entries),
+                'server_wait_ms': sum(e.wait_ns for e in entries) / 1e6,
+                'fetch_ms': sum(e.fetch_ns for e in entries) / 1e6,
+            },
+            'entries': [e.as_dict() for e in entries],
+        }
+
+
+class ProxySQLAnalyzer:
+    """ProxySQL metrics analyzer - MySQLTuner equivalent for ProxySQL"""
+
+    VERSION = "1.2.0"
+    RECONNECT_BACKOFF = 5.0   # seconds before a connection that failed to reconnect is tried again
+
+    # Statements of the single-query collectors. A sequential pass sends all
+    # the ones it needs as one multi-statement batch (see collect_metrics)
+    VERSION_QUERY = "SELECT @@version"
+    GLOBAL_STATUS_QUERY = "SELECT Variable_name, Variable_Value FROM stats_mysql_global"
+    GLOBAL_VARIABLES_QUERY = "SELECT variable_name, variable_value FROM global_variables"
+    POOL_QUERY = """
+    SELECT hostgroup, srv_host, srv_port, status, Queries,
+           ConnUsed, ConnFree, Bytes_data_sent, Bytes_data_recv,
+           ConnOK, ConnERR, MaxConnUsed, Latency_us
+    FROM stats_mysql_connection_pool
+    """
+    FREE_CONNECTIONS_QUERY = f"""
+    SELECT 'total' AS kind, NULL AS grp, COUNT(*) AS cnt,
+           SUM(CASE WHEN idle_ms > {STALE_IDLE_MS} THEN 1 ELSE 0 END) AS stale,
+           AVG(idle_ms) AS avg_idle, MAX(idle_ms) AS max_idle
+    FROM stats_mysql_free_connections
+    UNION ALL
+    SELECT 'hostgroup', hostgroup, COUNT(*), NULL, NULL, NULL
+    FROM stats_mysql_free_connections
+    GROUP BY hostgroup
+    UNION ALL
+    SELECT 'user', user, COUNT(*), NULL, NULL, NULL
+    FROM stats_mysql_free_connections
+    GROUP BY user
+    """
+    MEMORY_QUERY = """
+    SELECT Variable_Name, Variable_Value
+    FROM stats_memory_metrics
+    """
+    COMMANDS_QUERY = """
+    SELECT Command, Total_cnt, Total_Time_us
+    FROM stats_mysql_commands_counters
+    WHERE Total_cnt > 0
+    ORDER BY Total_cnt DESC
+    LIMIT 10
+    """
+    CACHE_RULES_QUERY = """
+    SELECT rule_id, COALESCE(match_pattern, match_digest, digest), cache_ttl
+    FROM mysql_query_rules
+    WHERE cache_ttl > 0
+    ORDER BY rule_id
+    """
+    QUERY_RULES_QUERY = """
+    SELECT rule_id, active, username, schemaname, flagIN, digest, match_digest,
+           match_pattern, negate_match_pattern, re_modifiers, flagOUT,
+           destination_hostgroup, cache_ttl, apply, comment
+    FROM mysql_query_rules
+    ORDER BY rule_id
+    """
+    RULE_HITS_QUERY = "SELECT rule_id, hits FROM stats_mysql_query_rules"
+    # epoch is set by LOAD MYSQL QUERY RULES TO RUNTIME; 'now' on ProxySQL's own clock
+    RULES_LOADED_QUERY = ("SELECT epoch, strftime('%s', 'now') FROM runtime_checksums_values "
+                          "WHERE name = 'mysql_query_rules'")
+    SERVERS_QUERY = """
+    SELECT hostgroup_id, hostname, port, status, max_replication_lag
+    FROM mysql_servers
+    ORDER BY hostgroup_id, hostname, port
+    """
+    REPLICATION_HOSTGROUPS_QUERY = "SELECT writer_hostgroup, reader_hostgroup FROM mysql_replication_hostgroups"
+    DIGEST_TOTALS_QUERY = """
+    SELECT digest, SUM(count_star), SUM(sum_time), MIN(first_seen), MAX(last_seen)
+    FROM stats_mysql_query_digest
+    GROUP BY digest
+    """
+    WORKLOAD_QUERY = """
+    SELECT digest_text, MIN(digest), SUM(count_star),
+           SUM(CASE WHEN hostgroup >= 0 THEN count_star ELSE 0 END),
+           SUM(CASE WHEN hostgroup >= 0 THEN sum_time ELSE 0 END),
+           SUM(sum_rows_sent), MIN(first_seen), MAX(last_seen), MAX(schemaname)
+    FROM stats_mysql_query_digest
+    GROUP BY digest_text
+    """
+    PASS_QUERIES = {
+        'version': VERSION_QUERY,
+        'global_status': GLOBAL_STATUS_QUERY,
+        'pool_stats': POOL_QUERY,
+        'free_conns': FREE_CONNECTIONS_QUERY,
+        'memory_metrics': MEMORY_QUERY,
+        'commands': COMMANDS_QUERY,
+        'global_variables': GLOBAL_VARIABLES_QUERY,
+        'existing_rules': CACHE_RULES_QUERY,
+        'query_rules': QUERY_RULES_QUERY,
+        'rule_hits': RULE_HITS_QUERY,
+        'rules_age': RULES_LOADED_QUERY,
+        'servers': SERVERS_QUERY,
+        'repl_hostgroups': REPLICATION_HOSTGROUPS_QUERY,
+        'digest_totals': DIGEST_TOTALS_QUERY,
+    }
+
+    def __init__(self, host: str, port: int, user: str, password: str, workers: int = 4,
+                 snapshot: Optional[str] = None, history: Optional[HistoryStore] = None,
+                 timeout: int = 10, read_timeout: Optional[int] = None,
+                 profiler: Optional[CollectorProfiler] = None, anomalies: Optional[AnomalyDetector] = None,
+                 baseline: Optional[str] = None, compare: Optional[PerformanceBaseline] = None,
+                 thresholds: Optional[Dict[str, float]] = None, report_format: str = 'text',
+                 rule_match: str = 'pattern'):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.workers = max(1, workers)
+        self.timeout = timeout   # connection_timeout of every admin connection (seconds)
+        # Per-read limit (fleet nodes); connectors without read_timeout already
+        # apply connection_timeout to reads
+        self.read_timeout = read_timeout
+        self.aborted = False
+        # Offline mode: read a --capture file instead of a live admin interface
+        self.snapshot = snapshot
+        self.snapshot_info: Dict = {}
+        self.conn: Optional[mysql.connector.connection.MySQLConnection] = None
+        # Collector threads each hold their own admin connection; anything
+        # without one shares self.conn under a lock
+        self._local = threading.local()
+        self._conn_lock = threading.RLock()
+        self._worker_conns: List[mysql.connector.connection.MySQLConnection] = []
+        # One reused cursor per connection; dropped with the connection
+        self._cursors: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+        # Admin traffic: statements sent, round trips they took, transparent reconnects
+        self._counter_lock = threading.Lock()
+        self.statements = 0
+        self.round_trips = 0
+        self.reconnects = 0
+        # Switched off if the admin interface ignores multi-statements, and while
+        # profiling so that every statement is timed on its own round trip
+        self.batching = profiler is None
+        self.profiler = profiler   # --profile: per-collector timings
+        self.anomalies = anomalies   # --anomalies: state carried between runs
+        self.baseline = baseline     # --baseline: file this run's structured result is written to
+        self.compare = compare       # --compare: stored result this run is diffed against
+        self.thresholds = {**BASELINE_THRESHOLDS, **(thresholds or {})}
+        self.rule_match = rule_match     # --rule-match: what proposed cache rules match on
+        self.report_format = report_format   # --format: text, json or ndjson
+        # Connection -> time.monotonic() its reconnect failed; not retried per statement
+        self._lost = weakref.WeakKeyDictionary()
+        # Health checks: rolling monitor log aggregates, read incrementally by every pass
+        self.ping_window = MonitorLogWindow('monitor.mysql_server_ping_log', 'ping',
+                                            'ping_success_time_us', 'ping_error')
+        self.connect_window = MonitorLogWindow('monitor.mysql_server_connect_log', 'connect',
+                                               'connect_success_time_us', 'connect_error', report_errors=True)
+        # Watch mode state: last known digest counters and the last_seen high-water mark
+        self._digest_baseline: Dict[Tuple[str, ...], Tuple[int, int]] = {}
+        self._digest_last_seen = 0
+        # Optional local time-series store written by every run / watch tick / exporter pass
+        self.history = history
+        # --cluster-digests: digest_text shapes memoized per digest hash
+        self.tokenizer = DigestTokenizer()
+
+    def _open_connection(self) -> mysql.connector.connection.MySQLConnection:
+        """Open a new admin interface connection (raises Error on failure)"""
+        options = {}
+        if self.read_timeout and 'read_timeout' in CONNECTOR_DEFAULTS:
+            options = {'read_timeout': self.read_timeout, 'write_timeout': self.read_timeout}
+        return mysql.connector.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            connection_timeout=self.timeout,
+            **options
+        )
+
+    def connect(self) -> bool:
+        """Connect to ProxySQL admin interface"""
+        if self.snapshot:
+            try:
+                self.conn = SnapshotConnection.load(self.snapshot)
+            except (OSError, ValueError) as e:
+                print(f"✗  Snapshot load failed: {e}")
+                return False
+            self.snapshot_info = self.conn.info
+            self.host = self.snapshot_info.get('host', self.host)
+            self.port = self.snapshot_info.get('port', self.port)
+            # Everything is local and in memory; collector threads would only add overhead
+            self.workers = 1
+            return True
+
+        try:
+            self.conn = self._open_connection()
+            return True
+        except Error as e:
+            print(f"✗  Connection failed: {e}")
+            return False
+
+    def close(self):
+        """Close database connection"""
+        if self.conn:
+            try:
+                self.conn.close()
+            except Error:
+                pass
+
+    def abort(self):
+        """Drop every admin connection without a QUIT, from any thread
+
+        Blocked reads on them fail at once, so a collection stuck on a hung
+        admin interface ends (with empty results) instead of waiting forever,
+        and no further collector connections are opened. The locks are not
+        taken: the stuck query may be holding them.
+        """
+        self.aborted = True
+        for conn in [self.conn] + list(self._worker_conns):
+            if conn is not None and hasattr(conn, 'shutdown'):
+                conn.shutdown()
+
+    def execute_query(self, query: str) -> List[Tuple]:
+        """Execute SQL query and return results"""
+        prefetched = getattr(self._local, 'prefetched', None)
+        if prefetched and query in prefetched:
+            return prefetched.pop(query)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._conn_lock:
+                return self._run_query(self.conn, query)
+        return self._run_query(conn, query)
+
+    def _count(self, statements: int = 1, round_trips: int = 1, reconnects: int = 0):
+        with self._counter_lock:
+            self.statements += statements
+            self.round_trips += round_trips
+            self.reconnects += reconnects
+
+    def admin_counters(self) -> Tuple[int, int, int]:
+        """(statements, round trips, reconnects) sent to the admin interface so far"""
+        with self._counter_lock:
+            return self.statements, self.round_trips, self.reconnects
+
+    def _cursor(self, conn):
+        """The connection's reused cursor (created client side, no round trip)"""
+        cursor = self._cursors.get(conn)
+        if cursor is None:
+            cursor = self._cursors[conn] = conn.cursor()
+        return cursor
+
+    def _reconnect(self, conn) -> bool:
+        """After a failed statement: True if the connection had dropped and is back
+
+        The liveness check (a ping) only happens here, after a failure, never
+        before a statement. A plain SQL error leaves the connection up and is
+        not retried; neither is anything on an aborted fleet node.
+        """
+        if self.aborted or not hasattr(conn, 'reconnect') or conn.is_connected():
+            return False
+        try:
+            conn.reconnect(attempts=1, delay=0)
+        except Error as e:
+            print(f"⚠  Reconnect failed: {e}")
+            self._lost[conn] = time.monotonic()
+            return False
+        self._lost.pop(conn, None)
+        self._cursors.pop(conn, None)
+        self._count(statements=0, round_trips=0, reconnects=1)
+        return True
+
+    def _is_lost(self, conn) -> bool:
+        """True within RECONNECT_BACKOFF seconds of a failed reconnect on conn"""
+        failed = self._lost.get(conn)
+        return failed is not None and time.monotonic() - failed < self.RECONNECT_BACKOFF
+
+    def pass_query(self, name: str) -> Optional[str]:
+        """The statement of a single-query collector, as it would be sent now"""
+        window = {'ping_checks': self.ping_window, 'connect_checks': self.connect_window}.get(name)
+        return window.query() if window is not None else self.PASS_QUERIES.get(name)
+
+    def profile_stage(self, name: str):
+        """Time a block as an analysis stage under --profile (no-op otherwise)"""
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(name)
+
+    @property
+    def connection_lost(self) -> bool:
+        """True when there is no main connection or it recently failed to reconnect"""
+        return self.conn is None or self._is_lost(self.conn)
+
+    def _fetch_all(self, conn, query: str) -> List[Tuple]:
+        cursor = self._cursor(conn)
+        self._count()
+        if self.profiler is None:
+            cursor.execute(query)
+            return cursor.fetchall() if cursor.with_rows else []
+        started = time.perf_counter_ns()
+        cursor.execute(query)
+        executed = time.perf_counter_ns()
+        rows = cursor.fetchall() if cursor.with_rows else []
+        self.profiler.record_query(executed - started, time.perf_counter_ns() - executed, rows)
+        return rows
+
+    def _run_query(self, conn, query: str) -> List[Tuple]:
+        """Run a query on the given connection, printing and swallowing errors
+
+        A statement that fails because the connection dropped is retried once
+        on a transparent reconnect.
+        """
+        if conn is None or self._is_lost(conn):
+            return []
+
+        try:
+            return self._fetch_all(conn, query)
+        except Error as e:
+            if not self._reconnect(conn):
+                print(f"Query error: {e}")
+                return []
+        try:
+            return self._fetch_all(conn, query)
+        except Error as e:
+            print(f"Query error: {e}")
+            return []
+
+    def execute_admin(self, statement: str, retry: bool = False) -> bool:
+        """Run one admin command (INSERT, DELETE, LOAD / SAVE ...) on the main connection
+
+        Unlike execute_query a failure is reported to the caller. Only
+        idempotent commands (retry=True) are re-sent after a transparent
+        reconnect: a write whose connection dropped may already have applied.
+        """
+        with self._conn_lock:
+            if self.conn is None:
+                return False
+            try:
+                self._fetch_all(self.conn, statement)
+                return True
+            except Error as e:
+                if not retry or not self._reconnect(self.conn):
+                    print(f"✗  {statement.split()[0]} failed: {e}")
+                    return False
+            try:
+                self._fetch_all(self.conn, statement)
+                return True
+            except Error as e:
+                print(f"✗  {statement.split()[0]} failed: {e}")
+                return False
+
+    def execute_batch(self, queries: List[str]) -> List[List[Tuple]]:
+        """Run several statements in one multi-statement round trip, one row list each
+
+        Statements whose result set did not come back (an error stops the
+        batch) are run again one by one, with the usual error printing. An
+        admin interface that silently answers only the first statement turns
+        batching off for the rest of the session.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._conn_lock:
+                return self._run_batch(self.conn, queries)
+        return self._run_batch(conn, queries)
+
+    def _fetch_sets(self, conn, queries: List[str]) -> Iterator[List[Tuple]]:
+        """Yield the row list of each statement of one multi-statement COM_QUERY"""
+        cursor = self._cursor(conn)
+        self._count(statements=len(queries))
+        if hasattr(cursor, 'fetchsets'):
+            # Connector/Python 9.2+: multi-statements need no flag
+            cursor.execute(';\n'.join(queries))
+            for _, rows in cursor.fetchsets():
+                yield rows
+        else:
+            for result in cursor.execute(';\n'.join(queries), multi=True):
+                yield result.fetchall() if result.with_rows else []
+
+    def _run_batch(self, conn, queries: List[str]) -> List[List[Tuple]]:
+        results: List[Optional[List[Tuple]]] = [None] * len(queries)
+        if conn is None or self._is_lost(conn):
+            return [[] for _ in queries]
+
+        if self.batching and len(queries) > 1 and not isinstance(conn, SnapshotConnection):
+            answered = 0
+            try:
+                for index, rows in zip(range(len(queries)), self._fetch_sets(conn, queries)):
+                    results[index] = rows
+                    answered += 1
+            except Error:
+                self._reconnect(conn)
+            else:
+                if answered < len(queries):
+                    self.batching = False
+        return [rows if rows is not None else self._run_query(conn, query)
+                for rows, query in zip(results, queries)]
+
+    @contextlib.contextmanager
+    def prefetch(self, queries: List[str]):
+        """Answer these statements from one execute_batch() round trip inside the block
+
+        Only execute_query() calls from the calling thread are answered, each
+        statement once; anything else goes to the server as usual.
+        """
+        if not self.batching:
+            # Nothing to save: the statements would go out one by one anyway
+            yield
+            return
+        queries = list(dict.fromkeys(queries))
+        self._local.prefetched = dict(zip(queries, self.execute_batch(queries)))
+        try:
+            yield
+        finally:
+            self._local.prefetched = None
+
+    def iterate_query(self, query: str, batch_size: int = 5000,
+                      columns: Optional[List[str]] = None) -> Iterator[Tuple]:
+        """Stream query rows in fetchmany() batches instead of materializing them all
+
+        Uses an unbuffered cursor, so at most batch_size rows are held client
+        side at once. Errors are printed and end the stream, like execute_query().
+        If a columns list is given it is filled with the result's column names.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._conn_lock:
+                yield from self._iterate_rows(self.conn, query, batch_size, columns)
+        else:
+            yield from self._iterate_rows(conn, query, batch_size, columns)
+
+    def _iterate_rows(self, conn, query: str, batch_size: int,
+                      columns: Optional[List[str]] = None) -> Iterator[Tuple]:
+        """Yield rows of a query on the given connection batch by batch
+
+        A dropped connection is reconnected and the query retried once, as
+        long as no row has been yielded yet.
+        """
+        if conn is None or self._is_lost(conn):
+            return
+
+        for attempt in range(2):
+            cursor = None
+            streamed = False
+            try:
+                cursor = self._cursor(conn)
+                self._count()
+                started = time.perf_counter_ns()
+                cursor.execute(query)
+                if self.profiler is not None:
+                    self.profiler.record_query(time.perf_counter_ns() - started, 0, [])
+                if columns is not None:
+                    columns.extend(cursor.column_names)
+                while True:
+                    started = time.perf_counter_ns()
+                    rows = cursor.fetchmany(batch_size)
+                    if self.profiler is not None:
+                        self.profiler.record_query(0, time.perf_counter_ns() - started, rows, statements=0)
+                    if not rows:
+                        break
+                    streamed = True
+                    yield from rows
+                return
+            except Error as e:
+                if streamed or attempt or not self._reconnect(conn):
+                    print(f"Query error: {e}")
+                    return
+            finally:
+                if cursor is not None:
+                    try:
+                        # Drain anything left so the connection stays usable
+                        if cursor.with_rows:
+                            cursor.fetchall()
+                    except Error:
+                        pass
+
+    def get_proxysql_version(self) -> str:
+        """Get ProxySQL version"""
+        result = self.execute_query(self.VERSION_QUERY)
+        return result[0][0] if result else "Unknown"
+
+    def get_query_digest(self, limit: int = 100) -> List[QueryDigest]:
+        """Fetch query digest statistics"""
+        query = f"""
+        SELECT hostgroup, schemaname, username, digest, digest_text,
+               count_star, sum_time, min_time, max_time
+        FROM stats_mysql_query_digest
+        WHERE count_star >= 10
+        ORDER BY sum_time DESC
+        LIMIT {limit}
+        """
+
+        results = self.execute_query(query)
+        return [
+            QueryDigest(
+                hostgroup=int(row[0]) if str(row[0]).lstrip('-').isdigit() else 0,
+                schemaname=str(row[1]),
+                username=str(row[2]),
+                digest=str(row[3]),
+                digest_text=str(row[4]),
+                count_star=int(row[5]) if str(row[5]).isdigit() else 0,
+                sum_time=int(row[6]) if str(row[6]).isdigit() else 0,
+                min_time=int(row[7]) if str(row[7]).isdigit() else 0,
+                max_time=int(row[8]) if str(row[8]).isdigit() else 0
+            )
+            for row in results
+        ]
+
+    def get_digest_rows(self, batch_size: int = 5000) -> List[Tuple]:
+        """Every digest row with the columns fleet merging needs, parsed but unranked
+
+        No count_star cut and no LIMIT: a digest that is cold on each node can
+        still be hot cluster-wide. Rows are (hostgroup, schemaname, username,
+        digest, digest_text, count_star, sum_time, min_time, max_time,
+        sum_rows_sent, first_seen, last_seen).
+        """
+        query = """
+        SELECT hostgroup, schemaname, username, digest, digest_text,
+               count_star, sum_time, min_time, max_time, sum_rows_sent, first_seen, last_seen
+        FROM stats_mysql_query_digest
+        """
+
+        to_int = lambda v: int(v) if str(v).lstrip('-').isdigit() else 0
+        return [
+            (to_int(row[0]), str(row[1]), str(row[2]), str(row[3]), str(row[4]),
+             *(to_int(value) for value in row[5:12]))
+            for row in self.iterate_query(query, batch_size=batch_size)
+        ]
+
+    def get_digest_loads(self, queries: List[QueryDigest], keys_per_digest: int = 100) -> List[DigestLoad]:
+        """Arrival rate and result size for each given digest, summed over hostgroups
+
+        Rates are count_star over the first_seen..last_seen window. Digests
+        without ? placeholders always produce the same query text (one key).
+        """
+        digests = list(dict.fromkeys(q.digest for q in queries))
+        if not digests:
+            return []
+        in_list = ', '.join("'" + digest.replace("'", "''") + "'" for digest in digests)
+        query = f"""
+        SELECT digest, digest_text, SUM(count_star), MIN(first_seen), MAX(last_seen),
+               SUM(sum_rows_sent), SUM(sum_time)
+        FROM stats_mysql_query_digest
+        WHERE digest IN ({in_list})
+        GROUP BY digest, digest_text
+        """
+
+        to_int = lambda v: int(v) if str(v).isdigit() else 0
+        loads = {}
+        for row in self.execute_query(query):
+            count_star = to_int(row[2])
+            if count_star == 0:
+                continue
+            window = max(1, to_int(row[4]) - to_int(row[3]))
+            loads[str(row[0])] = DigestLoad(
+                digest=str(row[0]),
+                digest_text=str(row[1]),
+                qps=count_star / window,
+                rows_per_exec=to_int(row[5]) / count_star,
+                avg_time_us=to_int(row[6]) / count_star,
+                keys=keys_per_digest if '?' in str(row[1]) else 1
+            )
+        return [loads[digest] for digest in digests if digest in loads]
+
+    def get_query_digest_topn(self, top_n: int = 20, rank_by: str = 'cache_score',
+                              min_count: int = 10, selects_only: bool = True,
+                              batch_size: int = 5000) -> List[QueryDigest]:
+        """Top-N digests by any DIGEST_RANK_KEYS key over the whole digest table
+
+        Unlike get_query_digest() there is no ORDER BY sum_time LIMIT pre-cut,
+        so frequent, cheap digests that rank high by cache score are not lost.
+        The table is streamed in fetchmany() batches without digest_text and
+        each row is scored from its raw tuple; only the current top_n rows are
+        kept in a bounded min-heap, so peak memory stays flat however many
+        digests ProxySQL holds. digest_text is then fetched for the winners only.
+        """
+        score = DIGEST_RANK_KEYS[rank_by]
+        select_filter = "AND digest_text LIKE 'SELECT%' AND hostgroup <> -1" if selects_only else ""
+        query = f"""
+        SELECT hostgroup, schemaname, username, digest,
+               count_star, sum_time, min_time, max_time
+        FROM stats_mysql_query_digest
+        WHERE count_star >= {int(min_count)} {select_filter}
+        """
+
+        heap: List[Tuple[float, int, Tuple]] = []
+        for seq, row in enumerate(self.iterate_query(query, batch_size=batch_size)):
+            count_star = int(row[4]) if str(row[4]).isdigit() else 0
+            sum_time = int(row[5]) if str(row[5]).isdigit() else 0
+            max_time = int(row[7]) if str(row[7]).isdigit() else 0
+            entry = (score(count_star, sum_time, max_time), seq, row)
+            if len(heap) < top_n:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+
+        winners = [row for _, _, row in sorted(heap, reverse=True)]
+        if not winners:
+            return []
+
+        digest_list = ", ".join("'" + str(row[3]).replace("'", "''") + "'" for row in winners)
+        texts = {
+            (str(hg), str(schema), str(user), str(digest)): str(text)
+            for hg, schema, user, digest, text in self.execute_query(f"""
+            SELECT hostgroup, schemaname, username, digest, digest_text
+            FROM stats_mysql_query_digest
+            WHERE digest IN ({digest_list})
+            """)
+        }
+
+        return [
+            QueryDigest(
+                hostgroup=int(row[0]) if str(row[0]).lstrip('-').isdigit() else 0,
+                schemaname=str(row[1]),
+                username=str(row[2]),
+                digest=str(row[3]),
+                digest_text=texts.get((str(row[0]), str(row[1]), str(row[2]), str(row[3])), str(row[3])),
+                count_star=int(row[4]) if str(row[4]).isdigit() else 0,
+                sum_time=int(row[5]) if str(row[5]).isdigit() else 0,
+                min_time=int(row[6]) if str(row[6]).isdigit() else 0,
+                max_time=int(row[7]) if str(row[7]).isdigit() else 0
+            )
+            for row in winners
+        ]
+
+    def get_query_digest_frame(self, min_count: int = 10, selects_only: bool = True,
+                               batch_size: int = 5000) -> DigestFrame:
+        """Read the whole digest table into a columnar DigestFrame (requires NumPy)
+
+        Like get_query_digest_topn() the scan skips digest_text; call
+        fill_digest_text() for the rows that will be displayed.
+        """
+        select_filter = "AND digest_text LIKE 'SELECT%' AND hostgroup <> -1" if selects_only else ""
+        query = f"""
+        SELECT hostgroup, schemaname, username, digest,
+               count_star, sum_time, min_time, max_time
+        FROM stats_mysql_query_digest
+        WHERE count_star >= {int(min_count)} {select_filter}
+        """
+        return DigestFrame.from_rows(self.iterate_query(query, batch_size=batch_size))
+
+    def fill_digest_text(self, frame: DigestFrame, indices) -> List[QueryDigest]:
+        """Fetch digest_text for the given frame rows and return their display views"""
+        indices = [int(i) for i in indices]
+        if not indices:
+            return []
+        digest_list = ", ".join("'" + frame.digest[i].replace("'", "''") + "'" for i in indices)
+        texts = {
+            (str(hg), str(schema), str(user), str(digest)): str(text)
+            for hg, schema, user, digest, text in self.execute_query(f"""
+            SELECT hostgroup, schemaname, username, digest, digest_text
+            FROM stats_mysql_query_digest
+            WHERE digest IN ({digest_list})
+            """)
+        }
+        for i in indices:
+            key = (str(frame.hostgroup[i]), frame.schemaname[i], frame.username[i], frame.digest[i])
+            if key in texts:
+                frame.digest_text[i] = texts[key]
+        return [frame.view(i) for i in indices]
+
+    def _collect_digest_frame(self, top_n: int, rank_by: str) -> Tuple[List[QueryDigest], DigestFrame]:
+        """Columnar digest collector: vectorized ranking, views for the top_n only"""
+        frame = self.get_query_digest_frame()
+        return self.fill_digest_text(frame, frame.top_indices(top_n, rank_by)), frame
+
+    def get_cache_stats(self) -> CacheStats:
+        """Fetch query cache statistics"""
         query = """
-        SELECT fd, hostgroup, srv_host, srv_port, user,
-               COALESCE(schema, '') as schema, idle_ms
-        FROM stats_mysql_free_connections
-        ORDER BY idle_ms DESC
+        SELECT Variable_name, Variable_Value
+        FROM stats_mysql_global
+        WHERE Variable_name LIKE 'Query_Cache%'
         """
 
-        results = self.execute_query(query)
+        return self._parse_cache_stats(self.execute_query(query))
+
+    def _parse_cache_stats(self, results: List[Tuple]) -> CacheStats:
+        """Build CacheStats from Query_Cache% rows of stats_mysql_global"""
+        stats = CacheStats()
+
+        for var_name, var_value in results:
+            value = int(var_value) if str(var_value).isdigit() else 0
+            if 'Memory_bytes' in var_name:
+                stats.memory_bytes = value
+            elif 'Entries' in var_name:
+                stats.entries = value
+            elif 'count_GET_OK' in var_name:
+                stats.count_get_ok = value
+            elif 'count_GET' in var_name:
+                stats.count_get = value
+            elif 'count_SET' in var_name:
+                stats.count_set = value
+            elif 'bytes_IN' in var_name:
+                stats.bytes_in = value
+            elif 'bytes_OUT' in var_name:
+                stats.bytes_out = value
+            elif 'Purged' in var_name:
+                stats.purged = value
 
-        connections = []
-        by_hostgroup = {}
-        by_user = {}
-        total_idle_ms = 0
-        max_idle = 0
-        stale_count = 0
+        return stats
 
+    def get_extended_connection_pool_stats(self) -> List[ConnectionPoolStats]:
+        """Fetch extended connection pool statistics with efficiency metrics"""
+        results = self.execute_query(self.POOL_QUERY)
+        pool_stats = []
         for row in results:
-            fd = int(row[0])
-            hostgroup = int(row[1])
-            srv_host = str(row[2])
-            srv_port = int(row[3])
-            user = str(row[4])
-            schema = str(row[5]) if row[5] else ''
-            idle_ms = int(row[6]) if str(row[6]).isdigit() else 0
-
-            conn = FreeConnectionStats(
-                fd=fd,
-                hostgroup=hostgroup,
-                srv_host=srv_host,
-                srv_port=srv_port,
-                user=user,
-                schema=schema,
-                idle_ms=idle_ms
-            )
+            pool_stats.append(ConnectionPoolStats(
+                hostgroup=int(row[0]) if str(row[0]).isdigit() else 0,
+                srv_host=str(row[1]),
+                srv_port=int(row[2]) if str(row[2]).isdigit() else 0,
+                status=str(row[3]),
+                queries=int(row[4]) if str(row[4]).isdigit() else 0,
+                conn_used=int(row[5]) if str(row[5]).isdigit() else 0,
+                conn_free=int(row[6]) if str(row[6]).isdigit() else 0,
+                bytes_sent=int(row[7]) if str(row[7]).isdigit() else 0,
+                bytes_recv=int(row[8]) if str(row[8]).isdigit() else 0,
+                conn_ok=int(row[9]) if str(row[9]).isdigit() else 0,
+                conn_err=int(row[10]) if str(row[10]).isdigit() else 0,
+                max_conn_used=int(row[11]) if str(row[11]).isdigit() else 0,
+                latency_us=int(row[12]) if str(row[12]).isdigit() else 0
+            ))
+        return pool_stats
+
+    def get_command_counters(self) -> List[Tuple[str, int, int]]:
+        """Fetch command counter statistics"""
+        results = self.execute_query(self.COMMANDS_QUERY)
+        return [
+            (str(row[0]),
+             int(row[1]) if str(row[1]).isdigit() else 0,
+             int(row[2]) if str(row[2]).isdigit() else 0)
+            for row in results
+        ]
+
+    def get_cache_config(self) -> Dict[str, str]:
+        """Fetch cache configuration variables"""
+        query = """
+        SELECT variable_name, variable_value
+        FROM global_variables
+        WHERE variable_name LIKE '%cache%'
+        ORDER BY variable_name
+        """
+
+        results = self.execute_query(query)
+        return {name: value for name, value in results}
+
+    def get_monitor_config(self) -> Dict[str, str]:
+        """Fetch monitor configuration variables"""
+        query = """
+        SELECT variable_name, variable_value
+        FROM global_variables
+        WHERE variable_name LIKE 'mysql-monitor%'
+        ORDER BY variable_name
+        """
 
-            connections.append(conn)
-            total_idle_ms += idle_ms
-            max_idle = max(max_idle, idle_ms)
+        results = self.execute_query(query)
+        return {name: value for name, value in results}
 
-            if conn.is_stale:
-                stale_count += 1
+    def _split_global_variables(self, results: List[Tuple]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Split one global_variables fetch into (cache_config, monitor_config)
 
-            # Aggregate by hostgroup
-            by_hostgroup[hostgroup] = by_hostgroup.get(hostgroup, 0) + 1
+        Mirrors the LIKE filters of get_cache_config() and get_monitor_config()
+        (SQLite LIKE is case-insensitive for ASCII).
+        """
+        cache_config = {}
+        monitor_config = {}
+        for name, value in sorted(results):
+            if 'cache' in name.lower():
+                cache_config[name] = value
+            if name.lower().startswith('mysql-monitor'):
+                monitor_config[name] = value
+        return cache_config, monitor_config
 
-            # Aggregate by user
-            by_user[user] = by_user.get(user, 0) + 1
+    def get_existing_cache_rules(self) -> List[Tuple[int, str, int]]:
+        """Fetch existing cache rules"""
+        results = self.execute_query(self.CACHE_RULES_QUERY)
+        return [
+            (int(row[0]) if str(row[0]).isdigit() else 0,
+             str(row[1]),
+             int(row[2]) if str(row[2]).isdigit() else 0)
+            for row in results
+        ]
 
-        total_connections = len(connections)
-        avg_idle = total_idle_ms / total_connections if total_connections > 0 else 0
+    def get_query_rules(self) -> List[QueryRule]:
+        """Fetch every mysql_query_rules row with the columns the query processor matches on"""
+        to_int = lambda v: int(v) if str(v).lstrip('-').isdigit() else None
+        text = lambda v: str(v) if v not in (None, '') else None
+        return [
+            QueryRule(
+                rule_id=to_int(row[0]) or 0,
+                active=to_int(row[1]) == 1,
+                username=text(row[2]),
+                schemaname=text(row[3]),
+                flag_in=to_int(row[4]) or 0,
+                digest=text(row[5]),
+                match_digest=text(row[6]),
+                match_pattern=text(row[7]),
+                negate_match_pattern=to_int(row[8]) == 1,
+                re_modifiers=str(row[9] or ''),
+                flag_out=to_int(row[10]),
+                destination_hostgroup=to_int(row[11]),
+                cache_ttl=to_int(row[12]),
+                apply=to_int(row[13]) == 1,
+                comment=str(row[14] or '')
+            )
+            for row in self.execute_query(self.QUERY_RULES_QUERY)
+        ]
 
-        return FreeConnectionSummary(
-            total_free=total_connections,
-            total_stale=stale_count,
-            avg_idle_ms=avg_idle,
-            max_idle_ms=max_idle,
-            connections_by_hostgroup=by_hostgroup,
-            connections_by_user=by_user
+    def get_query_rule_hits(self) -> Dict[int, int]:
+        """Fetch runtime rule hit counters (stats_mysql_query_rules)"""
+        return {
+            int(row[0]): int(row[1]) if str(row[1]).isdigit() else 0
+            for row in self.execute_query(self.RULE_HITS_QUERY)
+            if str(row[0]).isdigit()
+        }
+
+    def get_rules_loaded_age(self) -> Optional[int]:
+        """Seconds since the runtime query rules were loaded (the rule hit window), None when unknown"""
+        rows = self.execute_query(self.RULES_LOADED_QUERY)
+        if not rows or not all(str(v).isdigit() for v in rows[0][:2]) or not int(rows[0][0]):
+            return None
+        return max(0, int(rows[0][1]) - int(rows[0][0]))
+
+    def get_servers(self) -> Dict[int, List[Tuple[str, int, str, int]]]:
+        """Fetch mysql_servers: hostgroup -> [(hostname, port, status, max_replication_lag)]"""
+        to_int = lambda v: int(v) if str(v).isdigit() else 0
+        servers: Dict[int, List[Tuple[str, int, str, int]]] = {}
+        for row in self.execute_query(self.SERVERS_QUERY):
+            servers.setdefault(to_int(row[0]), []).append(
+                (str(row[1]), to_int(row[2]), str(row[3]).upper(), to_int(row[4])))
+        return servers
+
+    def get_replication_hostgroups(self) -> Dict[int, int]:
+        """Fetch mysql_replication_hostgroups: writer hostgroup -> reader hostgroup"""
+        return {
+            int(row[0]): int(row[1])
+            for row in self.execute_query(self.REPLICATION_HOSTGROUPS_QUERY)
+            if str(row[0]).isdigit() and str(row[1]).isdigit()
+        }
+
+    def simulate_rules(self, rules: List[QueryRule], track_overlaps: bool = False,
+                       record_matches: bool = False) -> RuleSimulator:
+        """Replay the whole digest table through rules (existing plus proposed)
+
+        Digest rows are aggregated across hostgroups in SQL and streamed, so
+        only the per-rule counters are held in memory.
+        """
+        simulator = RuleSimulator(rules, track_overlaps=track_overlaps, record_matches=record_matches)
+        query = """
+        SELECT username, schemaname, digest, digest_text, SUM(count_star)
+        FROM stats_mysql_query_digest
+        GROUP BY username, schemaname, digest, digest_text
+        """
+        for row in self.iterate_query(query):
+            simulator.replay(str(row[0]), str(row[1]), str(row[2]), str(row[3]),
+                             int(row[4]) if str(row[4]).isdigit() else 0)
+        return simulator
+
+    def convert_cache_rules(self, rules: List[QueryRule],
+                            replay: Callable[..., RuleSimulator]) -> RuleConversionPlan:
+        """Exact-match replacements for the existing regex cache rules (--convert-rules)
+
+        replay(rules, record_matches=True) runs every digest through a rule
+        chain (simulate_rules, or the merged fleet digests). The first run
+        learns which digests each active cache_ttl rule with a match_pattern or
+        match_digest regex matches where the chain reaches it: one digest hash
+        becomes a digest rule, up to CLUSTER_MAX_SHAPES distinct texts an
+        anchored match_digest alternation of them. The second run, with the
+        replacements in place, checks that each matches exactly the same
+        digests. Both regexes of a rule are timed on the same digest sample
+        (regex_costs_us) and weighted by the executions reaching the rule.
+        """
+        before = replay(rules, record_matches=True)
+        conversions, replaced = [], {}
+        for rule in rules:
+            if not (rule.active and rule.cache_ttl and (rule.match_pattern or rule.match_digest)) or rule.digest:
+                continue
+            stats = before.rule_stats(rule.rule_id)
+            conversion = RuleConversion(rule=rule, matched=dict(stats.matched) if stats else {},
+                                        reached=stats.reached if stats else 0)
+            texts = sorted(set(conversion.matched.values()))
+            if stats is None or stats.compile_error:
+                conversion.verdict = "✗ invalid regex - left as is"
+            elif rule.negate_match_pattern:
+                conversion.verdict = "✗ negate_match_pattern - left as is"
+            elif not texts:
+                conversion.verdict = "ℹ no digest reaches and matches it - left as is"
+            elif len(texts) > CLUSTER_MAX_SHAPES:
+                conversion.verdict = f"⚠ matches {len(texts)} texts - left as a regex"
+            else:
+                if len(conversion.matched) == 1:
+                    match = {'digest': next(iter(conversion.matched))}
+                elif len(texts) == 1:
+                    match = {'match_digest': f"^{regex_literal(texts[0])}$"}
+                else:
+                    match = {'match_digest': f"^(?:{'|'.join(regex_literal(text) for text in texts)})$"}
+                cleared = dict.fromkeys(('digest', 'match_digest', 'match_pattern'))
+                conversion.converted = replace(rule, **{**cleared, **match})
+                replaced[rule.rule_id] = conversion.converted
+            conversions.append(conversion)
+
+        after = replay([replaced.get(rule.rule_id, rule) for rule in rules], record_matches=True)
+        for conversion in conversions:
+            if conversion.converted is None:
+                continue
+            stats = after.rule_stats(conversion.rule.rule_id)
+            now = set(stats.matched) if stats else set()
+            extra, missed = len(now - set(conversion.matched)), len(set(conversion.matched) - now)
+            conversion.verdict = f"✗ differs (+{extra}/-{missed} digests)" if extra or missed else "✔ equivalent"
+        for conversion in conversions:
+            conversion.us_before, conversion.us_after = before.regex_costs_us(
+                [conversion.rule, conversion.converted or conversion.rule])
+        return RuleConversionPlan(conversions, before, after)
+
+    def advise_routing(self, topology: HostgroupTopology, rules: List[QueryRule],
+                       proposed: List[QueryRule], max_rules: int = 20) -> RoutingAdvice:
+        """Read-only digests the writer hostgroups serve, and which of them can go to readers
+
+        Only the writer hostgroups' digest rows are streamed. Every SELECT among
+        them gets a verdict: session-dependent functions keep it on the writer,
+        so does an existing rule that pins it there or ends the rule chain before
+        a new rule would be reached; a user that also writes one of its tables
+        on the writer may read its own writes (⚠, replica lag). Routing rules are
+        generated for the max_rules busiest movable (✔ and ⚠) digests, numbered
+        after every existing and proposed rule.
+        """
+        advice = RoutingAdvice(topology=topology)
+        if not topology.readers:
+            advice.issues.append(Recommendation(
+                'warning', "No mysql_replication_hostgroups pairs - writer and reader hostgroups are unknown, "
+                           "so reads cannot be split", 'routing'))
+            return advice
+
+        writers = topology.writers
+        query = f"""
+        SELECT hostgroup, username, schemaname, digest, digest_text,
+               SUM(count_star), SUM(sum_time), MIN(first_seen), MAX(last_seen)
+        FROM stats_mysql_query_digest
+        WHERE hostgroup IN ({', '.join(str(hostgroup) for hostgroup in writers)})
+        GROUP BY hostgroup, username, schemaname, digest
+        """
+        to_int = lambda v: int(v) if str(v).isdigit() else 0
+        written: Dict[str, set] = {}          # username -> tables it writes on a writer
+        reads: Dict[Tuple[int, str], RoutingCandidate] = {}
+        first_seen, last_seen = None, 0
+        for row in self.iterate_query(query):
+            hostgroup, username, schemaname = to_int(row[0]), str(row[1]), str(row[2])
+            digest, digest_text = str(row[3]), str(row[4])
+            count, sum_time = to_int(row[5]), to_int(row[6])
+            first_seen = min(first_seen, to_int(row[7])) if first_seen is not None else to_int(row[7])
+            last_seen = max(last_seen, to_int(row[8]))
+            advice.executions += count
+            advice.sum_time += sum_time
+            if not digest_is_read_only(digest_text):
+                written.setdefault(username, set()).update(digest_tables(digest_text))
+                continue
+            advice.read_executions += count
+            advice.read_time += sum_time
+            candidate = reads.get((hostgroup, digest))
+            if candidate is None:
+                candidate = reads[(hostgroup, digest)] = RoutingCandidate(
+                    digest=digest, digest_text=digest_text, writer_hostgroup=hostgroup,
+                    reader_hostgroup=topology.readers[hostgroup], window_s=0.0)
+            candidate.executions += count
+            candidate.sum_time += sum_time
+            candidate.users.append((username, schemaname))
+        advice.window_s = float(max(1, last_seen - (first_seen or 0))) if advice.executions else 0.0
+
+        simulator = RuleSimulator(rules)
+        for candidate in reads.values():
+            candidate.window_s = advice.window_s
+            candidate.verdict = self._routing_verdict(candidate, topology, simulator, written)
+        advice.candidates = sorted((c for c in reads.values() if c.executions >= ROUTING_MIN_EXECUTIONS),
+                                   key=lambda c: c.sum_time, reverse=True)
+
+        next_rule_id = max([rule.rule_id for rule in rules + proposed], default=100) + 1
+        movable = [c for c in advice.candidates if c.verdict.startswith(('✔', '⚠'))]
+        for candidate in movable[:max_rules]:
+            candidate.rule_id, next_rule_id = next_rule_id, next_rule_id + 1
+
+        for writer in writers:
+            reader = topology.readers[writer]
+            lagless = [f"{host}:{port}" for host, port, _, lag in topology.online(reader) if lag == 0]
+            if not topology.online(reader):
+                advice.issues.append(Recommendation(
+                    'critical', f"Reader hostgroup {reader} (writer {writer}) has no ONLINE servers", 'routing'))
+            elif lagless:
+                advice.issues.append(Recommendation(
+                    'tip', f"Set max_replication_lag on the reader hostgroup {reader} servers "
+                           f"({', '.join(lagless[:3])}{', ...' if len(lagless) > 3 else ''}) so lagging "
+                           f"replicas are shunned before they serve routed reads", f"hostgroup {reader}"))
+        return advice
+
+    def _routing_verdict(self, candidate: RoutingCandidate, topology: HostgroupTopology,
+                         simulator: RuleSimulator, written: Dict[str, set]) -> str:
+        """Whether one writer-served SELECT can be routed to its reader hostgroup"""
+        reader = candidate.reader_hostgroup
+        if not topology.online(reader):
+            return f"✗ reader hostgroup {reader} has no ONLINE servers"
+        session = ROUTING_SESSION_RE.search(candidate.digest_text)
+        if session:
+            return f"✗ session-dependent ({session.group(1).upper() if session.group(1) else '@variables'})"
+
+        routed_by, unrouted = None, False
+        for username, schemaname in candidate.users:
+            destination, set_by, stopped_by = simulator.destination(
+                username, schemaname, candidate.digest, candidate.digest_text)
+            if destination == reader:
+                routed_by = set_by
+            elif destination is not None:
+                return f"✗ pinned to hostgroup {destination} by rule {set_by}"
+            elif stopped_by is not None:
+                return f"✗ rule {stopped_by} applies first (apply=1) - set destination_hostgroup there"
+            else:
+                unrouted = True
+        if routed_by is not None and not unrouted:
+            return f"ℹ routed by rule {routed_by} already (writer runs are in transactions)"
+
+        tables = digest_tables(candidate.digest_text)
+        for username, _ in candidate.users:
+            overlap = sorted(tables & written.get(username, set()))
+            if overlap:
+                return f"⚠ read-after-write ({username} writes {overlap[0]})"
+        return "✔ safe"
+
+    def routing_rule(self, candidate: RoutingCandidate) -> QueryRule:
+        """The exact-digest rule that sends one candidate to its reader hostgroup"""
+        return QueryRule(
+            rule_id=candidate.rule_id,
+            digest=candidate.digest,
+            destination_hostgroup=candidate.reader_hostgroup,
+            apply=True,
+            proposed=True,
+            source_digest=candidate.digest,
+            comment=f"Route {candidate.digest_text[:60]}... (hostgroup {candidate.writer_hostgroup} -> "
+                    f"{candidate.reader_hostgroup}, {candidate.qps:.1f} qps)"
         )
 
-    def get_memory_metrics(self) -> MemoryMetrics:
-        """Fetch ProxySQL memory usage metrics"""
+    def routing_rule_insert(self, rule: QueryRule) -> str:
+        """The INSERT statement of a routing rule"""
+        return f"""INSERT INTO mysql_query_rules (rule_id, active, digest, destination_hostgroup, apply)
+VALUES ({rule.rule_id}, 1, '{rule.digest}', {rule.destination_hostgroup}, 1)"""
+
+    def get_cluster_rows(self) -> Iterator[Tuple[int, str, str, int, int, int]]:
+        """Stream (hostgroup, digest, digest_text, count_star, sum_time, max_time) of every SELECT digest row"""
         query = """
-        SELECT Variable_Name, Variable_Value
-        FROM stats_memory_metrics
+        SELECT hostgroup, digest, digest_text, count_star, sum_time, max_time
+        FROM stats_mysql_query_digest
+        WHERE digest_text LIKE 'SELECT%'
+        """
+        to_int = lambda v: int(v) if str(v).lstrip('-').isdigit() else 0
+        for row in self.iterate_query(query):
+            yield to_int(row[0]), str(row[1]), str(row[2]), to_int(row[3]), to_int(row[4]), to_int(row[5])
+
+    def cluster_digests(self, rows) -> DigestClustering:
+        """Group structurally equivalent read-only SELECT digests (see DigestShape)
+
+        Rows are (hostgroup, digest, digest_text, count_star, sum_time,
+        max_time), one per hostgroup/user/schema; query cache rows
+        (hostgroup -1) are skipped. Digests of one family join the cluster of
+        the first, smallest predicate set that is a subset of theirs, so a
+        query with extra optional filters lands with its base query.
+        """
+        started = time.perf_counter()
+        misses = self.tokenizer.misses
+        members: Dict[str, List] = {}    # digest -> [digest_text, count_star, sum_time, max_time, {hostgroup: count}]
+        for hostgroup, digest, digest_text, count, sum_time, max_time in rows:
+            if hostgroup < 0 or not digest_is_read_only(digest_text):
+                continue
+            member = members.get(digest)
+            if member is None:
+                member = members[digest] = [digest_text, 0, 0, 0, {}]
+            member[1] += count
+            member[2] += sum_time
+            member[3] = max(member[3], max_time)
+            member[4][hostgroup] = member[4].get(hostgroup, 0) + count
+
+        families: Dict[Tuple, List[Tuple[str, DigestShape]]] = {}
+        for digest, member in members.items():
+            shape = self.tokenizer.shape(digest, member[0])
+            families.setdefault(shape.family, []).append((digest, shape))
+
+        clustering = DigestClustering(digests=len(members))
+        for family in families.values():
+            family.sort(key=lambda item: (len(item[1].predicates), -members[item[0]][1]))
+            bases: List[Tuple[frozenset, DigestCluster]] = []
+            for digest, shape in family:
+                cluster = next((c for base, c in bases if base <= shape.predicates), None)
+                if cluster is None:
+                    cluster = DigestCluster()
+                    bases.append((shape.predicates, cluster))
+                    clustering.clusters.append(cluster)
+                digest_text, count, sum_time, max_time, hostgroups = members[digest]
+                cluster.digests.append((digest, digest_text, count))
+                cluster.shapes.append(shape)
+                cluster.count_star += count
+                cluster.sum_time += sum_time
+                cluster.max_time = max(cluster.max_time, max_time)
+                for hostgroup, executions in hostgroups.items():
+                    cluster.hostgroups[hostgroup] = cluster.hostgroups.get(hostgroup, 0) + executions
+        clustering.tokenized = self.tokenizer.misses - misses
+        clustering.seconds = time.perf_counter() - started
+        return clustering
+
+    def build_cluster_rules(self, cluster: DigestCluster, rule_id: int,
+                            topology: Optional[HostgroupTopology] = None) -> List[QueryRule]:
+        """Cache rules for one cluster: an anchored match_digest alternation of its member shapes
+
+        Precise by construction: a digest_text can only match if it has the
+        shape of a member, i.e. it belongs to the cluster. More than
+        CLUSTER_MAX_SHAPES shapes are spread over several rules.
         """
+        ttl = self.suggest_ttl(cluster.count_star, cluster.avg_time)
+        patterns = cluster.patterns
+        chunks = [patterns[start:start + CLUSTER_MAX_SHAPES] for start in range(0, len(patterns), CLUSTER_MAX_SHAPES)]
+        rules = []
+        for offset, chunk in enumerate(chunks):
+            regex = f"^{chunk[0]}$" if len(chunk) == 1 else f"^(?:{'|'.join(chunk)})$"
+            part = f" part {offset + 1}/{len(chunks)}" if len(chunks) > 1 else ''
+            rules.append(QueryRule(
+                rule_id=rule_id + offset,
+                match_digest=regex,
+                destination_hostgroup=topology.read_hostgroup(cluster.hostgroup) if topology else None,
+                cache_ttl=ttl,
+                apply=True,
+                proposed=True,
+                comment=f"Cache cluster of {len(cluster.digests)} digests{part}: {cluster.digest_text[:60]}... "
+                        f"(TTL: {ttl/1000:.0f}s, Score: {cluster.cache_score:.1f})"
+            ))
+        return rules
 
-        results = self.execute_query(query)
+    def cluster_rule_verdict(self, cluster: DigestCluster, rules: List[QueryRule]) -> str:
+        """Check that a cluster's rules match every member digest_text"""
+        compiled = [re.compile(rule.match_digest, rule.regex_flags) for rule in rules]
+        missed = sum(1 for _, digest_text, _ in cluster.digests
+                     if not any(regex.search(digest_text) for regex in compiled))
+        if missed:
+            return f"✗ misses {missed} of its digests"
+        return f"✔ precise ({len(cluster.digests)} digests, {len(rules)} rule{'s' if len(rules) > 1 else ''})"
+
+    def get_global_stats(self) -> GlobalStats:
+        """Fetch ProxySQL global performance statistics"""
+        query = """
+        SELECT Variable_name, Variable_Value
+        FROM stats_mysql_global
+        WHERE Variable_name IN (
+            'ProxySQL_Uptime',
+            'Client_Connections_connected',
+            'Server_Connections_created',
+            'Questions',
+            'Slow_queries',
+            'Active_Transactions'
+        )
+        """
+
+        return self._parse_global_stats(self.execute_query(query))
+
+    def _parse_global_stats(self, results: List[Tuple]) -> GlobalStats:
+        """Build GlobalStats from stats_mysql_global rows"""
+        wanted = {'ProxySQL_Uptime', 'Client_Connections_connected', 'Server_Connections_created',
+                  'Questions', 'Slow_queries', 'Active_Transactions'}
+        stats = GlobalStats()
+
+        for var_name, var_value in results:
+            if var_name not in wanted:
+                continue
+            value = int(var_value) if str(var_value).isdigit() else 0
+            if 'Uptime' in var_name:
+                stats.uptime_seconds = value
+            elif 'Client_Connections_connected' in var_name:
+                stats.client_connections_connected = value
+            elif 'Server_Connections_created' in var_name:
+                stats.server_connections_created = value
+            elif 'Questions' in var_name:
+                stats.queries_total = value
+            elif 'Slow_queries' in var_name:
+                stats.slow_queries = value
+            elif 'Active_Transactions' in var_name:
+                stats.active_transactions = value
+
+        return stats
+
+    def get_health_checks(self) -> Tuple[List[HealthCheckStats], List[HealthCheckStats]]:
+        """Fetch backend health check statistics (ping and connect)
+
+        Returns: (ping_checks, connect_checks)
+        """
+        return self.get_ping_checks(), self.get_connect_checks()
+
+    def get_ping_checks(self) -> List[HealthCheckStats]:
+        """Fetch ping health check statistics (last 5 minutes, read incrementally)"""
+        return self._read_monitor_log(self.ping_window)
+
+    def get_connect_checks(self) -> List[HealthCheckStats]:
+        """Fetch connect health check statistics (last 5 minutes, read incrementally)"""
+        return self._read_monitor_log(self.connect_window)
+
+    def _read_monitor_log(self, window: MonitorLogWindow) -> List[HealthCheckStats]:
+        window.update(self.execute_query(window.query()))
+        return window.stats()
+
+    def get_digest_totals(self) -> List[Tuple[str, int, int, int, int]]:
+        """(digest, count_star, sum_time, first_seen, last_seen) per digest hash
+
+        Summed across hostgroups, schemas and users on the admin side, so one
+        row per distinct query shape crosses the wire.
+        """
+        to_int = lambda v: int(v) if str(v).isdigit() else 0
+        return [(str(row[0]), to_int(row[1]), to_int(row[2]), to_int(row[3]), to_int(row[4]))
+                for row in self.execute_query(self.DIGEST_TOTALS_QUERY)]
+
+    def get_digest_texts(self, digests: List[str]) -> Dict[str, str]:
+        """digest_text of the given digest hashes"""
+        if not digests:
+            return {}
+        hashes = ', '.join("'" + d.replace("'", "''") + "'" for d in digests)
+        return {str(row[0]): str(row[1]) for row in self.execute_query(
+            f"SELECT digest, MAX(digest_text) FROM stats_mysql_query_digest WHERE digest IN ({hashes}) GROUP BY digest")}
+
+    def get_free_connections(self) -> FreeConnectionSummary:
+        """Fetch free connection statistics, aggregated on the admin side
+
+        Counts, stale count, average/max idle time and the per-hostgroup and
+        per-user tallies come from one UNION ALL of aggregate queries, so only
+        a handful of summary rows cross the wire however many connections are
+        pooled. Use get_free_connection_details() for per-connection rows.
+        """
+        summary = FreeConnectionSummary()
+        for kind, group, count, stale, avg_idle, max_idle in self.execute_query(self.FREE_CONNECTIONS_QUERY):
+            count = int(count) if str(count).isdigit() else 0
+            if kind == 'total':
+                summary.total_free = count
+                summary.total_stale = int(stale) if str(stale).isdigit() else 0
+                summary.avg_idle_ms = float(avg_idle) if avg_idle else 0.0
+                summary.max_idle_ms = int(float(max_idle)) if max_idle else 0
+            elif kind == 'hostgroup':
+                summary.connections_by_hostgroup[int(group) if str(group).lstrip('-').isdigit() else 0] = count
+            elif kind == 'user':
+                summary.connections_by_user[str(group)] = count
+
+        return summary
+
+    def get_free_connection_details(self, hostgroup: Optional[int] = None, user: Optional[str] = None,
+                                    min_idle_ms: int = 0, limit: int = 50) -> List[FreeConnectionStats]:
+        """Drill-down: individual free connections, longest idle first"""
+        conditions = [f"idle_ms >= {int(min_idle_ms)}"]
+        if hostgroup is not None:
+            conditions.append(f"hostgroup = {int(hostgroup)}")
+        if user is not None:
+            conditions.append("user = '" + user.replace("'", "''") + "'")
+        query = f"""
+        SELECT fd, hostgroup, srv_host, srv_port, user,
+               COALESCE(schema, '') as schema, idle_ms
+        FROM stats_mysql_free_connections
+        WHERE {' AND '.join(conditions)}
+        ORDER BY idle_ms DESC
+        LIMIT {int(limit)}
+        """
+
+        return [
+            FreeConnectionStats(
+                fd=int(row[0]),
+                hostgroup=int(row[1]),
+                srv_host=str(row[2]),
+                srv_port=int(row[3]),
+                user=str(row[4]),
+                schema=str(row[5]) if row[5] else '',
+                idle_ms=int(row[6]) if str(row[6]).isdigit() else 0
+            )
+            for row in self.execute_query(query)
+        ]
+
+    def get_memory_metrics(self) -> MemoryMetrics:
+        """Fetch ProxySQL memory usage metrics"""
+        results = self.execute_query(self.MEMORY_QUERY)
         metrics = MemoryMetrics()
 
         for var_name, var_value in results:
@@ -698,6 +4274,221 @@ class ProxySQLAnalyzer:
 
         return metrics
 
+    def _collect_global_status(self) -> Tuple[CacheStats, GlobalStats]:
+        """Read stats_mysql_global once and derive both cache and global stats"""
+        results = self.execute_query(self.GLOBAL_STATUS_QUERY)
+        cache_rows = [row for row in results if str(row[0]).startswith('Query_Cache')]
+        return self._parse_cache_stats(cache_rows), self._parse_global_stats(results)
+
+    def _collect_global_variables(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Read global_variables once for both cache and monitor configuration"""
+        results = self.execute_query(self.GLOBAL_VARIABLES_QUERY)
+        return self._split_global_variables(results)
+
+    def _open_worker_connection(self):
+        """ThreadPoolExecutor initializer: give each collector thread its own connection"""
+        if self.aborted:
+            return
+        try:
+            conn = self._open_connection()
+        except Error as e:
+            # Thread falls back to the shared connection
+            print(f"⚠  Collector connection failed, sharing main connection: {e}")
+            return
+        self._local.conn = conn
+        with self._conn_lock:
+            self._worker_conns.append(conn)
+        if self.aborted:
+            conn.shutdown()
+
+    def _close_worker_connections(self):
+        """Close the connections opened for collector threads"""
+        with self._conn_lock:
+            conns, self._worker_conns = self._worker_conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Error:
+                pass
+
+    def collect_metrics(self, digest_limit: int = 200, stream_digests: bool = False,
+                        top_n: int = 20, rank_by: str = 'cache_score',
+                        columnar: bool = False, free_conn_details: int = 0,
+                        simulate_rules: bool = False, rule_chain: bool = False,
+                        cache_sim: bool = False, cache_keys: int = 100, routing: bool = False,
+                        cluster: bool = False, convert_rules: bool = False, include_digests: bool = True,
+                        digest_rows: bool = False) -> AnalysisSnapshot:
+        """Run every collector once and return the results as one snapshot
+
+        Independent collectors run concurrently over a small pool of admin
+        connections (one per worker thread, up to self.workers), so wall time is
+        bounded by the slowest single query rather than the sum of all of them.
+        Each stats table is read exactly once per pass: stats_mysql_global
+        feeds both CacheStats and GlobalStats, and global_variables feeds both
+        the cache and monitor configuration sections.
+
+        With stream_digests the digest collector ranks the whole digest table
+        by rank_by (get_query_digest_topn) instead of the sum_time LIMIT pre-cut.
+        With columnar (NumPy) the whole table is loaded into a DigestFrame and
+        ranked with vectorized scores; pool efficiency scores are batch computed.
+
+        With simulate_rules the full mysql_query_rules table is read too, and a
+        second pass replays every digest through it plus the rules the report
+        will recommend (RuleSimulator).
+
+        With rule_chain stats_mysql_query_rules hits are read as well and the
+        existing rules are profiled (RuleChainProfile), replaying the digests
+        once more to learn which rules overlap.
+
+        With cache_sim the top queries' arrival rates and result sizes are
+        read into a QueryCacheModel sized by mysql-query_cache_size_MB.
+
+        mysql_servers and mysql_replication_hostgroups are always read into a
+        HostgroupTopology (proposed cache rules route to the reader hostgroup).
+        With routing the writer hostgroups' digests and mysql_query_rules are
+        read as well and the SELECTs that could move to readers are worked out
+        (advise_routing).
+
+        With cluster every SELECT digest row is streamed once more and grouped
+        into structurally equivalent clusters (cluster_digests).
+
+        With convert_rules the regex cache rules of mysql_query_rules get exact
+        digest / match_digest replacements, replaying the digests twice
+        (convert_cache_rules).
+
+        With self.anomalies (--anomalies) per-digest totals are read as well
+        and compared with the previous run's state (AnomalyDetector).
+
+        With self.baseline / self.compare (--baseline / --compare) the same
+        totals and the report's derived metrics become a PerformanceBaseline,
+        diffed against the stored one for --compare.
+
+        include_digests=False skips the digest table entirely (exporter mode
+        refreshes it on its own schedule). digest_rows=True reads the whole
+        table unranked into snapshot.digest_rows instead (fleet nodes, merged
+        by FleetCollector).
+        """
+        if columnar and np is None:
+            print("⚠  NumPy not installed - --columnar falls back to --stream-digests "
+                  "(uv run --with numpy proxysql_report.py ...)")
+            columnar, stream_digests = False, True
+
+        if columnar:
+            digest_collector = lambda: self._collect_digest_frame(top_n, rank_by)
+        elif stream_digests:
+            digest_collector = lambda: self.get_query_digest_topn(top_n=top_n, rank_by=rank_by)
+        else:
+            digest_collector = lambda: self.get_query_digest(limit=digest_limit)
+
+        collectors: Dict[str, Callable] = {
+            'version': self.get_proxysql_version,
+            'queries': digest_collector,
+            'global_status': self._collect_global_status,
+            'pool_stats': self.get_extended_connection_pool_stats,
+            'ping_checks': self.get_ping_checks,
+            'connect_checks': self.get_connect_checks,
+            'free_conns': self.get_free_connections,
+            'memory_metrics': self.get_memory_metrics,
+            'commands': self.get_command_counters,
+            'global_variables': self._collect_global_variables,
+            'existing_rules': self.get_existing_cache_rules,
+            'servers': self.get_servers,
+            'repl_hostgroups': self.get_replication_hostgroups,
+        }
+        if not include_digests or digest_rows:
+            del collectors['queries']
+        if digest_rows:
+            collectors['digest_rows'] = self.get_digest_rows
+        if free_conn_details:
+            collectors['free_conn_details'] = lambda: self.get_free_connection_details(limit=free_conn_details)
+        if simulate_rules or rule_chain or routing or convert_rules:
+            collectors['query_rules'] = self.get_query_rules
+        if rule_chain:
+            collectors['rule_hits'] = self.get_query_rule_hits
+            collectors['rules_age'] = self.get_rules_loaded_age
+        keep_baseline = self.baseline is not None or self.compare is not None
+        if self.anomalies is not None or keep_baseline:
+            collectors['digest_totals'] = self.get_digest_totals
+        if self.profiler is not None:
+            collectors = {name: self.profiler.wrap(name, collector) for name, collector in collectors.items()}
+
+        if self.workers == 1:
+            # One multi-statement round trip answers every collector with a fixed statement
+            with self.prefetch([query for query in map(self.pass_query, collectors) if query]):
+                results = {name: collector() for name, collector in collectors.items()}
+        else:
+            try:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(collectors)),
+                                        thread_name_prefix='collector',
+                                        initializer=self._open_worker_connection) as pool:
+                    futures = {name: pool.submit(collector) for name, collector in collectors.items()}
+                    results = {name: future.result() for name, future in futures.items()}
+            finally:
+                self._close_worker_connections()
+
+        cache_stats, global_stats = results.pop('global_status')
+        cache_config, monitor_config = results.pop('global_variables')
+        digest_totals = results.pop('digest_totals', [])
+        topology = results['topology'] = HostgroupTopology(servers=results.pop('servers'),
+                                                           readers=results.pop('repl_hostgroups'))
+        with self.profile_stage('scoring'):
+            if columnar:
+                results['queries'], results['digest_frame'] = results['queries']
+                PoolFrame(results['pool_stats']).apply_scores()
+            top_queries = self.select_top_queries(results.get('queries', []), top_n=top_n, rank_by=rank_by)
+        if simulate_rules:
+            with self.profile_stage('simulate_rules'):
+                proposed = self.propose_cache_rules(top_queries, results['existing_rules'], topology)
+                results['rule_simulation'] = self.simulate_rules(results['query_rules'] + proposed)
+        if rule_chain:
+            with self.profile_stage('rule_chain'):
+                overlaps = self.simulate_rules(results['query_rules'], track_overlaps=True)
+                rules_age = results.pop('rules_age')
+                results['rule_chain'] = RuleChainProfile(results['query_rules'], results.pop('rule_hits'),
+                                                         RuleChainProfile.window_queries(global_stats, rules_age),
+                                                         rules_age, simulator=overlaps)
+        if convert_rules:
+            with self.profile_stage('convert_rules'):
+                results['rule_conversion'] = self.convert_cache_rules(results['query_rules'], self.simulate_rules)
+        if self.anomalies is not None:
+            with self.profile_stage('anomalies'):
+                report = self.anomalies.observe(digest_totals, results['memory_metrics'].jemalloc_resident)
+                texts = self.get_digest_texts([a.subject for a in report.alerts if a.kind != 'memory'])
+                for alert in report.alerts:
+                    alert.digest_text = texts.get(alert.subject, '')
+                results['anomalies'] = report
+        if cache_sim:
+            with self.profile_stage('cache_sim'):
+                size_mb = cache_config.get('mysql-query_cache_size_MB', '256')
+                results['cache_model'] = QueryCacheModel(
+                    self.get_digest_loads(top_queries, keys_per_digest=cache_keys),
+                    size_mb=int(size_mb) if str(size_mb).isdigit() else 256, keys_per_digest=cache_keys)
+        if routing:
+            with self.profile_stage('routing'):
+                proposed = self.propose_cache_rules(top_queries, results['existing_rules'], topology)
+                results['routing'] = self.advise_routing(topology, results['query_rules'], proposed, max_rules=top_n)
+        if cluster:
+            with self.profile_stage('cluster'):
+                results['clusters'] = self.cluster_digests(self.get_cluster_rows())
+        snapshot = AnalysisSnapshot(cache_stats=cache_stats, global_stats=global_stats,
+                                    cache_config=cache_config, monitor_config=monitor_config,
+                                    **results)
+        if keep_baseline:
+            with self.profile_stage('baseline'):
+                snapshot.baseline = self.build_baseline(snapshot, digest_totals)
+                if self.compare is not None:
+                    snapshot.baseline_diff = self.compare.compare(snapshot.baseline, self.thresholds)
+        return snapshot
+
+    def build_baseline(self, snapshot: AnalysisSnapshot,
+                       digests: List[Tuple[str, int, int, int, int]]) -> PerformanceBaseline:
+        """This run's structured result for --baseline / --compare"""
+        kept = heapq.nlargest(BASELINE_TOP_DIGESTS, digests, key=lambda row: row[2])
+        texts = self.get_digest_texts([row[0] for row in kept])
+        return PerformanceBaseline.from_run(self.history_points(snapshot), snapshot.version,
+                                            self.snapshot or f"{self.host}:{self.port}", kept,
+                                            sum(row[2] for row in digests), texts)
+
     def suggest_ttl(self, count_star: int, avg_time: float) -> int:
         """Suggest appropriate TTL based on query frequency and execution time"""
         # High-frequency queries (>100/sec equivalent in our test window)
@@ -711,44 +4502,83 @@ class ProxySQLAnalyzer:
         else:
             return 60000  # 60 seconds
 
-    def generate_cache_rule(self, query: QueryDigest, rule_id: int) -> str:
-        """Generate ProxySQL cache rule SQL statement"""
-        # Extract table pattern from query
-        pattern = self._extract_query_pattern(query.digest_text)
-        ttl = self.suggest_ttl(query.count_star, query.avg_time)
+    def build_cache_rule(self, query: QueryDigest, rule_id: int,
+                         topology: Optional[HostgroupTopology] = None) -> QueryRule:
+        """Build the proposed cache rule for one digest
 
-        return f"""-- Rule {rule_id}: Cache {query.digest_text[:60]}... (TTL: {ttl/1000:.0f}s, Score: {query.cache_score:.1f})
-INSERT INTO mysql_query_rules (rule_id, active, match_pattern, destination_hostgroup, cache_ttl, apply)
-VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
+        Cache misses go to the reader hostgroup of the writer the digest runs
+        on (or stay on its own hostgroup); without a known topology the rule
+        sets no destination_hostgroup and routing is left as it is.
 
-    def _extract_query_pattern(self, digest_text: str) -> str:
-        """Extract regex pattern from digest text for cache rule matching"""
-        # Remove parameter placeholders and create regex pattern
-        import re
+        self.rule_match picks what the rule matches on: a match_pattern regex
+        of the digest text (pattern), the whole digest text as an anchored
+        match_digest literal, or the digest hash (digest).
+        """
+        if self.rule_match == 'digest':
+            match = {'digest': query.digest}
+        elif self.rule_match == 'match_digest':
+            match = {'match_digest': f"^{regex_literal(query.digest_text)}$"}
+        else:
+            # Extract table pattern from query
+            match = {'match_pattern': self._extract_query_pattern(query.digest_text)}
+        ttl = self.suggest_ttl(query.count_star, query.avg_time)
+
+        return QueryRule(
+            rule_id=rule_id,
+            **match,
+            destination_hostgroup=topology.read_hostgroup(query.hostgroup) if topology else None,
+            cache_ttl=ttl,
+            apply=True,
+            proposed=True,
+            source_digest=query.digest,
+            comment=f"Cache {query.digest_text[:60]}... (TTL: {ttl/1000:.0f}s, Score: {query.cache_score:.1f})"
+        )
 
-        # Replace ? with .* for flexible matching
-        pattern = digest_text.replace('?', '.*')
+    def propose_cache_rules(self, top_queries: List[QueryDigest], existing_rules: List[Tuple],
+                            topology: Optional[HostgroupTopology] = None) -> List[QueryRule]:
+        """Proposed cache rules for the top queries, numbered after the existing cache rules"""
+        # Start rule IDs after existing ones
+        existing_ids = {rule[0] for rule in existing_rules}
+        next_rule_id = max(existing_ids, default=100) + 1
+        return [self.build_cache_rule(query, next_rule_id + offset, topology)
+                for offset, query in enumerate(top_queries)]
 
-        # Only escape regex special chars that aren't SQL keywords
-        # ProxySQL uses regex directly on SQL - don't escape spaces, asterisks in SELECT *, etc.
-        pattern = pattern.replace('(', r'\(').replace(')', r'\)')
-        pattern = pattern.replace('[', r'\[').replace(']', r'\]')
-        pattern = pattern.replace('{', r'\{').replace('}', r'\}')
-        pattern = pattern.replace('+', r'\+').replace('|', r'\|')
-        pattern = pattern.replace('$', r'\$')  # But allow ^ for start anchor
+    def generate_cache_rule(self, query: QueryDigest, rule_id: int,
+                            topology: Optional[HostgroupTopology] = None) -> str:
+        """Generate ProxySQL cache rule SQL statement"""
+        return self.render_cache_rule(self.build_cache_rule(query, rule_id, topology))
+
+    def render_cache_rule(self, rule: QueryRule) -> str:
+        """Render a proposed cache rule as SQL"""
+        return f"-- Rule {rule.rule_id}: {rule.comment}\n{self.cache_rule_insert(rule)};"
+
+    def cache_rule_insert(self, rule: QueryRule) -> str:
+        """The INSERT statement of a proposed cache rule (digest, match_digest or match_pattern)"""
+        column, value = rule.match_column
+        columns = ['rule_id', 'active', column]
+        values = [str(rule.rule_id), '1', "'" + value.replace("'", "''") + "'"]
+        if rule.destination_hostgroup is not None:
+            columns.append('destination_hostgroup')
+            values.append(str(rule.destination_hostgroup))
+        columns += ['cache_ttl', 'apply']
+        values += [str(rule.cache_ttl), '1']
+        return f"INSERT INTO mysql_query_rules ({', '.join(columns)})\nVALUES ({', '.join(values)})"
 
-        # Add ^ anchor for start of query
-        if not pattern.startswith('^'):
-            pattern = '^' + pattern
+    def _extract_query_pattern(self, digest_text: str) -> str:
+        """Extract regex pattern from digest text for cache rule matching"""
+        # Replace ? placeholders with .* for flexible matching and match the rest
+        # literally: an unescaped * in SELECT * would read as "zero or more spaces"
+        # and . as any character, so the rule would miss its own query
+        pattern = '^' + '.*'.join(regex_literal(part) for part in digest_text.split('?'))
 
         # Limit pattern length to first 100 chars for readability
         if len(pattern) > 100:
             # Try to find a reasonable cutoff point (after FROM clause)
             from_idx = pattern.upper().find('FROM')
-            if from_idx > 0:
-                pattern = pattern[:from_idx + 30] + '.*'
-            else:
-                pattern = pattern[:100] + '.*'
+            pattern = pattern[:from_idx + 30] if from_idx > 0 else pattern[:100]
+            if (len(pattern) - len(pattern.rstrip('\\'))) % 2:
+                pattern = pattern[:-1]   # don't cut an escape in half
+            pattern += '.*'
 
         return pattern
 
@@ -759,14 +4589,22 @@ VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
         print(" >>  by George Liu (eva2000) at https://centminmod.com/")
         print(" >>  ProxySQL Admin Interface Analysis\n")
 
-    def print_connection_info(self, version: str):
+    def print_connection_info(self, version: str, pool_stats: List[ConnectionPoolStats],
+                              fleet: Optional[FleetSummary] = None):
         """Print connection information section"""
         print("-------- Connection Info " + "-" * 64)
-        print(f"✔  Connected to ProxySQL Admin Interface ({self.host}:{self.port})")
+        if fleet is not None:
+            print(f"✔  Fleet of {len(fleet.nodes)} ProxySQL Admin Interfaces "
+                  f"({len(fleet.ok_nodes)} merged cluster-wide by digest hash)")
+        elif self.snapshot:
+            captured = datetime.fromtimestamp(self.snapshot_info.get('captured_at', 0))
+            print(f"✔  Offline analysis of snapshot {self.snapshot} "
+                  f"(captured {captured:%Y-%m-%d %H:%M:%S} from {self.host}:{self.port})")
+        else:
+            print(f"✔  Connected to ProxySQL Admin Interface ({self.host}:{self.port})")
         print(f"✔  ProxySQL Version: {version}")
 
-        # Get backend server count and status
-        pool_stats = self.get_extended_connection_pool_stats()
+        # Backend server count and status
         online_count = sum(1 for p in pool_stats if p.status == 'ONLINE')
         total_count = len(pool_stats)
 
@@ -774,24 +4612,183 @@ VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
             print(f"✔  Backend Servers: {online_count} ONLINE (Total: {total_count})")
         print()
 
-    def print_top_queries(self, queries: List[QueryDigest], top_n: int = 20):
+    def select_top_queries(self, queries: List[QueryDigest], top_n: int = 20,
+                           rank_by: str = 'cache_score') -> List[QueryDigest]:
+        """Top SELECT digests by rank_by - the cache rule candidates"""
+        select_queries = [q for q in queries if q.is_select and q.hostgroup != -1]
+        return sorted(select_queries, key=lambda q: q.rank_value(rank_by), reverse=True)[:top_n]
+
+    def print_top_queries(self, top_queries: List[QueryDigest]):
         """Print top SELECT queries for caching"""
         print("-------- Top SELECT Queries for Caching " + "-" * 46)
         print(f"{'Rank':<6}{'Query Pattern':<50}{'Exec':<10}{'Total(μs)':<12}{'Avg(μs)':<10}{'Score':<8}")
         print("-" * 96)
 
-        select_queries = [q for q in queries if q.is_select and q.hostgroup != -1]
-        top_queries = sorted(select_queries, key=lambda q: q.cache_score, reverse=True)[:top_n]
+        for idx, query in enumerate(top_queries, 1):
+            # Truncate query text for display
+            query_text = query.digest_text[:48] + ".." if len(query.digest_text) > 50 else query.digest_text
+            print(f"{idx:<6}{query_text:<50}{query.count_star:<10}{query.sum_time:<12}{query.avg_time:<10.1f}{query.cache_score:<8.1f}")
+
+        print()
+
+    def print_anomalies(self, report: Optional[AnomalyReport]):
+        """Print the ranked --anomalies alert list"""
+        if report is None:
+            return
+
+        detector = self.anomalies
+        if report.baseline_only:
+            print("-------- Anomalies " + "-" * 70)
+            print(f"ℹ  Baseline recorded for {report.digests_tracked:,} digests"
+                  + (f" in {detector.path}" if detector else "") + " - alerts start from the next run")
+            print()
+            return
+        print(f"-------- Anomalies (vs previous run, {report.interval_s:,}s of ProxySQL time) " + "-" * 40)
+        if report.reset:
+            print("⚠  Digest counters went backwards since the previous run (restart or stats reset) - "
+                  "re-baselined, digest deltas skipped")
+        if not report.alerts:
+            print(f"✔  No anomalies: {report.digests_seen:,} digests compared"
+                  + (f" at {detector.sigma:g}σ" if detector else ""))
+            print()
+            return
+
+        print(f"{'Rank':<6}{'Severity':<13}{'Kind':<12}Detail")
+        print("-" * 100)
+        for idx, alert in enumerate(report.alerts, 1):
+            marker = "✗  critical" if alert.severity == 'critical' else "⚠  warning"
+            if alert.kind == 'memory':
+                subject = "jemalloc resident memory"
+            else:
+                text = alert.digest_text or '(digest text unavailable)'
+                subject = f"{text[:68]}.." if len(text) > 70 else text
+            print(f"{idx:<6}{marker:<13}{alert.kind:<12}{subject}")
+            print(f"{'':<31}└─ {alert.message}" + (f" [{alert.subject}]" if alert.kind != 'memory' else ''))
+        critical = sum(1 for a in report.alerts if a.severity == 'critical')
+        print(f"\n✗  {len(report.alerts)} anomalies ({critical} critical) - exit status 2" if critical else
+              f"\n⚠  {len(report.alerts)} anomalies - exit status 2")
+        print()
+
+    def print_baseline_diff(self, diff: Optional[BaselineDiff], top_n: int = 20):
+        """Print the --compare table: derived metrics, then per-digest average time"""
+        if diff is None:
+            return
+
+        taken = datetime.fromtimestamp(diff.info.get('taken_at') or 0).strftime('%Y-%m-%d %H:%M:%S')
+        print("-------- Baseline Comparison " + "-" * 71)
+        print(f"ℹ  Baseline: {diff.path} (ProxySQL {diff.info.get('proxysql_version') or 'Unknown'}, "
+              f"{diff.info.get('source') or 'unknown source'}, taken {taken})")
+        print()
+
+        def status(change: MetricChange) -> str:
+            limit = diff.thresholds.get(change.threshold, 0)
+            unit = ' pts' if change.unit == 'pts' else '%'
+            return f"✗  regression (limit {limit:g}{unit})" if change.regression else "✔  ok"
+
+        def fmt(change: MetricChange, value: float) -> str:
+            if change.name.startswith('memory.'):
+                return f"{value / 1048576:,.1f}MB"
+            if change.name == 'global.multiplexing_ratio':
+                return f"{value:,.1f}x"
+            return f"{value:,.1f}%" if change.name.endswith('_pct') else f"{value:,.1f}"
+
+        print(f"{'Metric':<44}{'Baseline':>12}{'Current':>12}{'Change':>12}  Status")
+        print("-" * 100)
+        for change in diff.metrics:
+            delta = f"{change.change:+,.1f}{' pts' if change.unit == 'pts' else '%'}"
+            print(f"{change.label[:43]:<44}{fmt(change, change.before):>12}{fmt(change, change.after):>12}"
+                  f"{delta:>12}  {status(change)}")
+        if not diff.metrics:
+            print("ℹ  No metrics in common with the baseline")
+        print()
+
+        print(f"Digest average time: {diff.digests_compared:,} compared, {diff.new_digests:,} new, "
+              f"{diff.gone_digests:,} gone (digests with {BASELINE_MIN_EXECUTIONS}+ executions in both runs)")
+        if diff.digests:
+            print(f"{'Digest':<50}{'Before μs':>12}{'After μs':>12}{'Change':>10}{'Share':>8}  Status")
+            print("-" * 100)
+            shown = [c for c in diff.digests if c.regression]
+            shown += [c for c in diff.digests if not c.regression][:max(top_n - len(shown), 0)]
+            for change in shown:
+                text = change.label or change.name
+                text = f"{text[:47]}.." if len(text) > 49 else text
+                print(f"{text:<50}{change.before:>12,.1f}{change.after:>12,.1f}{change.change:>+9.1f}%"
+                      f"{change.share * 100:>7.1f}%  {status(change)}")
+        print()
+
+        regressions = diff.regressions
+        if regressions:
+            print(f"✗  {len(regressions)} regression(s) beyond thresholds against {diff.path} - exit status 2")
+        else:
+            print(f"✔  No regressions against {diff.path}")
+        print()
+
+    def print_fleet(self, fleet: Optional[FleetSummary], top_queries: List[QueryDigest]):
+        """Print per-node results, question rate share and top query skew of a --fleet run"""
+        if fleet is None:
+            return
+
+        nodes = fleet.ok_nodes
+        total_qps = sum(node.qps for node in nodes)
+        print("-------- Fleet Nodes " + "-" * 68)
+        print(f"{'Node':<30}{'Status':<9}{'Time(s)':>8}{'QPS':>12}{'Share':>8}{'Hit Rate':>10}"
+              f"{'Digests':>10}{'Resident MB':>13}")
+        print("-" * 100)
+        for node in fleet.nodes:
+            if node.status != 'ok':
+                print(f"{node.endpoint[:29]:<30}{node.status:<9}{node.seconds:>8.2f}  {node.error}")
+                continue
+            share = node.qps / total_qps * 100 if total_qps else 0.0
+            print(f"{node.endpoint[:29]:<30}{node.status:<9}{node.seconds:>8.2f}{node.qps:>12,.1f}{share:>7.1f}%"
+                  f"{node.snapshot.cache_stats.hit_rate:>9.1f}%{len(node.digest_counts):>10,}"
+                  f"{node.snapshot.memory_metrics.jemalloc_resident_mb:>13.1f}")
+        print()
 
-        for idx, query in enumerate(top_queries, 1):
-            # Truncate query text for display
-            query_text = query.digest_text[:48] + ".." if len(query.digest_text) > 50 else query.digest_text
-            print(f"{idx:<6}{query_text:<50}{query.count_star:<10}{query.sum_time:<12}{query.avg_time:<10.1f}{query.cache_score:<8.1f}")
+        print(f"✔  {len(nodes)} of {len(fleet.nodes)} nodes merged in {fleet.seconds:.2f}s "
+              f"(slowest node {max(node.seconds for node in nodes):.2f}s)")
+        for node in fleet.nodes:
+            if node.status != 'ok':
+                print(f"✗  {node.endpoint}: {node.error} - left out of the cluster-wide totals")
+        if len(nodes) > 1 and total_qps:
+            even = 100 / len(nodes)
+            for node in nodes:
+                share = node.qps / total_qps * 100
+                if abs(share - even) > even * FLEET_SHARE_WARN:
+                    print(f"⚠  {node.endpoint} serves {share:.1f}% of questions (even share {even:.1f}%) "
+                          f"- check load balancer weights or node uptime")
+        for line in fleet.drift:
+            print(f"⚠  Config drift: {line}")
+        if len(nodes) > 1:
+            print(f"ℹ  Rules and configuration come from {nodes[0].endpoint}; memory sections show "
+                  f"{fleet.memory_node} (largest resident set)")
+            print(f"ℹ  Query cache memory/entries show {fleet.cache_node} (fullest cache); "
+                  f"hit and purge counters are cluster totals")
+        print()
 
+        if len(nodes) < 2 or not top_queries:
+            return
+        print("-------- Fleet Digest Skew " + "-" * 62)
+        print(f"{'Rank':<6}{'Digest':<20}{'Cluster Exec':>14}  {'Busiest Node':<30}{'Share':>8}{'Skew':>8}")
+        print("-" * 86)
+        skewed = 0
+        for idx, query in enumerate(top_queries, 1):
+            endpoint, executions, share, skew = fleet.digest_skew(query)
+            flag = ''
+            if skew >= FLEET_SKEW_WARN:
+                skewed += 1
+                flag = '  ⚠'
+            print(f"{idx:<6}{query.digest:<20}{executions:>14,}  {endpoint[:29]:<30}{share:>7.1f}%{skew:>7.2f}x{flag}")
+        print()
+        if skewed:
+            print(f"⚠  {skewed} of the top {len(top_queries)} queries run mostly on one node "
+                  f"(busiest node >= {FLEET_SKEW_WARN:g}x the per-node mean)")
+            print("   Sticky clients, uneven load balancer weights or node-local jobs; each node has its own")
+            print("   query cache, so cache hit rates for these digests will differ per node")
+        else:
+            print("✔  Top queries are spread evenly across the fleet")
         print()
-        return top_queries
 
-    def print_cache_stats(self, stats: CacheStats):
+    def print_cache_stats(self, stats: CacheStats, size_mb: Optional[str] = None):
         """Print query cache performance metrics"""
         print("-------- Query Cache Performance " + "-" * 56)
         print(f"Query_Cache_Memory_bytes: {stats.memory_bytes:,}")
@@ -801,6 +4798,12 @@ VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
         print(f"Query_Cache_bytes_IN: {stats.bytes_in:,}")
         print(f"Query_Cache_bytes_OUT: {stats.bytes_out:,}")
         print(f"Query_Cache_Purged: {stats.purged}")
+        if size_mb and str(size_mb).isdigit() and int(size_mb) > 0:
+            usage_pct = stats.memory_bytes / (int(size_mb) * 1024 * 1024) * 100
+            print(f"Query_Cache_Usage: {usage_pct:.1f}% of mysql-query_cache_size_MB ({size_mb} MB)")
+            if usage_pct >= 90 and stats.purged > 0:
+                print("⚠  Cache is at its size limit - Query_Cache_Purged includes early evictions, "
+                      "compare cache sizes with --cache-sim")
         print()
 
     def print_connection_pool_efficiency(self, pools: List[ConnectionPoolStats]):
@@ -833,23 +4836,21 @@ VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
         if not ping_checks and not connect_checks:
             return
 
-        print("-------- Backend Health Checks (Last 5 Minutes) " + "-" * 40)
-        print(f"{'Type':<12}{'Server':<20}{'Total Checks':<14}{'Failed':<10}{'Success Rate':<14}{'Avg Time(ms)':<15}")
-        print("-" * 85)
+        print("-------- Backend Health Checks (Last 5 Minutes) " + "-" * 64)
+        print(f"{'Type':<12}{'Server':<20}{'Total Checks':<14}{'Failed':<10}{'Success Rate':<14}{'Avg Time(ms)':<15}"
+              f"{'p50':>8}{'p95':>8}{'p99':>8}{'Max':>9}")
+        print("-" * 118)
 
-        for check in ping_checks:
+        for check in ping_checks + connect_checks:
             server = f"{check.hostname}:{check.port}"
             print(f"{check.check_type.capitalize():<12}{server:<20}{check.total_checks:<14}{check.failed_checks:<10}"
-                  f"{check.success_rate:>12.1f}% {check.avg_time_ms:<15.2f}")
+                  f"{check.success_rate:>12.1f}% {check.avg_time_ms:<15.2f}"
+                  f"{check.p50_ms:>8.2f}{check.p95_ms:>8.2f}{check.p99_ms:>8.2f}{check.max_ms:>9.2f}")
 
-        for check in connect_checks:
-            server = f"{check.hostname}:{check.port}"
-            print(f"{check.check_type.capitalize():<12}{server:<20}{check.total_checks:<14}{check.failed_checks:<10}"
-                  f"{check.success_rate:>12.1f}% {check.avg_time_ms:<15.2f}")
-
-            if check.last_error and check.failed_checks > 0:
+            if check.check_type == 'connect' and check.last_error and check.failed_checks > 0:
                 print(f"  └─ Last Error: {check.last_error}")
 
+        print("ℹ  p50/p95/p99/Max: successful check times in ms (±1% quantile sketch)")
         print()
 
     def print_free_connections(self, summary: FreeConnectionSummary):
@@ -878,6 +4879,23 @@ VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
                 print(f"  {user}: {count:,} connections")
             print()
 
+    def print_free_connection_details(self, connections: List[FreeConnectionStats]):
+        """Print the per-connection drill-down of the longest idle free connections"""
+        if not connections:
+            return
+
+        print("-------- Longest Idle Free Connections " + "-" * 50)
+        print(f"{'FD':<8}{'Hostgroup':<11}{'Server':<22}{'User':<16}{'Schema':<16}{'Idle(s)':<10}")
+        print("-" * 83)
+
+        for conn in connections:
+            server = f"{conn.srv_host}:{conn.srv_port}"
+            marker = " ⚠" if conn.is_stale else ""
+            print(f"{conn.fd:<8}{conn.hostgroup:<11}{server:<22}{conn.user[:15]:<16}{conn.schema[:15]:<16}"
+                  f"{conn.idle_seconds:<10.1f}{marker}")
+
+        print()
+
     def print_memory_metrics(self, metrics: MemoryMetrics):
         """Print ProxySQL memory usage metrics"""
         if metrics.jemalloc_allocated == 0 and metrics.jemalloc_resident == 0:
@@ -896,147 +4914,172 @@ VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
         print(f"  Thread Stacks: {metrics.total_stack_memory_mb:.2f} MB")
         print()
 
-    def print_pool_recommendations(self, pools: List[ConnectionPoolStats], global_stats: GlobalStats):
-        """Print connection pool tuning recommendations based on metrics"""
+    def pool_recommendations(self, pools: List[ConnectionPoolStats], global_stats: GlobalStats,
+                             ping_checks: Optional[List[HealthCheckStats]] = None) -> List[Recommendation]:
+        """Connection pool tuning recommendations based on metrics
+
+        Backend latency is judged on the monitor's p99 ping time where the
+        backend has one, so a mostly fast backend with tail spikes is still
+        flagged; the pool's Latency_us (last ping) is the fallback.
+        """
         recommendations = []
+        ping_by_backend = {(c.hostname, c.port): c for c in ping_checks or [] if c.sketch.count}
 
         for pool in pools:
+            subject = f"hostgroup {pool.hostgroup}"
             # High efficiency - positive feedback
             if pool.efficiency_score >= 85:
-                recommendations.append(
-                    f"✔  Hostgroup {pool.hostgroup}: Excellent connection pool efficiency ({pool.efficiency_score:.1f}/100 score)"
-                )
+                recommendations.append(Recommendation(
+                    'ok', f"Hostgroup {pool.hostgroup}: Excellent connection pool efficiency ({pool.efficiency_score:.1f}/100 score)",
+                    subject))
 
             # Low utilization warning
             if pool.pool_utilization < 20 and pool.total_connections > 10:
-                recommendations.append(
-                    f"⚠  Hostgroup {pool.hostgroup}: Low utilization ({pool.pool_utilization:.1f}%) - "
-                    f"Consider reducing max_connections (current pool: {pool.total_connections})"
-                )
+                recommendations.append(Recommendation(
+                    'warning', f"Hostgroup {pool.hostgroup}: Low utilization ({pool.pool_utilization:.1f}%) - "
+                    f"Consider reducing max_connections (current pool: {pool.total_connections})",
+                    subject))
 
             # High error rate alert
             if pool.connection_success_rate < 95 and pool.conn_err > 0:
-                recommendations.append(
-                    f"✗  Hostgroup {pool.hostgroup}: High connection errors ({pool.conn_err} failures, {pool.connection_success_rate:.1f}% success) - "
-                    f"Investigate backend {pool.srv_host}:{pool.srv_port} health"
-                )
+                recommendations.append(Recommendation(
+                    'critical', f"Hostgroup {pool.hostgroup}: High connection errors ({pool.conn_err} failures, {pool.connection_success_rate:.1f}% success) - "
+                    f"Investigate backend {pool.srv_host}:{pool.srv_port} health",
+                    subject))
 
             # High latency warning
-            if pool.avg_latency_ms > 10:
-                recommendations.append(
-                    f"⚠  Hostgroup {pool.hostgroup}: High backend latency ({pool.avg_latency_ms:.2f}ms) - "
-                    f"Check network/backend performance for {pool.srv_host}"
-                )
+            ping = ping_by_backend.get((pool.srv_host, pool.srv_port))
+            if ping is not None:
+                if ping.p99_ms > 10:
+                    recommendations.append(Recommendation(
+                        'warning', f"Hostgroup {pool.hostgroup}: High backend latency (p99 ping {ping.p99_ms:.2f}ms, "
+                        f"p50 {ping.p50_ms:.2f}ms, max {ping.max_ms:.2f}ms) - "
+                        f"Check network/backend performance for {pool.srv_host}",
+                        subject))
+            elif pool.avg_latency_ms > 10:
+                recommendations.append(Recommendation(
+                    'warning', f"Hostgroup {pool.hostgroup}: High backend latency ({pool.avg_latency_ms:.2f}ms) - "
+                    f"Check network/backend performance for {pool.srv_host}",
+                    subject))
 
             # Low queries per connection (inefficient pooling)
             if pool.queries_per_connection < 10 and pool.queries > 100:
-                recommendations.append(
-                    f"ℹ  Hostgroup {pool.hostgroup}: Low queries/connection ({pool.queries_per_connection:.1f}) - "
-                    f"Connection churning detected, verify transaction_persistent=1"
-                )
+                recommendations.append(Recommendation(
+                    'info', f"Hostgroup {pool.hostgroup}: Low queries/connection ({pool.queries_per_connection:.1f}) - "
+                    f"Connection churning detected, verify transaction_persistent=1",
+                    subject))
 
         # Global multiplexing analysis
         if global_stats.multiplexing_ratio >= 10:
-            recommendations.append(
-                f"✔  Strong multiplexing ratio ({global_stats.multiplexing_ratio:.1f}x) reducing backend load effectively"
-            )
+            recommendations.append(Recommendation(
+                'ok', f"Strong multiplexing ratio ({global_stats.multiplexing_ratio:.1f}x) reducing backend load effectively",
+                'multiplexing'))
         elif global_stats.multiplexing_ratio < 5 and global_stats.server_connections_created > 10:
-            recommendations.append(
-                f"⚠  Low multiplexing ratio ({global_stats.multiplexing_ratio:.1f}x) - "
-                f"Enable transaction_persistent=1 for better connection pooling"
-            )
+            recommendations.append(Recommendation(
+                'warning', f"Low multiplexing ratio ({global_stats.multiplexing_ratio:.1f}x) - "
+                f"Enable transaction_persistent=1 for better connection pooling",
+                'multiplexing'))
 
         # Slow query rate
         if global_stats.slow_query_rate > 1.0:
-            recommendations.append(
-                f"⚠  High slow query rate ({global_stats.slow_query_rate:.2f}%) - "
-                f"Review mysql-long_query_time threshold and optimize slow queries"
-            )
-
-        # Print recommendations
+            recommendations.append(Recommendation(
+                'warning', f"High slow query rate ({global_stats.slow_query_rate:.2f}%) - "
+                f"Review mysql-long_query_time threshold and optimize slow queries",
+                'slow_queries'))
+        return recommendations
+
+    def print_pool_recommendations(self, recommendations: List[Recommendation]):
+        """Print connection pool tuning recommendations"""
+        markers = {'ok': '✔', 'info': 'ℹ', 'warning': '⚠', 'critical': '✗'}
         if recommendations:
             print("Connection Pool Tuning Recommendations:")
             for rec in recommendations:
-                print(f"  {rec}")
+                print(f"  {markers[rec.severity]}  {rec.message}")
             print()
 
-    def print_connection_pool_analysis(self, free_conns: FreeConnectionSummary,
-                                       pool_stats: List[ConnectionPoolStats]):
-        """Generate recommendations for connection pool management"""
+    def free_connection_recommendations(self, free_conns: FreeConnectionSummary,
+                                        pool_stats: List[ConnectionPoolStats]) -> List[Recommendation]:
+        """Recommendations for connection pool management"""
         if free_conns.total_free == 0:
-            return
+            return []
 
         recommendations = []
 
         # Stale connection detection
         if free_conns.total_stale > 10:
-            recommendations.append(
-                f"⚠️  {free_conns.total_stale} stale connections detected (idle > 5min). "
-                f"Consider reducing mysql-wait_timeout or investigating connection leaks."
-            )
+            recommendations.append(Recommendation(
+                'warning', f"{free_conns.total_stale} stale connections detected (idle > 5min). "
+                f"Consider reducing mysql-wait_timeout or investigating connection leaks.",
+                'stale_connections'))
 
         # Excessive free connections
         if free_conns.total_free > 100:
             total_used = sum(p.conn_used for p in pool_stats)
-            recommendations.append(
-                f"ℹ️  High free connection count ({free_conns.total_free}). "
-                f"Pool may be oversized. Current utilization: {total_used} used vs {free_conns.total_free} free."
-            )
+            recommendations.append(Recommendation(
+                'info', f"High free connection count ({free_conns.total_free}). "
+                f"Pool may be oversized. Current utilization: {total_used} used vs {free_conns.total_free} free.",
+                'free_connections'))
 
         # Average idle time too high
         if free_conns.avg_idle_ms > 120000:  # > 2 minutes
-            recommendations.append(
-                f"💡 Average idle time is {free_conns.avg_idle_ms/1000:.0f}s. "
-                f"Consider tuning mysql-free_connections_pct to release idle connections faster."
-            )
-
+            recommendations.append(Recommendation(
+                'tip', f"Average idle time is {free_conns.avg_idle_ms/1000:.0f}s. "
+                f"Consider tuning mysql-free_connections_pct to release idle connections faster.",
+                'idle_time'))
+        return recommendations
+
+    def print_connection_pool_analysis(self, recommendations: List[Recommendation]):
+        """Print recommendations for connection pool management"""
         if recommendations:
             print("-------- Free Connection Pool Recommendations " + "-" * 41)
             for rec in recommendations:
-                print(f"{rec}")
+                print(f"{EMOJI_MARKERS[rec.severity]}{rec.message}")
                 print()
 
-    def print_memory_recommendations(self, metrics: MemoryMetrics):
-        """Generate recommendations for memory optimization"""
+    def memory_recommendations(self, metrics: MemoryMetrics) -> List[Recommendation]:
+        """Recommendations for memory optimization"""
         if metrics.jemalloc_allocated == 0 and metrics.jemalloc_resident == 0:
-            return
+            return []
 
         recommendations = []
 
         # High resident memory
         if metrics.jemalloc_resident_mb > 1024:  # > 1GB
-            recommendations.append(
-                f"⚠️  High memory usage detected: {metrics.jemalloc_resident_mb:.0f} MB resident. "
-                f"Monitor for memory leaks and consider capacity planning."
-            )
+            recommendations.append(Recommendation(
+                'warning', f"High memory usage detected: {metrics.jemalloc_resident_mb:.0f} MB resident. "
+                f"Monitor for memory leaks and consider capacity planning.",
+                'jemalloc_resident'))
 
         # Query digest memory pressure
         if metrics.query_digest_memory_mb > 100:
-            recommendations.append(
-                f"💡 Query digest using {metrics.query_digest_memory_mb:.0f} MB. "
-                f"Consider reducing mysql-query_digests_max_query_length or mysql-query_digests_max_digest_length."
-            )
+            recommendations.append(Recommendation(
+                'tip', f"Query digest using {metrics.query_digest_memory_mb:.0f} MB. "
+                f"Consider reducing mysql-query_digests_max_query_length or mysql-query_digests_max_digest_length.",
+                'query_digest_memory'))
 
         # High memory overhead
         if metrics.memory_overhead_pct > 50:
-            recommendations.append(
-                f"⚠️  Memory overhead is {metrics.memory_overhead_pct:.1f}% "
+            recommendations.append(Recommendation(
+                'warning', f"Memory overhead is {metrics.memory_overhead_pct:.1f}% "
                 f"(resident: {metrics.jemalloc_resident_mb:.0f} MB, allocated: {metrics.jemalloc_allocated_mb:.0f} MB). "
-                f"May indicate fragmentation or caching inefficiency."
-            )
+                f"May indicate fragmentation or caching inefficiency.",
+                'memory_overhead'))
 
         # SQLite memory high
         sqlite_mb = metrics.sqlite3_memory_bytes / (1024*1024)
         if sqlite_mb > 50:
-            recommendations.append(
-                f"ℹ️  SQLite using {sqlite_mb:.0f} MB. This is normal for large configurations "
-                f"but consider periodic VACUUM if admin interface feels sluggish."
-            )
-
+            recommendations.append(Recommendation(
+                'info', f"SQLite using {sqlite_mb:.0f} MB. This is normal for large configurations "
+                f"but consider periodic VACUUM if admin interface feels sluggish.",
+                'sqlite_memory'))
+        return recommendations
+
+    def print_memory_recommendations(self, recommendations: List[Recommendation]):
+        """Print recommendations for memory optimization"""
         if recommendations:
             print("-------- Memory Optimization Recommendations " + "-" * 44)
             for rec in recommendations:
-                print(f"{rec}")
+                print(f"{EMOJI_MARKERS[rec.severity]}{rec.message}")
                 print()
 
     def print_command_counters(self, counters: List[Tuple[str, int, int]]):
@@ -1078,7 +5121,7 @@ VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
             return
 
         print("-------- Existing Cache Rules " + "-" * 59)
-        print(f"{'Rule ID':<10}{'Match Pattern':<60}{'TTL (ms)':<12}")
+        print(f"{'Rule ID':<10}{'Match Pattern / Digest':<60}{'TTL (ms)':<12}")
         print("-" * 82)
 
         for rule_id, pattern, ttl in rules:
@@ -1087,105 +5130,2201 @@ VALUES ({rule_id}, 1, '{pattern}', 10, {ttl}, 1);"""
 
         print()
 
-    def print_recommendations(self, top_queries: List[QueryDigest], existing_rules: List[Tuple]):
+    def cache_rule_section(self, top_queries: List[QueryDigest], existing_rules: List[Tuple],
+                           simulation: Optional[RuleSimulator] = None,
+                           topology: Optional[HostgroupTopology] = None) -> ReportSection:
+        """Proposed cache rules (rows aligned with their SQL) and the general cache advice"""
+        verdicts = {}
+        if simulation:
+            existing_ids = {s.rule.rule_id for s in simulation.stats if not s.rule.proposed}
+            verdicts = {s.rule.rule_id: s.verdict(existing_ids) for s in simulation.stats if s.rule.proposed}
+
+        section = ReportSection('cache_rules', 'ProxySQL Query Cache Rules (Top 20 SELECT Query Candidates)')
+        withheld = 0
+        for rule in self.propose_cache_rules(top_queries, existing_rules, topology):
+            if verdicts.get(rule.rule_id, '').startswith('✗'):
+                withheld += 1   # failed the replay: not offered as ready-to-paste SQL
+                continue
+            section.rows.append({'rule_id': rule.rule_id, 'digest': rule.source_digest,
+                                 'match_column': rule.match_column[0], 'match_pattern': rule.match_pattern,
+                                 'match_digest': rule.match_digest, 'cache_ttl': rule.cache_ttl,
+                                 'destination_hostgroup': rule.destination_hostgroup,
+                                 'verdict': verdicts.get(rule.rule_id, '')})
+            section.sql.append(self.render_cache_rule(rule))
+        if simulation:
+            section.metrics['withheld'] = withheld
+        section.sql += ["LOAD MYSQL QUERY RULES TO RUNTIME;", "SAVE MYSQL QUERY RULES TO DISK;"]
+        section.recommendations = [Recommendation('info', message, 'query_cache') for message in (
+            "Monitor cache hit rate - aim for >70% for cached query patterns",
+            "Adjust TTL values based on data update frequency",
+            "ProxySQL query cache has NO automatic invalidation",
+            "Cache is best for read-heavy workloads with tolerable staleness",
+            "Review stats_mysql_query_digest regularly for new cache candidates",
+        )]
+        return section
+
+    def print_recommendations(self, section: ReportSection):
         """Print cache rule recommendations"""
         print("-------- Recommendations " + "-" * 64)
-        print("ProxySQL Query Cache Rules (Top 20 SELECT Query Candidates):\n")
+        print(f"{section.title}:\n")
 
-        # Start rule IDs after existing ones
-        existing_ids = {rule[0] for rule in existing_rules}
-        next_rule_id = max(existing_ids, default=100) + 1
-
-        for query in top_queries:
-            rule_sql = self.generate_cache_rule(query, next_rule_id)
-            print(rule_sql)
+        for row, sql in zip(section.rows, section.sql):
+            if row['verdict']:
+                print(f"-- Simulated: {row['verdict']}")
+            print(sql)
             print()
-            next_rule_id += 1
+        if section.metrics.get('withheld'):
+            print(f"-- Withheld {section.metrics['withheld']} proposed rules with a ✗ verdict "
+                  f"(see Cache Rule Simulation)")
 
         print("\n-- Apply all rules to ProxySQL runtime:")
-        print("LOAD MYSQL QUERY RULES TO RUNTIME;")
-        print("SAVE MYSQL QUERY RULES TO DISK;\n")
+        for sql in section.sql[len(section.rows):]:
+            print(sql)
+        print()
 
         # Additional recommendations
         print("General Recommendations:")
-        print("  * Monitor cache hit rate - aim for >70% for cached query patterns")
-        print("  * Adjust TTL values based on data update frequency")
-        print("  * ProxySQL query cache has NO automatic invalidation")
-        print("  * Cache is best for read-heavy workloads with tolerable staleness")
-        print("  * Review stats_mysql_query_digest regularly for new cache candidates")
+        for rec in section.recommendations:
+            print(f"  * {rec.message}")
+        print()
+
+    def print_rule_simulation(self, simulation: Optional[RuleSimulator]):
+        """Print per-rule replay results for existing and proposed query rules"""
+        if simulation is None:
+            return
+
+        print("-------- Cache Rule Simulation " + "-" * 58)
+        proposed_count = sum(1 for s in simulation.stats if s.rule.proposed)
+        print(f"Replayed {simulation.digests:,} digests ({simulation.executions:,} executions) through "
+              f"{len(simulation.stats)} active rules ({proposed_count} proposed)\n")
+        if not simulation.stats or simulation.executions == 0:
+            print("ℹ  Nothing to simulate")
+            print()
+            return
+
+        print(f"{'Rule':<8}{'Src':<6}{'Reach%':<8}{'Match%':<8}{'Digests':<9}{'Writes':<8}{'μs/eval':<9}{'Verdict'}")
+        print("-" * 96)
+        existing_ids = {s.rule.rule_id for s in simulation.stats if not s.rule.proposed}
+        for stats in simulation.stats:
+            reach_pct = stats.reached / simulation.executions * 100
+            match_pct = stats.executions / simulation.executions * 100
+            source = 'new' if stats.rule.proposed else 'live'
+            print(f"{stats.rule.rule_id:<8}{source:<6}{reach_pct:<8.1f}{match_pct:<8.1f}{stats.digests:<9}"
+                  f"{stats.write_digests:<8}{stats.avg_regex_us:<9.2f}{stats.verdict(existing_ids)}")
+        print()
+
+        for stats in simulation.stats:
+            for example in stats.write_examples:
+                example = example[:70] + ".." if len(example) > 72 else example
+                print(f"✗  Rule {stats.rule.rule_id} matches write: {example}")
+
+        cached_pct = simulation.cached_executions / simulation.executions * 100
+        select_pct = (simulation.cached_executions - simulation.cached_write_executions) / simulation.select_executions * 100 \
+            if simulation.select_executions > 0 else 0.0
+        print(f"Executions hitting a cache_ttl rule: {cached_pct:.1f}% ({select_pct:.1f}% of read-only SELECTs)")
+        if simulation.cached_write_executions:
+            print(f"✗  Write executions matched by a cache_ttl rule: {simulation.cached_write_executions:,}")
+        print(f"Rules evaluated per query:           {simulation.rules_per_query:.2f}")
+        print(f"Est. regex cost per query:           {simulation.regex_us_per_query:.2f}μs "
+              f"(Python re timing - relative, ProxySQL uses RE2/PCRE)")
+
+        merge_ready = [s.rule.rule_id for s in simulation.stats
+                       if s.rule.proposed and s.verdict(existing_ids).startswith('✔')]
+        if merge_ready:
+            print(f"✔  Merge-ready proposed rules (cheap and precise): {', '.join(map(str, merge_ready))}")
+        elif proposed_count:
+            print("⚠  No proposed rule is both cheap and precise - review the verdicts above")
+        print()
+
+    def print_cache_simulation(self, model: Optional[QueryCacheModel], top_queries: List[QueryDigest]):
+        """Print predicted query cache behaviour for candidate TTLs and cache sizes"""
+        if model is None:
+            return
+
+        print("-------- Query Cache Simulation " + "-" * 57)
+        if not model.loads:
+            print("ℹ  No cache candidates to simulate")
+            print()
+            return
+
+        ttl_header = ''.join(f"{'@' + str(ttl // 1000) + 's':<7}" for ttl in CACHE_SIM_TTLS_MS)
+        print(f"{'Query Pattern':<36}{'QPS':<9}{'Rows':<7}{'KB':<7}{ttl_header}{'Best':<6}")
+        print("-" * 100)
+        for load in model.loads:
+            query_text = load.digest_text[:32] + ".." if len(load.digest_text) > 34 else load.digest_text
+            hit_cells = ''.join(f"{load.hit_ratio(ttl / 1000) * 100:<7.1f}" for ttl in CACHE_SIM_TTLS_MS)
+            print(f"{query_text:<36}{load.qps:<9.2f}{load.rows_per_exec:<7.1f}{load.entry_bytes / 1024:<7.1f}"
+                  f"{hit_cells}{str(load.best_ttl() // 1000) + 's':<6}")
+        print(f"(hit % per TTL; Best = shortest TTL within 90% of the {max(CACHE_SIM_TTLS_MS) // 1000}s hit rate; "
+              f"{model.keys_per_digest} keys per parameterized digest)")
+        print()
+
+        suggested = []
+        for load in model.loads:
+            query = next((q for q in top_queries if q.digest == load.digest), None)
+            suggested.append(self.suggest_ttl(query.count_star, query.avg_time) if query else 60000)
+        policies = model.policies(suggested)
+
+        print(f"TTL policies at mysql-query_cache_size_MB = {model.size_mb}:")
+        print(f"{'Policy':<16}{'Hit%':<8}{'Memory(MB)':<12}{'Entries':<11}{'Purge/s':<10}{'Saved(ms/s)':<13}{'TTL scale':<10}")
+        print("-" * 80)
+        predictions = [model.predict(ttls, model.size_mb, policy) for policy, ttls in policies.items()]
+        for prediction in predictions:
+            print(f"{prediction.policy:<16}{prediction.hit_rate:<8.1f}{prediction.memory_mb:<12.1f}"
+                  f"{prediction.entries:<11,.0f}{prediction.purge_per_sec:<10.1f}"
+                  f"{prediction.saved_ms_per_sec:<13.1f}{prediction.ttl_scale:<10.2f}")
         print()
 
-    def run_analysis(self, top_n: int = 20):
+        best_policy = max(predictions[:2], key=lambda p: p.saved_ms_per_sec).policy
+        print(f"Cache sizes for the {best_policy} policy:")
+        print(f"{'Size(MB)':<16}{'Hit%':<8}{'Memory(MB)':<12}{'Entries':<11}{'Purge/s':<10}{'Saved(ms/s)':<13}{'TTL scale':<10}")
+        print("-" * 80)
+        sizes = [model.predict(policies[best_policy], model.size_mb * factor, best_policy)
+                 for factor in CACHE_SIM_SIZE_FACTORS]
+        for prediction in sizes:
+            print(f"{prediction.size_mb:<16g}{prediction.hit_rate:<8.1f}{prediction.memory_mb:<12.1f}"
+                  f"{prediction.entries:<11,.0f}{prediction.purge_per_sec:<10.1f}"
+                  f"{prediction.saved_ms_per_sec:<13.1f}{prediction.ttl_scale:<10.2f}")
+        print()
+
+        current = next(p for p in sizes if p.size_mb == model.size_mb)
+        if current.ttl_scale < 1:
+            fits = next((p for p in sizes if p.ttl_scale >= 1), None)
+            target = f"{fits.size_mb:g} MB" if fits else f"more than {sizes[-1].size_mb:g} MB"
+            print(f"⚠  {best_policy} TTLs do not fit in {model.size_mb} MB (entries evicted at "
+                  f"{current.ttl_scale:.0%} of TTL) - raise mysql-query_cache_size_MB to {target}")
+        else:
+            smallest = min((p for p in sizes if p.ttl_scale >= 1), key=lambda p: p.size_mb)
+            print(f"✔  {best_policy} TTLs fit in {model.size_mb} MB ({current.memory_mb:.1f} MB predicted, "
+                  f"{smallest.size_mb:g} MB would suffice)")
+        print(f"✔  Predicted backend time saved: {current.saved_ms_per_sec:.1f} ms/s "
+              f"({current.hit_rate:.1f}% of candidate executions served from cache)")
+        print("ℹ  Assumes uniform arrivals over each digest's keys and "
+              f"~{CACHE_SIM_ROW_BYTES} bytes per row (+{CACHE_SIM_ENTRY_OVERHEAD} per entry)")
+        print()
+
+    def routing_section(self, advice: RoutingAdvice, top_n: int = 20) -> ReportSection:
+        """--routing: writer load, the busiest read-only candidates and their routing rules"""
+        section = ReportSection('routing', 'Read/Write Split Routing', metrics={
+            'hostgroups': {writer: {'reader': reader, 'online_readers': len(advice.topology.online(reader))}
+                           for writer, reader in sorted(advice.topology.readers.items())},
+            'window_s': advice.window_s,
+            'writer_qps': advice.writer_qps,
+            'writer_backend_time_per_s': advice.writer_time_per_s,
+            'read_executions_pct': advice.read_executions / advice.executions * 100 if advice.executions else 0.0,
+            'read_backend_time_pct': advice.read_time / advice.sum_time * 100 if advice.sum_time else 0.0,
+            'candidates': len(advice.candidates),
+            'rules': advice.moved(advice.ruled),
+            'rules_read_after_write': advice.moved([c for c in advice.ruled if c.verdict.startswith('⚠')]),
+            'safe': advice.moved(advice.safe),
+            'read_after_write': advice.moved(advice.risky),
+        }, recommendations=list(advice.issues))
+        section.rows = [record_dict(c, 'qps', 'backend_time_per_s')
+                        for position, c in enumerate(advice.candidates) if position < top_n or c.rule_id is not None]
+        for candidate in advice.ruled:
+            rule = self.routing_rule(candidate)
+            caveat = f"\n-- {candidate.verdict}: review before applying" if candidate.verdict.startswith('⚠') else ''
+            section.sql.append(f"-- Rule {rule.rule_id}: {rule.comment}{caveat}\n{self.routing_rule_insert(rule)};")
+        if section.sql:
+            section.sql += ["LOAD MYSQL QUERY RULES TO RUNTIME;", "SAVE MYSQL QUERY RULES TO DISK;"]
+        return section
+
+    def print_routing(self, section: Optional[ReportSection]):
+        """Print writer-served SELECTs, their routing verdicts and the rules that move them to readers"""
+        if section is None:
+            return
+
+        metrics = section.metrics
+        print("-------- Read/Write Split Routing " + "-" * 55)
+        for writer, reader in metrics['hostgroups'].items():
+            print(f"Writer hostgroup {writer} → reader hostgroup {reader['reader']} "
+                  f"({reader['online_readers']} ONLINE servers)")
+        if metrics['window_s']:
+            print(f"Writer load: {metrics['writer_qps']:,.1f} queries/s, "
+                  f"{metrics['writer_backend_time_per_s']:.3f}s backend time/s; read-only SELECTs are "
+                  f"{metrics['read_executions_pct']:.1f}% of executions, {metrics['read_backend_time_pct']:.1f}% "
+                  f"of backend time")
+        print()
+
+        if section.rows:
+            print(f"{'Query Pattern':<44}{'QPS':<10}{'Time/s':<9}{'Users':<7}{'Rule':<7}{'Verdict'}")
+            print("-" * 110)
+            for row in section.rows:
+                text = row['digest_text'][:40] + ".." if len(row['digest_text']) > 42 else row['digest_text']
+                rule_id = row['rule_id'] if row['rule_id'] is not None else '-'
+                print(f"{text:<44}{row['qps']:<10.2f}{row['backend_time_per_s']:<9.3f}{len(row['users']):<7}"
+                      f"{rule_id!s:<7}{row['verdict']}")
+            print(f"(rates averaged over the writer hostgroups' digest window of {metrics['window_s']:,.0f}s; "
+                  f"SELECTs with at least {ROUTING_MIN_EXECUTIONS} executions)")
+            print()
+        elif metrics['window_s']:
+            print("✔  No read-only SELECT with enough executions runs on a writer hostgroup")
+            print()
+
+        for name, label in (('rules', f"The {metrics['rules']['digests']} generated rules move"),
+                            ('rules_read_after_write', f"Of these, the {metrics['rules_read_after_write']['digests']} "
+                                                       f"read-after-write (⚠) rules move"),
+                            ('safe', f"All {metrics['safe']['digests']} safe (✔) digests would move"),
+                            ('read_after_write', f"All {metrics['read_after_write']['digests']} read-after-write (⚠) "
+                                                 f"digests would move")):
+            moved = metrics[name]
+            if moved['digests']:
+                marker = '✔ ' if name in ('rules', 'safe') else '⚠ '
+                print(f"{marker} {label} {moved['qps']:,.1f} queries/s ({moved['executions_pct']:.1f}%) and "
+                      f"{moved['backend_time_per_s']:.3f}s backend time/s ({moved['backend_time_pct']:.1f}%) "
+                      f"off the writer")
+        if metrics['read_after_write']['digests']:
+            print("ℹ  Read-after-write: the same user writes the table on the writer. mysql_users.transaction_persistent=1 "
+                  "keeps reads inside transactions on the writer; autocommit reads right after a write can see replica lag")
+        for rec in section.recommendations:
+            print(f"{EMOJI_MARKERS[rec.severity]}{rec.message}")
+        print()
+
+        if section.sql:
+            print("-- Route the SELECTs to the reader hostgroups:")
+            for sql in section.sql:
+                print(sql)
+            print()
+
+    def conversion_section(self, plan: RuleConversionPlan) -> ReportSection:
+        """--convert-rules: each regex cache rule next to its exact-match replacement, with the regex cost of both"""
+        before, ready = plan.before, plan.ready
+        section = ReportSection('rule_conversion', 'Exact-Match Rule Conversion', metrics={
+            'digests': before.digests, 'executions': before.executions, 'active_rules': len(before.stats),
+            'regex_cache_rules': len(plan.conversions), 'converted': len(ready),
+            'digest_rules': sum(1 for c in ready if c.converted.digest),
+            'match_digest_rules': sum(1 for c in ready if c.converted.match_digest),
+            'samples': len(before.samples), 'timed_runs': RULE_CONVERT_REPEAT,
+            'regex_us_per_query_before': plan.us_per_query(converted=False),
+            'regex_us_per_query_after': plan.us_per_query(converted=True),
+        })
+        for conversion in plan.conversions:
+            rule, converted = conversion.rule, conversion.converted
+            stats = before.rule_stats(rule.rule_id)
+            column, value = rule.match_column
+            section.rows.append({
+                'rule_id': rule.rule_id, 'column': column, 'regex': value, 'reached': conversion.reached,
+                'digests': len(conversion.matched), 'texts': conversion.texts,
+                'executions': stats.executions if stats else 0,
+                'us_per_eval_before': conversion.us_before,
+                'converted_column': converted.match_column[0] if converted else None,
+                'converted_value': converted.match_column[1] if converted else None,
+                'us_per_eval_after': conversion.us_after if converted else None,
+                'verdict': conversion.verdict})
+        for conversion in ready:
+            rule, (column, value) = conversion.rule, conversion.converted.match_column
+            assignments = ', '.join(f"{name} = '" + value.replace("'", "''") + "'" if name == column else f"{name} = NULL"
+                                    for name in ('digest', 'match_digest', 'match_pattern'))
+            original = rule.match_column[1]
+            original = original[:60] + "..." if len(original) > 60 else original
+            section.sql.append(f"-- Rule {rule.rule_id}: {rule.match_column[0]} {original} -> {column} "
+                               f"({len(conversion.matched)} digest{'s' if len(conversion.matched) > 1 else ''}, "
+                               f"{conversion.texts} text{'s' if conversion.texts > 1 else ''})\n"
+                               f"UPDATE mysql_query_rules SET {assignments} WHERE rule_id = {rule.rule_id};")
+        if section.sql:
+            section.sql += ["LOAD MYSQL QUERY RULES TO RUNTIME;", "SAVE MYSQL QUERY RULES TO DISK;"]
+            section.recommendations.append(Recommendation(
+                'info', "Converted rules only match the digest texts seen now - a new query shape the regex "
+                        "would have cached is not cached until the rules are regenerated", 'query_rules'))
+        return section
+
+    def print_rule_conversion(self, section: Optional[ReportSection]):
+        """Print the regex cache rules side by side with their exact-match replacements"""
+        if section is None:
+            return
+
+        metrics = section.metrics
+        print("-------- Exact-Match Rule Conversion " + "-" * 52)
+        print(f"Replayed {metrics['digests']:,} digests ({metrics['executions']:,} executions) through "
+              f"{metrics['active_rules']} active rules: {metrics['regex_cache_rules']} regex cache rules, "
+              f"{metrics['converted']} convertible")
+        print()
+        if not section.rows:
+            print("ℹ  No active cache rule matches on match_pattern / match_digest - nothing to convert")
+            print()
+            return
+
+        print(f"{'Rule':<8}{'Reach%':<8}{'Digests':<9}{'Texts':<7}{'Before':<15}{'μs/eval':<9}"
+              f"{'After':<14}{'μs/eval':<9}{'Verdict'}")
+        print("-" * 110)
+        for row in section.rows:
+            reach_pct = row['reached'] / metrics['executions'] * 100 if metrics['executions'] else 0.0
+            if row['converted_column'] == 'digest':
+                after_us = 'hash'
+            elif row['us_per_eval_after'] is not None:
+                after_us = f"{row['us_per_eval_after']:.2f}"
+            else:
+                after_us = '-'
+            print(f"{row['rule_id']:<8}{reach_pct:<8.1f}{row['digests']:<9}{row['texts']:<7}{row['column']:<15}"
+                  f"{row['us_per_eval_before']:<9.2f}{row['converted_column'] or '-':<14}{after_us:<9}{row['verdict']}")
+        print()
+
+        print(f"Est. regex cost per query of these rules: {metrics['regex_us_per_query_before']:.2f}μs now, "
+              f"{metrics['regex_us_per_query_after']:.2f}μs converted")
+        print(f"(each regex timed on the same {metrics['samples']:,} digest texts, best of {metrics['timed_runs']} "
+              f"runs; Python re timing - relative, ProxySQL uses RE2/PCRE)")
+        for rec in section.recommendations:
+            print(f"ℹ  {rec.message}")
+        print()
+        if section.sql:
+            print(f"-- Convert {metrics['converted']} regex cache rules ({metrics['digest_rules']} to digest, "
+                  f"{metrics['match_digest_rules']} to anchored match_digest):")
+            for sql in section.sql:
+                print(sql)
+            print()
+
+    def cluster_section(self, clustering: DigestClustering, existing_rules: List[Tuple],
+                        topology: Optional[HostgroupTopology] = None, top_n: int = 20,
+                        rank_by: str = 'cache_score') -> ReportSection:
+        """--cluster-digests: the top multi-digest clusters and one cache rule (set) per cluster"""
+        top = clustering.top(top_n, rank_by)
+        section = ReportSection('digest_clusters', 'Digest Clusters', metrics={
+            'select_digests': clustering.digests,
+            'clusters': len(clustering.clusters),
+            'multi_digest_clusters': sum(1 for c in clustering.clusters if len(c.digests) > 1),
+            'tokenized': clustering.tokenized,
+            'memoized': clustering.digests - clustering.tokenized,
+            'seconds': clustering.seconds,
+            'rank_by': rank_by,
+        })
+        next_rule_id = max((rule[0] for rule in existing_rules), default=100) + 1
+        rule_count = 0
+        for cluster in top:
+            rules = self.build_cluster_rules(cluster, next_rule_id, topology)
+            next_rule_id += len(rules)
+            rule_count += len(rules)
+            verdict = self.cluster_rule_verdict(cluster, rules)
+            section.rows.append({'rule_ids': [rule.rule_id for rule in rules], 'digest_text': cluster.digest_text,
+                                 'digests': [digest for digest, _, _ in cluster.digests],
+                                 'texts': len({text for _, text, _ in cluster.digests}),
+                                 'shapes': len(cluster.patterns), 'variations': cluster.variations,
+                                 'count_star': cluster.count_star, 'sum_time': cluster.sum_time,
+                                 'avg_time': cluster.avg_time, 'cache_score': cluster.cache_score,
+                                 'cache_ttl': rules[0].cache_ttl, 'verdict': verdict})
+            section.sql += [f"-- Rule {rule.rule_id}: {rule.comment}\n-- {verdict}\n{self.cache_rule_insert(rule)};"
+                            for rule in rules]
+        # One per-digest regex rule (print_recommendations) covers every digest of the same text
+        per_digest = sum(row['texts'] for row in section.rows)
+        section.metrics.update({'clustered_digests': sum(len(row['digests']) for row in section.rows),
+                                'per_digest_rules': per_digest, 'cluster_rules': rule_count,
+                                'rules_saved': per_digest - rule_count})
+        if section.sql:
+            section.sql += ["LOAD MYSQL QUERY RULES TO RUNTIME;", "SAVE MYSQL QUERY RULES TO DISK;"]
+        return section
+
+    def print_digest_clusters(self, section: Optional[ReportSection]):
+        """Print the top digest clusters and their consolidated cache rules"""
+        if section is None:
+            return
+
+        metrics = section.metrics
+        print("-------- Digest Clusters " + "-" * 64)
+        print(f"Clustered {metrics['select_digests']:,} SELECT digests into {metrics['clusters']:,} clusters "
+              f"({metrics['multi_digest_clusters']:,} of more than one digest) in {metrics['seconds'] * 1000:,.0f} ms (read included); "
+              f"{metrics['tokenized']:,} tokenized, {metrics['memoized']:,} memoized")
+        print()
+        if not section.rows:
+            print("ℹ  No two SELECT digests share a structure - nothing to consolidate")
+            print()
+            return
+
+        print(f"{'Cluster (busiest digest)':<44}{'Digests':<9}{'Texts':<7}{'Shapes':<8}{'Executions':<13}"
+              f"{'Avg(ms)':<9}{'Rules':<7}{'Variations'}")
+        print("-" * 110)
+        for row in section.rows:
+            text = row['digest_text'][:40] + ".." if len(row['digest_text']) > 42 else row['digest_text']
+            print(f"{text:<44}{len(row['digests']):<9}{row['texts']:<7}{row['shapes']:<8}{row['count_star']:<13,}"
+                  f"{row['avg_time'] / 1000:<9.2f}{len(row['rule_ids']):<7}{', '.join(row['variations'])}")
+        print(f"(top {len(section.rows)} multi-digest clusters by {metrics['rank_by']}; executions and time added up "
+              f"over the cluster's digests)")
+        print()
+
+        marker = '✔ ' if metrics['rules_saved'] > 0 else 'ℹ '
+        print(f"{marker} {metrics['cluster_rules']} cluster rules cover {metrics['clustered_digests']:,} digests with "
+              f"{metrics['per_digest_rules']:,} distinct texts, which take {metrics['per_digest_rules']:,} per-digest "
+              f"rules: {metrics['rules_saved']:,} fewer rules in the chain")
+        print()
+        print("-- Consolidated cache rules (match_digest, anchored):")
+        for sql in section.sql:
+            print(sql)
+        print()
+
+    def print_rule_chain(self, profile: Optional[RuleChainProfile]):
+        """Print the rule chain profile and the pruned, reordered rule set"""
+        if profile is None:
+            return
+
+        print("-------- Query Rule Chain Profile " + "-" * 55)
+        if not profile.chain:
+            print("ℹ  No active query rules")
+            print()
+            return
+
+        print(f"{'Rule':<8}{'FlagIN':<8}{'Apply':<7}{'FlagOUT':<9}{'Hits':<12}{'Reach%':<8}{'Finding'}")
+        print("-" * 96)
+        for rule in profile.chain:
+            hits = profile.hits[rule.rule_id]
+            reach_pct = profile.reached[rule.rule_id] / profile.total_queries * 100 if profile.total_queries else 0.0
+            flag_out = '-' if rule.flag_out is None else rule.flag_out
+            print(f"{rule.rule_id:<8}{rule.flag_in:<8}{int(rule.apply):<7}{flag_out!s:<9}{hits:<12,}{reach_pct:<8.1f}"
+                  f"{self.rule_chain_finding(profile, rule)}")
+        print()
+
+        proposed = profile.proposed_chain()
+        if profile.fallthrough_queries is not None:
+            before = profile.current_evaluations / profile.total_queries if profile.total_queries else 0.0
+            after = profile.proposed_evaluations / profile.total_queries if profile.total_queries else 0.0
+            reduction = (1 - after / before) * 100 if before > 0 else 0.0
+            window = GlobalStats(uptime_seconds=profile.window_s or 0).uptime_formatted
+            print(f"Queries since rules loaded:    {profile.total_queries:,} (Questions over {window}; "
+                  f"{profile.matched_queries:,} hit a rule, {profile.fallthrough_queries:,} matched none)")
+            print(f"Rule evaluations per query:    {before:.2f} → {after:.2f} ({reduction:.0f}% fewer) "
+                  f"with {len(proposed)} of {len(profile.chain)} active rules")
+        else:
+            print(f"Queries hitting a rule:        {profile.matched_queries:,}")
+            print(f"Rule evaluations saved:        {profile.saved_per_hit:.2f} per rule hit by reordering, "
+                  f"{len(proposed)} of {len(profile.chain)} active rules kept")
+            print("ℹ  Rule load time unknown (runtime_checksums_values): queries matching no rule are not counted, "
+                  "so no share is given")
+        print("ℹ  Hits count since the last LOAD MYSQL QUERY RULES TO RUNTIME; overlaps come from the current digest table")
+        print()
+
+        dead = [rule.rule_id for rule in profile.dead_rules]
+        moves = profile.moves
+        reordered = any(new_id != rule.rule_id for new_id, rule in proposed)
+        if reordered and not moves and profile.reorder_saving_pct is not None:
+            print(f"ℹ  Reordering by hits saves {profile.reorder_saving_pct:.1f}% of rule evaluations "
+                  f"(below {RULE_CHAIN_MIN_SAVING_PCT:g}%) - rule_ids left as they are")
+        if not dead and not moves:
+            if not reordered:
+                print("✔  Rule chain is already pruned and ordered by hits")
+            print()
+            return
+
+        print("-- Pruned and reordered rule chain:" if moves else "-- Pruned rule chain:")
+        for line in self.rule_chain_sql(profile):
+            print(line)
+        print()
+
+    def rule_chain_finding(self, profile: RuleChainProfile, rule: QueryRule) -> str:
+        """Marker and verdict of one active rule in the chain"""
+        hits = profile.hits[rule.rule_id]
+        shadow = profile.shadowed_by(rule) if hits == 0 else None
+        if profile.unreachable(rule):
+            return f"✗ unreachable (no rule sets flagOUT {rule.flag_in})"
+        if shadow is not None:
+            return f"✗ shadowed by rule {shadow} (0 hits)"
+        if hits == 0:
+            return "✗ dead (0 hits)"
+        issue = profile.wiring_issue(rule)
+        return f"⚠ {issue}" if issue else "✔"
+
+    def rule_chain_sql(self, profile: RuleChainProfile) -> List[str]:
+        """SQL (with -- comments) that prunes dead rules and orders the chain by hits"""
+        dead = [rule.rule_id for rule in profile.dead_rules]
+        moves = profile.moves
+        lines = []
+        if dead:
+            lines.append("-- Disable dead rules (0 hits)")
+            lines.append(f"UPDATE mysql_query_rules SET active = 0 WHERE rule_id IN ({', '.join(map(str, dead))});")
+            lines.append("LOAD MYSQL QUERY RULES TO RUNTIME;")
+            lines.append("SAVE MYSQL QUERY RULES TO DISK;")
+        if moves:
+            offset = max(rule.rule_id for rule in profile.chain) + 1
+            saving = profile.reorder_saving_pct
+            saved = f"{saving:.0f}% fewer evaluations" if saving is not None \
+                else f"{profile.saved_per_hit:.2f} fewer evaluations per rule hit"
+            lines.append(f"-- Hot rules first ({saved}): rule_id decides evaluation order (moved through temporary ids)")
+            lines.append(f"UPDATE mysql_query_rules SET rule_id = rule_id + {offset} "
+                         f"WHERE rule_id IN ({', '.join(str(old) for _, old in moves)});")
+            for new_id, old_id in moves:
+                lines.append(f"UPDATE mysql_query_rules SET rule_id = {new_id} WHERE rule_id = {old_id + offset};")
+            lines.append("LOAD MYSQL QUERY RULES TO RUNTIME;")
+            lines.append("SAVE MYSQL QUERY RULES TO DISK;")
+        return lines
+
+    def run_analysis(self, top_n: int = 20, stream_digests: bool = False, rank_by: str = 'cache_score',
+                     columnar: bool = False, free_conn_details: int = 0, simulate_rules: bool = False,
+                     rule_chain: bool = False, cache_sim: bool = False, cache_keys: int = 100,
+                     routing: bool = False, cluster: bool = False, convert_rules: bool = False):
         """Run complete ProxySQL metrics analysis"""
+        with self.diagnostics():
+            if self.report_format == 'text':
+                self.print_header()
+
+            if not self.connect():
+                print("✗  Failed to connect to ProxySQL admin interface")
+                sys.exit(1)
+
+            started = time.perf_counter_ns()
+            try:
+                snapshot = self.collect_metrics(digest_limit=200, stream_digests=stream_digests,
+                                                top_n=top_n, rank_by=rank_by, columnar=columnar,
+                                                free_conn_details=free_conn_details,
+                                                simulate_rules=simulate_rules, rule_chain=rule_chain,
+                                                cache_sim=cache_sim, cache_keys=cache_keys, routing=routing,
+                                                cluster=cluster, convert_rules=convert_rules)
+            finally:
+                self.close()
+            if self.profiler is not None:
+                self.profiler.collect_ns = time.perf_counter_ns() - started
+                self.profiler.workers = self.workers
+
+            with self.profile_stage('history'):
+                self.record_history(self.history_points(snapshot))
+            with self.profile_stage('report'):
+                report = self.build_report(snapshot, top_n=top_n, rank_by=rank_by)
+        with self.profile_stage('render'):
+            self.render_report(report, top_n=top_n)
+        with self.diagnostics():
+            if self.anomalies is not None:
+                self.anomalies.save()
+            if self.baseline is not None and snapshot.baseline is not None:
+                if snapshot.baseline.save(self.baseline):
+                    print(f"✔  Baseline written to {self.baseline} "
+                          f"({len(snapshot.baseline.data['digests']):,} digests)")
+                    print()
+            if self.profiler is not None:
+                self.profiler.finish()
+                self.print_profile(self.profiler)
+        if ((snapshot.anomalies is not None and snapshot.anomalies.alerts)
+                or (snapshot.baseline_diff is not None and snapshot.baseline_diff.regressions)):
+            sys.exit(2)
+
+    def print_profile(self, profiler: CollectorProfiler):
+        """Print the --profile table (and write its JSON copy) after the report"""
+        entries = sorted(profiler.entries.values(), key=lambda e: (e.kind != 'collector', -e.wall_ns))
+        ms = lambda ns: f"{ns / 1e6:,.1f}"
+        print("-------- Analyzer Profile " + "-" * 74)
+        print(f"{'Step':<22}{'Kind':<11}{'Calls':>6}{'Stmts':>7}{'Wait ms':>11}{'Fetch ms':>11}"
+              f"{'Decode ms':>11}{'Total ms':>11}{'Rows':>10}{'Bytes':>12}")
+        print("-" * 112)
+        for entry in entries:
+            print(f"{entry.name:<22}{entry.kind:<11}{entry.calls:>6}{entry.statements:>7}"
+                  f"{ms(entry.wait_ns):>11}{ms(entry.fetch_ns):>11}{ms(entry.decode_ns):>11}"
+                  f"{ms(entry.wall_ns):>11}{entry.rows:>10,}{entry.bytes:>12,}")
+        print()
+
+        collectors = [e for e in entries if e.kind == 'collector']
+        totals = profiler.as_dict()['totals']
+        print(f"ℹ  Collection wall time: {ms(profiler.collect_ns)} ms on {self.workers} connection(s); "
+              f"collectors add up to {ms(sum(e.wall_ns for e in collectors))} ms")
+        print(f"ℹ  Admin interface: {totals['statements']:,} statements, {totals['server_wait_ms']:,.1f} ms "
+              f"server wait, {totals['fetch_ms']:,.1f} ms fetch, {totals['rows']:,} rows, "
+              f"{totals['bytes']:,} bytes")
+        if totals['statements']:
+            heaviest = max(entries, key=lambda e: e.wait_ns + e.fetch_ns)
+            print(f"ℹ  Heaviest on the admin interface: {heaviest.name} "
+                  f"({ms(heaviest.wait_ns + heaviest.fetch_ns)} ms wait + fetch, {heaviest.rows:,} rows)")
+        print(f"ℹ  Total run time: {ms(profiler.wall_ns)} ms (statements are not batched while profiling)")
+        if profiler.path:
+            try:
+                with open(profiler.path, 'w') as f:
+                    json.dump(profiler.as_dict(), f, indent=2)
+                print(f"✔  Profile written to {profiler.path}")
+            except OSError as e:
+                print(f"⚠  Could not write profile {profiler.path}: {e}")
+        print()
+
+    def build_report(self, snapshot: AnalysisSnapshot, top_n: int = 20, rank_by: str = 'cache_score') -> Report:
+        """Typed report model of one collected snapshot, shared by every --format renderer"""
+        top_queries = self.select_top_queries(snapshot.queries, top_n=top_n, rank_by=rank_by)
+        if snapshot.fleet is not None:
+            source, mode = ','.join(node.endpoint for node in snapshot.fleet.nodes), 'fleet'
+        elif self.snapshot:
+            source, mode = self.snapshot, 'snapshot'
+        else:
+            source, mode = f"{self.host}:{self.port}", 'live'
+        report = Report(snapshot=snapshot, top_queries=top_queries, info={
+            'analyzer': f"ProxySQL Metrics Analyzer {self.VERSION}",
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'source': source,
+            'mode': mode,
+            'proxysql_version': snapshot.version,
+        })
+        add = report.sections.append
+
+        online = sum(1 for p in snapshot.pool_stats if p.status == 'ONLINE')
+        add(ReportSection('connection', 'Connection Info', metrics={
+            'source': source, 'mode': mode, 'proxysql_version': snapshot.version,
+            'backends_online': online, 'backends_total': len(snapshot.pool_stats)}))
+        add(ReportSection('top_queries', 'Top SELECT Queries for Caching',
+                          metrics={'rank_by': rank_by, 'top_n': top_n, 'digests_read': len(snapshot.queries)},
+                          rows=[{'rank': idx, **record_dict(q, 'avg_time', 'cache_score')}
+                                for idx, q in enumerate(top_queries, 1)]))
+
+        fleet = snapshot.fleet
+        if fleet is not None:
+            total_qps = sum(node.qps for node in fleet.ok_nodes)
+            add(ReportSection('fleet', 'Fleet Nodes',
+                              metrics={'nodes': len(fleet.nodes), 'merged': len(fleet.ok_nodes),
+                                       'seconds': fleet.seconds, 'memory_node': fleet.memory_node,
+                                       'cache_node': fleet.cache_node},
+                              rows=[{'endpoint': node.endpoint, 'status': node.status, 'seconds': node.seconds,
+                                     'error': node.error, 'qps': node.qps,
+                                     'share_pct': node.qps / total_qps * 100 if total_qps and node.snapshot else 0.0,
+                                     'digests': len(node.digest_counts)} for node in fleet.nodes],
+                              recommendations=[Recommendation('warning', f"Config drift: {line}", 'config')
+                                               for line in fleet.drift]))
+
+        anomalies = snapshot.anomalies
+        if anomalies is not None:
+            add(ReportSection('anomalies', 'Anomalies',
+                              metrics={'interval_s': anomalies.interval_s, 'baseline_only': anomalies.baseline_only,
+                                       'digests_seen': anomalies.digests_seen,
+                                       'digests_tracked': anomalies.digests_tracked, 'reset': anomalies.reset},
+                              rows=[alert.as_dict() for alert in anomalies.alerts]))
+
+        diff = snapshot.baseline_diff
+        if diff is not None:
+            add(ReportSection('baseline_comparison', 'Baseline Comparison',
+                              metrics={'baseline': diff.path, **{f"baseline_{k}": v for k, v in diff.info.items()},
+                                       'thresholds': diff.thresholds, 'digests_compared': diff.digests_compared,
+                                       'new_digests': diff.new_digests, 'gone_digests': diff.gone_digests,
+                                       'regressions': len(diff.regressions)},
+                              rows=[{'kind': 'metric', **c.as_dict()} for c in diff.metrics]
+                              + [{'kind': 'digest', **c.as_dict()} for c in diff.digests]))
+
+        cache = snapshot.cache_stats
+        add(ReportSection('query_cache', 'Query Cache Performance', metrics={
+            **record_dict(cache, 'hit_rate'),
+            'query_cache_size_MB': snapshot.cache_config.get('mysql-query_cache_size_MB')}))
+        add(ReportSection('connection_pools', 'Connection Pool Efficiency Analysis', rows=[
+            record_dict(pool, 'total_connections', 'pool_utilization', 'connection_success_rate',
+                        'queries_per_connection', 'avg_latency_ms', 'efficiency_score')
+            for pool in snapshot.pool_stats]))
+        add(ReportSection('global', 'ProxySQL Global Performance Metrics', metrics=record_dict(
+            snapshot.global_stats, 'uptime_formatted', 'multiplexing_ratio', 'slow_query_rate')))
+        add(ReportSection('health_checks', 'Backend Health Checks (Last 5 Minutes)', rows=[
+            {'check_type': c.check_type, 'hostname': c.hostname, 'port': c.port, 'total_checks': c.total_checks,
+             'failed_checks': c.failed_checks, 'success_rate': c.success_rate, 'avg_time_ms': c.avg_time_ms,
+             'p50_ms': c.p50_ms, 'p95_ms': c.p95_ms, 'p99_ms': c.p99_ms, 'max_ms': c.max_ms,
+             'last_error': c.last_error} for c in snapshot.ping_checks + snapshot.connect_checks]))
+        add(ReportSection('free_connections', 'Free Connection Pool Analysis',
+                          metrics=record_dict(snapshot.free_conns, 'stale_percentage', 'max_idle_minutes'),
+                          rows=[record_dict(conn, 'idle_seconds', 'is_stale') for conn in snapshot.free_conn_details]))
+        add(ReportSection('memory', 'ProxySQL Memory Usage', metrics=record_dict(
+            snapshot.memory_metrics, 'jemalloc_allocated_mb', 'jemalloc_resident_mb', 'memory_overhead_pct',
+            'query_digest_memory_mb', 'total_stack_memory_mb')))
+        add(ReportSection('commands', 'Command Counters (Top 10)', rows=[
+            {'command': command, 'total_count': count, 'total_time_us': time_us}
+            for command, count, time_us in snapshot.commands]))
+        add(ReportSection('cache_config', 'Cache Configuration',
+                          metrics={k: v for k, v in sorted(snapshot.cache_config.items()) if k.startswith('mysql-')}))
+        add(ReportSection('monitor_config', 'Monitor Configuration', metrics=dict(sorted(snapshot.monitor_config.items()))))
+        add(ReportSection('existing_rules', 'Existing Cache Rules', rows=[
+            {'rule_id': rule_id, 'match_pattern': pattern, 'cache_ttl': ttl}
+            for rule_id, pattern, ttl in snapshot.existing_rules]))
+
+        profile = snapshot.rule_chain
+        if profile is not None:
+            add(ReportSection('rule_chain', 'Query Rule Chain Profile',
+                              metrics={'total_queries': profile.total_queries,
+                                       'matched_queries': profile.matched_queries,
+                                       'fallthrough_queries': profile.fallthrough_queries,
+                                       'window_s': profile.window_s,
+                                       'current_evaluations': profile.current_evaluations,
+                                       'proposed_evaluations': profile.proposed_evaluations,
+                                       'reorder_saving_pct': profile.reorder_saving_pct,
+                                       'saved_per_hit': profile.saved_per_hit,
+                                       'dead_rules': [rule.rule_id for rule in profile.dead_rules]},
+                              rows=[{'rule_id': rule.rule_id, 'flag_in': rule.flag_in, 'apply': rule.apply,
+                                     'flag_out': rule.flag_out, 'hits': profile.hits[rule.rule_id],
+                                     'reached': profile.reached[rule.rule_id],
+                                     'finding': self.rule_chain_finding(profile, rule)} for rule in profile.chain],
+                              sql=[line for line in self.rule_chain_sql(profile) if not line.startswith('--')]))
+
+        simulation = snapshot.rule_simulation
+        if simulation is not None:
+            existing_ids = {st.rule.rule_id for st in simulation.stats if not st.rule.proposed}
+            add(ReportSection('rule_simulation', 'Cache Rule Simulation',
+                              metrics={'digests': simulation.digests, 'executions': simulation.executions,
+                                       'cached_executions': simulation.cached_executions,
+                                       'cached_write_executions': simulation.cached_write_executions,
+                                       'rules_per_query': simulation.rules_per_query,
+                                       'regex_us_per_query': simulation.regex_us_per_query},
+                              rows=[{'rule_id': st.rule.rule_id, 'proposed': st.rule.proposed,
+                                     'reached': st.reached, 'digests': st.digests, 'executions': st.executions,
+                                     'write_digests': st.write_digests, 'avg_regex_us': st.avg_regex_us,
+                                     'verdict': st.verdict(existing_ids)} for st in simulation.stats]))
+
+        if snapshot.rule_conversion is not None:
+            add(self.conversion_section(snapshot.rule_conversion))
+
+        add(self.cache_rule_section(top_queries, snapshot.existing_rules, simulation, snapshot.topology))
+
+        model = snapshot.cache_model
+        if model is not None:
+            add(ReportSection('cache_simulation', 'Query Cache Simulation',
+                              metrics={'size_mb': model.size_mb, 'keys_per_digest': model.keys_per_digest},
+                              rows=[{'digest': load.digest, 'digest_text': load.digest_text, 'qps': load.qps,
+                                     'rows_per_exec': load.rows_per_exec, 'entry_bytes': load.entry_bytes,
+                                     'best_ttl_ms': load.best_ttl(),
+                                     'hit_pct': {ttl: load.hit_ratio(ttl / 1000) * 100 for ttl in CACHE_SIM_TTLS_MS}}
+                                    for load in model.loads]))
+
+        if snapshot.clusters is not None:
+            add(self.cluster_section(snapshot.clusters, snapshot.existing_rules, snapshot.topology,
+                                     top_n=top_n, rank_by=rank_by))
+
+        if snapshot.routing is not None:
+            add(self.routing_section(snapshot.routing, top_n=top_n))
+
+        add(ReportSection('pool_tuning', 'Connection Pool Tuning Recommendations',
+                          recommendations=self.pool_recommendations(snapshot.pool_stats, snapshot.global_stats,
+                                                                    snapshot.ping_checks)))
+        add(ReportSection('free_connection_tuning', 'Free Connection Pool Recommendations',
+                          recommendations=self.free_connection_recommendations(snapshot.free_conns,
+                                                                               snapshot.pool_stats)))
+        add(ReportSection('memory_tuning', 'Memory Optimization Recommendations',
+                          recommendations=self.memory_recommendations(snapshot.memory_metrics)))
+        return report
+
+    def render_report(self, report: Report, top_n: int = 20):
+        """Write the report in self.report_format to stdout"""
+        if self.report_format == 'json':
+            json.dump(report.as_dict(), sys.stdout, indent=2, default=str)
+            sys.stdout.write('\n')
+        elif self.report_format == 'ndjson':
+            # One record per line, written as it is produced
+            for record in report.records():
+                sys.stdout.write(json.dumps(record, default=str) + '\n')
+        else:
+            self.print_report(report, top_n=top_n)
+        sys.stdout.flush()
+
+    def diagnostics(self):
+        """Context in which progress and warnings go to stderr for machine-readable --format"""
+        if self.report_format == 'text':
+            return contextlib.nullcontext()
+        return contextlib.redirect_stdout(sys.stderr)
+
+    def print_report(self, report: Report, top_n: int = 20):
+        """Text renderer: print every report section of an already built report"""
+        snapshot, top_queries = report.snapshot, report.top_queries
+        # Connection info
+        self.print_connection_info(snapshot.version, snapshot.pool_stats, snapshot.fleet)
+
+        # Query digest analysis
+        self.print_top_queries(top_queries)
+
+        # Per-node collection, load share and digest skew (--fleet)
+        self.print_fleet(snapshot.fleet, top_queries)
+
+        # Regressions against the previous run (--anomalies)
+        self.print_anomalies(snapshot.anomalies)
+
+        # Before/after comparison with a stored result (--compare)
+        self.print_baseline_diff(snapshot.baseline_diff, top_n=top_n)
+
+        # Cache statistics
+        self.print_cache_stats(snapshot.cache_stats, snapshot.cache_config.get('mysql-query_cache_size_MB'))
+
+        # Extended connection pool efficiency
+        self.print_connection_pool_efficiency(snapshot.pool_stats)
+
+        # Global performance metrics
+        self.print_global_performance(snapshot.global_stats)
+
+        # Backend health checks
+        self.print_health_checks(snapshot.ping_checks, snapshot.connect_checks)
+
+        # Free connection analysis
+        self.print_free_connections(snapshot.free_conns)
+        self.print_free_connection_details(snapshot.free_conn_details)
+
+        # Memory metrics
+        self.print_memory_metrics(snapshot.memory_metrics)
+
+        # Command counters
+        self.print_command_counters(snapshot.commands)
+
+        # Cache configuration
+        self.print_cache_config(snapshot.cache_config)
+
+        # Monitor configuration
+        self.print_monitor_config(snapshot.monitor_config)
+
+        # Existing rules
+        self.print_existing_rules(snapshot.existing_rules)
+
+        # Existing rule chain cost
+        self.print_rule_chain(snapshot.rule_chain)
+
+        # Simulated rule chain (existing + proposed)
+        self.print_rule_simulation(snapshot.rule_simulation)
+
+        # Regex cache rules next to their exact-match replacements (--convert-rules)
+        self.print_rule_conversion(report.section('rule_conversion'))
+
+        # Cache rule recommendations
+        self.print_recommendations(report.section('cache_rules'))
+
+        # Predicted cache behaviour for candidate TTLs and sizes
+        self.print_cache_simulation(snapshot.cache_model, top_queries)
+
+        # Near-duplicate digests consolidated into one rule per cluster (--cluster-digests)
+        self.print_digest_clusters(report.section('digest_clusters'))
+
+        # Writer-served SELECTs that could go to the reader hostgroups (--routing)
+        self.print_routing(report.section('routing'))
+
+        # Connection pool recommendations
+        self.print_pool_recommendations(report.recommendations('pool_tuning'))
+
+        # Free connection recommendations
+        self.print_connection_pool_analysis(report.recommendations('free_connection_tuning'))
+
+        # Memory recommendations
+        self.print_memory_recommendations(report.recommendations('memory_tuning'))
+
+    def capture_snapshot(self, path: str, compresslevel: int = 6):
+        """Dump every table the collectors read into one compressed snapshot file
+
+        Single pass and raw: each table is streamed with SELECT * straight into
+        a gzip'd JSON-lines file (header record, then per table a column record,
+        row arrays and an end record), with no analysis on the production box.
+        Replay it anywhere with --from-snapshot.
+        """
+        self.print_header()
+
+        if not self.connect():
+            print("✗  Failed to connect to ProxySQL admin interface")
+            sys.exit(1)
+
+        started = time.monotonic()
+        try:
+            header = {
+                'format': SNAPSHOT_FORMAT,
+                'version': SNAPSHOT_VERSION,
+                'captured_at': time.time(),
+                'host': self.host,
+                'port': self.port,
+                'proxysql_version': self.get_proxysql_version(),
+                'analyzer_version': self.VERSION,
+            }
+            with gzip.open(path, 'wt', encoding='utf-8', compresslevel=compresslevel) as f:
+                f.write(json.dumps(header) + "\n")
+                for table in SNAPSHOT_TABLES:
+                    columns: List[str] = []
+                    row_count = 0
+                    for row in self.iterate_query(f"SELECT * FROM {table}", columns=columns):
+                        if row_count == 0:
+                            f.write(json.dumps({'table': table, 'columns': columns}) + "\n")
+                        f.write(json.dumps(row, default=str) + "\n")
+                        row_count += 1
+                    if row_count == 0 and columns:
+                        f.write(json.dumps({'table': table, 'columns': columns}) + "\n")
+                    if columns:
+                        f.write(json.dumps({'end': table, 'rows': row_count}) + "\n")
+                        print(f"✔  {table}: {row_count:,} rows")
+                    else:
+                        print(f"⚠  {table}: not captured")
+        finally:
+            self.close()
+
+        size_kb = os.path.getsize(path) / 1024
+        print(f"\n✔  Snapshot written to {path} ({size_kb:,.1f} KB in {time.monotonic() - started:.2f}s)")
+        print(f"ℹ  Analyze offline with: uv run proxysql_report.py --from-snapshot {path}\n")
+
+    def write_workload(self, path: str, top_n: int = 20, keys: int = 100):
+        """Write the top digests by executions as a replayable workload file
+
+        The digest table is streamed once, summed per digest text (users,
+        schemas and hostgroups merged; query cache hits count towards the mix
+        but not towards the backend time) and the top_n replayable statements
+        are kept with their share of the executions, production rate, rows per
+        execution and placeholder kinds (workload_params). A .lua path gets a
+        sysbench script, anything else the JSON spec that proxysql_workload.py
+        and the emulator's --mysql-port --workload read.
+        """
         self.print_header()
 
         if not self.connect():
             print("✗  Failed to connect to ProxySQL admin interface")
             sys.exit(1)
 
+        top: List[Tuple] = []   # min-heap of (count_star, digest_text, ...) - the top_n so far
+        executions = skipped = 0
+        first_seen, last_seen = None, 0
+        schemas: Dict[str, int] = {}
+        try:
+            proxysql_version = self.get_proxysql_version()
+            for row in self.iterate_query(self.WORKLOAD_QUERY):
+                text, digest, count_star, backend_count, backend_time, rows_sent, first, last, schemaname = row
+                count_star = int(count_star or 0)
+                if not count_star:
+                    continue
+                executions += count_star
+                first_seen = int(first) if first_seen is None else min(first_seen, int(first))
+                last_seen = max(last_seen, int(last))
+                if (text.split(None, 1) or [''])[0].upper() not in WORKLOAD_STATEMENTS:
+                    skipped += 1
+                    continue
+                schemas[schemaname] = schemas.get(schemaname, 0) + count_star
+                entry = (count_star, text, digest, int(backend_count or 0), int(backend_time or 0),
+                         int(rows_sent or 0))
+                if len(top) < top_n:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+        finally:
+            self.close()
+
+        if not top:
+            print("⚠  No replayable digests in stats_mysql_query_digest - nothing written\n")
+            return
+
+        window = max(1, last_seen - (first_seen or last_seen))
+        covered = sum(entry[0] for entry in top)
+        digests = []
+        for count_star, text, digest, backend_count, backend_time, rows_sent in sorted(top, reverse=True):
+            sql = WORKLOAD_GROUPED_RE.sub('', text)
+            digests.append(WorkloadDigest(
+                digest=digest, digest_text=text, sql=sql, params=workload_params(sql),
+                weight=round(count_star / covered, 6), count_star=count_star, qps=round(count_star / window, 3),
+                avg_time_us=round(backend_time / backend_count, 1) if backend_count else 0.0,
+                rows_per_exec=round(rows_sent / count_star, 2), read_only=digest_is_read_only(text)))
+        spec = {
+            'format': WORKLOAD_FORMAT,
+            'version': WORKLOAD_VERSION,
+            'generated_at': time.time(),
+            'source': self.snapshot or f"{self.host}:{self.port}",
+            'proxysql_version': proxysql_version,
+            'window_s': window,
+            'executions': executions,
+            'coverage_pct': round(covered / executions * 100, 2),
+            'qps': round(covered / window, 3),
+            'keys': keys,
+            'schemaname': max(schemas, key=schemas.get),
+            'limit': WORKLOAD_LIMIT,
+            'time_base': WORKLOAD_TIME_BASE,
+            'digests': [asdict(d) for d in digests],
+        }
+        lua = path.endswith('.lua')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.workload_lua(spec, path) if lua else json.dumps(spec, indent=1) + "\n")
+
+        print("-------- Workload Mix " + "-" * 68)
+        print(f"{'Share':<8}{'Prod q/s':<11}{'Avg(μs)':<10}{'Rows':<7}{'Params':<8}{'Query Pattern'}")
+        print("-" * 90)
+        for d in digests[:10]:
+            query_text = d.sql[:44] + ".." if len(d.sql) > 46 else d.sql
+            print(f"{d.weight * 100:<8.1f}{d.qps:<11,.1f}{d.avg_time_us:<10.1f}{d.rows_per_exec:<7.1f}"
+                  f"{len(d.params):<8}{query_text}")
+        if len(digests) > 10:
+            print(f"... {len(digests) - 10} more")
+        print()
+        kind = "sysbench script" if lua else "workload"
+        print(f"✔  {kind.capitalize()} written to {path}: {len(digests)} digests, {spec['coverage_pct']:.1f}% of "
+              f"{executions:,} executions ({spec['qps']:,.1f} q/s over {window:,}s of digest stats)")
+        if skipped:
+            print(f"ℹ  {skipped:,} digests left out: only {' / '.join(WORKLOAD_STATEMENTS)} statements are replayed")
+        if len(digests) == top_n and spec['coverage_pct'] < 80:
+            print(f"💡 The mix covers {spec['coverage_pct']:.1f}% of executions - raise --top for a closer match")
+        if lua:
+            print(f"ℹ  Replay with: sysbench {path} --mysql-host=127.0.0.1 --mysql-port=6033 --mysql-user=USER "
+                  f"--mysql-password=PASS --mysql-db={spec['schemaname']} --threads=8 --time=60 "
+                  f"--rate={max(1, round(spec['qps']))} run\n")
+        else:
+            print(f"ℹ  Replay with: uv run proxysql_workload.py --workload {path} --host 127.0.0.1 --port 6033 "
+                  f"--user USER --password PASS --qps {max(1, round(spec['qps']))} --duration 60\n")
+
+    @staticmethod
+    def workload_lua(spec: Dict, path: str) -> str:
+        """A --workload spec as a sysbench Lua script (same mix and placeholder values as proxysql_workload.py)"""
+        entries = []
+        for d in spec['digests']:
+            level = 0
+            while f"]{'=' * level}]" in d['sql']:
+                level += 1
+            params = ', '.join(f'"{kind}"' for kind in d['params'])
+            entries.append(f"  {{weight = {d['weight']:.6f}, params = {{{params}}}, "
+                           f"sql = [{'=' * level}[{d['sql']}]{'=' * level}]}},")
+        generated = datetime.fromtimestamp(spec['generated_at']).strftime('%Y-%m-%d %H:%M:%S')
+        return f"""-- sysbench workload written by proxysql_report.py --workload from {spec['source']} on {generated}
+-- {len(spec['digests'])} digests, {spec['coverage_pct']:.1f}% of {spec['executions']:,} executions \
+({spec['qps']:,.1f} q/s in production)
+--
+-- sysbench {os.path.basename(path)} --mysql-host=127.0.0.1 --mysql-port=6033 --mysql-user=USER \\
+--   --mysql-password=PASS --mysql-db={spec['schemaname']} --threads=8 --time=60 --rate={max(1, round(spec['qps']))} run
+
+-- Distinct values per placeholder set (--cache-keys), the value of every LIMIT /
+-- OFFSET placeholder and the first datetime of the time placeholders (epoch)
+local KEYS = {spec['keys']}
+local LIMIT = {spec['limit']}
+local TIME_BASE = {spec['time_base']}
+
+local digests = {{
+{chr(10).join(entries)}
+}}
+
+local cumulative, total = {{}}, 0
+for i, d in ipairs(digests) do
+  total = total + d.weight
+  cumulative[i] = total
+end
+
+-- Execution `key` of a digest: its n-th placeholder gets value key + n - 1
+local function render(d, key)
+  local i = 0
+  return (string.gsub(d.sql, "%?", function()
+    local kind, n = d.params[i + 1], key + i
+    i = i + 1
+    if kind == "limit" then return tostring(LIMIT) end
+    if kind == "string" then return "'v" .. n .. "'" end
+    if kind == "time" then return os.date("!'%Y-%m-%d %H:%M:%S'", TIME_BASE + n * 60) end
+    return tostring(n)
+  end))
+end
+
+function thread_init()
+  drv = sysbench.sql.driver()
+  con = drv:connect()
+end
+
+function thread_done()
+  con:disconnect()
+end
+
+function event()
+  local r = sysbench.rand.uniform_double() * total
+  local lo, hi = 1, #cumulative
+  while lo < hi do
+    local mid = math.floor((lo + hi) / 2)
+    if cumulative[mid] < r then lo = mid + 1 else hi = mid end
+  end
+  con:query(render(digests[lo], sysbench.rand.uniform(1, KEYS)))
+end
+"""
+
+    def take_watch_sample(self) -> WatchSample:
+        """Read the cumulative counters that watch mode turns into rates
+
+        stats_mysql_query_digest is read incrementally: after the first
+        (baseline) read only rows whose last_seen is at or after the newest
+        last_seen already seen are fetched, so each tick transfers just the
+        digests that actually ran instead of the whole table. The high-water
+        mark comes from ProxySQL's own clock, so client clock skew is harmless.
+
+        All statements of a tick (plus the memory metrics when history is
+        recorded) go out as one multi-statement round trip.
+        """
+        if self._digest_last_seen:
+            digest_query = f"""
+            SELECT hostgroup, schemaname, username, client_address, digest,
+                   count_star, sum_time, last_seen, digest_text
+            FROM stats_mysql_query_digest
+            WHERE last_seen >= {self._digest_last_seen}
+            """
+        else:
+            # Baseline: every row's counters, but no digest_text
+            digest_query = """
+            SELECT hostgroup, schemaname, username, client_address, digest,
+                   count_star, sum_time, last_seen, NULL
+            FROM stats_mysql_query_digest
+            """
+        global_query = "SELECT Variable_name, Variable_Value FROM stats_mysql_global"
+        pool_query = "SELECT hostgroup, srv_host, srv_port, Queries, ConnOK, ConnERR FROM stats_mysql_connection_pool"
+        queries = [global_query, pool_query, digest_query]
+        if self.history is not None:
+            queries.append(self.MEMORY_QUERY)
+
+        with self.prefetch(queries):
+            global_rows = self.execute_query(global_query)
+            pool_rows = self.execute_query(pool_query)
+            digest_rows = self.execute_query(digest_query)
+            memory = self.get_memory_metrics() if self.history is not None else None
+        cache_rows = [row for row in global_rows if str(row[0]).startswith('Query_Cache')]
+
+        pool_counters = {}
+        for row in pool_rows:
+            key = (int(row[0]) if str(row[0]).isdigit() else 0, str(row[1]),
+                   int(row[2]) if str(row[2]).isdigit() else 0)
+            pool_counters[key] = tuple(int(v) if str(v).isdigit() else 0 for v in row[3:6])
+
+        digest_counters = {}
+        digest_texts = {}
+        for row in digest_rows:
+            key = tuple(str(v) for v in row[:5])
+            digest_counters[key] = (int(row[5]) if str(row[5]).isdigit() else 0,
+                                    int(row[6]) if str(row[6]).isdigit() else 0)
+            last_seen = int(row[7]) if str(row[7]).isdigit() else 0
+            self._digest_last_seen = max(self._digest_last_seen, last_seen)
+            if row[8] is not None:
+                digest_texts[key[4]] = str(row[8])
+
+        return WatchSample(
+            taken_at=time.monotonic(),
+            cache_stats=self._parse_cache_stats(cache_rows),
+            global_stats=self._parse_global_stats(global_rows),
+            pool_counters=pool_counters,
+            digest_counters=digest_counters,
+            digest_texts=digest_texts,
+            memory=memory
+        )
+
+    def compute_watch_rates(self, previous: WatchSample, current: WatchSample) -> WatchRates:
+        """Turn two consecutive samples into per-second rates"""
+        interval = max(current.taken_at - previous.taken_at, 1e-6)
+        prev_cache, cur_cache = previous.cache_stats, current.cache_stats
+        prev_global, cur_global = previous.global_stats, current.global_stats
+
+        rates = WatchRates(
+            interval_s=interval,
+            questions_per_sec=counter_delta(cur_global.queries_total, prev_global.queries_total) / interval,
+            slow_queries_per_sec=counter_delta(cur_global.slow_queries, prev_global.slow_queries) / interval,
+            cache_gets_per_sec=counter_delta(cur_cache.count_get, prev_cache.count_get) / interval,
+            cache_hits_per_sec=counter_delta(cur_cache.count_get_ok, prev_cache.count_get_ok) / interval,
+            cache_sets_per_sec=counter_delta(cur_cache.count_set, prev_cache.count_set) / interval,
+            cache_purged_per_sec=counter_delta(cur_cache.purged, prev_cache.purged) / interval,
+            client_connections=cur_global.client_connections_connected
+        )
+
+        for key, (queries, conn_ok, conn_err) in sorted(current.pool_counters.items()):
+            prev_queries, prev_ok, prev_err = previous.pool_counters.get(key, (0, 0, 0))
+            rates.backends.append(BackendRate(
+                hostgroup=key[0],
+                srv_host=key[1],
+                srv_port=key[2],
+                queries_per_sec=counter_delta(queries, prev_queries) / interval,
+                conn_ok_per_sec=counter_delta(conn_ok, prev_ok) / interval,
+                conn_err_per_sec=counter_delta(conn_err, prev_err) / interval
+            ))
+
+        # Digest rows are keyed per hostgroup/user/schema; report per digest hash
+        by_digest: Dict[str, List[int]] = {}
+        for key, (count_star, sum_time) in current.digest_counters.items():
+            prev_count, prev_time = self._digest_baseline.get(key, (0, 0))
+            executions = counter_delta(count_star, prev_count)
+            if executions <= 0:
+                continue
+            totals = by_digest.setdefault(key[4], [0, 0])
+            totals[0] += executions
+            totals[1] += counter_delta(sum_time, prev_time)
+
+        rates.digests = [
+            DigestRate(digest=digest, digest_text=current.digest_texts.get(digest, digest),
+                       executions=executions, time_us=time_us, interval_s=interval)
+            for digest, (executions, time_us) in by_digest.items()
+        ]
+        rates.digests.sort(key=lambda d: d.executions, reverse=True)
+        return rates
+
+    def _advance_digest_baseline(self, sample: WatchSample):
+        """Fold a sample's digest counters into the baseline for the next tick"""
+        self._digest_baseline.update(sample.digest_counters)
+
+    def print_watch_rates(self, rates: WatchRates, top_n: int = 20):
+        """Print one watch tick"""
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        print(f"-------- Watch {timestamp} (interval {rates.interval_s:.1f}s) " + "-" * 52)
+        print(f"Questions/s: {rates.questions_per_sec:,.1f}  Slow/s: {rates.slow_queries_per_sec:,.2f}  "
+              f"Client_Connections_connected: {rates.client_connections:,}")
+        print(f"Query_Cache GET/s: {rates.cache_gets_per_sec:,.1f}  Hit_Rate (interval): {rates.cache_hit_rate:.1f}%  "
+              f"SET/s: {rates.cache_sets_per_sec:,.1f}  Purged/s: {rates.cache_purged_per_sec:,.1f}")
+        print()
+
+        if rates.backends:
+            print(f"{'Hostgroup':<12}{'Server':<24}{'Queries/s':<14}{'ConnOK/s':<12}{'ConnERR/s':<12}")
+            print("-" * 74)
+            for backend in rates.backends:
+                server = f"{backend.srv_host}:{backend.srv_port}"
+                marker = "  ✗" if backend.conn_err_per_sec > 0 else ""
+                print(f"{backend.hostgroup:<12}{server:<24}{backend.queries_per_sec:<14,.1f}"
+                      f"{backend.conn_ok_per_sec:<12,.2f}{backend.conn_err_per_sec:<12,.2f}{marker}")
+            print()
+
+        if rates.digests:
+            print(f"{'Rank':<6}{'Query Pattern':<50}{'QPS':<12}{'Avg(μs)':<12}")
+            print("-" * 80)
+            for idx, digest in enumerate(rates.digests[:top_n], 1):
+                query_text = digest.digest_text[:48] + ".." if len(digest.digest_text) > 50 else digest.digest_text
+                print(f"{idx:<6}{query_text:<50}{digest.qps:<12,.1f}{digest.avg_time:<12,.1f}")
+            print()
+
+    def history_points(self, snapshot: AnalysisSnapshot) -> Dict[str, float]:
+        """Pool, cache, global and memory metrics of one collection pass, by series name"""
+        points: Dict[str, float] = {}
+        for pool in snapshot.pool_stats:
+            labels = f"{{hostgroup={pool.hostgroup},server={pool.srv_host}:{pool.srv_port}}}"
+            points[f"pool.efficiency_score{labels}"] = pool.efficiency_score
+            points[f"pool.utilization_pct{labels}"] = pool.pool_utilization
+            points[f"pool.success_rate_pct{labels}"] = pool.connection_success_rate
+            points[f"pool.latency_ms{labels}"] = pool.avg_latency_ms
+        cache = snapshot.cache_stats
+        points['cache.hit_rate_pct'] = cache.hit_rate
+        points['cache.memory_bytes'] = cache.memory_bytes
+        points['cache.entries'] = cache.entries
+        points['cache.purged'] = cache.purged
+        stats = snapshot.global_stats
+        points['global.multiplexing_ratio'] = stats.multiplexing_ratio
+        points['global.client_connections'] = stats.client_connections_connected
+        points['global.questions'] = stats.queries_total
+        points['global.slow_query_rate_pct'] = stats.slow_query_rate
+        points.update(self._memory_points(snapshot.memory_metrics))
+        points['free.connections'] = snapshot.free_conns.total_free
+        points['free.stale'] = snapshot.free_conns.total_stale
+        return points
+
+    def _memory_points(self, memory: MemoryMetrics) -> Dict[str, float]:
+        return {
+            'memory.jemalloc_resident_bytes': memory.jemalloc_resident,
+            'memory.jemalloc_allocated_bytes': memory.jemalloc_allocated,
+            'memory.query_digest_bytes': memory.query_digest_memory,
+            'memory.overhead_pct': memory.memory_overhead_pct,
+        }
+
+    def watch_history_points(self, rates: WatchRates, sample: WatchSample) -> Dict[str, float]:
+        """Interval rates and gauges of one watch tick, by series name"""
+        points = {
+            'global.questions_per_sec': rates.questions_per_sec,
+            'global.slow_queries_per_sec': rates.slow_queries_per_sec,
+            'global.client_connections': rates.client_connections,
+            'global.multiplexing_ratio': sample.global_stats.multiplexing_ratio,
+            'cache.gets_per_sec': rates.cache_gets_per_sec,
+            'cache.interval_hit_rate_pct': rates.cache_hit_rate,
+            'cache.purged_per_sec': rates.cache_purged_per_sec,
+            'cache.memory_bytes': sample.cache_stats.memory_bytes,
+            'cache.entries': sample.cache_stats.entries,
+        }
+        for backend in rates.backends:
+            labels = f"{{hostgroup={backend.hostgroup},server={backend.srv_host}:{backend.srv_port}}}"
+            points[f"pool.queries_per_sec{labels}"] = backend.queries_per_sec
+            points[f"pool.conn_err_per_sec{labels}"] = backend.conn_err_per_sec
+        return points
+
+    def record_history(self, points: Dict[str, float]):
+        """Write one sample to the history store (snapshot replays keep their capture time)"""
+        if self.history is None:
+            return
+        ts = self.snapshot_info.get('captured_at') if self.snapshot else None
         try:
-            # Connection info
-            version = self.get_proxysql_version()
-            self.print_connection_info(version)
+            self.history.record(points, ts=ts)
+        except sqlite3.Error as e:
+            print(f"⚠  History write failed: {e}")
+
+    def print_trend(self, window: int, match: Optional[str] = None, width: int = 30):
+        """Print start/end/min/max, a sparkline and the biggest step for every stored series"""
+        store = self.history
+        table = store.resolution(window)
+        since = int(time.time()) - window
+        label = {'raw': 'raw samples', 'minute': '1-minute averages', 'hour': '1-hour averages'}[table]
+        print(f"-------- Trend: last {self._format_window(window)} ({label}) " + "-" * 40)
+        print(f"{'Metric':<58}{'Start':>12}{'End':>12}{'Min':>12}{'Max':>12}  {'Trend':<{width}}  Biggest step")
+        print("-" * (130 + width))
+
+        shown = 0
+        blocks = '▁▂▃▄▅▆▇█'
+        for name in store.series_names():
+            if match and match not in name:
+                continue
+            rows = store.query(name, since, table)
+            if not rows:
+                continue
+            # Re-bucket to the sparkline width
+            span = max(1, rows[-1][0] - rows[0][0] + 1)
+            buckets: List[List[float]] = [[] for _ in range(width)]
+            for ts, avg, _, _ in rows:
+                buckets[min(width - 1, (ts - rows[0][0]) * width // span)].append(avg)
+            series = [(rows[0][0] + i * span // width, sum(b) / len(b)) for i, b in enumerate(buckets) if b]
+            low = min(r[2] for r in rows)
+            high = max(r[3] for r in rows)
+            values = [v for _, v in series]
+            spread = (max(values) - min(values)) or 1.0
+            spark = ''.join(blocks[int((v - min(values)) / spread * (len(blocks) - 1))] for v in values)
+
+            step = ''
+            if len(series) > 1:
+                index = max(range(1, len(series)), key=lambda i: abs(series[i][1] - series[i - 1][1]))
+                delta = series[index][1] - series[index - 1][1]
+                if delta:
+                    when = datetime.fromtimestamp(series[index][0]).strftime('%m-%d %H:%M')
+                    step = f"{'+' if delta > 0 else ''}{delta:,.4g} at {when}"
+            display = name if len(name) <= 56 else name[:54] + '..'
+            print(f"{display:<58}{values[0]:>12,.4g}{values[-1]:>12,.4g}{low:>12,.4g}{high:>12,.4g}  "
+                  f"{spark:<{width}}  {step}")
+            shown += 1
+
+        if not shown:
+            print(f"ℹ  No history in the last {self._format_window(window)}"
+                  + (f" matching '{match}'" if match else ''))
+        print()
+        size_mb = store.size_bytes() / (1024 * 1024)
+        print(f"ℹ  History store: {store.path} ({size_mb:.1f} MB of {store.max_bytes / (1024 * 1024):g} MB cap, "
+              f"{len(store.series_names())} series)")
+        print()
+
+    @staticmethod
+    def _format_window(seconds: int) -> str:
+        for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+            if seconds >= size and seconds % size == 0:
+                return f"{seconds // size}{unit}"
+        return f"{seconds}s"
 
-            # Query digest analysis
-            all_queries = self.get_query_digest(limit=200)
-            top_queries = self.print_top_queries(all_queries, top_n=top_n)
+    def run_exporter(self, listen: str, max_age: float = 10.0, scrape_budget: float = 5.0,
+                     digest_interval: float = 300.0, top_n: int = 20, rank_by: str = 'cache_score'):
+        """Serve derived metrics over HTTP in OpenMetrics format until Ctrl+C"""
+        self.print_header()
 
-            # Cache statistics
-            cache_stats = self.get_cache_stats()
-            self.print_cache_stats(cache_stats)
+        if not self.connect():
+            print("✗  Failed to connect to ProxySQL admin interface")
+            sys.exit(1)
 
-            # Extended connection pool efficiency
-            pool_stats = self.get_extended_connection_pool_stats()
-            self.print_connection_pool_efficiency(pool_stats)
+        host, _, port = listen.rpartition(':')
+        exporter = MetricsExporter(self, max_age=max_age, scrape_budget=scrape_budget,
+                                   digest_interval=digest_interval, top_n=top_n, rank_by=rank_by)
+        try:
+            server = exporter.serve(host or '0.0.0.0', int(port))
+        except (OSError, ValueError) as e:
+            print(f"✗  Cannot listen on {listen}: {e}")
+            self.close()
+            sys.exit(1)
 
-            # Global performance metrics
-            global_stats = self.get_global_stats()
-            self.print_global_performance(global_stats)
+        exporter.schedule()   # first pass and digest ranking before the first scrape arrives
+        print(f"✔  Serving OpenMetrics on http://{host or '0.0.0.0'}:{port}/metrics "
+              f"(max age {max_age:g}s, scrape budget {scrape_budget:g}s, digests every {digest_interval:g}s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nℹ  Exporter stopped")
+        finally:
+            server.server_close()
+            exporter.shutdown()
+            self.close()
 
-            # Backend health checks
-            ping_checks, connect_checks = self.get_health_checks()
-            self.print_health_checks(ping_checks, connect_checks)
+    def run_fleet(self, endpoints: List[str], concurrency: int = 8, node_timeout: float = 30.0,
+                  top_n: int = 20, rank_by: str = 'cache_score', free_conn_details: int = 0,
+                  simulate_rules: bool = False, rule_chain: bool = False, cache_sim: bool = False,
+                  cache_keys: int = 100, cluster: bool = False, convert_rules: bool = False):
+        """Analyze many ProxySQL nodes concurrently and report their merged, cluster-wide workload"""
+        with self.diagnostics():
+            if self.report_format == 'text':
+                self.print_header()
+
+            fleet = FleetCollector(self, endpoints, concurrency=concurrency, node_timeout=node_timeout)
+            fleet.collect(free_conn_details=free_conn_details, rules=simulate_rules or rule_chain or convert_rules,
+                          rule_hits=rule_chain)
+            snapshot = fleet.merge(top_n=top_n, rank_by=rank_by, simulate_rules=simulate_rules,
+                                   rule_chain=rule_chain, cache_sim=cache_sim, cache_keys=cache_keys,
+                                   free_conn_details=free_conn_details, cluster=cluster,
+                                   convert_rules=convert_rules)
+            if snapshot is None:
+                for node in fleet.nodes:
+                    print(f"✗  {node.endpoint}: {node.error}")
+                print("✗  No fleet node could be collected")
+                sys.exit(1)
+
+            self.record_history(self.history_points(snapshot))
+            report = self.build_report(snapshot, top_n=top_n, rank_by=rank_by)
+        self.render_report(report, top_n=top_n)
+
+    def run_watch(self, interval: float, top_n: int = 20, count: Optional[int] = None):
+        """Continuously report per-second rates from one long-lived admin session
+
+        count limits the number of reported intervals (None = until Ctrl+C).
+        """
+        self.print_header()
 
-            # Free connection analysis
-            free_conns = self.get_free_connections()
-            self.print_free_connections(free_conns)
+        if not self.connect():
+            print("✗  Failed to connect to ProxySQL admin interface")
+            sys.exit(1)
 
-            # Memory metrics
-            memory_metrics = self.get_memory_metrics()
-            self.print_memory_metrics(memory_metrics)
+        print(f"ℹ  Watching every {interval:g}s (Ctrl+C to stop)\n")
+        reported = 0
+        try:
+            previous = self.take_watch_sample()
+            counters = self.admin_counters()
+            self._advance_digest_baseline(previous)
+            while count is None or reported < count:
+                time.sleep(max(0.0, interval - (time.monotonic() - previous.taken_at)))
+                current = self.take_watch_sample()
+                if self.connection_lost:
+                    # An empty sample would read as a restart and then a huge jump
+                    print("⚠  Admin connection lost - skipping this interval\n")
+                    time.sleep(interval)
+                    continue
+
+                if current.global_stats.uptime_seconds < previous.global_stats.uptime_seconds:
+                    # ProxySQL restarted: every counter starts over
+                    print("⚠  ProxySQL uptime went backwards (restart?) - resetting baseline\n")
+                    self._digest_baseline.clear()
+                    self._digest_last_seen = 0
+                    current = self.take_watch_sample()
+                else:
+                    rates = self.compute_watch_rates(previous, current)
+                    self.print_watch_rates(rates, top_n=top_n)
+                    tick = [now - before for now, before in zip(self.admin_counters(), counters)]
+                    print(f"ℹ  Admin round trips: {tick[1]} ({tick[0]} statements, {tick[2]} reconnects)\n")
+                    if self.history is not None:
+                        points = self.watch_history_points(rates, current)
+                        points.update(self._memory_points(current.memory))
+                        self.record_history(points)
+                    reported += 1
+
+                self._advance_digest_baseline(current)
+                previous = current
+                counters = self.admin_counters()
+        except KeyboardInterrupt:
+            print("\nℹ  Watch stopped")
+        finally:
+            self.close()
 
-            # Command counters
-            commands = self.get_command_counters()
-            self.print_command_counters(commands)
+    def apply_log(self, marker: str, message: str):
+        """Print one timestamped --apply step"""
+        print(f"{datetime.now().strftime('%H:%M:%S')} {marker}  {message}")
 
-            # Cache configuration
-            cache_config = self.get_cache_config()
-            self.print_cache_config(cache_config)
+    def canary_rules(self, snapshot: AnalysisSnapshot) -> List[QueryRule]:
+        """Proposed cache rules the simulation rates precise and cheap (✔ verdict)
 
-            # Monitor configuration
-            monitor_config = self.get_monitor_config()
-            self.print_monitor_config(monitor_config)
+        Every rule_id in mysql_query_rules, active or not, counts as taken.
+        """
+        taken = {rule.rule_id for rule in snapshot.query_rules}
+        return [stats.rule for stats in snapshot.rule_simulation.stats
+                if stats.rule.proposed and stats.verdict(taken).startswith('✔')]
 
-            # Existing rules
-            existing_rules = self.get_existing_cache_rules()
-            self.print_existing_rules(existing_rules)
+    def observe_window(self, window: CanaryWindow, seconds: float, interval: float,
+                       previous: WatchSample) -> WatchSample:
+        """Accumulate counter deltas into window for seconds, sampling every interval
 
-            # Cache rule recommendations
-            self.print_recommendations(top_queries, existing_rules)
+        Returns the last sample, the start of the next window.
+        """
+        self.apply_log('ℹ', f"Observing the {window.label} window for {seconds:g}s (sample every {interval:g}s)")
+        deadline = previous.taken_at + seconds
+        while time.monotonic() < deadline:
+            time.sleep(max(0.0, min(interval, deadline - time.monotonic())))
+            current = self.take_watch_sample()
+            if self.connection_lost:
+                self.apply_log('⚠', "Admin connection lost - skipping this sample")
+                continue
+            if current.global_stats.uptime_seconds < previous.global_stats.uptime_seconds:
+                window.restarted = True
+                self.apply_log('✗', "ProxySQL uptime went backwards (restart?) - ending the window")
+                return current
+            window.add(previous, current, self._digest_baseline)
+            self._advance_digest_baseline(current)
+            previous = current
+            self.apply_log('ℹ', f"{window.label} {window.seconds:.0f}s: backend {window.backend_qps:,.1f} q/s, "
+                                f"cache hit rate {window.hit_rate:.1f}%, connection errors {window.error_rate:.1f}%")
+        return previous
+
+    def rollback_rules(self, rules: List[QueryRule]) -> bool:
+        """Delete applied rules and reload the runtime; prints the SQL to run by hand on failure"""
+        statements = [f"DELETE FROM mysql_query_rules WHERE rule_id IN ({', '.join(str(r.rule_id) for r in rules)})",
+                      "LOAD MYSQL QUERY RULES TO RUNTIME"]
+        for statement in statements:
+            if not self.execute_admin(statement, retry=True):
+                self.apply_log('✗', "Rollback failed - run on the admin interface:")
+                for sql in statements:
+                    print(f"    {sql};")
+                return False
+            self.apply_log('✔', statement)
+        return True
+
+    def print_canary(self, rules: List[QueryRule], texts: Dict[str, str], before: CanaryWindow,
+                     after: CanaryWindow, outcome: CanaryOutcome):
+        """Print the before/after table of an --apply canary"""
+        print()
+        print("-------- Canary Result " + "-" * 77)
+        not_judged = "n/a"
+        rows = [
+            ("Backend queries/s", f"{before.backend_qps:,.1f}", f"{after.backend_qps:,.1f}",
+             f"{(after.backend_qps / before.backend_qps - 1) * 100:+.1f}%" if before.backend_qps > 0 else not_judged),
+            ("Backend queries per client query", f"{before.backend_share:.3f}", f"{after.backend_share:.3f}",
+             f"{outcome.offload_change_pct:+.1f}%" if outcome.offload_change_pct is not None else not_judged),
+            ("Query cache hit rate", f"{before.hit_rate:.1f}%", f"{after.hit_rate:.1f}%",
+             f"{outcome.hit_rate_change_pts:+.1f} pts"),
+            ("Backend latency (mix-adjusted)", "", "",
+             f"{outcome.latency_change_pct:+.1f}%" if outcome.latency_change_pct is not None else not_judged),
+            ("Backend connection error rate", f"{before.error_rate:.1f}%", f"{after.error_rate:.1f}%",
+             f"{outcome.error_rate_change_pts:+.1f} pts" if outcome.error_rate_change_pts is not None else not_judged),
+        ]
+        print(f"{'Metric':<40}{'Before':>14}{'After':>14}{'Change':>14}")
+        print("-" * 100)
+        for label, before_value, after_value, change in rows:
+            print(f"{label:<40}{before_value:>14}{after_value:>14}{change:>14}")
+        print()
 
-            # Connection pool recommendations
-            self.print_pool_recommendations(pool_stats, global_stats)
+        print(f"{'Rule':<8}{'Digest':<44}{'Before μs':>12}{'After μs':>12}{'Before/s':>10}{'Cached/s':>10}")
+        print("-" * 100)
+        for rule in rules:
+            digest = rule.source_digest or ''
+            text = texts.get(digest, digest)
+            text = f"{text[:41]}.." if len(text) > 43 else text
+            before_rate = before.digests.get(digest, (0, 0))[0] / before.seconds if before.seconds > 0 else 0.0
+            cached_rate = after.cached.get(digest, 0) / after.seconds if after.seconds > 0 else 0.0
+            print(f"{rule.rule_id:<8}{text:<44}{before.avg_time(digest):>12,.1f}{after.avg_time(digest):>12,.1f}"
+                  f"{before_rate:>10,.1f}{cached_rate:>10,.1f}")
+        print()
+        for regression in outcome.regressions:
+            print(f"✗  Worse: {regression}")
+        for benefit in outcome.benefits:
+            print(f"✔  Better: {benefit}")
+        if not outcome.regressions and not outcome.benefits:
+            print("ℹ  No measurable change")
+        print()
 
-            # Free connection recommendations
-            self.print_connection_pool_analysis(free_conns, pool_stats)
+    def run_apply(self, window: float = 60, interval: float = 10.0, top_n: int = 20,
+                  rank_by: str = 'cache_score', max_latency_pct: float = 10.0, max_error_pts: float = 2.0):
+        """Canary the proposed cache rules on the live proxy, then keep or roll them back
+
+        Only proposed rules the simulation rates precise and cheap are applied.
+        The counters are observed for window seconds before the rules are
+        loaded to runtime and for window seconds after. The rules are deleted
+        and the runtime reloaded when backend latency or connection errors got
+        worse, or when nothing measurably improved; SAVE MYSQL QUERY RULES TO
+        DISK only follows a measured benefit. Exit status 0: rules kept and
+        saved, or no proposed rule passed the simulation (nothing to apply),
+        2: rolled back, 1: a step failed (including no usable before window).
+        """
+        self.print_header()
 
-            # Memory recommendations
-            self.print_memory_recommendations(memory_metrics)
+        if not self.connect():
+            print("✗  Failed to connect to ProxySQL admin interface")
+            sys.exit(1)
 
+        try:
+            status = self._apply_canary(window, interval, top_n, rank_by, max_latency_pct, max_error_pts)
         finally:
             self.close()
+        sys.exit(status)
+
+    def _apply_canary(self, window: float, interval: float, top_n: int, rank_by: str,
+                      max_latency_pct: float, max_error_pts: float) -> int:
+        """The --apply steps; returns the exit status"""
+        self.apply_log('ℹ', f"Simulating the proposed cache rules for the top {top_n} queries")
+        snapshot = self.collect_metrics(top_n=top_n, rank_by=rank_by, simulate_rules=True)
+        rules = self.canary_rules(snapshot)
+        proposed = sum(1 for stats in snapshot.rule_simulation.stats if stats.rule.proposed)
+        if not rules:
+            self.apply_log('⚠', f"None of the {proposed} proposed cache rules is both precise and cheap "
+                                f"(see --simulate-rules) - nothing to apply")
+            return 0
+        self.apply_log('✔', f"{len(rules)} of {proposed} proposed cache rules pass the simulation: "
+                            f"{', '.join(str(rule.rule_id) for rule in rules)}")
+
+        try:
+            previous = self.take_watch_sample()
+            self._advance_digest_baseline(previous)
+            before = CanaryWindow('before')
+            previous = self.observe_window(before, window, interval, previous)
+        except KeyboardInterrupt:
+            print()
+            self.apply_log('ℹ', "Stopped before any rule was applied")
+            return 1
+        if before.restarted or not before.seconds:
+            self.apply_log('✗', "No usable before window - nothing applied")
+            return 1
+
+        applied: List[QueryRule] = []
+        try:
+            for rule in rules:
+                if not self.execute_admin(self.cache_rule_insert(rule)):
+                    self.apply_log('✗', f"INSERT of rule {rule.rule_id} failed - rolling back")
+                    if applied:
+                        self.rollback_rules(applied)
+                    return 1
+                applied.append(rule)
+                column, value = rule.match_column
+                self.apply_log('✔', f"INSERT rule {rule.rule_id}: {column} {value} (cache_ttl {rule.cache_ttl})")
+            if not self.execute_admin("LOAD MYSQL QUERY RULES TO RUNTIME", retry=True):
+                self.apply_log('✗', "LOAD MYSQL QUERY RULES TO RUNTIME failed - rolling back")
+                self.rollback_rules(applied)
+                return 1
+            self.apply_log('✔', f"LOAD MYSQL QUERY RULES TO RUNTIME ({len(applied)} new cache rules live)")
+
+            after = CanaryWindow('after')
+            self.observe_window(after, window, interval, previous)
+        except KeyboardInterrupt:
+            print()
+            self.apply_log('ℹ', "Interrupted - rolling back")
+            return 2 if self.rollback_rules(applied) else 1
+
+        outcome = before.judge(after, [rule.source_digest for rule in applied if rule.source_digest],
+                               max_latency_pct, max_error_pts)
+        self.print_canary(applied, {query.digest: query.digest_text for query in snapshot.queries},
+                          before, after, outcome)
+        if not outcome.keep:
+            reason = "regression" if outcome.regressions else "no measured benefit"
+            self.apply_log('✗' if outcome.regressions else 'ℹ', f"Rolling back ({reason})")
+            return 2 if self.rollback_rules(applied) else 1
+
+        if not self.execute_admin("SAVE MYSQL QUERY RULES TO DISK", retry=True):
+            self.apply_log('⚠', "Rules are live at runtime but not saved - run: SAVE MYSQL QUERY RULES TO DISK;")
+            return 1
+        self.apply_log('✔', f"SAVE MYSQL QUERY RULES TO DISK - kept rules "
+                            f"{', '.join(str(rule.rule_id) for rule in applied)}")
+        return 0
+
+
+class MetricsExporter:
+    """Long-lived OpenMetrics endpoint over one connected ProxySQLAnalyzer
+
+    Collection passes (everything but the digest table) run on a single
+    background thread, so at most one is ever in flight. A scrape reuses the
+    last pass while it is younger than max_age; otherwise it starts a pass (or
+    joins the one already running) and waits at most scrape_budget seconds
+    before answering from the previous pass, so a slow admin interface makes
+    scrapes stale rather than piling up collections. The digest table is
+    refreshed on its own thread and connection every digest_interval seconds
+    and never delays a scrape.
+    """
+
+    CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+    PREFIX = 'proxysql_report'
+
+    def __init__(self, analyzer: ProxySQLAnalyzer, max_age: float = 10.0, scrape_budget: float = 5.0,
+                 digest_interval: float = 300.0, top_n: int = 20, rank_by: str = 'cache_score'):
+        self.analyzer = analyzer
+        self.max_age = max_age
+        self.scrape_budget = scrape_budget
+        self.digest_interval = digest_interval
+        self.top_n = top_n
+        self.rank_by = rank_by
+        # Sequential passes on the main connection: no per-pass connection setup
+        analyzer.workers = 1
+
+        self._lock = threading.Lock()
+        self._collector = ThreadPoolExecutor(max_workers=1, thread_name_prefix='exporter-collect')
+        self._digest_collector = ThreadPoolExecutor(max_workers=1, thread_name_prefix='exporter-digests',
+                                                    initializer=analyzer._open_worker_connection)
+        self._pending: Optional[Future] = None
+        self._digest_pending: Optional[Future] = None
+
+        self.snapshot: Optional[AnalysisSnapshot] = None
+        self.up = False
+        self.collected_at = 0.0          # time.monotonic() of the last finished pass
+        self.collected_wall = 0.0
+        self.collection_seconds = 0.0
+        self.collections = 0
+        self.budget_exceeded = 0
+        self.digests: List[QueryDigest] = []
+        self.digests_at = float('-inf')  # time.monotonic() of the last digest refresh
+        self.digests_wall = 0.0
+        self.digest_seconds = 0.0
+
+    def _collect(self):
+        """One collection pass without the digest table (collector thread)"""
+        started = time.monotonic()
+        analyzer = self.analyzer
+        if analyzer.conn is None:
+            # A dropped connection is reconnected by the first statement that fails
+            try:
+                analyzer.conn = analyzer._open_connection()
+            except Error as e:
+                print(f"⚠  Reconnect failed: {e}")
+        snapshot = None
+        if not analyzer.connection_lost:
+            snapshot = analyzer.collect_metrics(include_digests=False)
+        up = not analyzer.connection_lost   # also False if the pass lost it for good
+        if not up:
+            snapshot = None
+        if snapshot is not None:
+            analyzer.record_history(analyzer.history_points(snapshot))
+        with self._lock:
+            self.up = up
+            if snapshot is not None:
+                self.snapshot = snapshot
+            self.collected_at = time.monotonic()
+            self.collected_wall = time.time()
+            self.collection_seconds = self.collected_at - started
+            self.collections += 1
+
+    def _refresh_digests(self):
+        """Re-rank the digest table (digest thread, own connection)"""
+        started = time.monotonic()
+        digests = self.analyzer.get_query_digest_topn(top_n=self.top_n, rank_by=self.rank_by)
+        with self._lock:
+            self.digests = digests
+            self.digests_at = time.monotonic()
+            self.digests_wall = time.time()
+            self.digest_seconds = self.digests_at - started
+
+    def schedule(self) -> Tuple[bool, Optional[Future]]:
+        """Start a collection pass and/or digest refresh if due; returns (fresh, pending pass)"""
+        with self._lock:
+            now = time.monotonic()
+            fresh = self.snapshot is not None and now - self.collected_at < self.max_age
+            if not fresh and (self._pending is None or self._pending.done()):
+                self._pending = self._collector.submit(self._collect)
+            if now - self.digests_at >= self.digest_interval and \
+                    (self._digest_pending is None or self._digest_pending.done()):
+                self.digests_at = now   # one refresh per interval even if it is slow
+                self._digest_pending = self._digest_collector.submit(self._refresh_digests)
+            return fresh, self._pending
+
+    def scrape(self) -> str:
+        """Metrics for one scrape, collecting first if the cached pass is too old"""
+        fresh, pending = self.schedule()
+        if not fresh:
+            try:
+                pending.result(timeout=self.scrape_budget)
+            except FutureTimeoutError:
+                with self._lock:
+                    self.budget_exceeded += 1
+        return self.render()
+
+    @staticmethod
+    def _labels(labels: Dict[str, object]) -> str:
+        if not labels:
+            return ''
+        escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+    def _family(self, lines: List[str], name: str, help_text: str, samples, metric_type: str = 'gauge',
+                unit: str = ''):
+        """Append one metric family; samples is a list of (labels, value)"""
+        name = f"{self.PREFIX}_{name}"
+        lines.append(f"# TYPE {name} {metric_type}")
+        if unit:
+            lines.append(f"# UNIT {name} {unit}")
+        lines.append(f"# HELP {name} {help_text}")
+        suffix = {'counter': '_total', 'info': '_info'}.get(metric_type, '')
+        for labels, value in samples:
+            value = str(value) if isinstance(value, int) else repr(float(value))
+            lines.append(f"{name}{suffix}{self._labels(labels)} {value}")
+
+    def render(self) -> str:
+        """OpenMetrics exposition of the cached pass"""
+        with self._lock:
+            snapshot, digests = self.snapshot, self.digests
+            up, collected_at, collected_wall = self.up, self.collected_at, self.collected_wall
+            collection_seconds, collections = self.collection_seconds, self.collections
+            budget_exceeded = self.budget_exceeded
+            digests_wall, digest_seconds = self.digests_wall, self.digest_seconds
+
+        lines: List[str] = []
+        family = functools.partial(self._family, lines)
+        family('up', 'Whether the last collection pass reached the admin interface', [({}, int(up))])
+        family('collection_duration_seconds', 'Duration of the last collection pass',
+               [({}, collection_seconds)], unit='seconds')
+        family('last_collection_timestamp_seconds', 'Unix time the last collection pass finished',
+               [({}, collected_wall)], unit='seconds')
+        family('data_age_seconds', 'Age of the collection pass served by this scrape',
+               [({}, time.monotonic() - collected_at if collections else 0.0)], unit='seconds')
+        family('collections', 'Collection passes run', [({}, collections)], metric_type='counter')
+        family('scrape_budget_exceeded', 'Scrapes answered from the previous pass because collection '
+               'exceeded the scrape budget', [({}, budget_exceeded)], metric_type='counter')
+        statements, round_trips, reconnects = self.analyzer.admin_counters()
+        family('admin_statements', 'Statements sent to the admin interface', [({}, statements)],
+               metric_type='counter')
+        family('admin_round_trips', 'Admin interface round trips (a batch of statements is one)',
+               [({}, round_trips)], metric_type='counter')
+        family('admin_reconnects', 'Transparent reconnects after a dropped admin connection',
+               [({}, reconnects)], metric_type='counter')
+
+        if snapshot is not None:
+            family('build', 'ProxySQL and analyzer versions',
+                   [({'proxysql_version': snapshot.version, 'analyzer_version': ProxySQLAnalyzer.VERSION}, 1)],
+                   metric_type='info')
+
+            pools = snapshot.pool_stats
+            pool_labels = lambda p: {'hostgroup': p.hostgroup, 'server': f"{p.srv_host}:{p.srv_port}"}
+            family('pool_efficiency_score', 'Connection pool efficiency score (0-100)',
+                   [(pool_labels(p), p.efficiency_score) for p in pools])
+            family('pool_utilization_percent', 'Used connections as a percentage of the pool',
+                   [(pool_labels(p), p.pool_utilization) for p in pools])
+            family('pool_connection_success_percent', 'Backend connection success rate',
+                   [(pool_labels(p), p.connection_success_rate) for p in pools])
+            family('pool_queries_per_connection', 'Queries per successful backend connection',
+                   [(pool_labels(p), p.queries_per_connection) for p in pools])
+            family('pool_latency_seconds', 'Backend latency', [(pool_labels(p), p.latency_us / 1e6) for p in pools],
+                   unit='seconds')
+
+            stats = snapshot.global_stats
+            family('multiplexing_ratio', 'Client connections per backend connection created',
+                   [({}, stats.multiplexing_ratio)])
+            family('slow_query_percent', 'Slow queries as a percentage of all queries', [({}, stats.slow_query_rate)])
+            family('client_connections', 'Connected client connections', [({}, stats.client_connections_connected)])
+            family('uptime_seconds', 'ProxySQL uptime', [({}, stats.uptime_seconds)], unit='seconds')
+
+            cache = snapshot.cache_stats
+            family('query_cache_hit_percent', 'Query cache GET hit rate', [({}, cache.hit_rate)])
+            family('query_cache_memory_bytes', 'Query cache memory', [({}, cache.memory_bytes)], unit='bytes')
+            family('query_cache_entries', 'Query cache entries', [({}, cache.entries)])
+
+            memory = snapshot.memory_metrics
+            family('memory_overhead_percent', 'jemalloc resident over allocated memory',
+                   [({}, memory.memory_overhead_pct)])
+            family('jemalloc_resident_bytes', 'jemalloc resident memory', [({}, memory.jemalloc_resident)],
+                   unit='bytes')
+
+            checks = snapshot.ping_checks + snapshot.connect_checks
+            check_labels = lambda c: {'type': c.check_type, 'hostname': c.hostname, 'port': c.port}
+            family('health_check_success_percent', 'Monitor check success rate over the last 5 minutes',
+                   [(check_labels(c), c.success_rate) for c in checks])
+            family('health_check_latency_seconds', 'Average monitor check time over the last 5 minutes',
+                   [(check_labels(c), c.avg_time_us / 1e6) for c in checks], unit='seconds')
+            family('health_check_latency_quantile_seconds',
+                   'Monitor check time quantiles over the last 5 minutes (successful checks)',
+                   [({**check_labels(c), 'quantile': label}, c.percentile_ms(q) / 1e3 if q < 1 else c.max_ms / 1e3)
+                    for c in checks for label, q in (('0.5', 0.5), ('0.95', 0.95), ('0.99', 0.99), ('1', 1.0))],
+                   unit='seconds')
+
+            free = snapshot.free_conns
+            family('free_connections', 'Idle backend connections in the pool',
+                   [({'hostgroup': hg}, count) for hg, count in sorted(free.connections_by_hostgroup.items())])
+            family('free_connections_stale', 'Free connections idle longer than 5 minutes', [({}, free.total_stale)])
+
+        if digests:
+            family('digest_refresh_timestamp_seconds', 'Unix time the digest ranking was refreshed',
+                   [({}, digests_wall)], unit='seconds')
+            family('digest_collection_duration_seconds', 'Duration of the last digest refresh',
+                   [({}, digest_seconds)], unit='seconds')
+            digest_labels = lambda q: {'hostgroup': q.hostgroup, 'digest': q.digest}
+            family('digest_cache_score', f'Cache worthiness score of the top {len(digests)} digests by {self.rank_by}',
+                   [(digest_labels(q), q.cache_score) for q in digests])
+            family('digest_avg_time_seconds', 'Average execution time of the top digests',
+                   [(digest_labels(q), q.avg_time / 1e6) for q in digests], unit='seconds')
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, host: str, port: int) -> ThreadingHTTPServer:
+        """HTTP server answering GET /metrics (not started)"""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404, 'Try /metrics')
+                    return
+                body = exporter.scrape().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', exporter.CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        return server
+
+    def shutdown(self):
+        """Stop the background collectors and close the digest connection"""
+        self._collector.shutdown(wait=False, cancel_futures=True)
+        self._digest_collector.shutdown(wait=False, cancel_futures=True)
+        self.analyzer._close_worker_connections()
+
+
+class FleetCollector:
+    """Collect many ProxySQL admin endpoints at once and merge them into one snapshot
+
+    Every endpoint gets its own ProxySQLAnalyzer (own collector threads and
+    connections) and at most `concurrency` nodes are collected at a time, so
+    wall time stays close to that of the slowest node rather than the sum of
+    all of them. A node still running node_timeout seconds after it started
+    has its connections dropped and is left out of the merge, like a node
+    that fails to connect.
+
+    Digest rows are merged by (hostgroup, schemaname, username, digest hash)
+    with counts and times summed, pools by (hostgroup, srv_host, srv_port)
+    and health checks by backend; cache, global, command and free connection
+    counters are summed. Rules and configuration come from the first node in
+    endpoint order that answered (the reference node); every node that
+    differs from it is reported as drift. Memory limits are per process, so
+    the memory sections show the node with the largest resident set and the
+    query cache memory/entries gauges the node with the fullest cache.
+    """
+
+    def __init__(self, analyzer: ProxySQLAnalyzer, endpoints: List[str], concurrency: int = 8,
+                 node_timeout: float = 30.0):
+        self.analyzer = analyzer
+        self.concurrency = max(1, concurrency)
+        self.node_timeout = node_timeout
+        self.nodes = [FleetNode(endpoint) for endpoint in endpoints]
+        self.seconds = 0.0
+        self._analyzers = {node.endpoint: self._node_analyzer(node.endpoint) for node in self.nodes}
+        self._lock = threading.Lock()
+
+    def _node_analyzer(self, endpoint: str) -> ProxySQLAnalyzer:
+        """Analyzer for one HOST[:PORT] endpoint (or --capture file), with the shared credentials"""
+        base = self.analyzer
+        if os.path.isfile(endpoint):
+            return ProxySQLAnalyzer(base.host, base.port, base.user, base.password, snapshot=endpoint)
+        host, sep, port = endpoint.rpartition(':')
+        if not sep:
+            host, port = endpoint, base.port
+        limit = max(1, int(self.node_timeout))
+        return ProxySQLAnalyzer(host, int(port), base.user, base.password, workers=base.workers,
+                                timeout=min(limit, base.timeout), read_timeout=limit)
+
+    def _collect_node(self, node: FleetNode, free_conn_details: int, rules: bool, rule_hits: bool):
+        """One node's collection pass (fleet thread)"""
+        analyzer = self._analyzers[node.endpoint]
+        with self._lock:
+            node.status, node.started = 'running', time.monotonic()
+        snapshot, hits, rules_age, error = None, {}, None, ''
+        try:
+            if analyzer.connect() and not analyzer.aborted:
+                snapshot = analyzer.collect_metrics(digest_rows=True, free_conn_details=free_conn_details)
+                if rules:
+                    snapshot.query_rules = analyzer.get_query_rules()
+                if rule_hits:
+                    hits = analyzer.get_query_rule_hits()
+                    rules_age = analyzer.get_rules_loaded_age()
+            else:
+                error = 'connection failed'
+        finally:
+            analyzer.close()
+        with self._lock:
+            if node.status != 'running':
+                return   # timed out meanwhile; whatever was read is incomplete
+            node.seconds = time.monotonic() - node.started
+            node.status, node.error = ('ok', '') if snapshot is not None else ('failed', error)
+            node.snapshot, node.rule_hits, node.rules_age = snapshot, hits, rules_age
+
+    def collect(self, free_conn_details: int = 0, rules: bool = False, rule_hits: bool = False) -> List[FleetNode]:
+        """Collect every node, enforcing node_timeout from the moment each node starts"""
+        started = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=min(self.concurrency, len(self.nodes)), thread_name_prefix='fleet')
+        futures = {pool.submit(self._collect_node, node, free_conn_details, rules, rule_hits): node
+                   for node in self.nodes}
+        pending = set(futures)
+        try:
+            while pending:
+                now = time.monotonic()
+                # Queued nodes have not started their clock yet: wake no later than a full timeout from now
+                deadline = min(futures[future].started + self.node_timeout if futures[future].started
+                               else now + self.node_timeout for future in pending)
+                done, pending = wait(pending, timeout=max(0.0, deadline - now), return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                now = time.monotonic()
+                with self._lock:
+                    for future in list(pending):
+                        node = futures[future]
+                        if node.status == 'running' and now - node.started >= self.node_timeout:
+                            node.status, node.seconds = 'timeout', now - node.started
+                            node.error = f'no answer within {self.node_timeout:g}s'
+                            self._analyzers[node.endpoint].abort()
+                            pending.discard(future)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.seconds = time.monotonic() - started
+        return self.nodes
+
+    def _merge_digests(self, nodes: List[FleetNode]) -> Tuple[List[QueryDigest], Dict[str, list]]:
+        """Merged digests plus per-hash [text, summed qps, rows sent, count, time] for the cache model"""
+        merged: Dict[Tuple, QueryDigest] = {}
+        loads: Dict[str, list] = {}
+        for node in nodes:
+            counts = node.digest_counts
+            for (hostgroup, schemaname, username, digest, digest_text, count_star, sum_time,
+                 min_time, max_time, rows_sent, first_seen, last_seen) in node.snapshot.digest_rows:
+                key = (hostgroup, schemaname, username, digest)
+                counts[key] = counts.get(key, 0) + count_star
+                entry = merged.get(key)
+                if entry is None:
+                    merged[key] = QueryDigest(hostgroup, schemaname, username, digest, digest_text,
+                                              count_star, sum_time, min_time, max_time)
+                else:
+                    entry.count_star += count_star
+                    entry.sum_time += sum_time
+                    entry.min_time = min(entry.min_time, min_time)
+                    entry.max_time = max(entry.max_time, max_time)
+                load = loads.setdefault(digest, [digest_text, 0.0, 0, 0, 0])
+                load[1] += count_star / max(1, last_seen - first_seen)
+                load[2] += rows_sent
+                load[3] += count_star
+                load[4] += sum_time
+            node.snapshot.digest_rows = []   # merged; drop the raw rows
+        return list(merged.values()), loads
+
+    @staticmethod
+    def _merge_pools(snapshots: List[AnalysisSnapshot]) -> List[ConnectionPoolStats]:
+        """Sum pool counters per backend; latency is the node average, status the worst seen"""
+        groups: Dict[Tuple, List[ConnectionPoolStats]] = {}
+        for snapshot in snapshots:
+            for pool in snapshot.pool_stats:
+                groups.setdefault((pool.hostgroup, pool.srv_host, pool.srv_port), []).append(pool)
+        return [
+            ConnectionPoolStats(
+                hostgroup=hostgroup, srv_host=srv_host, srv_port=srv_port,
+                status=next((p.status for p in group if p.status != 'ONLINE'), 'ONLINE'),
+                queries=sum(p.queries for p in group),
+                conn_used=sum(p.conn_used for p in group),
+                conn_free=sum(p.conn_free for p in group),
+                bytes_sent=sum(p.bytes_sent for p in group),
+                bytes_recv=sum(p.bytes_recv for p in group),
+                conn_ok=sum(p.conn_ok for p in group),
+                conn_err=sum(p.conn_err for p in group),
+                max_conn_used=sum(p.max_conn_used for p in group),
+                latency_us=int(sum(p.latency_us for p in group) / len(group))
+            )
+            for (hostgroup, srv_host, srv_port), group in groups.items()
+        ]
+
+    @staticmethod
+    def _merge_checks(check_lists: List[List[HealthCheckStats]]) -> List[HealthCheckStats]:
+        """Sum check counts per backend; average time is weighted by successful checks
+
+        The latency sketches are merged, so percentiles are cluster-wide.
+        """
+        groups: Dict[Tuple, List[HealthCheckStats]] = {}
+        for checks in check_lists:
+            for check in checks:
+                groups.setdefault((check.hostname, check.port), []).append(check)
+        merged = []
+        for (hostname, port), group in groups.items():
+            succeeded = [c.total_checks - c.failed_checks for c in group]
+            sketch = LatencySketch()
+            for check in group:
+                sketch.merge(check.sketch)
+            merged.append(HealthCheckStats(
+                check_type=group[0].check_type, hostname=hostname, port=port,
+                total_checks=sum(c.total_checks for c in group),
+                failed_checks=sum(c.failed_checks for c in group),
+                avg_time_us=int(sum(c.avg_time_us * n for c, n in zip(group, succeeded)) / max(1, sum(succeeded))),
+                last_error=next((c.last_error for c in group if c.last_error), None),
+                sketch=sketch
+            ))
+        return merged
+
+    @staticmethod
+    def _merge_free_connections(summaries: List[FreeConnectionSummary]) -> FreeConnectionSummary:
+        total = sum(s.total_free for s in summaries)
+        merged = FreeConnectionSummary(
+            total_free=total,
+            total_stale=sum(s.total_stale for s in summaries),
+            avg_idle_ms=sum(s.avg_idle_ms * s.total_free for s in summaries) / total if total else 0.0,
+            max_idle_ms=max(s.max_idle_ms for s in summaries)
+        )
+        for summary in summaries:
+            for hostgroup, count in summary.connections_by_hostgroup.items():
+                merged.connections_by_hostgroup[hostgroup] = merged.connections_by_hostgroup.get(hostgroup, 0) + count
+            for user, count in summary.connections_by_user.items():
+                merged.connections_by_user[user] = merged.connections_by_user.get(user, 0) + count
+        return merged
+
+    @staticmethod
+    def _merge_commands(snapshots: List[AnalysisSnapshot]) -> List[Tuple[str, int, int]]:
+        totals: Dict[str, List[int]] = {}
+        for snapshot in snapshots:
+            for command, count, time_us in snapshot.commands:
+                total = totals.setdefault(command, [0, 0])
+                total[0] += count
+                total[1] += time_us
+        return sorted(((command, count, time_us) for command, (count, time_us) in totals.items()),
+                      key=lambda row: row[1], reverse=True)[:10]
+
+    @staticmethod
+    def _drift(reference: FleetNode, nodes: List[FleetNode]) -> List[str]:
+        """Rules and cache/monitor variables that differ from the reference node"""
+        ref = reference.snapshot
+        ref_config = {**ref.cache_config, **ref.monitor_config}
+        drift = []
+        for node in nodes:
+            snapshot = node.snapshot
+            if snapshot.existing_rules != ref.existing_rules or snapshot.query_rules != ref.query_rules:
+                drift.append(f"{node.endpoint}: query rules differ from {reference.endpoint}")
+            config = {**snapshot.cache_config, **snapshot.monitor_config}
+            changed = sorted(name for name in config.keys() | ref_config.keys()
+                             if config.get(name) != ref_config.get(name))
+            if changed:
+                names = ', '.join(changed[:3]) + (f" (+{len(changed) - 3} more)" if len(changed) > 3 else '')
+                drift.append(f"{node.endpoint}: {names} differ from {reference.endpoint}")
+        return drift
+
+    @staticmethod
+    def _replay(digests: List[QueryDigest], rules: List[QueryRule], track_overlaps: bool = False,
+                record_matches: bool = False) -> RuleSimulator:
+        """Replay the merged digests through rules, aggregated across hostgroups like simulate_rules()"""
+        totals: Dict[Tuple[str, str, str, str], int] = {}
+        for query in digests:
+            key = (query.username, query.schemaname, query.digest, query.digest_text)
+            totals[key] = totals.get(key, 0) + query.count_star
+        simulator = RuleSimulator(rules, track_overlaps=track_overlaps, record_matches=record_matches)
+        for (username, schemaname, digest, digest_text), count in totals.items():
+            simulator.replay(username, schemaname, digest, digest_text, count)
+        return simulator
+
+    def merge(self, top_n: int = 20, rank_by: str = 'cache_score', simulate_rules: bool = False,
+              rule_chain: bool = False, cache_sim: bool = False, cache_keys: int = 100,
+              free_conn_details: int = 0, cluster: bool = False,
+              convert_rules: bool = False) -> Optional[AnalysisSnapshot]:
+        """One cluster-wide snapshot from every node that answered (None if none did)"""
+        nodes = [node for node in self.nodes if node.status == 'ok']
+        if not nodes:
+            return None
+        snapshots = [node.snapshot for node in nodes]
+        reference = nodes[0].snapshot
+
+        digests, loads = self._merge_digests(nodes)
+        queries = sorted((q for q in digests if q.count_star >= 10), key=lambda q: q.sum_time, reverse=True)
+        top_queries = self.analyzer.select_top_queries(queries, top_n=top_n, rank_by=rank_by)
+
+        global_stats = GlobalStats(**{f.name: sum(getattr(s.global_stats, f.name) for s in snapshots)
+                                      for f in fields(GlobalStats)})
+        global_stats.uptime_seconds = min(s.global_stats.uptime_seconds for s in snapshots)
+        memory_node = max(nodes, key=lambda node: node.snapshot.memory_metrics.jemalloc_resident)
+        cache_node = max(nodes, key=lambda node: node.snapshot.cache_stats.memory_bytes)
+        cache_stats = CacheStats(**{f.name: sum(getattr(s.cache_stats, f.name) for s in snapshots)
+                                    for f in fields(CacheStats)})
+        cache_stats.memory_bytes = cache_node.snapshot.cache_stats.memory_bytes
+        cache_stats.entries = cache_node.snapshot.cache_stats.entries
+        versions = list(dict.fromkeys(s.version for s in snapshots))
+
+        merged = AnalysisSnapshot(
+            version=versions[0] if len(versions) == 1 else 'mixed (' + ', '.join(versions) + ')',
+            queries=queries,
+            cache_stats=cache_stats,
+            pool_stats=self._merge_pools(snapshots),
+            global_stats=global_stats,
+            ping_checks=self._merge_checks([s.ping_checks for s in snapshots]),
+            connect_checks=self._merge_checks([s.connect_checks for s in snapshots]),
+            free_conns=self._merge_free_connections([s.free_conns for s in snapshots]),
+            memory_metrics=memory_node.snapshot.memory_metrics,
+            commands=self._merge_commands(snapshots),
+            cache_config=reference.cache_config,
+            monitor_config=reference.monitor_config,
+            existing_rules=reference.existing_rules,
+            topology=reference.topology,
+            free_conn_details=sorted((c for s in snapshots for c in s.free_conn_details),
+                                     key=lambda c: c.idle_ms, reverse=True)[:free_conn_details],
+            query_rules=reference.query_rules,
+            fleet=FleetSummary(self.nodes, seconds=self.seconds, memory_node=memory_node.endpoint,
+                               cache_node=cache_node.endpoint, drift=self._drift(nodes[0], nodes[1:]))
+        )
+
+        if simulate_rules:
+            proposed = self.analyzer.propose_cache_rules(top_queries, reference.existing_rules, reference.topology)
+            merged.rule_simulation = self._replay(digests, reference.query_rules + proposed)
+        if rule_chain:
+            hits: Dict[int, int] = {}
+            for node in nodes:
+                for rule_id, count in node.rule_hits.items():
+                    hits[rule_id] = hits.get(rule_id, 0) + count
+            # Each node's Questions scaled to its own hit window; unknown on any node, unknown overall
+            windows = [RuleChainProfile.window_queries(node.snapshot.global_stats, node.rules_age) for node in nodes]
+            known = None not in windows
+            merged.rule_chain = RuleChainProfile(reference.query_rules, hits, sum(windows) if known else None,
+                                                 max(node.rules_age for node in nodes) if known else None,
+                                                 simulator=self._replay(digests, reference.query_rules,
+                                                                        track_overlaps=True))
+        if cache_sim:
+            # Every node has its own query cache: model the mean node's share of the arrivals
+            candidates = []
+            for digest in dict.fromkeys(q.digest for q in top_queries):
+                digest_text, qps, rows_sent, count_star, sum_time = loads[digest]
+                if count_star:
+                    candidates.append(DigestLoad(digest=digest, digest_text=digest_text, qps=qps / len(nodes),
+                                                 rows_per_exec=rows_sent / count_star,
+                                                 avg_time_us=sum_time / count_star,
+                                                 keys=cache_keys if '?' in digest_text else 1))
+            size_mb = reference.cache_config.get('mysql-query_cache_size_MB', '256')
+            merged.cache_model = QueryCacheModel(candidates, size_mb=int(size_mb) if str(size_mb).isdigit() else 256,
+                                                 keys_per_digest=cache_keys)
+        if convert_rules:
+            merged.rule_conversion = self.analyzer.convert_cache_rules(
+                reference.query_rules, functools.partial(self._replay, digests))
+        if cluster:
+            merged.clusters = self.analyzer.cluster_digests(
+                (q.hostgroup, q.digest, q.digest_text, q.count_star, q.sum_time, q.max_time) for q in digests)
+        return merged
 
 
 def main():
@@ -1197,6 +7336,21 @@ def main():
 Examples:
   uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin
   uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --top 30
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --watch 5
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --exporter 9105
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --simulate-rules
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --capture node1.snap.gz
+  uv run proxysql_report.py --from-snapshot node1.snap.gz
+  uv run proxysql_report.py --user admin --password admin --fleet 10.0.0.11:6032,10.0.0.12:6032,10.0.0.13:6032
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --watch 1 --history history.db
+  uv run proxysql_report.py --history history.db --trend 24h --trend-match cache.
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --profile profile.json
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --anomalies /var/lib/proxysql-report.state
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --baseline before.json
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --format ndjson --top 5000
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --compare before.json --threshold digest_time_pct=10
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --apply --apply-window 5m
+  uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --top 200 --workload prod.json
 
 by George Liu (eva2000) at https://centminmod.com/
         """
@@ -1212,19 +7366,214 @@ by George Liu (eva2000) at https://centminmod.com/
                        help='ProxySQL admin password (default: admin)')
     parser.add_argument('--top', type=int, default=20,
                        help='Number of top queries to analyze (default: 20)')
+    parser.add_argument('--stream-digests', action='store_true',
+                       help='Rank the whole stats_mysql_query_digest table with a bounded top-N heap '
+                            'instead of the top 200 by sum_time')
+    parser.add_argument('--rank-by', choices=sorted(DIGEST_RANK_KEYS), default='cache_score',
+                       help='Digest ranking key for the top queries (default: cache_score)')
+    parser.add_argument('--columnar', action='store_true',
+                       help='Load the digest table into NumPy columns and rank with vectorized scores '
+                            '(needs numpy: uv run --with numpy)')
+    parser.add_argument('--free-conn-details', type=int, default=0, metavar='N',
+                       help='Also list the N longest idle free connections (per-connection drill-down)')
+    parser.add_argument('--simulate-rules', action='store_true',
+                       help='Replay every digest through the existing and proposed query rules '
+                            'and report coverage, write matches and regex cost')
+    parser.add_argument('--rule-match', choices=RULE_MATCH_MODES, default='pattern',
+                       help='What proposed cache rules match on: a match_pattern regex of the digest text '
+                            '(default), the whole digest text as an anchored match_digest, or the digest hash')
+    parser.add_argument('--convert-rules', action='store_true',
+                       help='Convert the existing regex cache rules to digest / anchored match_digest rules '
+                            'and compare the per-query regex cost before and after')
+    parser.add_argument('--rule-chain', action='store_true',
+                       help='Profile mysql_query_rules with stats_mysql_query_rules hits and print a '
+                            'pruned, reordered rule set')
+    parser.add_argument('--cache-sim', action='store_true',
+                       help='Predict query cache hit rate, memory and purge rate for candidate TTLs '
+                            'and mysql-query_cache_size_MB values')
+    parser.add_argument('--cache-keys', type=int, default=100, metavar='N',
+                       help='Distinct cache keys (literal values) assumed per parameterized digest '
+                            'for --cache-sim, and replayed per digest by a --workload file (default: 100)')
+    parser.add_argument('--cluster-digests', action='store_true',
+                       help='Group structurally equivalent SELECT digests (IN-list arity, column order, '
+                            'optional predicates) and propose one cache rule per cluster')
+    parser.add_argument('--routing', action='store_true',
+                       help='Find read-only SELECTs served by writer hostgroups (mysql_replication_hostgroups) '
+                            'and generate rules routing the safe ones to the reader hostgroup')
+    parser.add_argument('--exporter', metavar='[HOST:]PORT',
+                       help='Serve the derived metrics in OpenMetrics format on http://HOST:PORT/metrics')
+    parser.add_argument('--exporter-max-age', type=float, default=10.0, metavar='SECONDS',
+                       help='Reuse a collection pass for scrapes within SECONDS of it (default: 10)')
+    parser.add_argument('--scrape-budget', type=float, default=5.0, metavar='SECONDS',
+                       help='Longest a scrape waits for a collection before serving the previous one (default: 5)')
+    parser.add_argument('--digest-interval', type=float, default=300.0, metavar='SECONDS',
+                       help='Exporter refresh interval for the digest ranking (default: 300)')
+    parser.add_argument('--history', metavar='FILE',
+                       help='Append every run / watch tick / exporter pass to a local SQLite history FILE')
+    parser.add_argument('--history-max-mb', type=float, default=128, metavar='MB',
+                       help='Disk cap for the --history file; oldest fine-grained data is dropped first (default: 128)')
+    parser.add_argument('--trend', type=parse_duration, nargs='?', const=86400, metavar='WINDOW',
+                       help='Report trends from the --history file over WINDOW (e.g. 30m, 24h, 7d; default: 24h) and exit')
+    parser.add_argument('--trend-match', metavar='TEXT',
+                       help='Only show --trend series whose name contains TEXT (e.g. cache., hostgroup=10)')
+    parser.add_argument('--fleet', type=parse_endpoints, metavar='ENDPOINTS',
+                       help='Analyze many ProxySQL nodes at once and merge their digests cluster-wide: '
+                            'comma-separated HOST[:PORT] list (or --capture files), or @FILE with one per line')
+    parser.add_argument('--fleet-concurrency', type=int, default=8, metavar='N',
+                       help='Nodes collected at the same time in --fleet mode (default: 8)')
+    parser.add_argument('--node-timeout', type=float, default=30.0, metavar='SECONDS',
+                       help='Drop a --fleet node that has not answered within SECONDS (default: 30)')
+    parser.add_argument('--capture', metavar='FILE',
+                       help='Dump every table the analyzer reads into a compressed snapshot FILE and exit')
+    parser.add_argument('--from-snapshot', metavar='FILE',
+                       help='Run the full analysis offline from a --capture FILE (no connection)')
+    parser.add_argument('--workload', metavar='FILE',
+                       help='Write the --top digests by executions with their share of the mix and typed '
+                            'placeholders as a replayable workload FILE and exit (FILE.lua: sysbench script, '
+                            'else JSON for proxysql_workload.py)')
+    parser.add_argument('--watch', type=float, metavar='INTERVAL',
+                       help='Keep one admin session open and report per-second rates every INTERVAL seconds')
+    parser.add_argument('--watch-count', type=int, metavar='N',
+                       help='Stop watch mode after N intervals (default: run until Ctrl+C)')
+    parser.add_argument('--anomalies', metavar='STATE_FILE',
+                       help='Compare digests and memory with the previous run kept in STATE_FILE and print ranked '
+                            'alerts (new hot digests, latency/rate deviations, jemalloc growth); exit 2 on alerts')
+    parser.add_argument('--anomaly-sigma', type=float, default=ANOMALY_SIGMA, metavar='N',
+                       help=f'Standard deviations from the EWMA baseline that raise an alert (default: {ANOMALY_SIGMA:g})')
+    parser.add_argument('--baseline', metavar='FILE',
+                       help='Write this run\'s structured result (cache hit rate, multiplexing, pool efficiency, '
+                            'memory, per-digest average time) to FILE for a later --compare')
+    parser.add_argument('--compare', metavar='FILE',
+                       help='Diff this run against a --baseline FILE and exit 2 when a regression threshold is crossed')
+    parser.add_argument('--threshold', type=parse_threshold, action='append', default=[], metavar='NAME=VALUE',
+                       help='Override a --compare regression threshold (repeatable): '
+                            + ', '.join(f'{name}={value:g}' for name, value in BASELINE_THRESHOLDS.items()))
+    parser.add_argument('--apply', action='store_true',
+                       help='Canary the proposed cache rules that pass --simulate-rules: insert them, LOAD TO RUNTIME, '
+                            'compare the counters before and after and either SAVE TO DISK (measured benefit) or '
+                            'delete them again; exit 0 kept, 2 rolled back')
+    parser.add_argument('--apply-window', type=parse_duration, default=60, metavar='DURATION',
+                       help='Observation window before and after --apply loads the rules (e.g. 90s, 5m; default: 60s)')
+    parser.add_argument('--apply-interval', type=float, default=10.0, metavar='SECONDS',
+                       help='Sample and log the counters every SECONDS within an --apply window (default: 10)')
+    parser.add_argument('--apply-max-latency-pct', type=float, default=10.0, metavar='PCT',
+                       help='Roll back when mix-adjusted backend latency rises more than PCT%% (default: 10)')
+    parser.add_argument('--apply-max-error-pts', type=float, default=2.0, metavar='PTS',
+                       help='Roll back when the backend connection error rate rises more than PTS points (default: 2)')
+    parser.add_argument('--format', choices=REPORT_FORMATS, default='text',
+                       help='Report renderer: text, json (one document) or ndjson (one record per line); '
+                            'with json/ndjson progress and warnings go to stderr (default: text)')
+    parser.add_argument('--profile', nargs='?', const='', metavar='FILE',
+                       help='Time every collector (server wait, fetch, decode, rows, bytes) and the '
+                            'scoring/render stages; print a table after the report and write JSON to FILE')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Admin connections used to run collectors in parallel (default: 4, 1 = sequential)')
     parser.add_argument('--version', action='version',
                        version=f'ProxySQL Metrics Analyzer {ProxySQLAnalyzer.VERSION}')
 
     args = parser.parse_args()
 
+    if args.from_snapshot and (args.capture or args.watch or args.exporter):
+        parser.error("--from-snapshot cannot be combined with --capture, --watch or --exporter")
+    if args.fleet and (args.from_snapshot or args.capture or args.watch or args.exporter):
+        parser.error("--fleet cannot be combined with --from-snapshot, --capture, --watch or --exporter "
+                     "(list --capture files as fleet endpoints instead)")
+    if args.trend and not args.history:
+        parser.error("--trend needs --history FILE")
+    if args.anomalies and (args.capture or args.watch or args.exporter or args.fleet or args.trend):
+        parser.error("--anomalies applies to single report runs (live or --from-snapshot), e.g. from cron")
+    if (args.baseline or args.compare) and (args.capture or args.watch or args.exporter or args.fleet or args.trend):
+        parser.error("--baseline / --compare apply to single report runs (live or --from-snapshot)")
+    if args.threshold and not args.compare:
+        parser.error("--threshold needs --compare FILE")
+    if args.format != 'text' and (args.capture or args.watch or args.exporter or args.trend):
+        parser.error("--format applies to report runs (live, --from-snapshot or --fleet)")
+    if args.apply and (args.from_snapshot or args.capture or args.watch or args.exporter or args.fleet
+                       or args.trend or args.anomalies or args.baseline or args.compare or args.format != 'text'
+                       or args.profile is not None):
+        parser.error("--apply changes a live ProxySQL and runs on its own (no --from-snapshot, --capture, --watch, "
+                     "--exporter, --fleet, --trend, --anomalies, --baseline, --compare, --format or --profile)")
+    if args.routing and (args.capture or args.watch or args.exporter or args.fleet or args.trend or args.apply):
+        parser.error("--routing applies to a single report run (live or --from-snapshot)")
+    if args.convert_rules and (args.capture or args.watch or args.exporter or args.trend or args.apply):
+        parser.error("--convert-rules applies to report runs (live, --from-snapshot or --fleet)")
+    if args.profile is not None and (args.capture or args.watch or args.exporter or args.fleet or args.trend):
+        parser.error("--profile applies to a single report run (live or --from-snapshot)")
+    if args.workload and (args.capture or args.watch or args.exporter or args.fleet or args.trend or args.apply
+                          or args.format != 'text' or args.profile is not None):
+        parser.error("--workload writes a workload file from one ProxySQL (live or --from-snapshot) and exits "
+                     "(no --capture, --watch, --exporter, --fleet, --trend, --apply, --format or --profile)")
+
+    history = None
+    if args.history:
+        try:
+            history = HistoryStore(args.history, max_mb=args.history_max_mb)
+        except sqlite3.Error as e:
+            parser.error(f"cannot open history file {args.history}: {e}")
+
+    compare = None
+    if args.compare:
+        try:
+            compare = PerformanceBaseline.load(args.compare)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read baseline file {args.compare}: {e}")
+
+    anomalies = None
+    if args.anomalies:
+        anomalies = AnomalyDetector(args.anomalies, sigma=args.anomaly_sigma)
+        anomalies.load()
+
     analyzer = ProxySQLAnalyzer(
         host=args.host,
         port=args.port,
         user=args.user,
-        password=args.password
+        password=args.password,
+        workers=args.workers,
+        snapshot=args.from_snapshot,
+        history=history,
+        profiler=CollectorProfiler(args.profile or None) if args.profile is not None else None,
+        anomalies=anomalies,
+        baseline=args.baseline,
+        compare=compare,
+        thresholds=dict(args.threshold),
+        report_format=args.format,
+        rule_match=args.rule_match
     )
 
-    analyzer.run_analysis(top_n=args.top)
+    if args.trend:
+        analyzer.print_header()
+        analyzer.print_trend(args.trend, match=args.trend_match)
+        return
+
+    if args.capture:
+        analyzer.capture_snapshot(args.capture)
+        return
+
+    if args.workload:
+        analyzer.write_workload(args.workload, top_n=args.top, keys=args.cache_keys)
+        return
+
+    if args.apply:
+        analyzer.run_apply(window=args.apply_window, interval=args.apply_interval, top_n=args.top,
+                           rank_by=args.rank_by, max_latency_pct=args.apply_max_latency_pct,
+                           max_error_pts=args.apply_max_error_pts)
+    elif args.exporter:
+        analyzer.run_exporter(args.exporter, max_age=args.exporter_max_age, scrape_budget=args.scrape_budget,
+                              digest_interval=args.digest_interval, top_n=args.top, rank_by=args.rank_by)
+    elif args.watch:
+        analyzer.run_watch(args.watch, top_n=args.top, count=args.watch_count)
+    elif args.fleet:
+        analyzer.run_fleet(args.fleet, concurrency=args.fleet_concurrency, node_timeout=args.node_timeout,
+                           top_n=args.top, rank_by=args.rank_by, free_conn_details=args.free_conn_details,
+                           simulate_rules=args.simulate_rules, rule_chain=args.rule_chain,
+                           cache_sim=args.cache_sim, cache_keys=args.cache_keys, cluster=args.cluster_digests,
+                           convert_rules=args.convert_rules)
+    else:
+        analyzer.run_analysis(top_n=args.top, stream_digests=args.stream_digests, rank_by=args.rank_by,
+                              columnar=args.columnar, free_conn_details=args.free_conn_details,
+                              simulate_rules=args.simulate_rules, rule_chain=args.rule_chain,
+                              cache_sim=args.cache_sim, cache_keys=args.cache_keys, routing=args.routing,
+                              cluster=args.cluster_digests, convert_rules=args.convert_rules)
 
 
 if __name__ == '__main__':
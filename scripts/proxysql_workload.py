@@ -0,0 +1,445 @@
+#!/usr/bin/env -S uv run --quiet --script
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "mysql-connector-python>=8.0.33",
+# ]
+# ///
+
+"""
+ProxySQL Workload Replay v1.0.0
+
+Multi-threaded load driver for the workload files proxysql_report.py --workload
+writes: replays the production query mix (the top digests, their share of the
+executions and typed placeholder values) against ProxySQL, the emulator's
+--mysql-port stand-in or a MariaDB copy of the production schema, so the
+latency and offload of cache rules can be measured before they are rolled out.
+
+by George Liu (eva2000) at https://centminmod.com/
+
+Usage:
+    uv run proxysql_report.py --host 127.0.0.1 --port 6032 --user admin --password admin --top 200 --workload prod.json
+    uv run proxysql_workload.py --workload prod.json --host 127.0.0.1 --port 6033 --user app --password app --qps 500
+    uv run proxysql_workload.py --help
+"""
+
+import argparse
+import bisect
+import json
+import random
+import re
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+from typing import Dict, List
+
+try:
+    import mysql.connector
+    from mysql.connector import Error
+except ImportError:
+    print("Error: mysql-connector-python not installed. Run with: uv run proxysql_workload.py")
+    sys.exit(1)
+
+
+WORKLOAD_FORMAT = 'proxysql-report-workload'
+RESULT_FORMAT = 'proxysql-workload-result'
+PLACEHOLDER_RE = re.compile(r'\?')
+
+# Latency percentiles reported, digests listed in the text report (the JSON
+# result has all of them), the per-digest percentile --compare diffs (the tail
+# of a few hundred executions is too noisy) and the change it flags
+PERCENTILES = (50, 95, 99)
+REPORT_DIGESTS = 15
+COMPARE_PERCENTILE = 'p50'
+COMPARE_FLAG_PCT = 10.0
+
+
+@dataclass
+class WorkloadDigest:
+    """One digest of the mix (the proxysql_report.py --workload fields the driver needs)"""
+    digest: str
+    sql: str
+    params: List[str]
+    weight: float
+    qps: float
+    read_only: bool
+
+
+@dataclass
+class Workload:
+    """A proxysql_report.py --workload file"""
+    source: str
+    qps: float
+    keys: int
+    schemaname: str
+    limit: int
+    time_base: int
+    coverage_pct: float
+    digests: List[WorkloadDigest]
+
+    @classmethod
+    def load(cls, path: str) -> 'Workload':
+        """Read a workload file (raises OSError / ValueError)"""
+        with open(path, encoding='utf-8') as f:
+            spec = json.load(f)
+        if not isinstance(spec, dict) or spec.get('format') != WORKLOAD_FORMAT:
+            raise ValueError("not a workload file (write one with proxysql_report.py --workload FILE.json)")
+        try:
+            names = [f.name for f in fields(WorkloadDigest)]
+            digests = [WorkloadDigest(**{name: d[name] for name in names}) for d in spec['digests']]
+            return cls(source=spec['source'], qps=spec['qps'], keys=spec['keys'], schemaname=spec['schemaname'],
+                       limit=spec['limit'], time_base=spec['time_base'], coverage_pct=spec['coverage_pct'],
+                       digests=digests)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"incomplete workload file: {e}")
+
+    def value(self, kind: str, n: int) -> str:
+        """SQL literal of the n-th value of a placeholder kind (as the --workload sysbench script renders it)"""
+        if kind == 'limit':
+            return str(self.limit)
+        if kind == 'string':
+            return f"'v{n}'"
+        if kind == 'time':
+            return datetime.fromtimestamp(self.time_base + n * 60, timezone.utc).strftime("'%Y-%m-%d %H:%M:%S'")
+        return str(n)
+
+    def render(self, digest: WorkloadDigest, key: int) -> str:
+        """The query for cache key `key` of a digest: placeholder n gets value key + n"""
+        values = iter([self.value(kind, key + n) for n, kind in enumerate(digest.params)])
+        return PLACEHOLDER_RE.sub(lambda m: next(values, '1'), digest.sql)
+
+
+@dataclass
+class DigestResult:
+    """Executions, errors and latencies (ms) of one digest during the measured window"""
+    executed: int = 0
+    errors: int = 0
+    latencies: array = field(default_factory=lambda: array('d'))
+    last_error: str = ''
+
+    def merge(self, other: 'DigestResult'):
+        self.executed += other.executed
+        self.errors += other.errors
+        self.latencies.extend(other.latencies)
+        self.last_error = other.last_error or self.last_error
+
+
+def percentiles(latencies) -> Dict[str, float]:
+    """p50/p95/p99 (nearest rank) of a latency sample, in ms"""
+    if not latencies:
+        return {f'p{p}': 0.0 for p in PERCENTILES}
+    ordered = sorted(latencies)
+    return {f'p{p}': round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3) for p in PERCENTILES}
+
+
+class WorkloadDriver:
+    """Replay a Workload on N threads, each with its own connection
+
+    Every execution picks a digest by its weight and a cache key uniformly
+    from 1..keys, so each digest cycles through `keys` distinct queries like
+    --cache-sim assumes. With a target rate the schedule is open-loop: each
+    thread sends on a fixed timetable and latency is measured from the
+    scheduled start, so a stalled server shows up as latency instead of as a
+    lower send rate (no coordinated omission). Executions in the warmup are
+    not counted.
+    """
+
+    def __init__(self, workload: Workload, host: str, port: int, user: str, password: str,
+                 database: str, threads: int = 8, qps: float = 0.0, duration: float = 60.0,
+                 warmup: float = 0.0, seed: int = 42, writes: bool = True):
+        self.workload = workload
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+        self.threads = max(1, threads)
+        self.qps = qps
+        self.duration = duration
+        self.warmup = warmup
+        self.seed = seed
+        self.digests = [d for d in workload.digests if writes or d.read_only]
+        total = sum(d.weight for d in self.digests)
+        self.cumulative = []
+        running = 0.0
+        for d in self.digests:
+            running += d.weight / total
+            self.cumulative.append(running)
+        self.results: List[List[DigestResult]] = []
+        self.connect_errors: List[str] = []
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return mysql.connector.connect(host=self.host, port=self.port, user=self.user, password=self.password,
+                                       database=self.database or None, autocommit=True, connection_timeout=10)
+
+    def run(self) -> float:
+        """Run every thread to the end of the window; returns the measured seconds"""
+        started = time.monotonic()
+        measure_from = started + self.warmup
+        deadline = measure_from + self.duration
+        workers = [threading.Thread(target=self.worker, args=(n, started, measure_from, deadline),
+                                    name=f'replay-{n}', daemon=True) for n in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return max(0.0, min(time.monotonic(), deadline) - measure_from)
+
+    def worker(self, n: int, started: float, measure_from: float, deadline: float):
+        rng = random.Random(self.seed + n)
+        results = [DigestResult() for _ in self.digests]
+        try:
+            conn = self.connect()
+        except Error as e:
+            with self._lock:
+                self.connect_errors.append(str(e))
+            return
+        interval = self.threads / self.qps if self.qps else 0.0
+        next_at = started + n * interval / self.threads
+        cursor = conn.cursor()
+        try:
+            while True:
+                now = time.monotonic()
+                if interval:
+                    if next_at >= deadline:
+                        break
+                    if next_at > now:
+                        time.sleep(next_at - now)
+                    scheduled, next_at = next_at, next_at + interval
+                elif now >= deadline:
+                    break
+                else:
+                    scheduled = now
+                index = min(bisect.bisect_left(self.cumulative, rng.random()), len(self.digests) - 1)
+                sql = self.workload.render(self.digests[index], rng.randint(1, self.workload.keys))
+                error = ''
+                try:
+                    cursor.execute(sql)
+                    if cursor.with_rows:
+                        cursor.fetchall()
+                except Error as e:
+                    error = str(e)
+                finished = time.monotonic()
+                if scheduled >= measure_from:
+                    result = results[index]
+                    result.executed += 1
+                    if error:
+                        result.errors += 1
+                        result.last_error = error
+                    else:
+                        result.latencies.append((finished - scheduled) * 1000)
+                if error and not conn.is_connected():
+                    try:
+                        conn.reconnect(attempts=1)
+                        cursor = conn.cursor()
+                    except Error as e:
+                        with self._lock:
+                            self.connect_errors.append(str(e))
+                        break
+        finally:
+            try:
+                conn.close()
+            except Error:
+                pass
+            with self._lock:
+                self.results.append(results)
+
+    def summary(self, elapsed: float) -> Dict:
+        """The replay result: overall and per-digest rates, errors and latency percentiles"""
+        merged = [DigestResult() for _ in self.digests]
+        for results in self.results:
+            for total, result in zip(merged, results):
+                total.merge(result)
+        executed = sum(r.executed for r in merged)
+        latencies = array('d')
+        for r in merged:
+            latencies.extend(r.latencies)
+        digests = []
+        for n, (d, r) in enumerate(zip(self.digests, merged)):
+            digests.append({
+                'digest': d.digest, 'sql': d.sql,
+                'target_pct': round((self.cumulative[n] - (self.cumulative[n - 1] if n else 0.0)) * 100, 3),
+                'share_pct': round(r.executed / executed * 100, 3) if executed else 0.0,
+                'executed': r.executed, 'errors': r.errors, 'last_error': r.last_error,
+                **percentiles(r.latencies),
+            })
+        return {
+            'format': RESULT_FORMAT,
+            'finished_at': time.time(),
+            'target': f"{self.host}:{self.port}",
+            'threads': self.threads,
+            'target_qps': self.qps,
+            'seconds': round(elapsed, 3),
+            'executed': executed,
+            'errors': sum(r.errors for r in merged),
+            'qps': round(executed / elapsed, 3) if elapsed else 0.0,
+            **percentiles(latencies),
+            'connect_errors': self.connect_errors,
+            'digests': digests,
+        }
+
+
+def print_summary(result: Dict):
+    """Print a replay result"""
+    print("-------- Replay Results " + "-" * 66)
+    print(f"✔  {result['executed']:,} queries in {result['seconds']:.1f}s on {result['threads']} threads: "
+          f"{result['qps']:,.1f} q/s" + (f" (target {result['target_qps']:,.0f})" if result['target_qps'] else ""))
+    print("ℹ  Latency ms: " + "  ".join(f"p{p} {result[f'p{p}']:.2f}" for p in PERCENTILES))
+    if result['errors']:
+        print(f"⚠  {result['errors']:,} queries failed ({result['errors'] / max(1, result['executed']) * 100:.1f}%)")
+    for error in sorted(set(result['connect_errors'])):
+        print(f"✗  Connection failed: {error}")
+    print()
+    print(f"{'Target%':<9}{'Actual%':<9}{'Exec':<9}{'Err':<6}{'p50':<8}{'p95':<8}{'p99':<8}{'Query Pattern'}")
+    print("-" * 90)
+    for d in result['digests'][:REPORT_DIGESTS]:
+        query_text = d['sql'][:31] + ".." if len(d['sql']) > 33 else d['sql']
+        print(f"{d['target_pct']:<9.1f}{d['share_pct']:<9.1f}{d['executed']:<9,}{d['errors']:<6,}"
+              f"{d['p50']:<8.2f}{d['p95']:<8.2f}{d['p99']:<8.2f}{query_text}")
+    if len(result['digests']) > REPORT_DIGESTS:
+        print(f"... {len(result['digests']) - REPORT_DIGESTS} more (--format json lists all)")
+    failing = [d for d in result['digests'] if d['errors']]
+    if failing:
+        print()
+        for d in failing[:5]:
+            print(f"⚠  {d['errors']:,} errors: {d['sql'][:60]} - {d['last_error']}")
+    print()
+
+
+def print_comparison(result: Dict, baseline: Dict):
+    """Print the change of rate and latency percentiles against an earlier --baseline result"""
+    print("-------- Compared with Baseline " + "-" * 58)
+
+    def change(key: str, before: Dict, after: Dict) -> str:
+        if not before[key]:
+            return f"{key} {after[key]:.2f}"
+        pct = (after[key] - before[key]) / before[key] * 100
+        return f"{key} {before[key]:.2f} → {after[key]:.2f} ({pct:+.1f}%)"
+
+    print(f"ℹ  Throughput: {baseline['qps']:,.1f} → {result['qps']:,.1f} q/s")
+    print("ℹ  Latency ms: " + "  ".join(change(f'p{p}', baseline, result) for p in PERCENTILES))
+    before = {d['digest']: d for d in baseline['digests']}
+    changed = []
+    for d in result['digests']:
+        old = before.get(d['digest'])
+        key = COMPARE_PERCENTILE
+        if old and old[key] and d['executed'] and abs(d[key] - old[key]) / old[key] * 100 >= COMPARE_FLAG_PCT:
+            changed.append(((d[key] - old[key]) / old[key] * 100, d, old))
+    for pct, d, old in sorted(changed, key=lambda c: c[0])[:REPORT_DIGESTS]:
+        marker = '✔ ' if pct < 0 else '⚠ '
+        print(f"{marker} {COMPARE_PERCENTILE} {old[COMPARE_PERCENTILE]:.2f} → {d[COMPARE_PERCENTILE]:.2f} ms "
+              f"({pct:+.1f}%)  {d['sql'][:60]}")
+    if not changed:
+        print(f"ℹ  No digest's {COMPARE_PERCENTILE} moved by {COMPARE_FLAG_PCT:g}% or more")
+    print()
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(
+        description="ProxySQL Workload Replay - replay a proxysql_report.py --workload mix against ProxySQL or MySQL",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  uv run proxysql_workload.py --workload prod.json --host 127.0.0.1 --port 6033 --user app --password app
+  uv run proxysql_workload.py --workload prod.json --port 6033 --qps 500 --duration 120 --warmup 10 --baseline before.json
+  uv run proxysql_workload.py --workload prod.json --port 6033 --qps 500 --duration 120 --warmup 10 --compare before.json
+  uv run proxysql_workload.py --workload prod.json --port 3306 --database appdb_copy --no-writes
+
+by George Liu (eva2000) at https://centminmod.com/
+        """
+    )
+
+    parser.add_argument('--workload', required=True, metavar='FILE',
+                       help='Workload written by proxysql_report.py --workload FILE.json')
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='ProxySQL (or MySQL) host (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=6033,
+                       help='ProxySQL client port, or a MySQL port (default: 6033)')
+    parser.add_argument('--user', default='app',
+                       help='Client user (default: app)')
+    parser.add_argument('--password', default='',
+                       help='Client password (default: empty)')
+    parser.add_argument('--database',
+                       help='Default schema (default: the busiest schema of the workload)')
+    parser.add_argument('--threads', type=int, default=8,
+                       help='Client threads, one connection each (default: 8)')
+    parser.add_argument('--qps', type=float, default=0.0,
+                       help='Target rate over all threads, open-loop (default: 0 = as fast as the threads go)')
+    parser.add_argument('--duration', type=float, default=60.0, metavar='SECONDS',
+                       help='Measured replay time (default: 60)')
+    parser.add_argument('--warmup', type=float, default=0.0, metavar='SECONDS',
+                       help='Replay this long before measuring, e.g. to fill the query cache (default: 0)')
+    parser.add_argument('--no-writes', action='store_true',
+                       help='Replay the read-only digests only (e.g. against a production copy)')
+    parser.add_argument('--seed', type=int, default=42,
+                       help='Random seed of the digest and key choices (default: 42)')
+    parser.add_argument('--format', choices=('text', 'json'), default='text',
+                       help='Result output (default: text)')
+    parser.add_argument('--baseline', metavar='FILE',
+                       help='Write the JSON result to FILE for a later --compare')
+    parser.add_argument('--compare', metavar='FILE',
+                       help='Compare the result with a --baseline FILE (e.g. before the cache rules were loaded)')
+    parser.add_argument('--version', action='version', version='ProxySQL Workload Replay 1.0.0')
+
+    args = parser.parse_args()
+
+    try:
+        workload = Workload.load(args.workload)
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot read workload file {args.workload}: {e}")
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline.get('format') != RESULT_FORMAT:
+                raise ValueError("not a proxysql_workload.py --baseline file")
+        except (OSError, ValueError, AttributeError) as e:
+            parser.error(f"cannot read baseline file {args.compare}: {e}")
+
+    driver = WorkloadDriver(workload, args.host, args.port, args.user, args.password,
+                            database=args.database if args.database is not None else workload.schemaname,
+                            threads=args.threads, qps=args.qps, duration=args.duration, warmup=args.warmup,
+                            seed=args.seed, writes=not args.no_writes)
+    if not driver.digests:
+        parser.error("--no-writes leaves no digests to replay")
+
+    log = sys.stderr if args.format == 'json' else sys.stdout
+    print("\n >>  ProxySQL Workload Replay 1.0.0", file=log)
+    print(" >>  by George Liu (eva2000) at https://centminmod.com/\n", file=log)
+    print(f"✔  {len(driver.digests)} digests from {args.workload} ({workload.coverage_pct:.1f}% of the executions "
+          f"of {workload.source}, {workload.qps:,.1f} q/s in production)", file=log)
+    rate = f"{args.qps:,.0f} q/s" if args.qps else "full speed"
+    warmup = f" after {args.warmup:g}s warmup" if args.warmup else ""
+    print(f"ℹ  Replaying {args.duration:g}s{warmup} on {driver.threads} threads at {rate} against "
+          f"{args.host}:{args.port}/{driver.database}\n", file=log)
+
+    try:
+        elapsed = driver.run()
+    except KeyboardInterrupt:
+        print("\nℹ  Interrupted", file=log)
+        sys.exit(1)
+    result = driver.summary(elapsed)
+    if result['connect_errors'] and not result['executed']:
+        print(f"✗  Connection failed: {result['connect_errors'][0]}", file=log)
+        sys.exit(1)
+
+    if args.format == 'json':
+        print(json.dumps(result, indent=1))
+    else:
+        print_summary(result)
+        if baseline:
+            print_comparison(result, baseline)
+    if args.baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+        print(f"✔  Result written to {args.baseline}\n", file=log)
+
+
+if __name__ == '__main__':
+    main()